@@ -0,0 +1,199 @@
+"""
+Autocompletado de nombres de alimentos en memoria.
+
+Las claves (nombre normalizado completo y el resto del nombre a partir de cada
+palabra de 3 o más letras) se guardan en una lista ordenada; un prefijo es un
+rango contiguo que se localiza con búsqueda binaria. Para los prefijos cuyo
+rango es grande (las primeras letras) el top-k por popularidad se precalcula al
+construir el índice, así que ninguna consulta recorre más de UMBRAL_RANGO claves.
+"""
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count
+
+from nutricion.models import AlimentoConsumido
+
+from .catalogo import version_catalogo
+from .models import Alimento, IngredienteReceta
+from .texto import normalizar
+
+UMBRAL_RANGO = 2048         # Rangos mayores tienen el top-k precalculado
+LONGITUD_MINIMA_PALABRA = 3
+
+_CONFIGURACION = {
+    'RESULTADOS_DEFECTO': 10,
+    'MAX_RESULTADOS': 20,
+    'MAX_EDAD_SEGUNDOS': 3600,  # La popularidad se refresca aunque el catálogo no cambie
+    **settings.MACROMATE_SETTINGS.get('AUTOCOMPLETAR', {}),
+}
+
+
+def _claves_nombre(nombre_normalizado):
+    palabras = nombre_normalizado.split()
+    yield nombre_normalizado
+    for i in range(1, len(palabras)):
+        if len(palabras[i]) >= LONGITUD_MINIMA_PALABRA:
+            yield ' '.join(palabras[i:])
+
+
+class IndicePrefijos:
+    """
+    Índice inmutable; para reflejar cambios del catálogo se construye otro
+    """
+
+    def __init__(self, alimentos, max_resultados=None):
+        """
+        alimentos: iterable de (id, nombre, nombre_normalizado, popularidad)
+        """
+        self.max_resultados = max_resultados or _CONFIGURACION['MAX_RESULTADOS']
+        self.version = None
+        self.construido = time.monotonic()
+
+        ids, nombres, popularidades, entradas = [], [], [], []
+        for posicion, (pk, nombre, normalizado, popularidad) in enumerate(alimentos):
+            ids.append(pk)
+            nombres.append(nombre)
+            popularidades.append(popularidad)
+            entradas.extend((clave, posicion) for clave in _claves_nombre(normalizado or normalizar(nombre)))
+        entradas.sort()
+
+        self._ids = np.array(ids, dtype=np.int64)
+        self._nombres = nombres
+        self._claves = [clave for clave, _ in entradas]
+        self._posiciones = np.array([posicion for _, posicion in entradas], dtype=np.int64)
+        # Popularidad de cada clave (la de su alimento)
+        self._popularidad_claves = np.array(popularidades, dtype=np.float64)[self._posiciones] if entradas else np.array([])
+        self._top = {}
+        self._precalcular()
+
+    def _mejores(self, inicio, fin, k):
+        """
+        Posiciones (en self._claves) de las k claves más populares del rango, en orden
+        """
+        popularidad = self._popularidad_claves[inicio:fin]
+        if fin - inicio > k:
+            seleccion = np.argpartition(-popularidad, k - 1)[:k]
+        else:
+            seleccion = np.arange(fin - inicio)
+        seleccion = seleccion[np.lexsort((seleccion, -popularidad[seleccion]))]
+        return seleccion + inicio
+
+    def _precalcular(self):
+        # Recorre el árbol implícito de prefijos bajando solo por los rangos grandes
+        pendientes = [(0, len(self._claves), 0)]
+        reserva = self.max_resultados * 4  # Margen para descartar claves repetidas del mismo alimento
+        while pendientes:
+            inicio, fin, profundidad = pendientes.pop()
+            if fin - inicio <= UMBRAL_RANGO:
+                continue
+            if profundidad:
+                self._top[self._claves[inicio][:profundidad]] = self._mejores(inicio, fin, reserva)
+
+            # Las claves que terminan en esta profundidad van primero en el orden
+            while inicio < fin and len(self._claves[inicio]) <= profundidad:
+                inicio += 1
+            while inicio < fin:
+                caracter = self._claves[inicio][profundidad]
+                siguiente = bisect_left(self._claves, self._claves[inicio][:profundidad] + chr(ord(caracter) + 1), inicio, fin)
+                pendientes.append((inicio, siguiente, profundidad + 1))
+                inicio = siguiente
+
+    def buscar(self, prefijo, k=None):
+        """
+        Hasta k alimentos cuyo nombre (o una de sus palabras) empieza por el prefijo,
+        ordenados por popularidad. Devuelve [(id, nombre)].
+        """
+        k = max(1, min(k or _CONFIGURACION['RESULTADOS_DEFECTO'], self.max_resultados))
+        prefijo = normalizar(prefijo)
+        if not prefijo:
+            return []
+
+        candidatos = self._top.get(prefijo)
+        if candidatos is None:
+            inicio = bisect_left(self._claves, prefijo)
+            fin = bisect_left(self._claves, prefijo + '\uffff', inicio)
+            if inicio == fin:
+                return []
+            candidatos = self._mejores(inicio, fin, min(k * 4, fin - inicio))
+
+        resultado, vistos = [], set()
+        for posicion in self._posiciones[candidatos]:
+            if posicion not in vistos:
+                vistos.add(posicion)
+                resultado.append((int(self._ids[posicion]), self._nombres[posicion]))
+                if len(resultado) == k:
+                    break
+        return resultado
+
+    def memoria_bytes(self):
+        """
+        Estimación de la memoria ocupada por el índice
+        """
+        total = self._ids.nbytes + self._posiciones.nbytes + self._popularidad_claves.nbytes
+        total += sys.getsizeof(self._nombres) + sum(sys.getsizeof(n) for n in self._nombres)
+        total += sys.getsizeof(self._claves) + sum(sys.getsizeof(c) for c in self._claves)
+        total += sys.getsizeof(self._top) + sum(
+            sys.getsizeof(p) + v.nbytes for p, v in self._top.items()
+        )
+        return total
+
+    def estadisticas(self):
+        return {
+            'alimentos': len(self._nombres),
+            'claves': len(self._claves),
+            'prefijos_precalculados': len(self._top),
+            'memoria_bytes': self.memoria_bytes(),
+            'version': self.version,
+        }
+
+
+def popularidad_alimentos():
+    """
+    Número de veces que se ha consumido cada alimento o usado en una receta
+    """
+    popularidad = {}
+    for modelo in (AlimentoConsumido, IngredienteReceta):
+        for pk, usos in modelo.objects.values('id_alimento').annotate(usos=Count('id')).values_list('id_alimento', 'usos'):
+            popularidad[pk] = popularidad.get(pk, 0) + usos
+    return popularidad
+
+
+def construir_indice():
+    version = version_catalogo()
+    popularidad = popularidad_alimentos()
+    filas = Alimento.objects.values_list('pk', 'nombre', 'nombre_normalizado').iterator(chunk_size=5000)
+    indice = IndicePrefijos((pk, nombre, normalizado, popularidad.get(pk, 0)) for pk, nombre, normalizado in filas)
+    indice.version = version
+    return indice
+
+
+_indice = None
+_bloqueo = threading.Lock()
+
+
+def obtener_indice():
+    """
+    Índice del proceso; se reconstruye si cambió la versión del catálogo o caducó la popularidad.
+    Mientras un hilo reconstruye, el resto sigue usando el índice anterior.
+    """
+    global _indice
+    actual = _indice
+    if actual is not None and actual.version == version_catalogo() and (
+        time.monotonic() - actual.construido < _CONFIGURACION['MAX_EDAD_SEGUNDOS']
+    ):
+        return actual
+
+    # Solo espera al bloqueo quien todavía no tiene ningún índice que usar
+    if not _bloqueo.acquire(blocking=actual is None):
+        return actual
+    try:
+        if _indice is actual:
+            _indice = construir_indice()
+        return _indice
+    finally:
+        _bloqueo.release()
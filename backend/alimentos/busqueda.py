@@ -0,0 +1,221 @@
+"""
+Índice de búsqueda de alimentos por trigramas.
+
+Cada alimento se indexa con los trigramas de su nombre normalizado (sin tildes,
+en minúsculas) y, con menos peso, los del nombre de su categoría. Las entradas de
+cada trigrama están ordenadas por longitud del nombre, y una búsqueda lee el
+principio de las listas de los trigramas de la consulta, sin LIKE. Si alguna no
+cabe, se completa la puntuación de los alimentos del trigrama menos común
+(ver buscar_alimentos).
+"""
+import heapq
+from collections import defaultdict
+
+from django.db import connection, transaction
+
+from .models import Alimento, TrigramaAlimento
+from .texto import normalizar
+
+PESO_NOMBRE = 2
+PESO_CATEGORIA = 1
+MAX_CANDIDATOS = 200            # Candidatos que se puntúan y devuelven por búsqueda
+POSTINGS_POR_TRIGRAMA = 500     # Entradas leídas del principio de cada trigrama; con más, el trigrama es común
+MAX_POSTINGS_REPUNTUADOS = 2000 # Entradas del trigrama menos común puntuadas con exactitud como máximo
+PAGINA_REPUNTUADO = 500         # Por consulta (ids en IN, por debajo del límite de parámetros de SQLite)
+MAX_TRIGRAMAS_CONSULTA = 32
+SIMILITUD_MINIMA = 0.3          # Fracción mínima de los trigramas de la consulta que debe coincidir
+
+
+def trigramas(texto):
+    """
+    Trigramas de cada palabra ya normalizada, con relleno al estilo pg_trgm
+    ('  p', ' pl', 'pla', ..., 'no ') para que el inicio de palabra pese más
+    """
+    resultado = set()
+    for palabra in texto.split():
+        relleno = f'  {palabra} '
+        resultado.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+    return resultado
+
+
+def _postings(alimento_id, nombre_normalizado, nombre_categoria):
+    pesos = {t: PESO_CATEGORIA for t in trigramas(normalizar(nombre_categoria))}
+    pesos.update({t: PESO_NOMBRE for t in trigramas(nombre_normalizado)})
+    longitud = min(len(nombre_normalizado), 32767)
+    return [(t, alimento_id, peso, longitud) for t, peso in pesos.items()]
+
+
+def _insertar_postings(filas):
+    # INSERT directo con executemany: instanciar un modelo por trigrama
+    # multiplica por diez el coste de reconstruir el índice
+    opts = TrigramaAlimento._meta
+    columnas = ', '.join(
+        connection.ops.quote_name(opts.get_field(c).column)
+        for c in ('trigrama', 'id_alimento', 'peso', 'longitud')
+    )
+    sql = f'INSERT INTO {connection.ops.quote_name(opts.db_table)} ({columnas}) VALUES (%s, %s, %s, %s)'
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, filas)
+
+
+def indexar_alimentos(ids_alimento):
+    """
+    Regenera las entradas del índice de los alimentos dados (en bloque)
+    """
+    ids_alimento = list(ids_alimento)
+    filas = Alimento.objects.filter(pk__in=ids_alimento).values_list(
+        'pk', 'nombre_normalizado', 'id_categoria__nombre'
+    )
+    with transaction.atomic():
+        TrigramaAlimento.objects.filter(id_alimento_id__in=ids_alimento).delete()
+        _insertar_postings([p for pk, nombre, categoria in filas for p in _postings(pk, nombre, categoria)])
+
+
+def reconstruir_indice(tamano_lote=2000, salida=None):
+    """
+    Recalcula nombre_normalizado y todo el índice, por bloques de alimentos.
+    Cada bloque se sustituye en su propia transacción, así que las búsquedas
+    siguen funcionando mientras se reconstruye.
+    """
+    total = 0
+    ultimo_id = 0
+    while True:
+        bloque = list(
+            Alimento.objects.filter(pk__gt=ultimo_id).order_by('pk')
+            .only('pk', 'nombre', 'nombre_normalizado')[:tamano_lote]
+        )
+        if not bloque:
+            return total
+        cambiados = []
+        for alimento in bloque:
+            normalizado = normalizar(alimento.nombre)
+            if alimento.nombre_normalizado != normalizado:
+                alimento.nombre_normalizado = normalizado
+                cambiados.append(alimento)
+        with transaction.atomic():
+            Alimento.objects.bulk_update(cambiados, ['nombre_normalizado'])
+            indexar_alimentos([a.pk for a in bloque])
+        ultimo_id = bloque[-1].pk
+        total += len(bloque)
+        if salida:
+            salida(total)
+
+
+def _puntuacion(trigramas_consulta, nombre, categoria):
+    trigramas_nombre = trigramas(nombre)
+    trigramas_categoria = trigramas(normalizar(categoria))
+    return sum(
+        PESO_NOMBRE if t in trigramas_nombre else PESO_CATEGORIA if t in trigramas_categoria else 0
+        for t in trigramas_consulta
+    )
+
+
+def _repuntuar(acumulado, trigramas_consulta, menos_comun, limite):
+    # Puntuación exacta (sustituye a la de las listas recortadas) de la lista de menos_comun, de más corto a más largo
+    maximo = PESO_NOMBRE * len(trigramas_consulta)
+    lista = TrigramaAlimento.objects.filter(trigrama=menos_comun).order_by('longitud', 'id_alimento').values_list(
+        'id_alimento', flat=True
+    )
+    buscados = set(trigramas_consulta)
+    completos = 0
+    for inicio in range(0, MAX_POSTINGS_REPUNTUADOS, PAGINA_REPUNTUADO):
+        ids = list(lista[inicio:inicio + PAGINA_REPUNTUADO])
+        # Todas las entradas de esos alimentos por el índice de id_alimento: filtrar también por
+        # trigrama en SQL hace que SQLite recorra las listas (enormes) de los trigramas comunes
+        puntos = dict.fromkeys(ids, 0)
+        for pk, trigrama, peso in TrigramaAlimento.objects.filter(id_alimento__in=ids).values_list(
+            'id_alimento', 'trigrama', 'peso'
+        ):
+            if trigrama in buscados:
+                puntos[pk] += peso
+        acumulado.update(puntos)
+        completos += sum(p == maximo for p in puntos.values())
+        if len(ids) < PAGINA_REPUNTUADO or completos >= limite:
+            return
+
+
+def buscar_alimentos(consulta, limite=MAX_CANDIDATOS):
+    """
+    Devuelve [(id_alimento, relevancia)] ordenado de más a menos relevante.
+    La relevancia es un entero (0-1200 aprox.) para poder ordenar en SQL.
+
+    Por cada trigrama de la consulta se leen las POSTINGS_POR_TRIGRAMA
+    primeras entradas (las de nombres más cortos), en una única consulta UNION
+    ALL cuando la base de datos lo permite. Las listas de los trigramas raros
+    caben enteras; de las comunes solo saldrían los nombres cortos, y un nombre
+    largo que contiene la consulta (p. ej. «pollo» en un catálogo grande) se
+    quedaría sin sus puntos. Por eso, si alguna lista no cabe, los alimentos de
+    la del trigrama menos común se puntúan en SQL sobre todos los trigramas de
+    la consulta, por páginas y también de más corto a más largo, hasta tener
+    limite alimentos con todos ellos (los que se devolverían) o haber leído
+    MAX_POSTINGS_REPUNTUADOS entradas. Así la latencia tiene un máximo que no
+    depende del tamaño del catálogo; a cambio, un nombre largo solo puede
+    perderse si hay más de MAX_POSTINGS_REPUNTUADOS nombres más cortos con el
+    trigrama menos común y menos de limite coincidencias completas entre ellos.
+    Los candidatos se puntúan después con exactitud.
+    """
+    consulta_normalizada = normalizar(consulta)
+    trigramas_consulta = sorted(trigramas(consulta_normalizada))[:MAX_TRIGRAMAS_CONSULTA]
+    if not trigramas_consulta:
+        return []
+
+    listas = [
+        TrigramaAlimento.objects.filter(trigrama=t)
+        .order_by('longitud', 'id_alimento')
+        .values_list('trigrama', 'id_alimento', 'peso')[:POSTINGS_POR_TRIGRAMA + 1]
+        for t in trigramas_consulta
+    ]
+    if connection.features.supports_slicing_ordering_in_compound:
+        filas = listas[0].union(*listas[1:], all=True)
+    else:
+        # SQLite no admite LIMIT dentro de UNION: una consulta indexada y acotada por trigrama
+        filas = (fila for lista in listas for fila in lista)
+
+    por_trigrama = defaultdict(list)
+    for t, pk, peso in filas:
+        por_trigrama[t].append((pk, peso))
+    acumulado = defaultdict(int)
+    for lista in por_trigrama.values():
+        for pk, peso in lista[:POSTINGS_POR_TRIGRAMA]:
+            acumulado[pk] += peso
+
+    comunes = [t for t, lista in por_trigrama.items() if len(lista) > POSTINGS_POR_TRIGRAMA]
+    # Con algún trigrama sin entradas ningún alimento los tiene todos: basta lo leído
+    if comunes and len(por_trigrama) == len(trigramas_consulta):
+        raros = [t for t in por_trigrama if t not in comunes]
+        if raros:
+            menos_comun = min(raros, key=lambda t: (len(por_trigrama[t]), t))
+        else:
+            # Recuentos acotados: contar la lista entera crecería con el catálogo
+            recuentos = {
+                t: TrigramaAlimento.objects.filter(trigrama=t)[:MAX_POSTINGS_REPUNTUADOS + 1].count() for t in comunes
+            }
+            menos_comun = min(comunes, key=lambda t: (recuentos[t], t))
+        _repuntuar(acumulado, trigramas_consulta, menos_comun, limite)
+
+    maximo = PESO_NOMBRE * len(trigramas_consulta)
+    candidatos = heapq.nlargest(
+        limite,
+        (pk for pk, puntos in acumulado.items() if puntos >= SIMILITUD_MINIMA * maximo),
+        key=lambda pk: (acumulado[pk], -pk),
+    )
+    if not candidatos:
+        return []
+
+    filas = Alimento.objects.filter(pk__in=candidatos).values_list(
+        'pk', 'nombre_normalizado', 'id_categoria__nombre'
+    )
+    ranking = []
+    for pk, nombre, categoria in filas:
+        relevancia = 1000 * _puntuacion(trigramas_consulta, nombre, categoria) / maximo
+        # Desempate: los nombres que empiezan por la consulta o la contienen entera suben
+        if nombre.startswith(consulta_normalizada):
+            relevancia += 200
+        elif consulta_normalizada in nombre:
+            relevancia += 100
+        # A igual coincidencia, los nombres más cortos se parecen más a la consulta
+        relevancia -= min(len(nombre), 100) / 10
+        ranking.append((pk, int(relevancia)))
+
+    ranking.sort(key=lambda r: (-r[1], r[0]))
+    return ranking
@@ -0,0 +1,53 @@
+"""
+Versión del catálogo de alimentos.
+
+Cada alta, cambio o baja de un alimento o una categoría se anota en
+CambioCatalogo, y el id de la última anotación es la versión del catálogo:
+crece siempre y no depende de la caché. Las estructuras en memoria derivadas
+del catálogo (p. ej. el índice de autocompletado) la comparan para saber si
+tienen que reconstruirse, los listados la usan como ETag y los clientes
+sincronizan su copia desde ella (sincronizacion.py).
+
+Para no consultarla en cada petición se guarda en la caché: se actualiza al
+confirmar cada transacción que anota cambios y caduca a los SEGUNDOS_VERSION,
+así que una escritura concurrente que la deje atrás solo dura hasta entonces.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+
+from .models import CambioCatalogo
+
+CLAVE_VERSION = 'alimentos:version_catalogo'
+TIMEOUT_VERSION = settings.MACROMATE_SETTINGS['CATALOGO']['SEGUNDOS_VERSION']
+
+
+def ultima_version():
+    return CambioCatalogo.objects.aggregate(version=Max('id'))['version'] or 0
+
+
+def version_catalogo():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        version = ultima_version()
+        cache.add(CLAVE_VERSION, version, timeout=TIMEOUT_VERSION)
+    return version
+
+
+def actualizar_version_catalogo():
+    cache.set(CLAVE_VERSION, ultima_version(), timeout=TIMEOUT_VERSION)
+
+
+def registrar_cambios(tipo, ids, operacion):
+    """
+    Anota el cambio de los objetos ids ('alimento' o 'categoria'; 'guardado' o
+    'borrado'). Las señales lo hacen en cada save() y delete(); las operaciones
+    masivas (bulk_create, bulk_update, update) tienen que llamarlo ellas.
+    """
+    if not ids:
+        return
+    CambioCatalogo.objects.bulk_create(
+        [CambioCatalogo(tipo=tipo, id_objeto=pk, operacion=operacion) for pk in ids]
+    )
+    transaction.on_commit(actualizar_version_catalogo)
@@ -0,0 +1,32 @@
+from django.db.models import Case, IntegerField, Value, When
+from rest_framework import filters
+
+from .busqueda import buscar_alimentos
+from .texto import normalizar
+
+
+class BusquedaIndexadaFilter(filters.BaseFilterBackend):
+    """
+    Sustituye a SearchFilter: resuelve ?search= con el índice de trigramas
+    (sin tildes y ordenado por relevancia) en lugar de icontains + join.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        consulta = request.query_params.get(self.search_param, '')
+        if not normalizar(consulta):
+            return queryset
+
+        ranking = buscar_alimentos(consulta)
+        if not ranking:
+            return queryset.none()
+
+        relevancia = Case(
+            *[When(pk=pk, then=Value(puntos)) for pk, puntos in ranking],
+            output_field=IntegerField(),
+        )
+        return (
+            queryset.filter(pk__in=[pk for pk, _ in ranking])
+            .annotate(relevancia=relevancia)
+            .order_by('-relevancia', 'pk')
+        )
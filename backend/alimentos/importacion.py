@@ -0,0 +1,347 @@
+"""
+Importación masiva del catálogo de alimentos desde volcados CSV o JSONL.
+
+El fichero se lee línea a línea (memoria constante) y se procesa por lotes:
+por cada lote se buscan de una vez los alimentos que ya existen (por id
+externo o, si no lo hay, por nombre normalizado), se crean los nuevos con
+bulk_create y se actualizan con bulk_update solo los que cambian. Las
+categorías se resuelven con un mapa en memoria nombre normalizado -> id.
+
+Los valores de cada fila son por porción: la porción se convierte a gramos
+(g, kg, mg, oz, lb y, con densidad 1, ml, cl, dl y l) y va a porcion_gramos;
+sin porción se entiende 100 g. La energía puede venir en kcal o en kJ.
+
+bulk_create y bulk_update no emiten señales, así que cada lote hace en su
+misma transacción lo que harían ellas: reindexar los alimentos tocados,
+recalcular las recetas que los usan y anotar los cambios en el registro del
+catálogo (que también cambia su versión).
+Después se guarda en un fichero de progreso la posición (en bytes) hasta la
+que se ha importado, para poder reanudar. Repetir un lote ya confirmado no
+duplica nada: sus filas se encuentran y, sin cambios, no se escriben.
+"""
+import csv
+import json
+import os
+import re
+from collections import Counter
+from decimal import Decimal
+
+from django.db import transaction
+
+from .busqueda import indexar_alimentos
+from .catalogo import registrar_cambios
+from .models import Alimento, CategoriaAlimento, IngredienteReceta
+from .recetas import recalcular_recetas
+from .texto import normalizar
+
+TAMANO_LOTE = 2000
+MAXIMO_DECIMAL = 9999.99  # max_digits=6, decimal_places=2
+MAX_EJEMPLOS_DESCARTADAS = 5
+CAMPOS = ('nombre', 'calorias', 'energia_kj', 'proteinas', 'carbohidratos', 'grasas', 'porcion', 'categoria', 'id_externo')
+CAMPOS_ACTUALIZABLES = (
+    'nombre', 'nombre_normalizado', 'calorias', 'proteinas', 'carbohidratos', 'grasas',
+    'porcion_gramos', 'id_categoria', 'id_externo',
+)
+GRAMOS_POR_UNIDAD = {
+    '': 1, 'g': 1, 'gr': 1, 'grs': 1, 'gramos': 1, 'kg': 1000, 'mg': 0.001,
+    'oz': 28.349523125, 'lb': 453.59237,
+    'ml': 1, 'cl': 10, 'dl': 100, 'l': 1000,
+}
+KCAL_POR_UNIDAD = {'': 1, 'kcal': 1, 'kj': 1 / 4.184}
+_CANTIDAD = re.compile(r'^\s*(\d+(?:[.,]\d+)?)\s*([a-zA-Z]*)\.?\s*$')
+_BOM = b'\xef\xbb\xbf'
+
+
+class FilaInvalida(ValueError):
+    pass
+
+
+def _cantidad(valor, unidades, campo):
+    """
+    '1,5 kg' -> 1500.0 con unidades=GRAMOS_POR_UNIDAD; None si el valor está vacío
+    """
+    if valor is None or valor == '':
+        return None
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        numero, unidad = float(valor), ''
+    else:
+        coincidencia = _CANTIDAD.match(str(valor))
+        if not coincidencia:
+            raise FilaInvalida(f'{campo}: valor no reconocido {valor!r}')
+        numero, unidad = float(coincidencia[1].replace(',', '.')), coincidencia[2].lower()
+    if unidad not in unidades:
+        raise FilaInvalida(f'{campo}: unidad desconocida {unidad!r}')
+    numero *= unidades[unidad]
+    if not 0 <= numero <= MAXIMO_DECIMAL:
+        raise FilaInvalida(f'{campo}: fuera de rango ({numero:g})')
+    return Decimal(str(round(numero, 2)))
+
+
+def convertir_fila(valores):
+    """
+    valores: campo -> valor tal como viene en el fichero. Devuelve los campos de Alimento
+    (con categoria como nombre) o lanza FilaInvalida.
+    """
+    nombre = str(valores.get('nombre') or '').strip()[:200]
+    normalizado = normalizar(nombre)
+    if not normalizado:
+        raise FilaInvalida('nombre vacío')
+    calorias = _cantidad(valores.get('calorias'), KCAL_POR_UNIDAD, 'calorias')
+    if calorias is None:
+        kilojulios = _cantidad(valores.get('energia_kj'), {'': 1, 'kj': 1}, 'energia_kj')
+        if kilojulios is None:
+            raise FilaInvalida('sin calorías')
+        calorias = Decimal(str(round(float(kilojulios) / 4.184, 2)))
+    porcion = _cantidad(valores.get('porcion'), GRAMOS_POR_UNIDAD, 'porcion')
+    if porcion == 0:
+        raise FilaInvalida('porcion: cero gramos')
+    id_externo = str(valores.get('id_externo') or '').strip()
+    if len(id_externo) > 100:
+        raise FilaInvalida('id_externo: demasiado largo')
+    return {
+        'nombre': nombre,
+        'nombre_normalizado': normalizado,
+        'calorias': calorias,
+        'proteinas': _cantidad(valores.get('proteinas'), GRAMOS_POR_UNIDAD, 'proteinas'),
+        'carbohidratos': _cantidad(valores.get('carbohidratos'), GRAMOS_POR_UNIDAD, 'carbohidratos'),
+        'grasas': _cantidad(valores.get('grasas'), GRAMOS_POR_UNIDAD, 'grasas'),
+        'porcion_gramos': porcion,
+        'categoria': str(valores.get('categoria') or '').strip()[:100],
+        'id_externo': id_externo or None,
+    }
+
+
+class _Lineas:
+    """
+    Iterador de líneas (texto) de un fichero binario que lleva la cuenta de la
+    posición en bytes: tras cada fila del csv, el inicio de la siguiente
+    """
+
+    def __init__(self, fichero, posicion):
+        self.fichero = fichero
+        self.posicion = posicion
+        fichero.seek(posicion)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        linea = self.fichero.readline()
+        if not linea:
+            raise StopIteration
+        inicio = self.posicion
+        self.posicion += len(linea)
+        if inicio == 0 and linea.startswith(_BOM):
+            linea = linea[len(_BOM):]
+        return linea.decode('utf-8')
+
+
+def detectar_formato(ruta):
+    extension = os.path.splitext(ruta)[1].lower()
+    formatos = {'.csv': 'csv', '.tsv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+    if extension not in formatos:
+        raise ValueError(f'No se reconoce el formato de {ruta}: indica csv o jsonl')
+    return formatos[extension]
+
+
+def leer_filas(fichero, formato, posicion=0, columnas=None):
+    """
+    Genera (valores, posición tras la fila) desde `posicion`. fichero: abierto en binario.
+    columnas: campo -> nombre de la columna (o clave JSON) en el fichero, si no coinciden.
+    """
+    columnas = {campo: (columnas or {}).get(campo, campo) for campo in CAMPOS}
+    if formato == 'jsonl':
+        lineas = _Lineas(fichero, posicion)
+        for linea in lineas:
+            if not linea.strip():
+                continue
+            try:
+                objeto = json.loads(linea)
+            except ValueError:
+                yield None, lineas.posicion
+                continue
+            if not isinstance(objeto, dict):
+                yield None, lineas.posicion
+                continue
+            yield {campo: objeto.get(columna) for campo, columna in columnas.items()}, lineas.posicion
+        return
+
+    # La cabecera se lee siempre desde el principio, también al reanudar
+    cabecera_lineas = _Lineas(fichero, 0)
+    primera = next(cabecera_lineas, '')
+    try:
+        dialecto = csv.Sniffer().sniff(primera, delimiters=',;\t|')
+    except csv.Error:
+        dialecto = csv.excel
+    cabecera = next(csv.reader([primera], dialecto), [])
+    indices = {campo: cabecera.index(columna) for campo, columna in columnas.items() if columna in cabecera}
+    if 'nombre' not in indices or not {'calorias', 'energia_kj'} & set(indices):
+        raise ValueError(f'La cabecera debe tener nombre y calorias (o energia_kj): {cabecera}')
+    lineas = _Lineas(fichero, max(posicion, cabecera_lineas.posicion))
+    for fila in csv.reader(lineas, dialecto):
+        if not fila:
+            continue
+        yield {campo: fila[i] if i < len(fila) else None for campo, i in indices.items()}, lineas.posicion
+
+
+class Importador:
+    """
+    Escribe lotes de filas ya convertidas. contadores: leidas, creados,
+    actualizados, sin_cambios y descartadas.
+    """
+
+    def __init__(self, contadores=None):
+        self.contadores = Counter(contadores or {})
+        self.leidas_al_empezar = self.contadores['leidas']
+        self.descartadas = []  # Primeros motivos, para informar
+        self.categorias = {
+            normalizar(nombre): pk for pk, nombre in CategoriaAlimento.objects.order_by('-pk').values_list('pk', 'nombre')
+        }
+
+    def convertir(self, valores):
+        self.contadores['leidas'] += 1
+        try:
+            if valores is None:
+                raise FilaInvalida('línea mal formada')
+            return convertir_fila(valores)
+        except FilaInvalida as error:
+            self.contadores['descartadas'] += 1
+            if len(self.descartadas) < MAX_EJEMPLOS_DESCARTADAS:
+                self.descartadas.append(f"fila {self.contadores['leidas']}: {error}")
+            return None
+
+    def _ids_categorias(self, filas):
+        nuevas = {}
+        for fila in filas:
+            clave = normalizar(fila['categoria'])
+            if clave and clave not in self.categorias:
+                nuevas.setdefault(clave, fila['categoria'])
+        if nuevas:
+            with transaction.atomic():
+                creadas = CategoriaAlimento.objects.bulk_create([CategoriaAlimento(nombre=n) for n in nuevas.values()])
+                registrar_cambios('categoria', [c.pk for c in creadas], 'guardado')
+            self.categorias.update(zip(nuevas, (c.pk for c in creadas)))
+
+    def _existentes(self, filas):
+        """
+        Alimento ya guardado para cada fila (o None): primero por id externo, si
+        no por nombre normalizado. Una fila con id externo solo se empareja por
+        nombre con alimentos que aún no tienen id externo.
+        """
+        ids_externos = [f['id_externo'] for f in filas if f['id_externo']]
+        por_id = {a.id_externo: a for a in Alimento.objects.filter(id_externo__in=ids_externos)} if ids_externos else {}
+        nombres = [f['nombre_normalizado'] for f in filas if f['id_externo'] not in por_id]
+        por_nombre, por_nombre_sin_id = {}, {}
+        for alimento in Alimento.objects.filter(nombre_normalizado__in=nombres).order_by('pk'):
+            por_nombre.setdefault(alimento.nombre_normalizado, alimento)
+            if alimento.id_externo is None:
+                por_nombre_sin_id.setdefault(alimento.nombre_normalizado, alimento)
+
+        usados = set()
+        for fila in filas:
+            if fila['id_externo'] in por_id:
+                alimento = por_id[fila['id_externo']]
+            elif fila['id_externo']:
+                alimento = por_nombre_sin_id.get(fila['nombre_normalizado'])
+            else:
+                alimento = por_nombre.get(fila['nombre_normalizado'])
+            # Dos filas del lote no pueden escribir sobre el mismo alimento
+            if alimento is not None and alimento.pk in usados:
+                alimento = None
+            if alimento is not None:
+                usados.add(alimento.pk)
+            yield fila, alimento
+
+    def escribir_lote(self, filas):
+        # Dentro del lote, la última aparición de cada alimento es la que vale
+        unicas = {}
+        for fila in filas:
+            unicas[fila['id_externo'] or ('nombre', fila['nombre_normalizado'])] = fila
+        filas = list(unicas.values())
+        self._ids_categorias(filas)
+
+        nuevos, cambiados = [], []
+        for fila, alimento in self._existentes(filas):
+            valores = {campo: fila[campo] for campo in CAMPOS_ACTUALIZABLES if campo != 'id_categoria'}
+            valores['id_categoria_id'] = self.categorias.get(normalizar(fila['categoria']))
+            if alimento is None:
+                if valores['porcion_gramos'] is None:
+                    valores['porcion_gramos'] = Decimal(100)
+                nuevos.append(Alimento(**valores))
+                continue
+            # Los campos vacíos del fichero no borran lo que ya hay
+            cambios = {
+                campo: valor for campo, valor in valores.items()
+                if valor is not None and getattr(alimento, campo) != valor
+            }
+            for campo, valor in cambios.items():
+                setattr(alimento, campo, valor)
+            if cambios:
+                cambiados.append(alimento)
+            else:
+                self.contadores['sin_cambios'] += 1
+
+        if nuevos or cambiados:
+            with transaction.atomic():
+                Alimento.objects.bulk_create(nuevos)
+                Alimento.objects.bulk_update(cambiados, CAMPOS_ACTUALIZABLES)
+                indexar_alimentos([a.pk for a in nuevos + cambiados])
+                recetas = IngredienteReceta.objects.filter(
+                    id_alimento__in=[a.pk for a in cambiados]
+                ).values_list('id_receta', flat=True).distinct()
+                recalcular_recetas(recetas)
+                registrar_cambios('alimento', [a.pk for a in nuevos + cambiados], 'guardado')
+        self.contadores['creados'] += len(nuevos)
+        self.contadores['actualizados'] += len(cambiados)
+
+
+def ruta_progreso(ruta):
+    return f'{ruta}.progreso'
+
+
+def _identidad(ruta):
+    estado = os.stat(ruta)
+    return {'tamano': estado.st_size, 'modificado': estado.st_mtime_ns}
+
+
+def _guardar_progreso(ruta, posicion, contadores):
+    destino = ruta_progreso(ruta)
+    with open(f'{destino}.tmp', 'w') as f:
+        json.dump({**_identidad(ruta), 'posicion': posicion, 'contadores': contadores}, f)
+    os.replace(f'{destino}.tmp', destino)
+
+
+def importar(ruta, formato=None, columnas=None, tamano_lote=TAMANO_LOTE, reanudar=False, salida=None):
+    """
+    Importa el fichero y devuelve el Importador (con contadores y motivos de descarte).
+    reanudar: continúa desde el fichero de progreso, si lo hay.
+    salida: función a la que se pasa el Importador tras cada lote.
+    """
+    formato = formato or detectar_formato(ruta)
+    posicion, contadores = 0, None
+    if reanudar and os.path.exists(ruta_progreso(ruta)):
+        with open(ruta_progreso(ruta)) as f:
+            progreso = json.load(f)
+        if {c: progreso.get(c) for c in ('tamano', 'modificado')} != _identidad(ruta):
+            raise ValueError(f'{ruta} ha cambiado desde la importación interrumpida')
+        posicion, contadores = progreso['posicion'], progreso['contadores']
+
+    importador = Importador(contadores)
+    with open(ruta, 'rb') as fichero:
+        lote = []
+        for valores, posicion in leer_filas(fichero, formato, posicion, columnas):
+            fila = importador.convertir(valores)
+            if fila is not None:
+                lote.append(fila)
+            if len(lote) >= tamano_lote:
+                importador.escribir_lote(lote)
+                lote = []
+                _guardar_progreso(ruta, posicion, importador.contadores)
+                if salida:
+                    salida(importador)
+        importador.escribir_lote(lote)
+    if salida:
+        salida(importador)
+    if os.path.exists(ruta_progreso(ruta)):
+        os.remove(ruta_progreso(ruta))
+    return importador
@@ -0,0 +1,64 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from alimentos.autocompletar import IndicePrefijos
+from alimentos.texto import normalizar
+
+PALABRAS = [
+    'pollo', 'pechuga', 'platano', 'arroz', 'integral', 'leche', 'desnatada', 'queso', 'fresco',
+    'manzana', 'pan', 'atun', 'salmon', 'huevo', 'yogur', 'natural', 'avena', 'pasta', 'tomate',
+    'lechuga', 'cocido', 'frito', 'asado', 'light', 'zumo', 'naranja', 'galletas', 'chocolate',
+    'almendras', 'nueces', 'garbanzos', 'lentejas', 'ternera', 'pavo', 'jamon', 'serrano',
+]
+
+
+def generar_alimentos(n, semilla=0):
+    rng = np.random.default_rng(semilla)
+    numero_palabras = rng.integers(1, 5, n)
+    indices = rng.integers(0, len(PALABRAS), (n, 4))
+    popularidad = rng.zipf(1.5, n).clip(max=10**6)
+    for i in range(n):
+        nombre = ' '.join(PALABRAS[j] for j in indices[i, :numero_palabras[i]]) + f' {i}'
+        yield i + 1, nombre, normalizar(nombre), int(popularidad[i])
+
+
+class Command(BaseCommand):
+    help = 'Mide construcción, memoria y latencia (p50/p99) del índice de autocompletado'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alimentos', type=int, default=500_000)
+        parser.add_argument('--consultas', type=int, default=20_000)
+        parser.add_argument('--k', type=int, default=10)
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        indice = IndicePrefijos(generar_alimentos(options['alimentos']))
+        construccion = time.perf_counter() - inicio
+        estadisticas = indice.estadisticas()
+        self.stdout.write(
+            f"{estadisticas['alimentos']} alimentos, {estadisticas['claves']} claves, "
+            f"{estadisticas['prefijos_precalculados']} prefijos precalculados"
+        )
+        self.stdout.write(f'Construcción: {construccion:.2f} s')
+        self.stdout.write(f"Memoria: {estadisticas['memoria_bytes'] / 2**20:.1f} MiB")
+
+        # Mitad prefijos cortos de una palabra (rangos grandes), mitad prefijos de nombres completos
+        rng = np.random.default_rng(1)
+        nombres = [normalizado for _, _, normalizado, _ in generar_alimentos(1000, semilla=2)]
+        consultas = [
+            PALABRAS[rng.integers(len(PALABRAS))][:rng.integers(1, 7)] if i % 2 else
+            nombres[rng.integers(len(nombres))][:rng.integers(1, 20)]
+            for i in range(options['consultas'])
+        ]
+        tiempos = np.empty(len(consultas))
+        for i, consulta in enumerate(consultas):
+            t = time.perf_counter()
+            indice.buscar(consulta, options['k'])
+            tiempos[i] = time.perf_counter() - t
+
+        p50, p99, maximo = np.percentile(tiempos, [50, 99, 100]) * 1000
+        self.stdout.write(f'Latencia: p50 {p50:.3f} ms, p99 {p99:.3f} ms, máx {maximo:.3f} ms')
+        estilo = self.style.SUCCESS if p99 < 10 else self.style.ERROR
+        self.stdout.write(estilo(f'Objetivo p99 < 10 ms: {"cumplido" if p99 < 10 else "no cumplido"}'))
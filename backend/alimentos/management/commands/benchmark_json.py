@@ -0,0 +1,119 @@
+import hashlib
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.utils.text import compress_sequence, compress_string
+from rest_framework.renderers import JSONRenderer
+
+from alimentos.management.commands.benchmark_paginacion import sembrar_alimentos
+from alimentos.models import Alimento
+from alimentos.serializers import AlimentoSerializer
+from alimentos.views import exportar_alimentos
+from macromate.benchmarks import base_datos_temporal
+from macromate.renderizado import RenderizadorJSON
+
+BYTES_ALEATORIOS_GZIP = 100  # Como GZipMiddleware
+
+
+def _lista(renderizador):
+    def generar():
+        alimentos = Alimento.objects.select_related('id_categoria').order_by('id')
+        yield renderizador.render(AlimentoSerializer(alimentos, many=True).data)
+    return generar
+
+
+def _flujo():
+    return exportar_alimentos(RequestFactory().get('/api/alimentos/exportar/')).streaming_content
+
+
+VARIANTES = {
+    'drf': _lista(JSONRenderer()),  # Antes: serializador y JSONRenderer sobre la lista completa
+    'orjson': _lista(RenderizadorJSON()),
+    'flujo': _flujo,  # /api/alimentos/exportar/
+}
+
+
+def memoria_kb():
+    # VmRSS: memoria residente actual; VmHWM: su máximo desde que empezó el proceso
+    with open('/proc/self/status') as f:
+        campos = dict(linea.split(':', 1) for linea in f)
+    return int(campos['VmRSS'].split()[0]), int(campos['VmHWM'].split()[0])
+
+
+def _medir(nombre, comprimir, cola):
+    """
+    Se ejecuta en un proceso hijo (fork) para que el pico de memoria de una
+    variante no lo herede la siguiente: el pico que se informa es lo que crece
+    el hijo sobre la memoria con la que nace.
+    """
+    inicial, _ = memoria_kb()
+    cpu, reloj = time.process_time(), time.perf_counter()
+    trozos = VARIANTES[nombre]()
+    if comprimir:
+        trozos = compress_sequence(trozos, max_random_bytes=BYTES_ALEATORIOS_GZIP) if nombre == 'flujo' else (
+            compress_string(b''.join(trozos), max_random_bytes=BYTES_ALEATORIOS_GZIP),
+        )
+    resumen, total = hashlib.blake2b(), 0
+    for trozo in trozos:
+        total += len(trozo)
+        if not comprimir:
+            resumen.update(trozo)
+    cpu, reloj = time.process_time() - cpu, time.perf_counter() - reloj
+    cola.put({
+        'bytes': total, 'cpu': cpu, 'reloj': reloj,
+        'pico_mb': (memoria_kb()[1] - inicial) / 1024, 'resumen': resumen.hexdigest(),
+    })
+
+
+class Command(BaseCommand):
+    help = ('Bytes, CPU y pico de memoria de servir el catálogo completo en JSON: serializador con el '
+            'JSONRenderer de DRF (antes), con orjson y en flujo desde un iterador, con y sin gzip')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alimentos', type=int, default=100_000)
+
+    def handle(self, *args, **options):
+        contexto = multiprocessing.get_context('fork')
+        with base_datos_temporal():
+            inicio = time.perf_counter()
+            sembrar_alimentos(options['alimentos'])
+            self.stdout.write(f"{options['alimentos']} alimentos sembrados en {time.perf_counter() - inicio:.1f} s")
+
+            resultados = {}
+            for comprimir in (False, True):
+                for nombre in VARIANTES:
+                    cola = contexto.Queue()
+                    proceso = contexto.Process(target=_medir, args=(nombre, comprimir, cola))
+                    proceso.start()
+                    resultados[nombre, comprimir] = cola.get()
+                    proceso.join()
+                    if proceso.exitcode:
+                        raise CommandError(f'La variante {nombre} terminó con código {proceso.exitcode}')
+
+            # Solo la codificación, sobre los mismos datos ya serializados
+            datos = AlimentoSerializer(Alimento.objects.select_related('id_categoria').order_by('id'), many=True).data
+            codificar = {}
+            for nombre, renderizador in (('drf', JSONRenderer()), ('orjson', RenderizadorJSON())):
+                cpu = time.process_time()
+                renderizador.render(datos)
+                codificar[nombre] = time.process_time() - cpu
+
+        self.stdout.write(f"{'variante':<14} {'bytes':>12} {'CPU (s)':>8} {'reloj (s)':>10} {'pico RSS (MB)':>14}")
+        for (nombre, comprimir), r in resultados.items():
+            etiqueta = f'{nombre}+gzip' if comprimir else nombre
+            self.stdout.write(f"{etiqueta:<14} {r['bytes']:>12} {r['cpu']:>8.2f} {r['reloj']:>10.2f} {r['pico_mb']:>14.1f}")
+
+        # Las tres variantes deben escribir exactamente el mismo JSON
+        if len({resultados[nombre, False]['resumen'] for nombre in VARIANTES}) != 1:
+            raise CommandError('Las variantes no producen el mismo JSON')
+        self.stdout.write(
+            f"Solo codificar: JSONRenderer {codificar['drf']:.3f} s, orjson {codificar['orjson']:.3f} s "
+            f"({codificar['drf'] / codificar['orjson']:.1f}x); el resto es el serializador"
+        )
+        antes, orjson, flujo = (resultados[nombre, True] for nombre in VARIANTES)
+        self.stdout.write(
+            f"Con gzip: orjson usa {antes['cpu'] / orjson['cpu']:.1f}x menos CPU que DRF; "
+            f"el flujo, {antes['pico_mb'] / max(flujo['pico_mb'], 0.1):.0f}x menos memoria de pico"
+        )
@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from rest_framework.pagination import Cursor
+
+from alimentos.models import Alimento, CategoriaAlimento
+from macromate.benchmarks import base_datos_temporal, medir, percentiles
+from macromate.paginacion import PaginacionCursor
+
+
+def sembrar_alimentos(n, lote=20_000):
+    categorias = CategoriaAlimento.objects.bulk_create(
+        [CategoriaAlimento(nombre=f'Categoría {i}') for i in range(20)]
+    )
+    for inicio in range(0, n, lote):
+        Alimento.objects.bulk_create([
+            Alimento(
+                nombre=f'Alimento {i}', nombre_normalizado=f'alimento {i}',
+                calorias=i % 900, proteinas=i % 50, carbohidratos=i % 80, grasas=i % 30,
+                id_categoria=categorias[i % len(categorias)],
+            )
+            for i in range(inicio, min(inicio + lote, n))
+        ])
+
+
+class Command(BaseCommand):
+    help = 'Compara la latencia por página de la paginación por cursor frente a OFFSET según la profundidad'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alimentos', type=int, default=1_000_000)
+        parser.add_argument('--repeticiones', type=int, default=30)
+
+    def handle(self, *args, **options):
+        n = options['alimentos']
+        profundidades = [p for p in (0, 1_000, 10_000, 100_000, 500_000, n - 100) if 0 <= p < n]
+
+        with base_datos_temporal():
+            inicio = time.perf_counter()
+            sembrar_alimentos(n)
+            self.stdout.write(f'{n} alimentos sembrados en {time.perf_counter() - inicio:.1f} s')
+
+            cliente = Client()
+            paginador = PaginacionCursor()
+            paginador.base_url = 'http://testserver/api/alimentos/lista/'
+            queryset = Alimento.objects.select_related('id_categoria').order_by('id')
+            tamano = paginador.page_size
+
+            self.stdout.write(f"{'profundidad':>12} {'cursor p50 (ms)':>16} {'cursor p99':>11} {'offset p50 (ms)':>16} {'offset p99':>11}")
+            for profundidad in profundidades:
+                if profundidad:
+                    ultimo_id = queryset.values_list('id', flat=True)[profundidad - 1]
+                    url = paginador.encode_cursor(Cursor(offset=0, reverse=False, position=str(ultimo_id)))
+                else:
+                    url = paginador.base_url
+
+                def pagina_cursor():
+                    respuesta = cliente.get(url)
+                    assert respuesta.status_code == 200 and len(respuesta.json()['results']) == tamano
+
+                def pagina_offset():
+                    list(queryset[profundidad:profundidad + tamano])
+
+                cursor = percentiles(medir(pagina_cursor, options['repeticiones']))
+                offset = percentiles(medir(pagina_offset, options['repeticiones']))
+                self.stdout.write(
+                    f"{profundidad:>12} {cursor['p50']:>16.2f} {cursor['p99']:>11.2f} "
+                    f"{offset['p50']:>16.2f} {offset['p99']:>11.2f}"
+                )
+        self.stdout.write('La columna offset solo mide la consulta SQL (sin serializar), para comparar el coste en base de datos')
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from alimentos.models import CambioCatalogo
+from alimentos.sincronizacion import RETENCION_DIAS, compactar
+
+
+class Command(BaseCommand):
+    help = ('Compacta el registro de cambios del catálogo: deja el último cambio de cada objeto y borra los '
+            'anteriores a --dias; los clientes con una versión anterior recibirán el catálogo completo')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=RETENCION_DIAS, help='Días de cambios que se conservan')
+
+    def handle(self, *args, **options):
+        if options['dias'] < 0:
+            raise CommandError('--dias no puede ser negativo')
+        inicio = time.perf_counter()
+        fusionados, caducados = compactar(options['dias'])
+        primero = CambioCatalogo.objects.order_by('id').values_list('id', flat=True).first()
+        self.stdout.write(self.style.SUCCESS(
+            f'{fusionados} cambios sustituidos y {caducados} caducados borrados en {time.perf_counter() - inicio:.2f} s; '
+            f'quedan {CambioCatalogo.objects.count()} (delta disponible desde la versión {(primero or 1) - 1})'
+        ))
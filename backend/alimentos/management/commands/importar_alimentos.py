@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from alimentos.importacion import TAMANO_LOTE, CAMPOS, importar, ruta_progreso
+
+
+class Command(BaseCommand):
+    help = ('Importa alimentos desde un volcado CSV o JSONL por lotes y en memoria constante, '
+            'sin duplicar los que ya existen (por id externo o nombre normalizado)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichero')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], help='Por defecto, según la extensión')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Filas por transacción')
+        parser.add_argument(
+            '--columna', action='append', default=[], metavar='CAMPO=COLUMNA',
+            help=f'Nombre en el fichero de un campo ({", ".join(CAMPOS)}); se puede repetir',
+        )
+        parser.add_argument('--reanudar', action='store_true', help='Continúa una importación interrumpida')
+
+    def handle(self, *args, **options):
+        columnas = {}
+        for par in options['columna']:
+            campo, _, columna = par.partition('=')
+            if campo not in CAMPOS or not columna:
+                raise CommandError(f'--columna {par}: se espera CAMPO=COLUMNA con CAMPO en {", ".join(CAMPOS)}')
+            columnas[campo] = columna
+
+        inicio = time.perf_counter()
+
+        def progreso(importador):
+            contadores = importador.contadores
+            segundos = time.perf_counter() - inicio
+            ritmo = (contadores['leidas'] - importador.leidas_al_empezar) / max(segundos, 1e-9)
+            self.stdout.write(
+                f"{contadores['leidas']} filas ({contadores['creados']} nuevos, "
+                f"{contadores['actualizados']} actualizados), {ritmo:.0f} filas/s"
+            )
+
+        try:
+            importador = importar(
+                options['fichero'], options['formato'], columnas, options['lote'],
+                reanudar=options['reanudar'], salida=progreso,
+            )
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        except KeyboardInterrupt:
+            raise CommandError(
+                f'Importación interrumpida; el progreso está en {ruta_progreso(options["fichero"])}: '
+                'repite la orden con --reanudar'
+            )
+
+        contadores = importador.contadores
+        for motivo in importador.descartadas:
+            self.stdout.write(self.style.WARNING(f'Descartada {motivo}'))
+        self.stdout.write(self.style.SUCCESS(
+            f"Importación terminada en {time.perf_counter() - inicio:.1f} s: {contadores['leidas']} filas, "
+            f"{contadores['creados']} nuevos, {contadores['actualizados']} actualizados, "
+            f"{contadores['sin_cambios']} sin cambios, {contadores['descartadas']} descartadas"
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from alimentos.models import IngredienteReceta
+from alimentos.recetas import recalcular_recetas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los macros por porción de todas las recetas con ingredientes'
+
+    def handle(self, *args, **options):
+        ids = list(IngredienteReceta.objects.values_list('id_receta', flat=True).distinct())
+        recalcular_recetas(ids)
+        self.stdout.write(self.style.SUCCESS(f'{len(ids)} recetas recalculadas'))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from alimentos.busqueda import reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de alimentos (nombres normalizados y trigramas)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=2000, help='Alimentos por transacción')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        total = reconstruir_indice(
+            options['lote'],
+            salida=lambda n: self.stdout.write(f'{n} alimentos indexados'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Índice reconstruido: {total} alimentos en {time.perf_counter() - inicio:.2f} s'
+        ))
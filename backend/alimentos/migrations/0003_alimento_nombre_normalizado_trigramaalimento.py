@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:27
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+_NO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+
+def normalizar(texto):
+    # Copia de alimentos.texto.normalizar tal como era en esta migración: si cambia, esta no
+    if not texto:
+        return ''
+    sin_tildes = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return _NO_ALFANUMERICO.sub(' ', sin_tildes.lower()).strip()
+
+
+def rellenar_nombre_normalizado(apps, schema_editor):
+    Alimento = apps.get_model('alimentos', 'Alimento')
+    pendientes = []
+    for alimento in Alimento.objects.only('pk', 'nombre').iterator(chunk_size=2000):
+        alimento.nombre_normalizado = normalizar(alimento.nombre)
+        pendientes.append(alimento)
+        if len(pendientes) >= 2000:
+            Alimento.objects.bulk_update(pendientes, ['nombre_normalizado'])
+            pendientes = []
+    Alimento.objects.bulk_update(pendientes, ['nombre_normalizado'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alimentos', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alimento',
+            name='nombre_normalizado',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200),
+        ),
+        migrations.CreateModel(
+            name='TrigramaAlimento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigrama', models.CharField(max_length=3)),
+                ('peso', models.PositiveSmallIntegerField(default=1)),
+                ('longitud', models.PositiveSmallIntegerField(default=0)),
+                ('id_alimento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='alimentos.alimento')),
+            ],
+            options={
+                'db_table': 'indice_trigramas_alimentos',
+                'indexes': [models.Index(fields=['trigrama', 'longitud', 'id_alimento', 'peso'], name='idx_trigrama_alimento')],
+            },
+        ),
+        # El índice de trigramas se construye con: python manage.py reconstruir_indice_busqueda
+        migrations.RunPython(rellenar_nombre_normalizado, migrations.RunPython.noop),
+    ]
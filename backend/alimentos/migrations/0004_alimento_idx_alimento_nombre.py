@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alimentos', '0003_alimento_nombre_normalizado_trigramaalimento'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alimento',
+            index=models.Index(fields=['nombre'], name='idx_alimento_nombre'),
+        ),
+    ]
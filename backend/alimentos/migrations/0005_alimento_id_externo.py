@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alimentos', '0004_alimento_idx_alimento_nombre'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alimento',
+            name='id_externo',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alimentos', '0005_alimento_id_externo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('alimento', 'Alimento'), ('categoria', 'Categoría')], max_length=10)),
+                ('id_objeto', models.BigIntegerField()),
+                ('operacion', models.CharField(choices=[('guardado', 'Alta o cambio'), ('borrado', 'Baja')], max_length=10)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'cambios_catalogo',
+                'indexes': [models.Index(fields=['tipo', 'id_objeto', 'id'], name='idx_cambio_objeto')],
+            },
+        ),
+    ]
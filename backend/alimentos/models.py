@@ -1,4 +1,5 @@
 from django.db import models
+from .texto import normalizar
 
 # Create your models here.
 
@@ -20,12 +21,39 @@ class Alimento(models.Model):
     carbohidratos = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
     grasas = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
     porcion_gramos = models.DecimalField(max_digits=6, decimal_places=2, default=100)
+    nombre_normalizado = models.CharField(max_length=200, blank=True, editable=False, db_index=True)
+    id_externo = models.CharField(max_length=100, null=True, blank=True, unique=True, editable=False)  # Id en la fuente importada
     
     def __str__(self):
         return self.nombre
+
+    def save(self, *args, **kwargs):
+        self.nombre_normalizado = normalizar(self.nombre)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'nombre' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'nombre_normalizado'}
+        super().save(*args, **kwargs)
     
     class Meta:
         db_table = 'alimentos'
+        indexes = [
+            models.Index(fields=['nombre'], name='idx_alimento_nombre'),
+        ]
+
+class TrigramaAlimento(models.Model):
+    """
+    Entrada del índice de búsqueda: un trigrama del nombre (o de la categoría) de un alimento
+    """
+    trigrama = models.CharField(max_length=3)
+    id_alimento = models.ForeignKey(Alimento, on_delete=models.CASCADE)
+    peso = models.PositiveSmallIntegerField(default=1)
+    longitud = models.PositiveSmallIntegerField(default=0)  # Longitud del nombre, para leer primero los más cortos
+
+    class Meta:
+        db_table = 'indice_trigramas_alimentos'
+        indexes = [
+            models.Index(fields=['trigrama', 'longitud', 'id_alimento', 'peso'], name='idx_trigrama_alimento'),
+        ]
 
 class Receta(models.Model):
     TIPO_COMIDA_CHOICES = [
@@ -60,4 +88,30 @@ class IngredienteReceta(models.Model):
     cantidad = models.DecimalField(max_digits=6, decimal_places=2)
     
     class Meta:
-        db_table = 'ingredientes_receta'
\ No newline at end of file
+        db_table = 'ingredientes_receta'
+
+class CambioCatalogo(models.Model):
+    """
+    Registro de altas, cambios y bajas del catálogo para la sincronización
+    incremental (alimentos/sincronizacion.py): el id es la versión del catálogo
+    """
+    TIPO_CHOICES = [
+        ('alimento', 'Alimento'),
+        ('categoria', 'Categoría'),
+    ]
+    OPERACION_CHOICES = [
+        ('guardado', 'Alta o cambio'),
+        ('borrado', 'Baja'),
+    ]
+
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    id_objeto = models.BigIntegerField()  # Sin clave foránea: la baja sobrevive al objeto
+    operacion = models.CharField(max_length=10, choices=OPERACION_CHOICES)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'cambios_catalogo'
+        indexes = [
+            # Compactación: ¿hay un cambio posterior del mismo objeto?
+            models.Index(fields=['tipo', 'id_objeto', 'id'], name='idx_cambio_objeto'),
+        ]
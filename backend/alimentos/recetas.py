@@ -0,0 +1,86 @@
+"""
+Macros por porción de las recetas, derivados de sus ingredientes.
+
+calorias_porcion (y el resto) = Σ cantidad × (valor del alimento / porcion_gramos) ÷ porciones
+
+Los valores se guardan en Receta y solo se recalculan las recetas afectadas
+por un cambio (ingrediente añadido, modificado o quitado, alimento modificado
+o cambio de porciones), agrupadas por transacción.
+"""
+import threading
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+
+from .models import IngredienteReceta, Receta
+
+CAMPOS_RECETA = {
+    'calorias': 'calorias_porcion',
+    'proteinas': 'proteinas_porcion',
+    'carbohidratos': 'carbohidratos_porcion',
+    'grasas': 'grasas_porcion',
+}
+TAMANO_LOTE = 1000
+_CENTESIMAS = Decimal('0.01')
+
+
+def recalcular_recetas(ids_receta):
+    """
+    Recalcula y guarda (bulk_update) los macros por porción de las recetas dadas.
+    Las recetas sin ingredientes quedan sin valores.
+    """
+    ids_receta = sorted(set(ids_receta))
+    for i in range(0, len(ids_receta), TAMANO_LOTE):
+        _recalcular_bloque(ids_receta[i:i + TAMANO_LOTE])
+
+
+def _recalcular_bloque(ids_receta):
+    totales = defaultdict(lambda: dict.fromkeys(CAMPOS_RECETA, Decimal(0)))
+    filas = IngredienteReceta.objects.filter(id_receta__in=ids_receta).values_list(
+        'id_receta', 'cantidad', 'id_alimento__porcion_gramos',
+        *(f'id_alimento__{campo}' for campo in CAMPOS_RECETA),
+    )
+    for id_receta, cantidad, porcion_gramos, *valores in filas:
+        factor = cantidad / (porcion_gramos or 100)
+        total = totales[id_receta]
+        for campo, valor in zip(CAMPOS_RECETA, valores):
+            total[campo] += (valor or 0) * factor
+
+    recetas = list(Receta.objects.filter(pk__in=ids_receta).only('pk', 'porciones'))
+    for receta in recetas:
+        total = totales.get(receta.pk)
+        porciones = max(receta.porciones or 1, 1)
+        for campo, campo_receta in CAMPOS_RECETA.items():
+            valor = (total[campo] / porciones).quantize(_CENTESIMAS) if total else None
+            setattr(receta, campo_receta, valor)
+    Receta.objects.bulk_update(recetas, list(CAMPOS_RECETA.values()))
+
+
+_pendientes = threading.local()
+
+
+def _procesar_pendientes():
+    ids = getattr(_pendientes, 'ids', None)
+    _pendientes.ids = set()
+    if ids:
+        recalcular_recetas(ids)
+
+
+def programar_recalculo(ids_receta):
+    """
+    Acumula recetas a recalcular y las procesa todas juntas al confirmar la transacción.
+    El primer callback de la transacción vacía la acumulación y los demás no hacen nada;
+    si la transacción se revierte, sus recetas se recalculan (sin efecto) en el siguiente commit.
+    """
+    ids_receta = set(ids_receta)
+    if not ids_receta:
+        return
+    if getattr(_pendientes, 'ids', None) is None:
+        _pendientes.ids = set()
+    _pendientes.ids.update(ids_receta)
+    transaction.on_commit(_procesar_pendientes)
+
+
+def recetas_con_alimento(id_alimento):
+    return IngredienteReceta.objects.filter(id_alimento_id=id_alimento).values_list('id_receta', flat=True).distinct()
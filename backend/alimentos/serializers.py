@@ -11,7 +11,28 @@ class AlimentoSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Alimento
-        fields = '__all__'
+        exclude = ('nombre_normalizado', 'id_externo')
+
+# Mismos campos y en el mismo orden que AlimentoSerializer
+CAMPOS_FILA_ALIMENTO = (
+    ('id', 'id'), ('nombre_categoria', 'id_categoria__nombre'), ('nombre', 'nombre'),
+    ('calorias', 'calorias'), ('proteinas', 'proteinas'), ('carbohidratos', 'carbohidratos'),
+    ('grasas', 'grasas'), ('porcion_gramos', 'porcion_gramos'), ('id_categoria', 'id_categoria'),
+)
+
+def filas_alimentos(alimentos, filas_por_lectura=2000):
+    """
+    Lo mismo que AlimentoSerializer(alimentos, many=True).data pero leyendo con
+    values_list().iterator() y sin instanciar modelos ni campos: para listados
+    enteros que se escriben en flujo (Decimal sin convertir, ver flujo_json)
+    """
+    nombres = [nombre for nombre, _ in CAMPOS_FILA_ALIMENTO]
+    filas = alimentos.values_list(*(campo for _, campo in CAMPOS_FILA_ALIMENTO))
+    for fila in filas.iterator(chunk_size=filas_por_lectura):
+        alimento = dict(zip(nombres, fila))
+        if alimento['id_categoria'] is None:
+            del alimento['nombre_categoria']  # AlimentoSerializer tampoco lo incluye
+        yield alimento
 
 class IngredienteRecetaSerializer(serializers.ModelSerializer):
     nombre_alimento = serializers.CharField(source='id_alimento.nombre', read_only=True)
@@ -26,4 +47,6 @@ class RecetaSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Receta
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        # Derivados de los ingredientes (alimentos/recetas.py)
+        read_only_fields = ('calorias_porcion', 'proteinas_porcion', 'carbohidratos_porcion', 'grasas_porcion')
\ No newline at end of file
@@ -0,0 +1,71 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .busqueda import indexar_alimentos
+from .catalogo import registrar_cambios
+from .models import Alimento, CategoriaAlimento, IngredienteReceta, Receta
+from .recetas import programar_recalculo, recetas_con_alimento
+
+TAMANO_LOTE_REINDEXADO = 2000
+
+
+@receiver(post_save, sender=Alimento)
+def reindexar_alimento(sender, instance, **kwargs):
+    # Las entradas del índice se borran en cascada al borrar el alimento
+    transaction.on_commit(lambda: indexar_alimentos([instance.pk]))
+
+
+@receiver(post_save, sender=Alimento)
+def registrar_guardado_alimento(sender, instance, **kwargs):
+    registrar_cambios('alimento', [instance.pk], 'guardado')
+
+
+@receiver(post_save, sender=CategoriaAlimento)
+def registrar_guardado_categoria(sender, instance, created, **kwargs):
+    registrar_cambios('categoria', [instance.pk], 'guardado')
+    if not created:
+        # nombre_categoria va en cada alimento: las copias de los clientes tienen que actualizarlos
+        registrar_cambios('alimento', list(Alimento.objects.filter(id_categoria=instance).values_list('pk', flat=True)), 'guardado')
+
+
+@receiver(post_delete, sender=Alimento)
+def registrar_borrado_alimento(sender, instance, **kwargs):
+    registrar_cambios('alimento', [instance.pk], 'borrado')
+
+
+@receiver(post_delete, sender=CategoriaAlimento)
+def registrar_borrado_categoria(sender, instance, **kwargs):
+    # Sus alimentos se borran en cascada y cada uno anota su baja
+    registrar_cambios('categoria', [instance.pk], 'borrado')
+
+
+@receiver(post_save, sender=CategoriaAlimento)
+def reindexar_categoria(sender, instance, created, **kwargs):
+    if created:
+        return
+
+    def reindexar():
+        ids = list(Alimento.objects.filter(id_categoria=instance).values_list('pk', flat=True))
+        for i in range(0, len(ids), TAMANO_LOTE_REINDEXADO):
+            indexar_alimentos(ids[i:i + TAMANO_LOTE_REINDEXADO])
+
+    transaction.on_commit(reindexar)
+
+
+@receiver([post_save, post_delete], sender=IngredienteReceta)
+def recalcular_receta_por_ingrediente(sender, instance, **kwargs):
+    programar_recalculo([instance.id_receta_id])
+
+
+@receiver(post_save, sender=Alimento)
+def recalcular_recetas_por_alimento(sender, instance, created, **kwargs):
+    if not created:
+        programar_recalculo(recetas_con_alimento(instance.pk))
+
+
+@receiver(post_save, sender=Receta)
+def recalcular_receta_por_porciones(sender, instance, created, update_fields=None, **kwargs):
+    # Al crearla todavía no tiene ingredientes; bulk_update de recetas.py no emite señales
+    if not created and (update_fields is None or 'porciones' in update_fields):
+        programar_recalculo([instance.pk])
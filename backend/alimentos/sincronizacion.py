@@ -0,0 +1,107 @@
+"""
+Sincronización incremental del catálogo de alimentos.
+
+El cliente guarda su copia del catálogo y la versión con la que la obtuvo, y
+pide solo lo que ha cambiado desde entonces: los alimentos y categorías
+guardados después (su estado actual) y los ids de los borrados. Se responde el
+catálogo completo si el cliente no tiene versión o si la suya es anterior a lo
+que queda en el registro tras compactarlo.
+
+La versión se lee antes que los datos: un cambio que llegue entre medias puede
+salir ya en esta respuesta y volverá a salir en la siguiente, lo que es
+inofensivo (guardar dos veces el mismo estado), pero nunca se pierde.
+
+compactar() mantiene el registro pequeño: de cada objeto basta su último
+cambio (para cualquier versión de cliente el resultado es el mismo), y los
+anteriores a RETENCION_CAMBIOS_DIAS se borran; a los clientes que se quedaron
+antes de ese punto se les manda el catálogo completo.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from macromate.renderizado import dumps, flujo_json
+from .catalogo import ultima_version
+from .models import Alimento, CambioCatalogo, CategoriaAlimento
+from .serializers import filas_alimentos
+
+RETENCION_DIAS = settings.MACROMATE_SETTINGS['CATALOGO']['RETENCION_CAMBIOS_DIAS']
+IDS_POR_CONSULTA = 500  # Por debajo del límite de parámetros de SQLite
+
+
+def _por_lotes(queryset, ids):
+    for i in range(0, len(ids), IDS_POR_CONSULTA):
+        yield from filas_alimentos(queryset.filter(pk__in=ids[i:i + IDS_POR_CONSULTA]))
+
+
+def cambios_desde(desde):
+    """
+    Cambios del catálogo posteriores a la versión desde (0: ninguna). Devuelve
+    un dict con la versión actual, si es el catálogo completo, las categorías y
+    un iterador de alimentos (en el formato de AlimentoSerializer) guardados,
+    y los ids de los borrados.
+    """
+    version = ultima_version()
+    primero = CambioCatalogo.objects.order_by('id').values_list('id', flat=True).first()
+    # Sin registro anterior a la versión del cliente no se sabe qué se ha perdido
+    completo = not desde or desde > version or (primero is not None and desde < primero - 1)
+    alimentos = Alimento.objects.order_by('id')
+    if completo:
+        return {
+            'version': version, 'completo': True,
+            'categorias': list(CategoriaAlimento.objects.order_by('id').values('id', 'nombre')),
+            'alimentos': filas_alimentos(alimentos),
+            'categorias_borradas': [], 'alimentos_borrados': [],
+        }
+
+    ultimos = {}
+    for tipo, pk, operacion in CambioCatalogo.objects.filter(id__gt=desde, id__lte=version).order_by('id').values_list(
+        'tipo', 'id_objeto', 'operacion'
+    ):
+        ultimos[tipo, pk] = operacion
+
+    def ids(tipo, operacion):
+        return sorted(pk for (t, pk), op in ultimos.items() if t == tipo and op == operacion)
+
+    return {
+        'version': version, 'completo': False,
+        'categorias': list(CategoriaAlimento.objects.filter(pk__in=ids('categoria', 'guardado')).order_by('id').values('id', 'nombre')),
+        # Un objeto guardado que ya no existe se borró después de leer la versión: su baja irá en la próxima
+        'alimentos': _por_lotes(alimentos, ids('alimento', 'guardado')),
+        'categorias_borradas': ids('categoria', 'borrado'), 'alimentos_borrados': ids('alimento', 'borrado'),
+    }
+
+
+def flujo_cambios(cambios):
+    """
+    El dict de cambios_desde() en JSON, con los alimentos en flujo al final
+    """
+    cabecera = dumps({clave: valor for clave, valor in cambios.items() if clave != 'alimentos'})
+    yield cabecera[:-1] + b',"alimentos":'
+    yield from flujo_json(cambios['alimentos'])
+    yield b'}'
+
+
+def compactar(dias=RETENCION_DIAS):
+    """
+    Borra del registro los cambios sustituidos por otro posterior del mismo
+    objeto y los anteriores a dias días (salvo el último, que es la versión).
+    Devuelve (fusionados, caducados).
+    """
+    with transaction.atomic():
+        posteriores = CambioCatalogo.objects.filter(
+            tipo=OuterRef('tipo'), id_objeto=OuterRef('id_objeto'), id__gt=OuterRef('id')
+        )
+        fusionados, _ = CambioCatalogo.objects.filter(Exists(posteriores)).delete()
+
+        # Por id y no por fecha: lo que queda empieza siempre justo después de lo borrado
+        limite = CambioCatalogo.objects.filter(fecha__lt=timezone.now() - timedelta(days=dias)).order_by('-id').values_list(
+            'id', flat=True
+        ).first()
+        caducados = 0
+        if limite is not None:
+            caducados, _ = CambioCatalogo.objects.filter(id__lte=min(limite, ultima_version() - 1)).delete()
+    return fusionados, caducados
@@ -0,0 +1,486 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from unittest import mock, skipUnless
+from macromate import planes
+from macromate.renderizado import RenderizadorJSON, flujo_json
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from usuarios.models import Usuario
+from .autocompletar import IndicePrefijos, UMBRAL_RANGO
+from . import busqueda
+from .busqueda import POSTINGS_POR_TRIGRAMA, buscar_alimentos, indexar_alimentos
+from .catalogo import ultima_version, version_catalogo
+from .importacion import importar, ruta_progreso
+from .models import Alimento, CambioCatalogo, CategoriaAlimento, IngredienteReceta, Receta, TrigramaAlimento
+from .serializers import AlimentoSerializer
+from .sincronizacion import compactar
+from .texto import normalizar
+
+
+class BusquedaAlimentosTestCase(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.frutas = CategoriaAlimento.objects.create(nombre='Frutas')
+            self.lacteos = CategoriaAlimento.objects.create(nombre='Lácteos')
+            self.platano = Alimento.objects.create(nombre='Plátano', calorias=89, id_categoria=self.frutas)
+            self.batido = Alimento.objects.create(nombre='Batido de plátano y leche', calorias=70, id_categoria=self.lacteos)
+            self.manzana = Alimento.objects.create(nombre='Manzana', calorias=52, id_categoria=self.frutas)
+
+    def test_normalizar_quita_tildes_y_signos(self):
+        self.assertEqual(normalizar('  Plátano (maduro), AÑEJO '), 'platano maduro anejo')
+
+    def test_busqueda_sin_tildes_y_ordenada_por_relevancia(self):
+        ids = [pk for pk, _ in buscar_alimentos('platano')]
+        self.assertEqual(ids[:2], [self.platano.pk, self.batido.pk])
+        self.assertNotIn(self.manzana.pk, ids)
+
+    def test_busqueda_tolera_errores_de_escritura(self):
+        ids = [pk for pk, _ in buscar_alimentos('manzna')]
+        self.assertEqual(ids[0], self.manzana.pk)
+
+    def test_nombres_largos_con_trigramas_comunes(self):
+        # Más de POSTINGS_POR_TRIGRAMA nombres cortos con «pollo»: el largo no está al principio de ninguna lista
+        largo = Alimento.objects.create(nombre='Muslo de pollo asado lentamente con hierbas provenzales', calorias=190)
+        cortos = Alimento.objects.bulk_create(
+            [Alimento(nombre=f'Pollo {i}', nombre_normalizado=f'pollo {i}', calorias=165) for i in range(POSTINGS_POR_TRIGRAMA + 50)]
+        )
+        indexar_alimentos([largo.pk, *(a.pk for a in cortos)])
+
+        self.assertIn(largo.pk, [pk for pk, _ in buscar_alimentos('pollo', limite=1000)])
+        # La puntuación exacta lee como mucho MAX_POSTINGS_REPUNTUADOS entradas, de más corta a más larga
+        with mock.patch.object(busqueda, 'MAX_POSTINGS_REPUNTUADOS', 100), \
+                mock.patch.object(busqueda, 'PAGINA_REPUNTUADO', 100):
+            self.assertNotIn(largo.pk, [pk for pk, _ in buscar_alimentos('pollo', limite=1000)])
+        # Con limite coincidencias completas entre los cortos no hace falta seguir leyendo
+        with CaptureQueriesContext(connection) as consultas:
+            buscar_alimentos('pollo', limite=10)
+        self.assertLessEqual(len(consultas), 2 * len(busqueda.trigramas('pollo')) + 4)
+        # También con un trigrama raro en la consulta y el resto comunes
+        Alimento.objects.create(nombre='Pollo al curry', calorias=150)
+        indexar_alimentos(Alimento.objects.filter(nombre='Pollo al curry').values_list('pk', flat=True))
+        self.assertIn(largo.pk, [pk for pk, _ in buscar_alimentos('pollo asado', limite=1000)][:2])
+
+    def test_renombrar_categoria_reindexa_sus_alimentos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.frutas.nombre = 'Tropicales'
+            self.frutas.save()
+        ids = [pk for pk, _ in buscar_alimentos('tropicales')]
+        self.assertCountEqual(ids, [self.platano.pk, self.manzana.pk])
+
+    def test_borrar_alimento_elimina_su_indice(self):
+        pk = self.manzana.pk
+        self.manzana.delete()
+        self.assertFalse(TrigramaAlimento.objects.filter(id_alimento_id=pk).exists())
+
+    def test_lista_alimentos_usa_el_indice(self):
+        respuesta = self.client.get('/api/alimentos/lista/', {'search': 'PLATANO'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([a['nombre'] for a in respuesta.json()['results']], ['Plátano', 'Batido de plátano y leche'])
+
+    def test_paginacion_por_cursor_con_busqueda(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(5):
+                Alimento.objects.create(nombre=f'Plátano variedad {i}', calorias=90)
+
+        nombres, url = [], '/api/alimentos/lista/?search=platano&limite=2'
+        while url:
+            pagina = self.client.get(url).json()
+            self.assertLessEqual(len(pagina['results']), 2)
+            nombres += [a['nombre'] for a in pagina['results']]
+            url = pagina['next']
+
+        self.assertEqual(nombres[0], 'Plátano')
+        self.assertEqual(len(nombres), 7)
+        self.assertEqual(len(set(nombres)), 7)
+
+
+class PaginacionAlimentosTestCase(TestCase):
+    def test_limite_maximo_de_pagina(self):
+        Alimento.objects.bulk_create([Alimento(nombre=f'A{i}', calorias=1) for i in range(250)])
+        pagina = self.client.get('/api/alimentos/lista/', {'limite': 1000}).json()
+        self.assertEqual(len(pagina['results']), 200)
+        self.assertIsNotNone(pagina['next'])
+        self.assertEqual([a['nombre'] for a in self.client.get(pagina['next']).json()['results']], [f'A{i}' for i in range(200, 250)])
+
+    def test_version_asincrona_con_los_mismos_cursores(self):
+        Alimento.objects.bulk_create([Alimento(nombre=f'A{i}', calorias=1) for i in range(25)])
+        sincrona = self.client.get('/api/alimentos/lista/', {'limite': 10}).json()
+        asincrona = self.client.get('/api/alimentos/async/lista/', {'limite': 10}).json()
+        self.assertEqual(asincrona['results'], sincrona['results'])
+        self.assertIsNone(asincrona['previous'])
+
+        # Un cursor de la versión síncrona sirve en la asíncrona y al revés
+        segunda = self.client.get(sincrona['next'].replace('/lista/', '/async/lista/')).json()
+        self.assertEqual(segunda['results'], self.client.get(sincrona['next']).json()['results'])
+        tercera = self.client.get(segunda['next']).json()
+        self.assertEqual([a['nombre'] for a in tercera['results']], [f'A{i}' for i in range(20, 25)])
+        self.assertIsNone(tercera['next'])
+        anterior = self.client.get(tercera['previous']).json()
+        self.assertEqual(anterior['results'], segunda['results'])
+
+        self.assertEqual(self.client.get('/api/alimentos/async/lista/', {'cursor': 'roto'}).status_code, 404)
+        self.assertEqual(self.client.get('/api/alimentos/async/lista/', {'search': 'a'}).status_code, 400)
+
+    def test_get_condicional_con_la_version_del_catalogo(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            categoria = CategoriaAlimento.objects.create(nombre='Frutas')
+            Alimento.objects.create(nombre='Pera', calorias=57, id_categoria=categoria)
+        respuesta = self.client.get('/api/alimentos/lista/')
+        self.assertIn('public', respuesta['Cache-Control'])
+        with self.assertNumQueries(0):
+            no_modificada = self.client.get('/api/alimentos/lista/', HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(no_modificada.status_code, 304)
+
+        # Renombrar una categoría cambia la lista (lleva el nombre de la categoría)
+        with self.captureOnCommitCallbacks(execute=True):
+            categoria.nombre = 'Fruta fresca'
+            categoria.save()
+        cambiada = self.client.get('/api/alimentos/lista/', HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(cambiada.status_code, 200)
+        self.assertNotEqual(cambiada['ETag'], respuesta['ETag'])
+
+
+class RenderizadoJSONTestCase(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            frutas = CategoriaAlimento.objects.create(nombre='Frutas')
+            Alimento.objects.bulk_create(
+                [Alimento(nombre=f'Fruta {i}', calorias=Decimal('52.30'), proteinas=i, id_categoria=frutas) for i in range(30)]
+                + [Alimento(nombre='Sal', calorias=0)]
+            )
+
+    def test_misma_salida_que_jsonrenderer(self):
+        datos = {
+            'decimal': Decimal('12.50'), 'fecha': date(2024, 3, 1), 'ñ': 'año',
+            'momento': datetime(2024, 3, 1, 8, 30, 15, 123456, tzinfo=timezone.utc), 1: [None, 2.5],
+        }
+        self.assertEqual(RenderizadorJSON().render(datos), JSONRenderer().render(datos))
+        self.assertEqual(RenderizadorJSON().render(None), b'')
+
+    def test_exportacion_en_flujo_igual_que_el_serializador(self):
+        respuesta = self.client.get('/api/alimentos/exportar/')
+        self.assertTrue(respuesta.streaming)
+        self.assertEqual(respuesta['Content-Type'], 'application/json')
+        exportados = json.loads(b''.join(respuesta.streaming_content))
+        alimentos = Alimento.objects.select_related('id_categoria').order_by('id')
+        self.assertEqual(exportados, json.loads(JSONRenderer().render(AlimentoSerializer(alimentos, many=True).data)))
+        self.assertNotIn('nombre_categoria', exportados[-1])
+
+        self.assertEqual(b''.join(flujo_json(iter([]))), b'[]')
+        self.assertEqual(json.loads(b''.join(flujo_json(({'i': i} for i in range(5)), filas_por_bloque=2))),
+                         [{'i': i} for i in range(5)])
+
+    def test_gzip_por_encima_del_umbral(self):
+        grande = self.client.get('/api/alimentos/lista/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(grande['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(grande.content))['results']), 31)
+        pequena = self.client.get('/api/alimentos/autocompletar/', {'q': 'sal'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(pequena.has_header('Content-Encoding'))
+
+        exportacion = self.client.get('/api/alimentos/exportar/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(b''.join(exportacion.streaming_content)))), 31)
+
+
+class SincronizacionCatalogoTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.frutas = CategoriaAlimento.objects.create(nombre='Frutas')
+            self.verduras = CategoriaAlimento.objects.create(nombre='Verduras')
+            self.pera = Alimento.objects.create(nombre='Pera', calorias=57, id_categoria=self.frutas)
+            self.kiwi = Alimento.objects.create(nombre='Kiwi', calorias=61, id_categoria=self.frutas)
+            self.col = Alimento.objects.create(nombre='Col', calorias=25, id_categoria=self.verduras)
+
+    def cambios(self, desde=None):
+        respuesta = self.client.get('/api/alimentos/cambios/', {} if desde is None else {'desde': desde})
+        self.assertEqual(respuesta.status_code, 200)
+        return json.loads(b''.join(respuesta.streaming_content))
+
+    def test_catalogo_completo_y_delta(self):
+        completo = self.cambios()
+        self.assertTrue(completo['completo'])
+        self.assertEqual([a['nombre'] for a in completo['alimentos']], ['Pera', 'Kiwi', 'Col'])
+        self.assertEqual([c['nombre'] for c in completo['categorias']], ['Frutas', 'Verduras'])
+        version = completo['version']
+        self.assertEqual(version, version_catalogo())
+
+        sin_cambios = self.cambios(version)
+        self.assertFalse(sin_cambios['completo'])
+        self.assertEqual(sin_cambios['alimentos'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pera.calorias = Decimal('58.00')
+            self.pera.save()
+            self.pera.save()
+            id_kiwi, _ = self.kiwi.pk, self.kiwi.delete()
+            Alimento.objects.create(nombre='Mango', calorias=60)
+        self.assertEqual(version_catalogo(), ultima_version())
+        delta = self.cambios(version)
+        self.assertFalse(delta['completo'])
+        self.assertEqual([(a['nombre'], a['calorias']) for a in delta['alimentos']], [('Pera', '58.00'), ('Mango', '60.00')])
+        self.assertEqual(delta['alimentos_borrados'], [id_kiwi])
+        self.assertEqual(delta['categorias'], [])
+
+        # Renombrar una categoría cambia nombre_categoria de sus alimentos; borrarla, los borra
+        with self.captureOnCommitCallbacks(execute=True):
+            self.verduras.nombre = 'Hortalizas'
+            self.verduras.save()
+        delta = self.cambios(delta['version'])
+        self.assertEqual(delta['categorias'], [{'id': self.verduras.pk, 'nombre': 'Hortalizas'}])
+        self.assertEqual([a['nombre_categoria'] for a in delta['alimentos']], ['Hortalizas'])
+        id_verduras = self.verduras.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.verduras.delete()
+        delta = self.cambios(delta['version'])
+        self.assertEqual((delta['categorias_borradas'], delta['alimentos_borrados']), ([id_verduras], [self.col.pk]))
+
+        self.assertTrue(self.cambios(delta['version'] + 1)['completo'])
+        self.assertEqual(self.client.get('/api/alimentos/cambios/', {'desde': 'x'}).status_code, 400)
+
+    def test_compactacion(self):
+        version = self.cambios()['version']
+        with self.captureOnCommitCallbacks(execute=True):
+            for calorias in (58, 59, 60):
+                self.pera.calorias = calorias
+                self.pera.save()
+            self.kiwi.delete()
+        antes = self.cambios(version)
+
+        # Quitar los cambios sustituidos no cambia ningún delta
+        self.assertEqual(compactar(), (4, 0))  # Las altas de Pera y Kiwi y dos cambios de Pera
+        self.assertEqual(self.cambios(version), antes)
+
+        # Los caducados sí: quien se quedó antes recibe el catálogo completo
+        call_command('compactar_cambios_catalogo', dias=0, stdout=io.StringIO())
+        self.assertEqual(CambioCatalogo.objects.count(), 1)
+        completo = self.cambios(version)
+        self.assertTrue(completo['completo'])
+        self.assertEqual(completo['version'], antes['version'])
+        self.assertEqual([a['nombre'] for a in completo['alimentos']], ['Pera', 'Col'])
+        self.assertFalse(self.cambios(antes['version'])['completo'])
+
+    def test_importacion_anota_los_cambios(self):
+        version = ultima_version()
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, 'alimentos.csv')
+            with open(ruta, 'w') as f:
+                f.write('nombre,calorias,categoria\nPera,60,Frutas\nTofu,76,Legumbres\n')
+            with self.captureOnCommitCallbacks(execute=True):
+                importar(ruta)
+        delta = self.cambios(version)
+        self.assertEqual([a['nombre'] for a in delta['alimentos']], ['Pera', 'Tofu'])
+        self.assertEqual([c['nombre'] for c in delta['categorias']], ['Legumbres'])
+
+
+class AutocompletarTestCase(TestCase):
+    def test_prefijo_ordenado_por_popularidad(self):
+        indice = IndicePrefijos([
+            (1, 'Pan integral', 'pan integral', 5),
+            (2, 'Pan blanco', 'pan blanco', 50),
+            (3, 'Panceta', 'panceta', 1),
+            (4, 'Pechuga de pollo', 'pechuga de pollo', 20),
+        ])
+        self.assertEqual([pk for pk, _ in indice.buscar('Pan', 10)], [2, 1, 3])
+        self.assertEqual(indice.buscar('pan b', 10), [(2, 'Pan blanco')])
+        # También por el comienzo de palabras posteriores
+        self.assertEqual([pk for pk, _ in indice.buscar('pollo', 10)], [4])
+        self.assertEqual(indice.buscar('xyz', 10), [])
+        self.assertGreater(indice.memoria_bytes(), 0)
+
+    def test_rangos_grandes_usan_top_precalculado(self):
+        filas = [(i, f'arroz {i}', f'arroz {i}', i) for i in range(1, UMBRAL_RANGO * 2)]
+        indice = IndicePrefijos(filas, max_resultados=5)
+        self.assertIn('a', indice._top)
+        self.assertEqual([pk for pk, _ in indice.buscar('a', 3)], [UMBRAL_RANGO * 2 - 1, UMBRAL_RANGO * 2 - 2, UMBRAL_RANGO * 2 - 3])
+        # k fuera de rango se acota a 1..max_resultados
+        self.assertEqual(len(indice.buscar('a', 1000)), 5)
+        self.assertEqual(len(indice.buscar('a', -5)), 1)
+
+    def test_endpoint_valida_k(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(30):
+                Alimento.objects.create(nombre=f'Pan {i}', calorias=250)
+        for k in ('-5', '0', 'abc'):
+            self.assertEqual(self.client.get('/api/alimentos/autocompletar/', {'q': 'pan', 'k': k}).status_code, 400)
+        respuesta = self.client.get('/api/alimentos/autocompletar/', {'q': 'pan', 'k': 1000})
+        self.assertEqual(len(respuesta.json()), settings.MACROMATE_SETTINGS['AUTOCOMPLETAR']['MAX_RESULTADOS'])
+
+    def test_endpoint_refleja_cambios_del_catalogo(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Alimento.objects.create(nombre='Plátano', calorias=89)
+        respuesta = self.client.get('/api/alimentos/autocompletar/', {'q': 'pla'})
+        self.assertEqual([a['nombre'] for a in respuesta.json()], ['Plátano'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Alimento.objects.create(nombre='Platija', calorias=80)
+        respuesta = self.client.get('/api/alimentos/autocompletar/', {'q': 'pla'})
+        self.assertCountEqual([a['nombre'] for a in respuesta.json()], ['Plátano', 'Platija'])
+
+
+class RecetasTestCase(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user('chef@example.com', 'chef', 'clave-segura-123')
+        self.arroz = Alimento.objects.create(nombre='Arroz', calorias=130, proteinas=Decimal('2.7'), carbohidratos=28, grasas=Decimal('0.3'))
+        self.pollo = Alimento.objects.create(nombre='Pollo', calorias=165, proteinas=31, carbohidratos=0, grasas=Decimal('3.6'))
+        self.receta = Receta.objects.create(id_usuario=self.usuario, nombre='Arroz con pollo', porciones=2)
+
+    def test_ingredientes_actualizan_macros_por_porcion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredienteReceta.objects.create(id_receta=self.receta, id_alimento=self.arroz, cantidad=200)
+            ingrediente = IngredienteReceta.objects.create(id_receta=self.receta, id_alimento=self.pollo, cantidad=100)
+        self.receta.refresh_from_db()
+        self.assertEqual(self.receta.calorias_porcion, Decimal('212.50'))  # (260 + 165) / 2
+        self.assertEqual(self.receta.proteinas_porcion, Decimal('18.20'))   # (5.4 + 31) / 2
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ingrediente.delete()
+        self.receta.refresh_from_db()
+        self.assertEqual(self.receta.calorias_porcion, Decimal('130.00'))
+
+    def test_cambio_de_alimento_se_propaga_a_sus_recetas(self):
+        otra = Receta.objects.create(id_usuario=self.usuario, nombre='Arroz blanco', porciones=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredienteReceta.objects.create(id_receta=self.receta, id_alimento=self.arroz, cantidad=100)
+            IngredienteReceta.objects.create(id_receta=otra, id_alimento=self.arroz, cantidad=100)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.arroz.calorias = 150
+            self.arroz.save()
+        self.assertEqual(
+            sorted(Receta.objects.values_list('calorias_porcion', flat=True)),
+            [Decimal('75.00'), Decimal('150.00')]
+        )
+
+    def test_lista_recetas_con_consultas_constantes(self):
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+        IngredienteReceta.objects.create(id_receta=self.receta, id_alimento=self.arroz, cantidad=100)
+        with self.assertNumQueries(2):
+            cliente.get('/api/alimentos/recetas/')
+
+        for i in range(10):
+            receta = Receta.objects.create(id_usuario=self.usuario, nombre=f'Receta {i}')
+            IngredienteReceta.objects.create(id_receta=receta, id_alimento=self.arroz, cantidad=100)
+            IngredienteReceta.objects.create(id_receta=receta, id_alimento=self.pollo, cantidad=50)
+        with self.assertNumQueries(2):
+            respuesta = cliente.get('/api/alimentos/recetas/')
+        self.assertEqual(len(respuesta.json()['results']), 11)
+
+
+class ImportacionAlimentosTestCase(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = directorio.name
+        self.lacteos = CategoriaAlimento.objects.create(nombre='Lácteos')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.arroz = Alimento.objects.create(nombre='Arroz blanco', calorias=130, carbohidratos=28)
+
+    def fichero(self, nombre, contenido):
+        ruta = os.path.join(self.directorio, nombre)
+        with open(ruta, 'w', encoding='utf-8') as f:
+            f.write(contenido)
+        return ruta
+
+    def test_csv_normaliza_unidades_y_no_duplica(self):
+        ruta = self.fichero('alimentos.csv', (
+            'nombre;calorias;proteinas;grasas;porcion;categoria\n'
+            'Yogur natural;61;3,5;3,3;125 g;LACTEOS\n'
+            'Queso curado;1650 kJ;2,5 oz;;1 oz;Quesos\n'
+            'ARROZ BLANCO;;;;;\n'
+            'Pan integral;250;9;3;0,05 kg;\n'
+            'Pan Integral;247;9;3;0,05 kg;\n'
+            ';100;;;;\n'
+            'Zumo;45;;;2 tazas;\n'
+        ))
+        importador = importar(ruta)
+        self.assertEqual(importador.contadores['leidas'], 7)
+        self.assertEqual(importador.contadores['creados'], 3)
+        self.assertEqual(importador.contadores['descartadas'], 3)  # Sin calorías, sin nombre y unidad desconocida
+
+        yogur = Alimento.objects.get(nombre='Yogur natural')
+        self.assertEqual((yogur.porcion_gramos, yogur.proteinas, yogur.id_categoria), (Decimal('125'), Decimal('3.5'), self.lacteos))
+        queso = Alimento.objects.get(nombre='Queso curado')
+        self.assertEqual((queso.calorias, queso.proteinas, queso.porcion_gramos), (Decimal('394.36'), Decimal('70.87'), Decimal('28.35')))
+        self.assertEqual(queso.id_categoria.nombre, 'Quesos')
+        # Dentro del fichero gana la última aparición
+        self.assertEqual(Alimento.objects.get(nombre_normalizado='pan integral').calorias, Decimal('247'))
+        self.assertEqual(Alimento.objects.filter(nombre_normalizado='arroz blanco').count(), 1)
+        self.assertEqual([pk for pk, _ in buscar_alimentos('yogur')], [yogur.pk])
+
+    def test_jsonl_actualiza_por_id_externo_y_recalcula_recetas(self):
+        usuario = Usuario.objects.create_user('chef@example.com', 'chef', 'clave-segura-123')
+        receta = Receta.objects.create(id_usuario=usuario, nombre='Arroz', porciones=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredienteReceta.objects.create(id_receta=receta, id_alimento=self.arroz, cantidad=100)
+
+        ruta = self.fichero('alimentos.jsonl', '{"code": "A1", "name": "Arroz blanco", "kcal": 140}\nno es json\n')
+        columnas = {'id_externo': 'code', 'nombre': 'name', 'calorias': 'kcal'}
+        importar(ruta, columnas=columnas)
+        self.arroz.refresh_from_db()
+        self.assertEqual((self.arroz.id_externo, self.arroz.calorias, self.arroz.carbohidratos), ('A1', Decimal('140'), Decimal('28')))
+        receta.refresh_from_db()
+        self.assertEqual(receta.calorias_porcion, Decimal('140.00'))
+
+        # El id externo manda sobre el nombre; los campos vacíos no borran nada
+        ruta = self.fichero('cambios.jsonl', '{"code": "A1", "name": "Arroz vaporizado", "kcal": "140 kcal"}\n')
+        importador = importar(ruta, columnas=columnas)
+        self.assertEqual(importador.contadores['actualizados'], 1)
+        self.assertEqual(Alimento.objects.get(id_externo='A1').nombre, 'Arroz vaporizado')
+        self.assertEqual(importar(ruta, columnas=columnas).contadores['sin_cambios'], 1)
+
+    def test_reanuda_desde_el_fichero_de_progreso(self):
+        filas = ''.join(f'Alimento {i},{i}\n' for i in range(10))
+        ruta = self.fichero('alimentos.csv', 'nombre,calorias\n' + filas)
+        vistas = []
+
+        def interrumpir(importador):
+            vistas.append(importador.contadores['leidas'])
+            if len(vistas) == 2:
+                raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            importar(ruta, tamano_lote=3, salida=interrumpir)
+        self.assertTrue(os.path.exists(ruta_progreso(ruta)))
+        self.assertEqual(Alimento.objects.filter(nombre__startswith='Alimento').count(), 6)
+
+        importador = importar(ruta, tamano_lote=3, reanudar=True)
+        self.assertEqual((importador.contadores['leidas'], importador.contadores['creados']), (10, 10))
+        self.assertEqual(Alimento.objects.filter(nombre__startswith='Alimento').count(), 10)
+        self.assertFalse(os.path.exists(ruta_progreso(ruta)))
+
+
+@skipUnless(planes.soportado(), 'Los planes se leen con EXPLAIN QUERY PLAN de SQLite')
+class PlanesConsultaTestCase(TestCase):
+    def test_busqueda_por_trigramas_sin_recorrer_tablas(self):
+        for queryset in (
+            TrigramaAlimento.objects.filter(trigrama='arr').order_by('longitud', 'id_alimento')
+            .values_list('id_alimento', 'peso')[:500],
+            Alimento.objects.filter(pk__in=[1, 2, 3]).values_list('pk', 'nombre_normalizado', 'id_categoria__nombre'),
+        ):
+            with self.subTest(consulta=str(queryset.query)):
+                self.assertEqual(planes.tablas_recorridas(queryset), [])
+                self.assertFalse(planes.ordena_en_memoria(queryset))
+
+    def test_alimento_por_nombre(self):
+        queryset = Alimento.objects.filter(nombre='Arroz')
+        self.assertEqual(planes.tablas_recorridas(queryset), [])
+        self.assertIn('idx_alimento_nombre', planes.indices_usados(queryset))
+
+    def test_busquedas_de_la_importacion_por_indice(self):
+        for queryset in (
+            Alimento.objects.filter(id_externo__in=['A1', 'A2']),
+            Alimento.objects.filter(nombre_normalizado__in=['arroz', 'pan']).order_by('pk'),
+        ):
+            with self.subTest(consulta=str(queryset.query)):
+                self.assertEqual(planes.tablas_recorridas(queryset), [])
@@ -0,0 +1,14 @@
+import re
+import unicodedata
+
+_NO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+
+def normalizar(texto):
+    """
+    Minúsculas, sin tildes ni signos: 'Plátano (maduro)' -> 'platano maduro'
+    """
+    if not texto:
+        return ''
+    sin_tildes = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return _NO_ALFANUMERICO.sub(' ', sin_tildes.lower()).strip()
@@ -3,5 +3,9 @@ from . import views
 
 urlpatterns = [
     path('lista/', views.ListaAlimentosView.as_view(), name='lista_alimentos'),
+    path('async/lista/', views.lista_alimentos_async, name='lista_alimentos_async'),
+    path('cambios/', views.cambios_catalogo, name='cambios_catalogo'),
+    path('exportar/', views.exportar_alimentos, name='exportar_alimentos'),
     path('recetas/', views.ListaRecetasView.as_view(), name='lista_recetas'),
+    path('autocompletar/', views.autocompletar_alimentos, name='autocompletar_alimentos'),
 ]
\ No newline at end of file
@@ -1,14 +1,39 @@
-from rest_framework import generics, filters
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import require_GET
+from rest_framework import generics, filters, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
-from .models import Alimento, Receta
-from .serializers import AlimentoSerializer, RecetaSerializer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from macromate.asincrono import respuesta_json
+from macromate.condicional import condicional, etag
+from macromate.paginacion import PaginacionCursor
+from macromate.renderizado import flujo_json
+from .autocompletar import obtener_indice
+from .catalogo import version_catalogo
+from .filters import BusquedaIndexadaFilter
+from .models import Alimento, IngredienteReceta, Receta
+from .serializers import AlimentoSerializer, RecetaSerializer, filas_alimentos
+from .sincronizacion import cambios_desde, flujo_cambios
+
+def _validadores_catalogo(request):
+    # La versión cambia con cualquier alta, cambio o baja de alimentos o categorías; leerla no toca la base de datos
+    return etag('catalogo', version_catalogo()), None
 
 class ListaAlimentosView(generics.ListAPIView):
-    queryset = Alimento.objects.all()
+    # select_related evita una consulta por fila al serializar nombre_categoria
+    queryset = Alimento.objects.select_related('id_categoria')
     serializer_class = AlimentoSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['nombre', 'id_categoria__nombre']
+    filter_backends = [BusquedaIndexadaFilter]
+
+    @method_decorator(condicional(_validadores_catalogo, privada=False))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
 
 class ListaRecetasView(generics.ListAPIView):
     serializer_class = RecetaSerializer
@@ -17,4 +42,106 @@ class ListaRecetasView(generics.ListAPIView):
     search_fields = ['nombre', 'descripcion']
 
     def get_queryset(self):
-        return Receta.objects.filter(id_usuario=self.request.user)
\ No newline at end of file
+        # Número de consultas constante: recetas + ingredientes (con su alimento) en un prefetch.
+        # Los macros por porción ya vienen calculados en la propia receta (recetas.py)
+        return Receta.objects.filter(id_usuario=self.request.user).prefetch_related(
+            Prefetch('ingredientereceta_set', queryset=IngredienteReceta.objects.select_related('id_alimento'))
+        )
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedOrReadOnly])
+def autocompletar_alimentos(request):
+    """
+    Sugerencias por prefijo para el buscador de alimentos: ?q=<prefijo>&k=<n>
+    """
+    try:
+        k = int(request.query_params['k']) if 'k' in request.query_params else None
+    except ValueError:
+        return Response({'error': 'k debe ser un número entero'}, status=status.HTTP_400_BAD_REQUEST)
+    if k is not None and k < 1:
+        return Response({'error': 'k debe ser mayor que 0'}, status=status.HTTP_400_BAD_REQUEST)
+
+    sugerencias = obtener_indice().buscar(request.query_params.get('q', ''), k)
+    return Response([{'id': pk, 'nombre': nombre} for pk, nombre in sugerencias])
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedOrReadOnly])
+@condicional(_validadores_catalogo, privada=False)
+def exportar_alimentos(request):
+    """
+    Catálogo completo en un solo array JSON, con los campos de /lista/. Las filas
+    se leen por lotes con iterator() y se escriben según se leen: la memoria no
+    crece con el tamaño del catálogo
+    """
+    return StreamingHttpResponse(flujo_json(filas_alimentos(Alimento.objects.order_by('id'))), content_type='application/json')
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedOrReadOnly])
+def cambios_catalogo(request):
+    """
+    Sincronización incremental del catálogo: ?desde=<versión> devuelve solo lo
+    que ha cambiado desde esa versión, o el catálogo completo (completo: true)
+    si no se indica o ya no está en el registro. La respuesta trae la versión
+    con la que pedir la siguiente vez.
+    """
+    try:
+        desde = int(request.query_params.get('desde', 0))
+    except ValueError:
+        return Response({'error': 'desde debe ser una versión (número entero)'}, status=status.HTTP_400_BAD_REQUEST)
+    if desde < 0:
+        return Response({'error': 'desde no puede ser negativo'}, status=status.HTTP_400_BAD_REQUEST)
+
+    return StreamingHttpResponse(flujo_cambios(cambios_desde(desde)), content_type='application/json')
+
+@require_GET
+async def lista_alimentos_async(request):
+    """
+    Versión asíncrona de ListaAlimentosView sin búsqueda: páginas por id con el
+    mismo formato y los mismos cursores que la versión síncrona
+    """
+    if request.GET.get(BusquedaIndexadaFilter.search_param):
+        return respuesta_json(
+            {'error': 'La búsqueda no está disponible en la versión asíncrona, use /api/alimentos/lista/'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    paginador = PaginacionCursor()
+    peticion = Request(request)
+    paginador.base_url = request.build_absolute_uri()
+    tamano = paginador.get_page_size(peticion)
+    try:
+        cursor = paginador.decode_cursor(peticion)
+        posicion = int(cursor.position) if cursor and cursor.position is not None else None
+    except (NotFound, ValueError):
+        return respuesta_json({'detail': 'Cursor inválido'}, status=status.HTTP_404_NOT_FOUND)
+
+    alimentos = Alimento.objects.select_related('id_categoria')
+    hacia_atras = bool(cursor and cursor.reverse and posicion is not None)
+    if hacia_atras:
+        alimentos = alimentos.filter(id__lt=posicion).order_by('-id')
+    else:
+        if posicion is not None:
+            alimentos = alimentos.filter(id__gt=posicion)
+        alimentos = alimentos.order_by('id')
+    # Una fila de más indica si hay otra página en ese sentido
+    filas = [alimento async for alimento in alimentos[:tamano + 1]]
+    hay_mas = len(filas) > tamano
+    pagina = filas[:tamano]
+    if hacia_atras:
+        pagina.reverse()
+
+    def enlace(alimento, reverse):
+        return paginador.encode_cursor(Cursor(offset=0, reverse=reverse, position=str(alimento.id)))
+
+    if hacia_atras:
+        siguiente = enlace(pagina[-1], False) if pagina else None
+        anterior = enlace(pagina[0], True) if pagina and hay_mas else None
+    else:
+        siguiente = enlace(pagina[-1], False) if hay_mas else None
+        anterior = enlace(pagina[0], True) if pagina and posicion is not None else None
+
+    return respuesta_json({
+        'next': siguiente,
+        'previous': anterior,
+        'results': AlimentoSerializer(pagina, many=True).data,
+    })
@@ -0,0 +1,27 @@
+"""
+Perfil de despliegue ASGI: gunicorn gestiona los procesos y cada worker es un
+bucle de eventos de uvicorn.
+
+    gunicorn macromate.asgi:application -c despliegue/gunicorn_asgi.py
+
+Las vistas async def de lectura (/api/*/async/...) atienden cualquier número de
+conexiones por worker sin un hilo por conexión: solo las consultas pasan al
+hilo del ORM asíncrono. El resto de vistas (DRF es síncrono) también
+funcionan, pero Django las ejecuta de una en una en ese mismo hilo por worker,
+así que las escrituras y los logins rinden menos que con gunicorn_wsgi.py.
+Conviene servir bajo ASGI solo las rutas de lectura asíncronas si el
+balanceador permite repartir por ruta.
+"""
+import multiprocessing
+
+import decouple
+
+bind = decouple.config('BIND', default='0.0.0.0:8000')
+# Un bucle de eventos por núcleo: más workers solo añaden memoria
+workers = decouple.config('WEB_CONCURRENCY', default=multiprocessing.cpu_count(), cast=int)
+worker_class = 'uvicorn.workers.UvicornWorker'
+keepalive = 5
+timeout = 30
+graceful_timeout = 30
+max_requests = 10000
+max_requests_jitter = 1000
@@ -0,0 +1,25 @@
+"""
+Perfil de despliegue WSGI (el actual): workers gthread de gunicorn.
+
+    gunicorn macromate.wsgi:application -c despliegue/gunicorn_wsgi.py
+
+Cada conexión abierta ocupa uno de los THREADS hilos de un worker mientras se
+atiende, también durante la espera de la base de datos o de un cliente lento.
+
+Detrás de un proxy inverso que termina TLS y sobrescribe X-Forwarded-Proto,
+DETRAS_DE_PROXY=True hace que Django confíe en esa cabecera (los dos perfiles).
+"""
+import multiprocessing
+
+import decouple
+
+bind = decouple.config('BIND', default='0.0.0.0:8000')
+workers = decouple.config('WEB_CONCURRENCY', default=multiprocessing.cpu_count() * 2 + 1, cast=int)
+worker_class = 'gthread'
+threads = decouple.config('THREADS', default=8, cast=int)
+keepalive = 5
+timeout = 30
+graceful_timeout = 30
+# Reciclar los workers acota la memoria que acumulan las cachés de cada proceso
+max_requests = 10000
+max_requests_jitter = 1000
@@ -0,0 +1,53 @@
+"""
+Utilidades de las vistas asíncronas (async def) de lectura.
+
+DRF no ejecuta vistas asíncronas: estas son vistas de Django que responden con
+JSON igual que Response (mismo codificador, macromate/renderizado.py, así que
+Decimal y fechas salen igual que en la versión síncrona) y que autentican con el mismo JWT y la misma
+caché de usuarios que JWTAutenticacionCacheada.
+
+Bajo ASGI (despliegue/gunicorn_asgi.py) una conexión lenta no ocupa un hilo: solo
+las consultas pasan al hilo del ORM asíncrono de Django.
+"""
+from functools import wraps
+
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from macromate.renderizado import dumps
+from usuarios.autenticacion import JWTAutenticacionCacheada
+
+_autenticacion = JWTAutenticacionCacheada()
+
+
+def respuesta_json(datos, status=status.HTTP_200_OK, headers=None):
+    return HttpResponse(dumps(datos), status=status, headers=headers, content_type='application/json')
+
+
+def _respuesta_no_autenticado(excepcion):
+    detalle = excepcion.detail
+    return respuesta_json(
+        detalle if isinstance(detalle, dict) else {'detail': str(detalle)},
+        status=status.HTTP_401_UNAUTHORIZED,
+        headers={'WWW-Authenticate': _autenticacion.authenticate_header(None)},
+    )
+
+
+def autenticacion_requerida(vista):
+    """
+    Equivalente a IsAuthenticated para vistas async def: deja el usuario en request.user o responde 401
+    """
+    @wraps(vista)
+    async def envoltura(request, *args, **kwargs):
+        try:
+            resultado = await _autenticacion.aautenticar(request)
+            if resultado is None:
+                raise NotAuthenticated()
+        except (AuthenticationFailed, InvalidToken, NotAuthenticated) as e:
+            return _respuesta_no_autenticado(e)
+        request.user, request.auth = resultado
+        return await vista(request, *args, **kwargs)
+
+    return envoltura
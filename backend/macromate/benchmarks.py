@@ -0,0 +1,70 @@
+"""
+Utilidades comunes de los comandos benchmark_*.
+
+Los benchmarks que necesitan datos trabajan sobre una base de datos temporal
+(la misma que crean los tests) para no tocar nunca la base de datos real.
+"""
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from django.db import connection
+
+
+@contextmanager
+def base_datos_temporal(fichero=None):
+    """
+    Crea una base de datos de pruebas migrada y la destruye al terminar.
+    fichero: en SQLite, ruta de la base de datos en disco en lugar de en memoria
+    (necesario si varios hilos escriben a la vez)
+    """
+    nombre_original = connection.settings_dict['NAME']
+    nombre_test_original = connection.settings_dict['TEST'].get('NAME')
+    if fichero is not None:
+        connection.settings_dict['TEST']['NAME'] = str(fichero)
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(nombre_original, verbosity=0)
+        connection.settings_dict['TEST']['NAME'] = nombre_test_original
+
+
+def medir(funcion, repeticiones, calentamiento=3):
+    """
+    Ejecuta funcion() repeticiones veces y devuelve los tiempos en milisegundos
+    """
+    for _ in range(calentamiento):
+        funcion()
+    tiempos = np.empty(repeticiones)
+    for i in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos[i] = (time.perf_counter() - inicio) * 1000
+    return tiempos
+
+
+def percentiles(tiempos):
+    p50, p95, p99 = np.percentile(tiempos, [50, 95, 99])
+    return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'media': float(np.mean(tiempos))}
+
+
+def comparar(resultados, referencia, tolerancia=0.25, margen_ms=0.5):
+    """
+    Regresiones de resultados frente a una ejecución de referencia (mismo formato):
+    p50 más de un tolerancia (relativo) y margen_ms (absoluto) por encima, más
+    consultas SQL o más errores. Devuelve [(nombre, motivo)]; lo que no está en
+    la referencia no se compara.
+    """
+    regresiones = []
+    for nombre, actual in resultados.items():
+        previo = referencia.get(nombre)
+        if previo is None:
+            continue
+        if actual['p50'] > previo['p50'] * (1 + tolerancia) and actual['p50'] - previo['p50'] > margen_ms:
+            regresiones.append((nombre, f"p50 {previo['p50']:.2f} -> {actual['p50']:.2f} ms"))
+        if actual['consultas'] > previo['consultas']:
+            regresiones.append((nombre, f"consultas {previo['consultas']} -> {actual['consultas']}"))
+        if actual['errores'] > previo['errores']:
+            regresiones.append((nombre, f"errores {previo['errores']} -> {actual['errores']}"))
+    return regresiones
@@ -0,0 +1,245 @@
+"""
+Caché compartida entre procesos sin servicios externos.
+
+SQLiteCache guarda las entradas en un fichero SQLite (modo WAL) que comparten
+todos los workers de gunicorn del mismo nodo, al contrario que LocMemCache,
+que es de cada proceso. Cada hilo abre su propia conexión (y la reabre tras un
+fork), las lecturas no bloquean a las escrituras y incr() es atómico entre
+procesos.
+
+obtener_o_calcular() es la lectura a través de la caché que usan los
+endpoints; lleva la cuenta de aciertos y fallos por espacio de claves.
+aobtener_o_calcular() es su versión para las vistas asíncronas: nunca espera
+al bloqueo del fichero en el bucle de eventos (ver aleer()).
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache as cache_defecto
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+PURGA_CADA_ESCRITURAS = 100  # Comprobar MAX_ENTRIES en cada escritura obliga a contar la tabla
+
+
+class SQLiteCache(BaseCache):
+    """
+    Backend de caché sobre un fichero SQLite.
+
+    CACHES = {'default': {'BACKEND': 'macromate.cache.SQLiteCache', 'LOCATION': '/ruta/cache.sqlite3'}}
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._ruta = str(location)
+        self._local = threading.local()
+        self._escrituras = 0
+
+    def _conexion(self, esperar=True):
+        """
+        Conexión del hilo. Sin esperar, la conexión no aguarda al bloqueo del
+        fichero: si está ocupado, sqlite3.OperationalError al momento.
+        """
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conexiones = {}
+            self._local.pid = os.getpid()
+        conexion = self._local.conexiones.get(esperar)
+        if conexion is None:
+            directorio = os.path.dirname(self._ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            # isolation_level=None: autocommit, las transacciones se abren explícitamente
+            conexion = sqlite3.connect(
+                self._ruta, timeout=10 if esperar else 0, isolation_level=None, check_same_thread=False
+            )
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            conexion.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'clave TEXT PRIMARY KEY, valor BLOB NOT NULL, expira REAL) WITHOUT ROWID'
+            )
+            self._local.conexiones[esperar] = conexion
+        return conexion
+
+    def _purgar_si_toca(self, conexion):
+        self._escrituras += 1
+        if self._escrituras % PURGA_CADA_ESCRITURAS:
+            return
+        conexion.execute('DELETE FROM cache WHERE expira < ?', (time.time(),))
+        (entradas,) = conexion.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if entradas > self._max_entries:
+            # Como FileBasedCache: se descarta 1/CULL_FREQUENCY de las entradas, las que antes caducan
+            conexion.execute(
+                'DELETE FROM cache WHERE clave IN (SELECT clave FROM cache ORDER BY expira IS NULL, expira LIMIT ?)',
+                (entradas // self._cull_frequency if self._cull_frequency else entradas,)
+            )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conexion = self._conexion()
+        cursor = conexion.execute(
+            'INSERT INTO cache (clave, valor, expira) VALUES (?, ?, ?) '
+            'ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor, expira = excluded.expira '
+            'WHERE cache.expira < ?',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self.get_backend_timeout(timeout), time.time())
+        )
+        self._purgar_si_toca(conexion)
+        return cursor.rowcount == 1
+
+    def get(self, key, default=None, version=None):
+        return self._leer(self._conexion(), key, default, version)
+
+    def get_sin_esperar(self, key, default=None, version=None):
+        """
+        get() que no espera si el fichero está bloqueado (sqlite3.OperationalError)
+        """
+        return self._leer(self._conexion(esperar=False), key, default, version)
+
+    def _leer(self, conexion, key, default, version):
+        key = self.make_and_validate_key(key, version=version)
+        fila = conexion.execute(
+            'SELECT valor FROM cache WHERE clave = ? AND (expira IS NULL OR expira >= ?)', (key, time.time())
+        ).fetchone()
+        if fila is None:
+            return default
+        return pickle.loads(fila[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conexion = self._conexion()
+        conexion.execute(
+            'INSERT OR REPLACE INTO cache (clave, valor, expira) VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self.get_backend_timeout(timeout))
+        )
+        self._purgar_si_toca(conexion)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._conexion().execute(
+            'UPDATE cache SET expira = ? WHERE clave = ? AND (expira IS NULL OR expira >= ?)',
+            (self.get_backend_timeout(timeout), key, time.time())
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._conexion().execute('DELETE FROM cache WHERE clave = ?', (key,)).rowcount == 1
+
+    def delete_many(self, keys, version=None):
+        claves = [self.make_and_validate_key(key, version=version) for key in keys]
+        if claves:
+            self._conexion().execute(
+                f'DELETE FROM cache WHERE clave IN ({",".join("?" * len(claves))})', claves
+            )
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._conexion().execute(
+            'SELECT 1 FROM cache WHERE clave = ? AND (expira IS NULL OR expira >= ?)', (key, time.time())
+        ).fetchone() is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conexion = self._conexion()
+        # BEGIN IMMEDIATE toma el bloqueo de escritura: lectura y escritura son atómicas entre procesos
+        conexion.execute('BEGIN IMMEDIATE')
+        try:
+            fila = conexion.execute(
+                'SELECT valor FROM cache WHERE clave = ? AND (expira IS NULL OR expira >= ?)', (key, time.time())
+            ).fetchone()
+            if fila is None:
+                raise ValueError("Key '%s' not found" % key)
+            valor = pickle.loads(fila[0]) + delta
+            conexion.execute(
+                'UPDATE cache SET valor = ? WHERE clave = ?', (pickle.dumps(valor, pickle.HIGHEST_PROTOCOL), key)
+            )
+        except Exception:
+            conexion.execute('ROLLBACK')
+            raise
+        conexion.execute('COMMIT')
+        return valor
+
+    def clear(self):
+        self._conexion().execute('DELETE FROM cache')
+
+
+_contadores = defaultdict(lambda: {'aciertos': 0, 'fallos': 0})
+_bloqueo_contadores = threading.Lock()
+_AUSENTE = object()
+
+
+def obtener_o_calcular(espacio, clave, calcular, timeout=DEFAULT_TIMEOUT, cache=None):
+    """
+    Devuelve el valor cacheado o lo calcula y lo guarda. Si calcular() devuelve
+    None no se guarda nada (p. ej. un 404).
+    """
+    cache = cache or cache_defecto
+    valor = cache.get(clave, _AUSENTE)
+    acierto = valor is not _AUSENTE
+    with _bloqueo_contadores:
+        _contadores[espacio]['aciertos' if acierto else 'fallos'] += 1
+    if acierto:
+        return valor
+    valor = calcular()
+    if valor is not None:
+        cache.set(clave, valor, timeout)
+    return valor
+
+
+async def aleer(clave, default=None, cache=None):
+    """
+    cache.get() desde el bucle de eventos. Una lectura de SQLite por clave
+    primaria cuesta menos que el salto a un hilo de cache.aget(), así que se
+    hace en el propio bucle, pero sin esperar al bloqueo del fichero: si está
+    ocupado (en WAL las escrituras no bloquean a las lecturas; sí un checkpoint
+    o una recuperación) se repite en otro hilo, donde esperar no para al resto
+    de corrutinas. Con otros backends se lee siempre en otro hilo.
+    """
+    cache = cache or cache_defecto
+    get_sin_esperar = getattr(cache, 'get_sin_esperar', None)  # La caché por defecto es un proxy
+    if get_sin_esperar is not None:
+        try:
+            return get_sin_esperar(clave, default)
+        except sqlite3.OperationalError:
+            pass
+    return await sync_to_async(cache.get, thread_sensitive=False)(clave, default)
+
+
+async def aobtener_o_calcular(espacio, clave, acalcular, timeout=DEFAULT_TIMEOUT, cache=None):
+    """
+    obtener_o_calcular() con una corrutina como calcular. La lectura es la de
+    aleer(); la escritura tras un fallo espera al bloqueo de escritura del
+    fichero (hasta el timeout de la conexión), así que va siempre a otro hilo.
+    """
+    cache = cache or cache_defecto
+    valor = await aleer(clave, _AUSENTE, cache)
+    acierto = valor is not _AUSENTE
+    with _bloqueo_contadores:
+        _contadores[espacio]['aciertos' if acierto else 'fallos'] += 1
+    if acierto:
+        return valor
+    valor = await acalcular()
+    if valor is not None:
+        # thread_sensitive=False: en el hilo del ORM asíncrono haría esperar también a sus consultas
+        await sync_to_async(cache.set, thread_sensitive=False)(clave, valor, timeout)
+    return valor
+
+
+def estadisticas():
+    """
+    Aciertos y fallos de este proceso por espacio de claves
+    """
+    with _bloqueo_contadores:
+        return {
+            espacio: {**contador, 'ratio_aciertos': contador['aciertos'] / max(sum(contador.values()), 1)}
+            for espacio, contador in _contadores.items()
+        }
+
+
+def reiniciar_estadisticas():
+    with _bloqueo_contadores:
+        _contadores.clear()
@@ -0,0 +1,103 @@
+"""
+GET condicional (ETag / Last-Modified) para las vistas de DRF.
+
+Cada vista declara una función que calcula sus validadores sin cargar ni
+serializar los objetos: de la entrada de caché si la hay, o de una consulta
+que solo lee el id y la fecha de modificación. Si el cliente ya tiene esa
+versión (If-None-Match / If-Modified-Since) se responde 304 sin ejecutar la
+vista; si no, la respuesta lleva los validadores para la próxima vez. Si no
+hay validadores antes de la vista se vuelven a pedir después (la vista puede
+haber llenado la caché de la que salen).
+
+Como django.views.decorators.http.condition, pero con una sola función para
+los dos validadores (una consulta en vez de dos) y aplicado dentro de
+@api_view, cuando DRF ya ha autenticado al usuario. En las vistas async def
+va debajo de @autenticacion_requerida (macromate/asincrono.py) y los
+validadores, que son síncronos, se ejecutan fuera del bucle de eventos.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+def etag(*partes):
+    """
+    ETag fuerte a partir de los valores que identifican la versión (no se exponen tal cual)
+    """
+    return '"%s"' % hashlib.blake2b(repr(partes).encode(), digest_size=12).hexdigest()
+
+
+def _cabeceras(respuesta, valor_etag, ultima_modificacion, privada):
+    if valor_etag:
+        respuesta['ETag'] = valor_etag
+    if ultima_modificacion:
+        respuesta['Last-Modified'] = http_date(ultima_modificacion.timestamp())
+    # no-cache: el cliente puede guardar la respuesta pero debe revalidarla siempre
+    patch_cache_control(respuesta, no_cache=True, **({'private': True} if privada else {'public': True}))
+    if privada:
+        patch_vary_headers(respuesta, ['Authorization'])
+    return respuesta
+
+
+def _no_modificada(request, valor_etag, ultima_modificacion, privada):
+    # 304 si el cliente ya tiene esta versión, None si hay que ejecutar la vista
+    if valor_etag is None and ultima_modificacion is None:
+        return None
+    timestamp = int(ultima_modificacion.timestamp()) if ultima_modificacion else None
+    respuesta = get_conditional_response(request, etag=valor_etag, last_modified=timestamp)
+    if respuesta is None:
+        return None
+    return _cabeceras(respuesta, valor_etag, ultima_modificacion, privada)
+
+
+def condicional(validadores, privada=True):
+    """
+    validadores(request, *args, **kwargs) -> (etag, ultima_modificacion); cualquiera
+    de los dos puede ser None, y si lo son ambos la vista responde como siempre.
+    privada: la respuesta depende del usuario (Cache-Control private y Vary: Authorization).
+    """
+    def decorador(vista):
+        if iscoroutinefunction(vista):
+            return _decorar_async(vista, validadores, privada)
+
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return vista(request, *args, **kwargs)
+            valor_etag, ultima_modificacion = validadores(request, *args, **kwargs)
+            no_modificada = _no_modificada(request, valor_etag, ultima_modificacion, privada)
+            if no_modificada is not None:
+                return no_modificada
+            respuesta = vista(request, *args, **kwargs)
+            if respuesta.status_code != 200:
+                return respuesta
+            if valor_etag is None and ultima_modificacion is None:
+                valor_etag, ultima_modificacion = validadores(request, *args, **kwargs)
+            return _cabeceras(respuesta, valor_etag, ultima_modificacion, privada)
+        return envoltura
+    return decorador
+
+
+def _decorar_async(vista, validadores, privada):
+    # Los validadores leen la caché (un fichero) y, sin entrada, la base de datos
+    avalidadores = sync_to_async(validadores)
+
+    @wraps(vista)
+    async def envoltura(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await vista(request, *args, **kwargs)
+        valor_etag, ultima_modificacion = await avalidadores(request, *args, **kwargs)
+        no_modificada = _no_modificada(request, valor_etag, ultima_modificacion, privada)
+        if no_modificada is not None:
+            return no_modificada
+        respuesta = await vista(request, *args, **kwargs)
+        if respuesta.status_code != 200:
+            return respuesta
+        if valor_etag is None and ultima_modificacion is None:
+            valor_etag, ultima_modificacion = await avalidadores(request, *args, **kwargs)
+        return _cabeceras(respuesta, valor_etag, ultima_modificacion, privada)
+    return envoltura
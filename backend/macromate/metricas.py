@@ -0,0 +1,375 @@
+"""
+Métricas por ruta en formato Prometheus, agregadas entre los workers del nodo.
+
+MetricasMiddleware anota por ruta (el patrón de URL resuelto, no la URL
+concreta, para que el número de series no crezca con los ids):
+- peticiones por método y estado;
+- un histograma de latencia;
+- un histograma de consultas SQL por petición;
+- el tiempo total en SQL.
+Las consultas se miden con un execute_wrapper instalado en cada conexión
+a la base de datos, también en el hilo del ORM de las vistas asíncronas. El
+wrapper suma en la medida de la petición en curso, que viaja en una
+ContextVar. En las respuestas en streaming (exportar_alimentos,
+cambios_catalogo) las consultas se hacen al consumir el contenido: la
+petición se registra cuando el iterador termina, con lo que ha tardado y
+consultado hasta entonces.
+
+Cada proceso acumula en memoria y un hilo suyo vuelca los incrementos cada
+INTERVALO_VOLCADO segundos a un fichero SQLite que comparten los workers (como
+macromate/cache.py). Es una transacción con un UPSERT por serie, no una
+escritura por petición, y fuera de las peticiones. /metrics vuelca lo pendiente del proceso que atiende
+y lee la suma de todos. Lo que los demás workers aún no han volcado (como
+mucho INTERVALO_VOLCADO segundos) aparece en la siguiente lectura.
+"""
+import atexit
+import hmac
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseNotFound
+
+_CONFIGURACION = {
+    'ACTIVAS': True,
+    'RUTA': str(settings.BASE_DIR / 'metricas.sqlite3'),
+    'INTERVALO_VOLCADO': 10,
+    'CUBETAS_SEGUNDOS': [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5],
+    'CUBETAS_CONSULTAS': [0, 1, 2, 5, 10, 20, 50, 100],
+    'TOKEN': '',
+    **settings.MACROMATE_SETTINGS.get('METRICAS', {}),
+}
+
+PETICIONES = 'macromate_peticiones_total'
+DURACION = 'macromate_duracion_peticion_segundos'
+CONSULTAS = 'macromate_consultas_sql_por_peticion'
+TIEMPO_SQL = 'macromate_tiempo_sql_segundos_total'
+DESCRIPCIONES = {
+    PETICIONES: ('counter', 'Peticiones por ruta, método y estado'),
+    DURACION: ('histogram', 'Latencia de las peticiones por ruta'),
+    CONSULTAS: ('histogram', 'Consultas SQL por petición y ruta'),
+    TIEMPO_SQL: ('counter', 'Tiempo en consultas SQL por ruta'),
+}
+SUMA = '_sum'  # Componente de la suma de un histograma; el resto son límites de cubeta
+METODOS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+SIN_RUTA = 'sin_ruta'  # 404 y redirecciones de los middlewares anteriores a la resolución de la URL
+
+# [consultas, segundos en SQL] de la petición en curso
+_medida = ContextVar('medida_peticion', default=None)
+_FIN = object()
+
+
+def _medir_consulta(execute, sql, params, many, context):
+    medida = _medida.get()
+    if medida is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medida[0] += 1
+        medida[1] += time.perf_counter() - inicio
+
+
+def _instalar(connection, **kwargs):
+    # Al principio: los execute_wrapper() temporales se quitan con pop() del final
+    if _medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _medir_consulta)
+
+
+connection_created.connect(lambda sender, connection, **kwargs: _instalar(connection))
+
+
+def _limites(cubetas):
+    return [repr(float(c)) for c in cubetas] + ['+Inf']
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RegistroMetricas:
+    """
+    Acumulador de un proceso. Las series son (nombre, etiquetas, componente) ->
+    incremento pendiente de volcar; componente es '' en los contadores y el
+    límite de la cubeta (sin acumular) o SUMA en los histogramas.
+    """
+
+    def __init__(self, ruta, intervalo, cubetas_segundos, cubetas_consultas):
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self._cubetas = {DURACION: list(cubetas_segundos), CONSULTAS: list(cubetas_consultas)}
+        self._limites = {nombre: _limites(cubetas) for nombre, cubetas in self._cubetas.items()}
+        self._etiquetas = {}
+        self._pendientes = defaultdict(float)
+        self._bloqueo = threading.Lock()
+        self._bloqueo_volcado = threading.Lock()
+        self._local = threading.local()
+        self._pid_volcador = None
+
+    def _conexion(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None or self._local.pid != os.getpid():
+            directorio = os.path.dirname(self.ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            conexion = sqlite3.connect(self.ruta, timeout=10, isolation_level=None, check_same_thread=False)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            conexion.execute(
+                'CREATE TABLE IF NOT EXISTS metricas (nombre TEXT NOT NULL, etiquetas TEXT NOT NULL, '
+                'componente TEXT NOT NULL, valor REAL NOT NULL, PRIMARY KEY (nombre, etiquetas, componente)) '
+                'WITHOUT ROWID'
+            )
+            self._local.conexion = conexion
+            self._local.pid = os.getpid()
+        return conexion
+
+    def _cubeta(self, nombre, valor):
+        return self._limites[nombre][bisect_left(self._cubetas[nombre], valor)]
+
+    def registrar(self, ruta, metodo, estado, segundos, consultas, segundos_sql):
+        etiquetas = self._etiquetas.get(ruta)
+        if etiquetas is None:
+            etiquetas = self._etiquetas[ruta] = f'ruta="{_escapar(ruta)}"'
+        cubeta_duracion = self._cubeta(DURACION, segundos)
+        cubeta_consultas = self._cubeta(CONSULTAS, consultas)
+        with self._bloqueo:
+            pendientes = self._pendientes
+            pendientes[PETICIONES, f'{etiquetas},metodo="{metodo}",estado="{estado}"', ''] += 1
+            pendientes[DURACION, etiquetas, cubeta_duracion] += 1
+            pendientes[DURACION, etiquetas, SUMA] += segundos
+            pendientes[CONSULTAS, etiquetas, cubeta_consultas] += 1
+            pendientes[CONSULTAS, etiquetas, SUMA] += consultas
+            pendientes[TIEMPO_SQL, etiquetas, ''] += segundos_sql
+        if self._pid_volcador != os.getpid():
+            self._arrancar_volcador()
+
+    def _arrancar_volcador(self):
+        # Un hilo por proceso (arrancado tras el fork de gunicorn): sin tráfico también se vuelca
+        with self._bloqueo:
+            if self._pid_volcador == os.getpid():
+                return
+            self._pid_volcador = os.getpid()
+        threading.Thread(target=self._volcar_periodicamente, name='volcado-metricas', daemon=True).start()
+
+    def _volcar_periodicamente(self):
+        while self._pid_volcador == os.getpid():
+            time.sleep(self.intervalo)
+            self.volcar(esperar=False)
+
+    def volcar(self, esperar=True):
+        """
+        Suma lo pendiente en el fichero compartido. Sin esperar, si otro hilo ya
+        está volcando no hace nada (lo pendiente irá en el siguiente volcado).
+        """
+        if not self._bloqueo_volcado.acquire(blocking=esperar):
+            return
+        try:
+            with self._bloqueo:
+                pendientes, self._pendientes = self._pendientes, defaultdict(float)
+            if not pendientes:
+                return
+            conexion = self._conexion()
+            try:
+                conexion.execute('BEGIN IMMEDIATE')
+                conexion.executemany(
+                    'INSERT INTO metricas (nombre, etiquetas, componente, valor) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (nombre, etiquetas, componente) DO UPDATE SET valor = valor + excluded.valor',
+                    [(*serie, valor) for serie, valor in pendientes.items()]
+                )
+                conexion.execute('COMMIT')
+            except sqlite3.Error:
+                if conexion.in_transaction:
+                    conexion.execute('ROLLBACK')
+                # Fichero bloqueado demasiado tiempo: se reintenta en el siguiente volcado
+                with self._bloqueo:
+                    for serie, valor in pendientes.items():
+                        self._pendientes[serie] += valor
+        finally:
+            self._bloqueo_volcado.release()
+
+    def exponer(self):
+        """
+        Texto en formato de exposición de Prometheus con la suma de todos los procesos
+        """
+        self.volcar()
+        series = defaultdict(lambda: defaultdict(dict))
+        for nombre, etiquetas, componente, valor in self._conexion().execute(
+            'SELECT nombre, etiquetas, componente, valor FROM metricas'
+        ):
+            series[nombre][etiquetas][componente] = valor
+
+        lineas = []
+        for nombre, (tipo, ayuda) in DESCRIPCIONES.items():
+            if not series[nombre]:
+                continue
+            lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} {tipo}']
+            for etiquetas, valores in sorted(series[nombre].items()):
+                if tipo != 'histogram':
+                    lineas.append(f'{nombre}{{{etiquetas}}} {valores[""]!r}')
+                    continue
+                # Todas las cubetas (también las vacías), acumuladas como pide Prometheus
+                limites = set(self._limites[nombre]) | (valores.keys() - {SUMA})
+                acumulado = 0.0
+                for limite in sorted(limites, key=float):
+                    acumulado += valores.get(limite, 0.0)
+                    lineas.append(f'{nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado!r}')
+                lineas.append(f'{nombre}_sum{{{etiquetas}}} {valores.get(SUMA, 0.0)!r}')
+                lineas.append(f'{nombre}_count{{{etiquetas}}} {acumulado!r}')
+        return '\n'.join(lineas) + '\n'
+
+    def detener(self):
+        """
+        Para el hilo de volcado (tras volcar lo pendiente)
+        """
+        self._pid_volcador = None
+        self.volcar()
+
+
+_registro = RegistroMetricas(
+    _CONFIGURACION['RUTA'], _CONFIGURACION['INTERVALO_VOLCADO'],
+    _CONFIGURACION['CUBETAS_SEGUNDOS'], _CONFIGURACION['CUBETAS_CONSULTAS'],
+)
+atexit.register(lambda: _registro.volcar())
+
+
+def obtener_registro():
+    return _registro
+
+
+def configurar_registro(ruta, intervalo=None):
+    """
+    Sustituye el registro del proceso (benchmarks y tests); devuelve el anterior
+    """
+    global _registro
+    anterior = _registro
+    anterior.detener()
+    _registro = RegistroMetricas(
+        ruta, _CONFIGURACION['INTERVALO_VOLCADO'] if intervalo is None else intervalo,
+        _CONFIGURACION['CUBETAS_SEGUNDOS'], _CONFIGURACION['CUBETAS_CONSULTAS'],
+    )
+    return anterior
+
+
+def _ruta(request):
+    resolucion = getattr(request, 'resolver_match', None)
+    return '/' + resolucion.route if resolucion is not None else SIN_RUTA
+
+
+class MetricasMiddleware:
+    """
+    Primero de MIDDLEWARE: la latencia incluye al resto de middlewares
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not _CONFIGURACION['ACTIVAS']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+        # Las conexiones ya abiertas no pasan por connection_created
+        for conexion in connections.all(initialized_only=True):
+            _instalar(conexion)
+
+    def _registrar(self, request, respuesta, inicio, medida):
+        metodo = request.method if request.method in METODOS else 'OTRO'
+        obtener_registro().registrar(
+            _ruta(request), metodo, respuesta.status_code, time.perf_counter() - inicio, medida[0], medida[1]
+        )
+
+    def _terminar(self, request, respuesta, inicio, medida):
+        if respuesta.streaming:
+            self._medir_contenido(request, respuesta, inicio, medida)
+        else:
+            self._registrar(request, respuesta, inicio, medida)
+        return respuesta
+
+    def _medir_contenido(self, request, respuesta, inicio, medida):
+        """
+        Envuelve streaming_content: cada parte se genera con la medida de la
+        petición activa y se registra al acabar (o al cerrarse a medias)
+        """
+        if respuesta.is_async:
+            iterador = aiter(respuesta.streaming_content)
+
+            async def contenido():
+                try:
+                    while True:
+                        token = _medida.set(medida)
+                        try:
+                            parte = await anext(iterador, _FIN)
+                        finally:
+                            _medida.reset(token)
+                        if parte is _FIN:
+                            return
+                        yield parte
+                finally:
+                    self._registrar(request, respuesta, inicio, medida)
+        else:
+            iterador = iter(respuesta.streaming_content)
+
+            def contenido():
+                try:
+                    while True:
+                        token = _medida.set(medida)
+                        try:
+                            parte = next(iterador, _FIN)
+                        finally:
+                            _medida.reset(token)
+                        if parte is _FIN:
+                            return
+                        yield parte
+                finally:
+                    self._registrar(request, respuesta, inicio, medida)
+
+        respuesta.streaming_content = contenido()
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        medida = [0, 0.0]
+        token = _medida.set(medida)
+        inicio = time.perf_counter()
+        try:
+            respuesta = self.get_response(request)
+        finally:
+            _medida.reset(token)
+        return self._terminar(request, respuesta, inicio, medida)
+
+    async def __acall__(self, request):
+        medida = [0, 0.0]
+        token = _medida.set(medida)
+        inicio = time.perf_counter()
+        try:
+            respuesta = await self.get_response(request)
+        finally:
+            _medida.reset(token)
+        return self._terminar(request, respuesta, inicio, medida)
+
+
+def vista_metricas(request):
+    """
+    GET /metrics para Prometheus. Con METRICAS_TOKEN exige «Authorization: Bearer <token>»;
+    sin token solo responde en DEBUG (detrás del proxy todas las peticiones parecen locales).
+    """
+    token = _CONFIGURACION['TOKEN']
+    if token:
+        autorizado = hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    else:
+        autorizado = settings.DEBUG
+    if not autorizado:
+        return HttpResponseNotFound()
+    return HttpResponse(obtener_registro().exponer(), content_type='text/plain; version=0.0.4; charset=utf-8')
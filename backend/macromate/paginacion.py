@@ -0,0 +1,24 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+_PAGINACION = settings.MACROMATE_SETTINGS['PAGINACION']
+
+
+class PaginacionCursor(CursorPagination):
+    """
+    Paginación por cursor (keyset) sobre la clave primaria: cada página es un
+    WHERE id > <último id> ORDER BY id LIMIT n por índice, así que la página
+    10.000 cuesta lo mismo que la primera (a diferencia de OFFSET).
+
+    Si el queryset viene ordenado por relevancia desde el buscador de alimentos,
+    el cursor avanza sobre esa anotación y usa el id como desempate.
+    """
+    ordering = 'id'
+    page_size = _PAGINACION['TAMANO_PAGINA']
+    page_size_query_param = 'limite'
+    max_page_size = _PAGINACION['MAX_TAMANO_PAGINA']
+
+    def get_ordering(self, request, queryset, view):
+        if 'relevancia' in queryset.query.annotations:
+            return ('-relevancia', 'id')
+        return super().get_ordering(request, queryset, view)
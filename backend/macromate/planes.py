@@ -0,0 +1,33 @@
+"""
+Lectura de planes de consulta (EXPLAIN) para los tests de rendimiento.
+
+Interpreta la salida de EXPLAIN QUERY PLAN de SQLite, la base de datos de
+desarrollo y de los tests: «SEARCH t USING INDEX i (...)» es una búsqueda por
+índice y «SCAN t» (con o sin índice) recorre la tabla o el índice entero.
+"""
+import re
+
+from django.db import connection
+
+_RECORRIDO = re.compile(r'\bSCAN (?!CONSTANT ROW)(\w+)')
+_INDICE = re.compile(r'USING (?:COVERING )?INDEX (\w+)')
+
+
+def soportado():
+    return connection.vendor == 'sqlite'
+
+
+def tablas_recorridas(queryset):
+    """
+    Tablas que el plan de la consulta recorre enteras en lugar de buscar por índice
+    """
+    return _RECORRIDO.findall(queryset.explain())
+
+
+def indices_usados(queryset):
+    return _INDICE.findall(queryset.explain())
+
+
+def ordena_en_memoria(queryset):
+    # ORDER BY que el índice no resuelve: SQLite ordena las filas en un árbol temporal
+    return 'USE TEMP B-TREE FOR ORDER BY' in queryset.explain()
@@ -0,0 +1,40 @@
+"""
+Ejecutor de los tests (TEST_RUNNER).
+
+La caché por defecto es un fichero que comparten los workers del nodo
+(macromate/cache.py): los tests la vacían con cache.clear(), así que con un
+servidor corriendo al lado le borrarían y ensuciarían las entradas. Durante la
+ejecución la caché apunta a un fichero de un directorio temporal que se borra al
+terminar.
+
+Lo mismo con las métricas: MetricasMiddleware anota cada petición del cliente
+de pruebas y el registro del proceso apunta al fichero de la suite, no a
+metricas.sqlite3.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from macromate.metricas import configurar_registro
+
+
+class EjecutorPruebas(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._directorio = tempfile.TemporaryDirectory(prefix='macromate-tests-')
+        self._caches = override_settings(CACHES={
+            **settings.CACHES,
+            'default': {**settings.CACHES['default'], 'LOCATION': os.path.join(self._directorio.name, 'cache.sqlite3')},
+        })
+        self._caches.enable()
+        self._registro = configurar_registro(os.path.join(self._directorio.name, 'metricas.sqlite3'))
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        # Vuelca lo pendiente en el fichero temporal; al registro restaurado no le queda nada para atexit
+        configurar_registro(self._registro.ruta, self._registro.intervalo)
+        self._directorio.cleanup()
+        super().teardown_test_environment(**kwargs)
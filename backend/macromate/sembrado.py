@@ -0,0 +1,228 @@
+"""
+Datos sintéticos realistas para los benchmarks.
+
+sembrar() crea de una vez (bulk_create) usuarios con perfil, un catálogo de
+alimentos con categorías, un catálogo de ejercicios, recetas con ingredientes
+y años de historial por usuario: registros diarios con sus comidas, alimentos
+consumidos y ejercicios, medidas corporales semanales y un objetivo de macros
+cada pocos meses. bulk_create no emite señales, así que los totales de comidas
+y días (también las calorías quemadas) se calculan aquí con totales.aportes()
+y calcular_calorias_quemadas(), y después se rellenan las tablas derivadas
+(macros por porción de las recetas, índice de búsqueda, registro de cambios
+del catálogo y resúmenes de adherencia).
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from alimentos.busqueda import reconstruir_indice
+from alimentos.catalogo import registrar_cambios
+from alimentos.management.commands.benchmark_autocompletar import generar_alimentos
+from alimentos.models import Alimento, CategoriaAlimento, IngredienteReceta, Receta
+from alimentos.recetas import recalcular_recetas
+from nutricion.adherencia import recalcular_resumenes
+from nutricion.models import (
+    AlimentoConsumido, ComidaDiaria, Ejercicio, Macronutrientes, RegistroDiario, RegistroEjercicio,
+)
+from nutricion.totales import CAMPOS_TOTALES, aportes
+from nutricion.utils import (
+    AJUSTES_OBJETIVO, FACTORES_ACTIVIDAD, calcular_calorias_quemadas, calcular_macros_para_perfil,
+)
+from usuarios.models import MedidaCorporal, Perfil, Usuario
+
+CONTRASENA = 'clave-benchmark-123'
+CATEGORIAS = [
+    'Carnes', 'Pescados', 'Lácteos', 'Huevos', 'Cereales', 'Legumbres', 'Frutas', 'Verduras',
+    'Frutos secos', 'Aceites', 'Bebidas', 'Dulces', 'Panadería', 'Embutidos', 'Platos preparados',
+]
+EJERCICIOS = [
+    ('Correr', 'cardio', 600), ('Bicicleta', 'cardio', 450), ('Natación', 'cardio', 500),
+    ('Pesas', 'fuerza', 350), ('Yoga', 'flexibilidad', 200), ('Remo', 'resistencia', 480),
+]
+TIPOS_COMIDA = [tipo for tipo, _ in ComidaDiaria.TIPO_COMIDA_CHOICES]
+PROBABILIDAD_REGISTRO = 0.85   # Días con registro
+PROBABILIDAD_EJERCICIO = 0.4   # Días registrados con ejercicio
+DIAS_ENTRE_MEDIDAS = 7
+DIAS_ENTRE_OBJETIVOS = 120
+
+
+def _decimal(valor):
+    return Decimal(str(round(float(valor), 2)))
+
+
+def _sembrar_catalogo(rng, n):
+    categorias = CategoriaAlimento.objects.bulk_create([CategoriaAlimento(nombre=c) for c in CATEGORIAS])
+    proteinas = rng.uniform(0, 30, n)
+    carbohidratos = rng.uniform(0, 60, n)
+    grasas = rng.uniform(0, 25, n)
+    alimentos = Alimento.objects.bulk_create([
+        Alimento(
+            nombre=nombre, nombre_normalizado=normalizado,
+            calorias=_decimal(4 * proteinas[i] + 4 * carbohidratos[i] + 9 * grasas[i]),
+            proteinas=_decimal(proteinas[i]), carbohidratos=_decimal(carbohidratos[i]), grasas=_decimal(grasas[i]),
+            porcion_gramos=100 if i % 5 else int(rng.choice([30, 50, 125, 250])),
+            id_categoria=categorias[i % len(categorias)],
+        )
+        for i, (_, nombre, normalizado, _) in enumerate(generar_alimentos(n, semilla=int(rng.integers(2**31))))
+    ], batch_size=5000)
+    registrar_cambios('categoria', [c.pk for c in categorias], 'guardado')
+    registrar_cambios('alimento', [a.pk for a in alimentos], 'guardado')
+    # Unos pocos alimentos acaparan la mayoría de los consumos, como en la práctica
+    popularidad = 1 / np.arange(1, n + 1) ** 1.1
+    return alimentos, popularidad / popularidad.sum()
+
+
+def _sembrar_usuarios(rng, n, hoy):
+    contrasena = make_password(CONTRASENA)  # Un solo hash PBKDF2 para todos
+    usuarios = Usuario.objects.bulk_create([
+        Usuario(email=f'usuario{i}@benchmark.local', nombre_usuario=f'usuario{i}', password=contrasena)
+        for i in range(n)
+    ])
+    perfiles = []
+    for usuario in usuarios:
+        perfil = Perfil(
+            id_usuario=usuario,
+            nombre=usuario.nombre_usuario,
+            fecha_nacimiento=hoy - timedelta(days=int(rng.integers(18 * 365, 70 * 365))),
+            genero=rng.choice(['masculino', 'femenino']),
+            altura=_decimal(rng.uniform(150, 200)),
+            peso_actual=_decimal(rng.uniform(50, 120)),
+            nivel_actividad=rng.choice(list(FACTORES_ACTIVIDAD)),
+            objetivo=rng.choice(list(AJUSTES_OBJETIVO)),
+        )
+        perfil.peso_objetivo = _decimal(float(perfil.peso_actual) + rng.uniform(-15, 10))
+        bmr = perfil.calcular_bmr()
+        perfil.bmr = _decimal(bmr)
+        perfil.tdee = _decimal(bmr * perfil.factor_actividad())
+        perfiles.append(perfil)
+    return usuarios, Perfil.objects.bulk_create(perfiles)
+
+
+def _sembrar_objetivos(rng, perfil, dias):
+    base = calcular_macros_para_perfil(perfil)
+    fechas = dias[::DIAS_ENTRE_OBJETIVOS]
+    objetivos = Macronutrientes.objects.bulk_create([
+        Macronutrientes(
+            id_perfil=perfil, activo=i == len(fechas) - 1,
+            **{campo: _decimal(base[campo] * rng.uniform(0.9, 1.1))
+               for campo in ('calorias_diarias', 'proteinas', 'carbohidratos', 'grasas')},
+        )
+        for i in range(len(fechas))
+    ])
+    # fecha_calculo es auto_now_add: se fija después
+    for objetivo, fecha in zip(objetivos, fechas):
+        objetivo.fecha_calculo = fecha
+    Macronutrientes.objects.bulk_update(objetivos, ['fecha_calculo'])
+    return objetivos
+
+
+def _sembrar_historial(rng, perfil, dias, alimentos, popularidad, ejercicios):
+    objetivos = _sembrar_objetivos(rng, perfil, dias)
+    registros, comidas_por_registro, sesiones = [], [], []
+    for i, fecha in enumerate(dias):
+        if rng.random() >= PROBABILIDAD_REGISTRO:
+            continue
+        registros.append(RegistroDiario(
+            id_perfil=perfil, fecha=fecha, agua_litros=_decimal(rng.uniform(0.5, 3)),
+            id_macro_objetivo=objetivos[i // DIAS_ENTRE_OBJETIVOS],
+        ))
+        comidas = []
+        for tipo in rng.choice(TIPOS_COMIDA, size=int(rng.integers(2, 5)), replace=False):
+            elegidos = rng.choice(len(alimentos), size=int(rng.integers(1, 4)), p=popularidad)
+            consumidos = [
+                AlimentoConsumido(id_alimento=alimentos[j], cantidad_gramos=_decimal(rng.integers(20, 200)))
+                for j in elegidos
+            ]
+            comidas.append((ComidaDiaria(tipo_comida=tipo), consumidos))
+        comidas_por_registro.append(comidas)
+        if rng.random() < PROBABILIDAD_EJERCICIO:
+            ejercicio = ejercicios[int(rng.integers(len(ejercicios)))]
+            sesion = RegistroEjercicio(id_registro=registros[-1], id_ejercicio=ejercicio, duracion_minutos=int(rng.integers(15, 91)))
+            sesion.calorias_quemadas = calcular_calorias_quemadas(
+                ejercicio.calorias_por_hora, sesion.duracion_minutos, perfil.peso_actual
+            )
+            registros[-1].calorias_quemadas = sesion.calorias_quemadas
+            sesiones.append(sesion)
+    RegistroDiario.objects.bulk_create(registros)
+    RegistroEjercicio.objects.bulk_create(sesiones, batch_size=5000)
+
+    todas, consumidos = [], []
+    for registro, comidas in zip(registros, comidas_por_registro):
+        for comida, consumidos_comida in comidas:
+            comida.id_registro = registro
+            sumados = [aportes(c.id_alimento, c.cantidad_gramos) for c in consumidos_comida]
+            for campo, (campo_comida, campo_registro) in CAMPOS_TOTALES.items():
+                total = sum((aporte[campo] for aporte in sumados), Decimal(0))
+                setattr(comida, campo_comida, total)
+                setattr(registro, campo_registro, getattr(registro, campo_registro) + total)
+            todas.append(comida)
+    RegistroDiario.objects.bulk_update(registros, [r for _, r in CAMPOS_TOTALES.values()], batch_size=1000)
+    ComidaDiaria.objects.bulk_create(todas, batch_size=5000)
+    for comida, consumidos_comida in (par for comidas in comidas_por_registro for par in comidas):
+        for consumido in consumidos_comida:
+            consumido.id_comida = comida
+            consumidos.append(consumido)
+    AlimentoConsumido.objects.bulk_create(consumidos, batch_size=5000)
+
+    fechas_medidas = dias[::DIAS_ENTRE_MEDIDAS]
+    # Paseo aleatorio con deriva hacia el peso objetivo
+    deriva = (float(perfil.peso_objetivo) - float(perfil.peso_actual)) / len(fechas_medidas)
+    pesos = float(perfil.peso_actual) + np.cumsum(deriva + rng.normal(0, 0.4, len(fechas_medidas)))
+    medidas = MedidaCorporal.objects.bulk_create([
+        MedidaCorporal(
+            id_perfil=perfil, peso=_decimal(np.clip(peso, 35, 250)),
+            porcentaje_grasa=_decimal(rng.uniform(10, 35)) if rng.random() < 0.3 else None,
+        )
+        for peso in pesos
+    ])
+    # fecha_registro es auto_now_add: se fija después
+    for medida, fecha in zip(medidas, fechas_medidas):
+        medida.fecha_registro = fecha
+    MedidaCorporal.objects.bulk_update(medidas, ['fecha_registro'])
+    return [(perfil.pk, registro.fecha) for registro in registros]
+
+
+def _sembrar_recetas(rng, usuarios, por_usuario, alimentos, popularidad):
+    recetas = Receta.objects.bulk_create([
+        Receta(id_usuario=usuario, nombre=f'Receta {j} de {usuario.nombre_usuario}', porciones=int(rng.integers(1, 7)))
+        for usuario in usuarios for j in range(por_usuario)
+    ])
+    IngredienteReceta.objects.bulk_create([
+        IngredienteReceta(id_receta=receta, id_alimento=alimentos[j], cantidad=_decimal(rng.integers(10, 400)))
+        for receta in recetas
+        for j in rng.choice(len(alimentos), size=int(rng.integers(3, 9)), replace=False, p=popularidad)
+    ], batch_size=5000)
+    recalcular_recetas([receta.pk for receta in recetas])
+
+
+def sembrar(usuarios=20, alimentos=5000, recetas_por_usuario=5, anios=2, semilla=0, hoy=None, salida=None):
+    """
+    Siembra la base de datos actual (pensado para base_datos_temporal()) y devuelve los usuarios creados.
+    El historial de cada usuario acaba hoy. salida: función a la que se notifica el progreso.
+    """
+    rng = np.random.default_rng(semilla)
+    hoy = hoy or date.today()
+    dias = [hoy - timedelta(days=d) for d in range(anios * 365 - 1, -1, -1)]
+    notificar = salida or (lambda mensaje: None)
+
+    with transaction.atomic():
+        catalogo, popularidad = _sembrar_catalogo(rng, alimentos)
+        ejercicios = Ejercicio.objects.bulk_create([
+            Ejercicio(nombre=nombre, categoria=categoria, calorias_por_hora=calorias)
+            for nombre, categoria, calorias in EJERCICIOS
+        ])
+        notificar(f'{alimentos} alimentos')
+        creados, perfiles = _sembrar_usuarios(rng, usuarios, hoy)
+        claves = []
+        for i, perfil in enumerate(perfiles, 1):
+            claves.extend(_sembrar_historial(rng, perfil, dias, catalogo, popularidad, ejercicios))
+            notificar(f'Historial de {i}/{usuarios} usuarios')
+        _sembrar_recetas(rng, creados, recetas_por_usuario, catalogo, popularidad)
+        notificar(f'{usuarios * recetas_por_usuario} recetas')
+    reconstruir_indice()
+    recalcular_resumenes(claves)
+    notificar('Índice de búsqueda y resúmenes de adherencia')
+    return creados
@@ -30,6 +30,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'macromate.metricas.MetricasMiddleware',  # Primero: mide también al resto de middlewares
+    'macromate.renderizado.CompresionMiddleware',  # Antes que el resto: comprime la respuesta ya terminada
     'corsheaders.middleware.CorsMiddleware',  
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -63,11 +65,21 @@ WSGI_APPLICATION = 'macromate.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3', 
+        'NAME': config('DB_PATH', default=str(BASE_DIR / 'db.sqlite3')),
     }
 }
 
 # Validacion de Contraseñas
+# El primero calcula PBKDF2 en un pool acotado (usuarios/hashing.py); mismo algoritmo que el de Django.
+# No se lista PBKDF2PasswordHasher: compartiría el nombre de algoritmo y lo sustituiría
+PASSWORD_HASHERS = [
+    'usuarios.hashing.PBKDF2HasherAcotado',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -109,12 +121,18 @@ AUTH_USER_MODEL = 'usuarios.Usuario'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication con caché de usuarios (usuarios/autenticacion.py)
+        'usuarios.autenticacion.JWTAutenticacionCacheada',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ),
-
+    'DEFAULT_RENDERER_CLASSES': (
+        'macromate.renderizado.RenderizadorJSON',  # orjson, misma salida que JSONRenderer
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'macromate.paginacion.PaginacionCursor',
+    'PAGE_SIZE': 50,
 }
 
 SIMPLE_JWT = {
@@ -147,17 +165,29 @@ if not DEBUG:
     SECURE_BROWSER_XSS_FILTER = True
     SECURE_CONTENT_TYPE_NOSNIFF = True
     SECURE_SSL_REDIRECT = True
+    # Solo si hay un proxy inverso que termina TLS y sobrescribe siempre X-Forwarded-Proto:
+    # sin él cualquier cliente podría hacer pasar una petición http por https
+    if config('DETRAS_DE_PROXY', default=False, cast=bool):
+        SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
     SESSION_COOKIE_SECURE = True
     CSRF_COOKIE_SECURE = True
 
 
 CACHES = {
+    # Fichero SQLite compartido por todos los workers del nodo (macromate/cache.py)
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        'BACKEND': 'macromate.cache.SQLiteCache',
+        'LOCATION': config('CACHE_PATH', default=str(BASE_DIR / 'cache.sqlite3')),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
 
+# Los tests usan su propia caché en un directorio temporal, nunca el fichero del nodo
+TEST_RUNNER = 'macromate.pruebas.EjecutorPruebas'
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # Para desarrollo
 
 MACROMATE_SETTINGS = {
@@ -172,5 +202,82 @@ MACROMATE_SETTINGS = {
     'AI': {
         'MAX_TOKENS': 500,
         'TEMPERATURE': 0.7,
-    }
+    },
+    'PAGINACION': {
+        'TAMANO_PAGINA': 50,
+        'MAX_TAMANO_PAGINA': 200, # Límite para ?limite= en los listados
+    },
+    'AUTOCOMPLETAR': {
+        'RESULTADOS_DEFECTO': 10,
+        'MAX_RESULTADOS': 20,
+        'MAX_EDAD_SEGUNDOS': 3600, # Reconstruir para refrescar la popularidad
+    },
+    'CACHE': {
+        'TIMEOUT_LECTURAS': 300, # Perfil y macros actuales; se invalidan al escribir
+        'TIMEOUT_TENDENCIA': 86400, # Tendencia de peso; se invalida con cada medida nueva
+    },
+    'AUTH_CACHE': {
+        'MAX_ENTRADAS': 10000, # Usuarios por proceso
+        'TTL_SEGUNDOS': 60,
+        'CACHEAR_PERFIL': True, # Guardar también el id del perfil (request.user.id_perfil_cacheado)
+    },
+    'LISTA_NEGRA': {
+        # Filtro de Bloom de refresh tokens en lista negra (usuarios/tokens.py)
+        'CAPACIDAD': 1_000_000,
+        'PROB_FALSOS_POSITIVOS': 0.001,
+        'SEGUNDOS_SINCRONIZACION': 5, # Máximo sin mirar deltas aunque no cambie la versión
+        'SEGUNDOS_RECONSTRUCCION': 3600,
+    },
+    'HASHING': {
+        # HILOS + MAX_COLA por debajo de los hilos de cada worker: siempre quedan hilos para el resto
+        # Hashes de contraseña simultáneos por proceso; None: núcleos disponibles menos uno (mínimo 1).
+        # Con varios workers por nodo conviene fijarlo a (núcleos - 1) / workers
+        'HILOS': None,
+        'MAX_COLA': 6, # Más operaciones en espera se rechazan con 429
+        'SEGUNDOS_REINTENTO': 1,
+    },
+    'TENDENCIA_PESO': {
+        'SEMIVIDA_DIAS': 7, # Media móvil exponencial: peso a la mitad cada 7 días
+        'VENTANA_RITMO_DIAS': 28, # Ritmo actual: pendiente de las medidas de las últimas 4 semanas
+        'PUNTOS_DEFECTO': 200,
+        'MAX_PUNTOS': 1000,
+        'MAX_DIAS_PROYECCION': 3650, # Más allá no se estima fecha de objetivo
+    },
+    'ADHERENCIA': {
+        'TOLERANCIA': 0.10,  # Un día cumple el objetivo si queda a menos de ±10 %
+        'MAX_DIAS_RANGO': 3660,
+    },
+    'METRICAS': {
+        # Middleware y /metrics (macromate/metricas.py); el fichero lo comparten los workers del nodo
+        'ACTIVAS': config('METRICAS_ACTIVAS', default=True, cast=bool),
+        'RUTA': config('METRICAS_PATH', default=str(BASE_DIR / 'metricas.sqlite3')),
+        'INTERVALO_VOLCADO': 10, # Segundos entre volcados de cada proceso al fichero
+        'CUBETAS_SEGUNDOS': [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5],
+        'CUBETAS_CONSULTAS': [0, 1, 2, 5, 10, 20, 50, 100],
+        'TOKEN': config('METRICAS_TOKEN', default=''), # Bearer que debe enviar Prometheus
+    },
+    'CATALOGO': {
+        'SEGUNDOS_VERSION': 60, # Caducidad de la versión en caché (alimentos/catalogo.py)
+        'RETENCION_CAMBIOS_DIAS': 90, # compactar_cambios_catalogo; clientes más antiguos reciben el catálogo completo
+    },
+    'PLANIFICADOR': {
+        # Planes de comidas (nutricion/planificador.py)
+        'PRESUPUESTO_MS': 150, # Tiempo máximo de búsqueda por plan; se reparte entre las comidas
+        'CANDIDATOS': 400, # Alimentos preseleccionados por comida
+        'ALIMENTOS_POR_COMIDA': 3,
+        'MAX_ALIMENTOS_POR_COMIDA': 6,
+        'GRAMOS_MIN': 10,
+        'GRAMOS_MAX': 400,
+        'COMBINACIONES_POR_LOTE': 2048,
+        'ERROR_SUFICIENTE': 0.02, # Error relativo (RMS de los macros) con el que se deja de buscar
+        'RUIDO': 0.05, # Variedad entre planes: ruido en la preselección
+    },
+    'COMPRESION': {
+        'UMBRAL_BYTES': 1024, # Respuestas menores salen sin gzip
+    },
+    'REGISTRO_DIA': {
+        # Con estos límites cada bulk_create cabe en un solo INSERT (también en SQLite)
+        'MAX_COMIDAS': 20,
+        'MAX_ALIMENTOS': 200,
+    },
 }
\ No newline at end of file
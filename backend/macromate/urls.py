@@ -1,17 +1,22 @@
 from django.contrib import admin
 from django.urls import path, include
+from macromate.metricas import vista_metricas
 from usuarios.views import (
-    registro_usuario, login_usuario, perfil_usuario, 
-    logout_usuario, cambiar_contrasena
+    registro_usuario, login_usuario, perfil_usuario, perfil_usuario_async,
+    logout_usuario, cambiar_contrasena, refrescar_token, tendencia_peso
 )
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', vista_metricas, name='metricas'),
     path('api/usuarios/registro/', registro_usuario, name='registro'),
     path('api/usuarios/login/', login_usuario, name='login'),
     path('api/usuarios/perfil/', perfil_usuario, name='perfil'),
+    path('api/usuarios/async/perfil/', perfil_usuario_async, name='perfil_async'),
     path('api/usuarios/cambiar_contrasena/', cambiar_contrasena, name='cambiar_contrasena'),
     path('api/usuarios/logout/', logout_usuario, name='logout'),
+    path('api/usuarios/token/refrescar/', refrescar_token, name='refrescar_token'),
+    path('api/usuarios/tendencia-peso/', tendencia_peso, name='tendencia_peso'),
     
     path('api/nutricion/', include('nutricion.urls')),
     path('api/alimentos/', include('alimentos.urls')),
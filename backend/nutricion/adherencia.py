@@ -0,0 +1,299 @@
+"""
+Adherencia a los macros objetivo agregada por semana ISO y por mes.
+
+ResumenAdherencia guarda, por perfil y periodo, sumas de consumo y de objetivo
+y cuántos días se cumplió cada objetivo (con una tolerancia). Cualquier cambio
+en un RegistroDiario (o en sus totales, o en los macros en vigor) programa el
+recálculo de su semana y su mes, agrupado por transacción; recalcular una
+cubeta lee como mucho 31 registros.
+
+resumen_rango() sirve un rango de fechas con los meses y semanas completos que
+contiene más los días sueltos de los extremos: un año son unas 12 filas de
+resumen y unos pocos registros diarios en lugar de 365 días de comidas.
+
+Objetivo de un día: el Macronutrientes enlazado en id_macro_objetivo o, si no
+tiene, el último calculado para el perfil hasta esa fecha.
+"""
+import threading
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Macronutrientes, RegistroDiario, ResumenAdherencia
+
+# Macro -> (campo consumido en RegistroDiario y ResumenAdherencia, campo objetivo en Macronutrientes)
+CAMPOS_ADHERENCIA = {
+    'calorias': ('calorias_consumidas', 'calorias_diarias'),
+    'proteinas': ('proteinas_consumidas', 'proteinas'),
+    'carbohidratos': ('carbohidratos_consumidos', 'carbohidratos'),
+    'grasas': ('grasas_consumidas', 'grasas'),
+}
+CAMPOS_RESUMEN = ['dias_registrados', 'dias_con_objetivo'] + [
+    campo
+    for macro, (consumido, _) in CAMPOS_ADHERENCIA.items()
+    for campo in (consumido, f'{consumido}_con_objetivo', f'{macro}_objetivo', f'dias_cumple_{macro}')
+]
+PERIODOS = ('semana', 'mes')
+TOLERANCIA = Decimal(str(settings.MACROMATE_SETTINGS['ADHERENCIA']['TOLERANCIA']))
+# Cada perfil añade un OR a las consultas: SQLite limita la profundidad de las expresiones a 1000
+TAMANO_LOTE = 100
+_CENTESIMAS = Decimal('0.01')
+
+
+def inicio_periodo(periodo, fecha):
+    if periodo == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    return fecha.replace(day=1)
+
+
+def fin_periodo(periodo, inicio):
+    if periodo == 'semana':
+        return inicio + timedelta(days=6)
+    return (inicio.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def _periodos_completos(periodo, desde, hasta):
+    inicio = inicio_periodo(periodo, desde)
+    if inicio < desde:
+        inicio = fin_periodo(periodo, inicio) + timedelta(days=1)
+    completos = []
+    while fin_periodo(periodo, inicio) <= hasta:
+        completos.append(inicio)
+        inicio = fin_periodo(periodo, inicio) + timedelta(days=1)
+    return completos
+
+
+def _descomponer(desde, hasta):
+    """
+    Divide [desde, hasta] en meses completos, semanas completas fuera de esos
+    meses y rangos de días sueltos. Devuelve (meses, semanas, rangos_dias).
+    """
+    meses = _periodos_completos('mes', desde, hasta)
+    restos = (
+        [(desde, meses[0] - timedelta(days=1)), (fin_periodo('mes', meses[-1]) + timedelta(days=1), hasta)]
+        if meses else [(desde, hasta)]
+    )
+    semanas, rangos_dias = [], []
+    for inicio, fin in restos:
+        if inicio > fin:
+            continue
+        completas = _periodos_completos('semana', inicio, fin)
+        semanas.extend(completas)
+        if not completas:
+            rangos_dias.append((inicio, fin))
+            continue
+        rangos_dias.append((inicio, completas[0] - timedelta(days=1)))
+        rangos_dias.append((fin_periodo('semana', completas[-1]) + timedelta(days=1), fin))
+    return meses, semanas, [(a, b) for a, b in rangos_dias if a <= b]
+
+
+def _acumulado_vacio():
+    return dict.fromkeys(CAMPOS_RESUMEN, 0)
+
+
+def _sumar(acumulado, otro):
+    for campo in CAMPOS_RESUMEN:
+        acumulado[campo] += otro[campo]
+    return acumulado
+
+
+def _sumar_dia(acumulado, consumos, objetivo):
+    acumulado['dias_registrados'] += 1
+    for macro, (consumido, _) in CAMPOS_ADHERENCIA.items():
+        acumulado[consumido] += consumos[macro]
+    if objetivo is None:
+        return
+    acumulado['dias_con_objetivo'] += 1
+    for macro, (consumido, _) in CAMPOS_ADHERENCIA.items():
+        meta = objetivo[macro]
+        if not meta:
+            continue
+        acumulado[f'{consumido}_con_objetivo'] += consumos[macro]
+        acumulado[f'{macro}_objetivo'] += meta
+        if abs(consumos[macro] - meta) <= meta * TOLERANCIA:
+            acumulado[f'dias_cumple_{macro}'] += 1
+
+
+def _dias(filtro, ids_perfil):
+    """
+    (id_perfil, fecha, consumos, objetivo) de los registros que cumplen el filtro, en dos consultas
+    """
+    campos_objetivo = [objetivo for _, objetivo in CAMPOS_ADHERENCIA.values()]
+    registros = list(RegistroDiario.objects.filter(filtro).values_list(
+        'id_perfil', 'fecha', 'id_macro_objetivo',
+        *(consumido for consumido, _ in CAMPOS_ADHERENCIA.values()),
+        *(f'id_macro_objetivo__{campo}' for campo in campos_objetivo),
+    ))
+    if not registros:
+        return
+    historial = defaultdict(lambda: ([], []))
+    if any(fila[2] is None for fila in registros):
+        macros = Macronutrientes.objects.filter(id_perfil__in=ids_perfil).order_by(
+            'id_perfil', 'fecha_calculo', 'id'
+        ).values_list('id_perfil', 'fecha_calculo', *campos_objetivo)
+        for id_perfil, fecha_calculo, *valores in macros:
+            fechas, objetivos = historial[id_perfil]
+            fechas.append(fecha_calculo)
+            objetivos.append(dict(zip(CAMPOS_ADHERENCIA, valores)))
+
+    n = len(CAMPOS_ADHERENCIA)
+    for id_perfil, fecha, id_macro, *valores in registros:
+        consumos = dict(zip(CAMPOS_ADHERENCIA, valores[:n]))
+        if id_macro is not None:
+            objetivo = dict(zip(CAMPOS_ADHERENCIA, valores[n:]))
+        else:
+            fechas, objetivos = historial[id_perfil]
+            indice = bisect_right(fechas, fecha)
+            objetivo = objetivos[indice - 1] if indice else None
+        yield id_perfil, fecha, consumos, objetivo
+
+
+def recalcular_resumenes(claves):
+    """
+    Recalcula desde sus registros las semanas y meses que contienen los días dados.
+    claves: pares (id_perfil, fecha)
+    """
+    cubetas = defaultdict(set)
+    for id_perfil, fecha in claves:
+        for periodo in PERIODOS:
+            cubetas[id_perfil].add((periodo, inicio_periodo(periodo, fecha)))
+    ids_perfil = sorted(cubetas)
+    for i in range(0, len(ids_perfil), TAMANO_LOTE):
+        _recalcular_bloque({p: cubetas[p] for p in ids_perfil[i:i + TAMANO_LOTE]})
+
+
+def _recalcular_bloque(cubetas):
+    acumulados = {
+        (id_perfil, periodo, inicio): _acumulado_vacio()
+        for id_perfil, propias in cubetas.items() for periodo, inicio in propias
+    }
+    rangos = reduce(or_, (
+        Q(id_perfil=id_perfil,
+          fecha__range=(min(i for _, i in propias), max(fin_periodo(p, i) for p, i in propias)))
+        for id_perfil, propias in cubetas.items()
+    ))
+    for id_perfil, fecha, consumos, objetivo in _dias(rangos, list(cubetas)):
+        for periodo in PERIODOS:
+            acumulado = acumulados.get((id_perfil, periodo, inicio_periodo(periodo, fecha)))
+            if acumulado is not None:
+                _sumar_dia(acumulado, consumos, objetivo)
+
+    vacias = [clave for clave, acumulado in acumulados.items() if not acumulado['dias_registrados']]
+    with transaction.atomic():
+        if vacias:
+            ResumenAdherencia.objects.filter(reduce(or_, (
+                Q(id_perfil=id_perfil, periodo=periodo, inicio=inicio) for id_perfil, periodo, inicio in vacias
+            ))).delete()
+        ResumenAdherencia.objects.bulk_create(
+            [
+                ResumenAdherencia(id_perfil_id=id_perfil, periodo=periodo, inicio=inicio, **acumulado)
+                for (id_perfil, periodo, inicio), acumulado in acumulados.items()
+                if acumulado['dias_registrados']
+            ],
+            update_conflicts=True,
+            unique_fields=['id_perfil', 'periodo', 'inicio'],
+            update_fields=CAMPOS_RESUMEN,
+        )
+
+
+_pendientes = threading.local()
+
+
+def _procesar_pendientes():
+    claves = getattr(_pendientes, 'claves', None)
+    _pendientes.claves = set()
+    if claves:
+        recalcular_resumenes(claves)
+
+
+def programar_resumenes(claves):
+    """
+    Acumula días (id_perfil, fecha) cuyos resúmenes hay que recalcular y los
+    procesa juntos al confirmar la transacción, como programar_recalculo() de las recetas
+    """
+    claves = set(claves)
+    if not claves:
+        return
+    if getattr(_pendientes, 'claves', None) is None:
+        _pendientes.claves = set()
+    _pendientes.claves.update(claves)
+    transaction.on_commit(_procesar_pendientes)
+
+
+def _formatear(acumulado):
+    def porcentaje(parte, total):
+        return (Decimal(parte) * 100 / total).quantize(Decimal('0.1')) if total else None
+
+    def media(suma, dias):
+        return (Decimal(suma) / dias).quantize(_CENTESIMAS) if dias else None
+
+    datos = {'dias_registrados': acumulado['dias_registrados'], 'dias_con_objetivo': acumulado['dias_con_objetivo']}
+    for macro, (consumido, _) in CAMPOS_ADHERENCIA.items():
+        datos[macro] = {
+            'media': media(acumulado[consumido], acumulado['dias_registrados']),
+            'objetivo_medio': media(acumulado[f'{macro}_objetivo'], acumulado['dias_con_objetivo']),
+            'porcentaje_objetivo': porcentaje(acumulado[f'{consumido}_con_objetivo'], acumulado[f'{macro}_objetivo']),
+            'dias_cumplidos': acumulado[f'dias_cumple_{macro}'],
+            'porcentaje_dias_cumplidos': porcentaje(acumulado[f'dias_cumple_{macro}'], acumulado['dias_con_objetivo']),
+        }
+    return datos
+
+
+def resumen_rango(id_perfil, desde, hasta, agrupar=None):
+    """
+    Adherencia del perfil entre desde y hasta (incluidos) y, si se pide
+    agrupar ('semana' o 'mes'), la serie por periodos recortada al rango.
+    Como mucho tres consultas sea cual sea la longitud del rango.
+    """
+    if agrupar:
+        segmentos = []
+        inicio = inicio_periodo(agrupar, desde)
+        while inicio <= hasta:
+            segmentos.append((max(inicio, desde), min(fin_periodo(agrupar, inicio), hasta)))
+            inicio = fin_periodo(agrupar, inicio) + timedelta(days=1)
+    else:
+        segmentos = [(desde, hasta)]
+
+    partes = [_descomponer(inicio, fin) for inicio, fin in segmentos]
+    filas_buscadas = {
+        ('mes', m) for meses, _, _ in partes for m in meses
+    } | {('semana', s) for _, semanas, _ in partes for s in semanas}
+    filas = {}
+    if filas_buscadas:
+        filtro = Q()
+        for periodo in PERIODOS:
+            inicios = [i for p, i in filas_buscadas if p == periodo]
+            if inicios:
+                filtro |= Q(periodo=periodo, inicio__in=inicios)
+        for fila in ResumenAdherencia.objects.filter(filtro, id_perfil_id=id_perfil).values('periodo', 'inicio', *CAMPOS_RESUMEN):
+            filas[(fila.pop('periodo'), fila.pop('inicio'))] = fila
+
+    rangos_dias = [rango for _, _, rangos in partes for rango in rangos]
+    por_fecha = {}
+    if rangos_dias:
+        filtro = Q(id_perfil_id=id_perfil) & reduce(or_, (Q(fecha__range=rango) for rango in rangos_dias))
+        por_fecha = {fecha: (consumos, objetivo) for _, fecha, consumos, objetivo in _dias(filtro, [id_perfil])}
+
+    serie = []
+    for (inicio, fin), (meses, semanas, rangos) in zip(segmentos, partes):
+        acumulado = _acumulado_vacio()
+        for clave in [('mes', m) for m in meses] + [('semana', s) for s in semanas]:
+            if clave in filas:
+                _sumar(acumulado, filas[clave])
+        for fecha, (consumos, objetivo) in por_fecha.items():
+            if any(a <= fecha <= b for a, b in rangos):
+                _sumar_dia(acumulado, consumos, objetivo)
+        serie.append((inicio, fin, acumulado))
+
+    total = reduce(_sumar, (acumulado for _, _, acumulado in serie), _acumulado_vacio())
+    resultado = {'desde': desde, 'hasta': hasta, 'total': _formatear(total)}
+    if agrupar:
+        resultado['serie'] = [{'desde': inicio, 'hasta': fin, **_formatear(acumulado)} for inicio, fin, acumulado in serie]
+    return resultado
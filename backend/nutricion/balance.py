@@ -0,0 +1,68 @@
+"""
+Balance energético diario: calorías consumidas menos calorías quemadas.
+
+RegistroDiario.calorias_quemadas es la suma de las calorías de sus
+RegistroEjercicio y se mantiene como los totales de las comidas (totales.py):
+cada alta, cambio o baja de un ejercicio aplica su diferencia al registro del
+día con un UPDATE atómico. Un ejercicio registrado sin calorías las deriva de
+su duración, de las calorías por hora del ejercicio y del peso actual del
+perfil. El balance de un rango se lee solo de los registros diarios, sin
+volver a cruzar ejercicios ni comidas.
+"""
+from decimal import Decimal
+
+from django.db.models import F
+
+from usuarios.models import Perfil
+
+from .models import RegistroDiario
+from .utils import calcular_calorias_quemadas
+
+_CERO = Decimal('0.00')
+
+
+def derivar_calorias_quemadas(registro_ejercicio):
+    peso = Perfil.objects.filter(
+        registrodiario=registro_ejercicio.id_registro_id
+    ).values_list('peso_actual', flat=True).first()
+    return calcular_calorias_quemadas(
+        registro_ejercicio.id_ejercicio.calorias_por_hora, registro_ejercicio.duracion_minutos, peso
+    )
+
+
+def aplicar_quemadas(id_registro, delta):
+    if delta:
+        RegistroDiario.objects.filter(pk=id_registro).update(calorias_quemadas=F('calorias_quemadas') + delta)
+
+
+def balance_rango(id_perfil, desde, hasta):
+    """
+    Balance de cada día registrado entre desde y hasta (incluidos) y del rango, en una consulta
+    """
+    filas = RegistroDiario.objects.filter(id_perfil_id=id_perfil, fecha__range=(desde, hasta)).order_by(
+        'fecha'
+    ).values_list('fecha', 'calorias_consumidas', 'calorias_quemadas')
+    dias = []
+    consumidas_total = quemadas_total = _CERO
+    for fecha, consumidas, quemadas in filas:
+        dias.append({
+            'fecha': fecha,
+            'calorias_consumidas': consumidas,
+            'calorias_quemadas': quemadas,
+            'balance_neto': consumidas - quemadas,
+        })
+        consumidas_total += consumidas
+        quemadas_total += quemadas
+    balance_total = consumidas_total - quemadas_total
+    return {
+        'desde': desde,
+        'hasta': hasta,
+        'total': {
+            'dias_registrados': len(dias),
+            'calorias_consumidas': consumidas_total,
+            'calorias_quemadas': quemadas_total,
+            'balance_neto': balance_total,
+            'balance_medio': (balance_total / len(dias)).quantize(Decimal('0.01')) if dias else None,
+        },
+        'dias': dias,
+    }
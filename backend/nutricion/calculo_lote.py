@@ -0,0 +1,160 @@
+"""
+Cálculo de macronutrientes por lotes con NumPy.
+
+Replica exactamente las fórmulas de utils.py (mismo orden de operaciones en
+coma flotante y mismo redondeo) pero sobre columnas completas de perfiles, para
+poder recalcular cientos de miles de perfiles en una sola pasada.
+"""
+from datetime import date
+
+import numpy as np
+
+from .utils import (
+    FACTORES_ACTIVIDAD, AJUSTES_OBJETIVO, REPARTO_MACROS,
+    CONSTANTES_GENERO, CONSTANTE_GENERO_DEFECTO,
+)
+
+CAMPOS_PERFIL_LOTE = (
+    'peso_actual', 'altura', 'fecha_nacimiento', 'genero', 'nivel_actividad', 'objetivo'
+)
+
+
+def _columna_texto(valores):
+    columna = np.asarray(valores)
+    if columna.dtype.kind != 'U':
+        columna = columna.astype(str)
+    return columna
+
+
+def _codificar(valores, claves):
+    """
+    Convierte una columna de texto (género, actividad, objetivo) en índices sobre
+    `claves`; los valores desconocidos reciben el índice len(claves).
+    Las tablas son pequeñas, así que basta una comparación vectorizada por clave.
+    """
+    columna = _columna_texto(valores)
+    codigos = np.full(columna.shape, len(claves), dtype=np.intp)
+    for i, clave in enumerate(claves):
+        codigos[columna == clave] = i
+    return codigos
+
+
+def _mapear(codigos, claves, tabla, defecto):
+    valores = np.array([tabla[c] for c in claves] + [defecto], dtype=np.float64)
+    return valores[codigos]
+
+
+def _redondear(valores, decimales):
+    """
+    Redondeo equivalente al round() de Python.
+    np.round multiplica por 10**decimales y puede discrepar en los casos límite,
+    así que esos pocos valores se redondean con round().
+    """
+    escalados = valores * (10 ** decimales)
+    resultado = np.round(valores, decimales)
+    dudosos = np.flatnonzero(np.abs(np.abs(escalados - np.trunc(escalados)) - 0.5) < 1e-6)
+    for i in dudosos:
+        resultado[i] = round(float(valores[i]), decimales)
+    return resultado
+
+
+def _columna_fechas(fechas_nacimiento):
+    fechas = np.asarray(fechas_nacimiento)
+    if fechas.dtype == object:
+        fechas = np.array(
+            [np.datetime64(f, 'D') if f else np.datetime64('NaT') for f in fechas],
+            dtype='datetime64[D]'
+        )
+    return fechas.astype('datetime64[D]')
+
+
+def calcular_edades(fechas_nacimiento, hoy=None):
+    """
+    Edad en años cumplidos para cada fecha de nacimiento (0 si falta la fecha)
+    """
+    hoy = hoy or date.today()
+    fechas = _columna_fechas(fechas_nacimiento)
+    validas = ~np.isnat(fechas)
+    seguras = np.where(validas, fechas, np.datetime64(hoy, 'D'))
+
+    anios = seguras.astype('datetime64[Y]')
+    meses = seguras.astype('datetime64[M]')
+    anio = anios.astype(np.int64) + 1970
+    mes = (meses - anios.astype('datetime64[M]')).astype(np.int64) + 1
+    dia = (seguras - meses.astype('datetime64[D]')).astype(np.int64) + 1
+
+    no_cumplidos = (mes > hoy.month) | ((mes == hoy.month) & (dia > hoy.day))
+    edades = hoy.year - anio - no_cumplidos.astype(np.int64)
+    return np.where(validas, edades, 0)
+
+
+def calcular_macros_lote(pesos, alturas, fechas_nacimiento, generos, niveles_actividad, objetivos, hoy=None):
+    """
+    Calcula BMR, TDEE, calorías y macronutrientes para columnas de perfiles.
+
+    Devuelve un diccionario de arrays con las mismas claves numéricas que
+    calcular_macros_para_perfil más 'valido', que marca los perfiles con peso,
+    altura y fecha de nacimiento. Los perfiles no válidos quedan a 0 igual que
+    en el cálculo individual.
+    """
+    pesos = np.nan_to_num(np.asarray(pesos, dtype=np.float64), nan=0.0)
+    alturas = np.nan_to_num(np.asarray(alturas, dtype=np.float64), nan=0.0)
+    fechas = _columna_fechas(fechas_nacimiento)
+    edades = calcular_edades(fechas, hoy).astype(np.float64)
+
+    claves_genero = list(CONSTANTES_GENERO)
+    claves_actividad = list(FACTORES_ACTIVIDAD)
+    claves_objetivo = list(REPARTO_MACROS)
+    codigos_genero = _codificar(generos, claves_genero)
+    codigos_actividad = _codificar(niveles_actividad, claves_actividad)
+    codigos_objetivo = _codificar(objetivos, claves_objetivo)
+
+    constantes = _mapear(codigos_genero, claves_genero, CONSTANTES_GENERO, CONSTANTE_GENERO_DEFECTO)
+    factores = _mapear(codigos_actividad, claves_actividad, FACTORES_ACTIVIDAD, 1.2)
+    ajustes = _mapear(codigos_objetivo, claves_objetivo, AJUSTES_OBJETIVO, 1.0)
+
+    reparto = np.array(
+        [REPARTO_MACROS[c] for c in claves_objetivo] + [REPARTO_MACROS['mantenimiento']],
+        dtype=np.float64
+    )[codigos_objetivo]
+    ratio_proteina, ratio_grasas, ratio_carbohidratos = reparto[:, 0], reparto[:, 1], reparto[:, 2]
+
+    # Mismo orden de operaciones que calcular_bmr / calcular_tdee / ajustar_calorias_objetivo
+    bmr = (10 * pesos) + (6.25 * alturas) - (5 * edades) + constantes
+    tdee = bmr * factores
+    calorias = tdee * ajustes
+
+    proteinas = (calorias * ratio_proteina) / 4
+    grasas = (calorias * ratio_grasas) / 9
+    carbohidratos = (calorias * ratio_carbohidratos) / 4
+
+    valido = (pesos != 0) & (alturas != 0) & ~np.isnat(fechas)
+    cero = np.zeros_like(bmr)
+
+    return {
+        'valido': valido,
+        'calorias_diarias': np.where(valido, np.rint(calorias), cero),
+        'proteinas': np.where(valido, _redondear(proteinas, 1), cero),
+        'carbohidratos': np.where(valido, _redondear(carbohidratos, 1), cero),
+        'grasas': np.where(valido, _redondear(grasas, 1), cero),
+        'bmr': np.where(valido, np.rint(bmr), cero),
+        'tdee': np.where(valido, np.rint(tdee), cero),
+    }
+
+
+def calcular_macros_queryset(queryset, hoy=None):
+    """
+    Calcula los macros de todos los perfiles de un queryset con una sola consulta.
+    Devuelve (ids, resultado) donde resultado es el diccionario de calcular_macros_lote.
+    """
+    filas = list(queryset.values_list('pk', *CAMPOS_PERFIL_LOTE))
+    if not filas:
+        return np.array([], dtype=np.int64), calcular_macros_lote([], [], [], [], [], [], hoy)
+
+    ids, pesos, alturas, fechas, generos, niveles, objetivos = zip(*filas)
+    resultado = calcular_macros_lote(
+        [float(p) if p is not None else np.nan for p in pesos],
+        [float(a) if a is not None else np.nan for a in alturas],
+        fechas, generos, niveles, objetivos, hoy,
+    )
+    return np.array(ids, dtype=np.int64), resultado
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+import httpx
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from alimentos.management.commands.benchmark_paginacion import sembrar_alimentos
+from macromate.benchmarks import base_datos_temporal
+from nutricion.models import Macronutrientes
+from usuarios.models import Perfil, Usuario
+
+RUTAS = {
+    'wsgi': ['/api/nutricion/macros-actuales/', '/api/usuarios/perfil/', '/api/alimentos/lista/'],
+    'asgi': ['/api/nutricion/async/macros-actuales/', '/api/usuarios/async/perfil/', '/api/alimentos/async/lista/'],
+}
+APLICACIONES = {'wsgi': 'macromate.wsgi:application', 'asgi': 'macromate.asgi:application'}
+
+
+def memoria_kb(pid):
+    """
+    RSS del proceso y de sus descendientes (master de gunicorn y workers), leído de /proc
+    """
+    total, pendientes = 0, [pid]
+    while pendientes:
+        actual = pendientes.pop()
+        try:
+            with open(f'/proc/{actual}/status') as f:
+                total += next(int(linea.split()[1]) for linea in f if linea.startswith('VmRSS:'))
+            for tarea in os.listdir(f'/proc/{actual}/task'):
+                with open(f'/proc/{actual}/task/{tarea}/children') as f:
+                    pendientes.extend(int(hijo) for hijo in f.read().split())
+        except (FileNotFoundError, ProcessLookupError, StopIteration):
+            continue
+    return total
+
+
+async def carga(url_base, rutas, cabeceras, conexiones, segundos, pid):
+    """
+    conexiones clientes con keep-alive que repiten peticiones sin pausa; devuelve
+    peticiones/s (errores incluidos), latencias en ms y el pico de memoria del servidor
+    """
+    latencias, errores, pico = [], 0, 0
+    limites = httpx.Limits(max_connections=conexiones, max_keepalive_connections=conexiones)
+    async with httpx.AsyncClient(base_url=url_base, headers=cabeceras, limits=limites, timeout=60) as cliente:
+        fin = time.monotonic() + segundos
+
+        async def usuario(indice):
+            nonlocal errores
+            i = indice
+            while time.monotonic() < fin:
+                inicio = time.perf_counter()
+                try:
+                    respuesta = await cliente.get(rutas[i % len(rutas)])
+                    errores += respuesta.status_code != 200
+                except httpx.TransportError:
+                    # Conexión cortada o plazo agotado: el servidor no da abasto
+                    errores += 1
+                latencias.append((time.perf_counter() - inicio) * 1000)
+                i += 1
+
+        async def muestrear():
+            nonlocal pico
+            while time.monotonic() < fin:
+                pico = max(pico, memoria_kb(pid))
+                await asyncio.sleep(0.2)
+
+        inicio = time.monotonic()
+        await asyncio.gather(muestrear(), *(usuario(i) for i in range(conexiones)))
+        duracion = time.monotonic() - inicio
+    return len(latencias) / duracion, np.array(latencias), errores, pico
+
+
+class Command(BaseCommand):
+    help = ('Peticiones/s y memoria por conexión concurrente de los endpoints de lectura: '
+            'vistas síncronas con gunicorn gthread (WSGI) frente a las asíncronas con uvicorn (ASGI)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conexiones', type=int, nargs='+', default=[1, 16, 64, 256])
+        parser.add_argument('--segundos', type=float, default=10)
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--hilos', type=int, default=8, help='Hilos por worker gthread (WSGI)')
+        parser.add_argument('--alimentos', type=int, default=10_000)
+        parser.add_argument('--puerto', type=int, default=8765)
+
+    def arrancar(self, tipo, opciones, entorno):
+        comando = [
+            sys.executable, '-m', 'gunicorn', APLICACIONES[tipo],
+            '-c', str(settings.BASE_DIR / 'despliegue' / f'gunicorn_{tipo}.py'),
+            '--bind', f'127.0.0.1:{opciones["puerto"]}', '--workers', str(opciones['workers']),
+            '--threads', str(opciones['hilos']), '--log-level', 'warning',
+        ]
+        servidor = subprocess.Popen(comando, cwd=settings.BASE_DIR, env=entorno)
+        url_base = f'http://127.0.0.1:{opciones["puerto"]}'
+        limite = time.monotonic() + 30
+        while time.monotonic() < limite:
+            try:
+                httpx.get(url_base + RUTAS[tipo][2], timeout=1)
+                return servidor, url_base
+            except httpx.TransportError:
+                time.sleep(0.2)
+        servidor.terminate()
+        raise CommandError(f'El servidor {tipo} no arrancó')
+
+    def handle(self, *args, **opciones):
+        with tempfile.TemporaryDirectory() as directorio, \
+                base_datos_temporal(fichero=Path(directorio) / 'db.sqlite3'):
+            usuario = Usuario.objects.create_user('asgi@example.com', 'asgi', 'clave-segura-123')
+            perfil = Perfil.objects.create(
+                id_usuario=usuario, peso_actual=80, altura=180, fecha_nacimiento=date(1990, 1, 1), genero='masculino'
+            )
+            Macronutrientes.objects.create(
+                id_perfil=perfil, calorias_diarias=2500, proteinas=160, carbohidratos=280, grasas=80, activo=True
+            )
+            sembrar_alimentos(opciones['alimentos'])
+            cabeceras = {
+                'Authorization': f'Bearer {RefreshToken.for_user(usuario).access_token}',
+                'X-Forwarded-Proto': 'https',  # Como detrás del proxy: DEBUG=False redirige a https
+            }
+            entorno = {
+                **os.environ, 'DEBUG': 'False', 'DETRAS_DE_PROXY': 'True',
+                'DB_PATH': str(Path(directorio) / 'db.sqlite3'),
+                'CACHE_PATH': str(Path(directorio) / 'cache.sqlite3'),
+                'METRICAS_PATH': str(Path(directorio) / 'metricas.sqlite3'),
+            }
+
+            self.stdout.write(
+                f'{"servidor":>8} {"conexiones":>10} {"pet/s":>8} {"p50 (ms)":>9} {"p99":>8} '
+                f'{"errores":>7} {"RSS (MB)":>9} {"KB/conexión":>11}'
+            )
+            for tipo in ('wsgi', 'asgi'):
+                servidor, url_base = self.arrancar(tipo, opciones, entorno)
+                try:
+                    # Calentamiento: cachés de usuarios y lecturas llenas antes de medir
+                    asyncio.run(carga(url_base, RUTAS[tipo], cabeceras, 8, 3, servidor.pid))
+                    en_reposo = memoria_kb(servidor.pid)
+                    for conexiones in opciones['conexiones']:
+                        rps, latencias, errores, pico = asyncio.run(carga(
+                            url_base, RUTAS[tipo], cabeceras, conexiones, opciones['segundos'], servidor.pid
+                        ))
+                        p50, p99 = np.percentile(latencias, [50, 99])
+                        self.stdout.write(
+                            f'{tipo:>8} {conexiones:>10} {rps:>8.0f} {p50:>9.1f} {p99:>8.1f} {errores:>7} '
+                            f'{pico / 1024:>9.1f} {max(pico - en_reposo, 0) / conexiones:>11.1f}'
+                        )
+                finally:
+                    servidor.terminate()
+                    servidor.wait(timeout=30)
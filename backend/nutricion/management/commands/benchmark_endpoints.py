@@ -0,0 +1,298 @@
+import json
+import platform
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import django
+import numpy as np
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, reverse
+
+from alimentos.catalogo import ultima_version
+from alimentos.models import Alimento
+from macromate.benchmarks import base_datos_temporal, comparar, percentiles
+from macromate.metricas import configurar_registro
+from macromate.sembrado import CONTRASENA, sembrar
+from nutricion import utils
+from usuarios.models import Perfil, Usuario
+from usuarios.tokens import RefreshTokenFiltrado
+
+OTRA_CONTRASENA = 'otra-clave-benchmark-456'
+REPETICIONES_HASHING = 5  # Cada petición cuesta uno o dos hashes PBKDF2 de cientos de ms
+LLAMADAS_POR_MUESTRA = 1000  # Las funciones de nutricion.utils tardan microsegundos: se mide por bloques
+
+
+def escenario(url, metodo='get', datos=None, estado=200, usuario='rotativo', repeticiones=None, variante=None):
+    """
+    Petición a medir para la URL con nombre url.
+    datos: dict o función (contexto, i) -> dict con la query string (GET) o el cuerpo JSON.
+    usuario: 'rotativo' (un usuario sembrado distinto en cada repetición), None (anónimo)
+    o el nombre de un usuario propio del benchmark.
+    """
+    return {
+        'nombre': f'{url}:{variante}' if variante else url, 'url': url, 'metodo': metodo, 'datos': datos,
+        'estado': estado, 'usuario': usuario, 'repeticiones': repeticiones,
+    }
+
+
+def _cambio_contrasena(contexto, i):
+    actual, nueva = (CONTRASENA, OTRA_CONTRASENA) if i % 2 == 0 else (OTRA_CONTRASENA, CONTRASENA)
+    return {'contrasena_actual': actual, 'nueva_contrasena': nueva, 'confirmar_contrasena': nueva}
+
+
+def _registro_dia(contexto, i):
+    return {
+        'fecha': str(contexto.hoy - timedelta(days=i % 30)),
+        'comidas': [
+            {'tipo_comida': 'snack', 'alimentos': [
+                {'id_alimento': contexto.ids_alimento[(i * 7 + j) % len(contexto.ids_alimento)], 'cantidad_gramos': 100}
+                for j in range(3)
+            ]},
+        ],
+    }
+
+
+ESCENARIOS = [
+    escenario('registro', 'post', lambda c, i: {
+        'nombre_usuario': f'nuevo{i}', 'email': f'nuevo{i}@benchmark.local',
+        'password': CONTRASENA, 'password_confirm': CONTRASENA,
+    }, estado=201, usuario=None, repeticiones=REPETICIONES_HASHING),
+    escenario('login', 'post', {'email': 'usuario0@benchmark.local', 'password': CONTRASENA},
+              usuario=None, repeticiones=REPETICIONES_HASHING),
+    escenario('perfil'),
+    escenario('perfil', 'put', lambda c, i: {'nombre': f'Nombre {i}'}, variante='edicion'),
+    escenario('perfil_async'),
+    # Las repeticiones alternan entre dos contraseñas: cada una deshace la anterior
+    escenario('cambiar_contrasena', 'post', _cambio_contrasena, usuario='contrasenas', repeticiones=REPETICIONES_HASHING),
+    escenario('logout', 'post', lambda c, i: {'refresh': c.refresco('sesiones')}, estado=205, usuario='sesiones'),
+    escenario('refrescar_token', 'post', lambda c, i: {'refresh': c.refresco('sesiones')}, usuario=None),
+    escenario('tendencia_peso', datos={'puntos': 100}),
+    escenario('calcular_macros', 'post'),
+    escenario('macros_actuales'),
+    escenario('macros_actuales_async'),
+    escenario('totales_hoy'),
+    escenario('panel'),
+    escenario('registrar_dia', 'post', _registro_dia, estado=201),
+    escenario('adherencia'),
+    escenario('adherencia', datos=lambda c, i: {
+        'desde': str(c.hoy - timedelta(days=364)), 'hasta': str(c.hoy), 'agrupar': 'mes',
+    }, variante='anio'),
+    escenario('balance', datos=lambda c, i: {'desde': str(c.hoy - timedelta(days=364)), 'hasta': str(c.hoy)}),
+    escenario('plan_comidas', 'post', lambda c, i: {'semilla': i}),
+    escenario('lista_alimentos', usuario=None),
+    escenario('lista_alimentos', datos={'search': 'pollo asado'}, usuario=None, variante='busqueda'),
+    escenario('lista_alimentos_async', usuario=None),
+    escenario('cambios_catalogo', datos=lambda c, i: {'desde': c.version_catalogo - 10}, usuario=None),
+    escenario('exportar_alimentos', usuario=None, repeticiones=20),  # Todo el catálogo en cada petición
+    escenario('lista_recetas'),
+    escenario('autocompletar_alimentos', datos={'q': 'pol'}, usuario=None),
+    escenario('metricas', usuario=None),  # Sin METRICAS_TOKEN solo responde con DEBUG
+]
+
+
+def urls_con_nombre(resolver=None):
+    """
+    Nombres de todas las URLs de macromate/urls.py salvo las del admin
+    """
+    resolver = resolver or get_resolver()
+    nombres = set()
+    for patron in resolver.url_patterns:
+        if isinstance(patron, URLResolver):
+            if patron.namespace != 'admin':
+                nombres |= urls_con_nombre(patron)
+        elif patron.name:
+            nombres.add(patron.name)
+    return nombres
+
+
+# Funciones de nutricion.utils y cómo obtener sus argumentos de un perfil
+FUNCIONES_UTILS = {
+    'calcular_edad': lambda p: (p,),
+    'calcular_bmr': lambda p: (p,),
+    'calcular_tdee': lambda p: (utils.calcular_bmr(p), p.nivel_actividad),
+    'ajustar_calorias_objetivo': lambda p: (utils.calcular_tdee(utils.calcular_bmr(p), p.nivel_actividad), p.objetivo),
+    'distribuir_macronutrientes': lambda p: (2000, p.objetivo),
+    'calcular_macros_para_perfil': lambda p: (p,),
+}
+
+
+class Contexto:
+    """
+    Datos sembrados que necesitan las peticiones: usuarios, sus tokens e ids de alimentos
+    """
+
+    def __init__(self, usuarios, hoy):
+        self.hoy = hoy
+        self.usuarios = usuarios
+        self.accesos = [str(RefreshTokenFiltrado.for_user(u).access_token) for u in usuarios]
+        self.propios = {}
+        for nombre in ('contrasenas', 'sesiones'):
+            usuario = Usuario.objects.create_user(f'{nombre}@benchmark.local', nombre, CONTRASENA)
+            Perfil.objects.create(id_usuario=usuario)
+            self.propios[nombre] = usuario
+        self.ids_alimento = list(Alimento.objects.order_by('pk').values_list('pk', flat=True)[:1000])
+        self.version_catalogo = ultima_version()
+
+    def refresco(self, nombre):
+        return str(RefreshTokenFiltrado.for_user(self.propios[nombre]))
+
+    def cabeceras(self, usuario, i):
+        if usuario is None:
+            return {}
+        if usuario == 'rotativo':
+            acceso = self.accesos[i % len(self.accesos)]
+        else:
+            # Token nuevo en cada repetición: cambiar la contraseña revoca los anteriores
+            self.propios[usuario].refresh_from_db()
+            acceso = str(RefreshTokenFiltrado.for_user(self.propios[usuario]).access_token)
+        return {'HTTP_AUTHORIZATION': f'Bearer {acceso}'}
+
+
+def preparar_peticion(contexto, escenario, i):
+    """
+    Argumentos para el método del cliente de pruebas de la repetición i de un escenario
+    """
+    datos = escenario['datos']
+    datos = datos(contexto, i) if callable(datos) else (datos or {})
+    extra = contexto.cabeceras(escenario['usuario'], i)
+    if escenario['metodo'] != 'get':
+        datos, extra = json.dumps(datos, default=str), {**extra, 'content_type': 'application/json'}
+    return reverse(escenario['url']), datos, {'secure': True, **extra}
+
+
+def medir_escenario(cliente, contexto, escenario, repeticiones, sin_cache=False):
+    metodo = getattr(cliente, escenario['metodo'])
+    tiempos, consultas, errores = np.empty(repeticiones), np.empty(repeticiones, dtype=np.int64), 0
+    # Calentamiento sin medir: una petición por usuario rotativo (cachés como en régimen normal)
+    calentamiento = min(len(contexto.usuarios), repeticiones)
+    for i in range(calentamiento + repeticiones):
+        ruta, datos, extra = preparar_peticion(contexto, escenario, i)
+        if sin_cache:
+            cache.clear()
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            respuesta = metodo(ruta, datos, **extra)
+            if respuesta.streaming:
+                b''.join(respuesta.streaming_content)
+            duracion = (time.perf_counter() - inicio) * 1000
+        if i < calentamiento:
+            continue
+        tiempos[i - calentamiento], consultas[i - calentamiento] = duracion, len(capturadas)
+        errores += respuesta.status_code != escenario['estado']
+    return {
+        **percentiles(tiempos), 'peticiones': repeticiones, 'errores': errores,
+        'consultas': int(np.median(consultas)), 'consultas_max': int(consultas.max()),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Siembra datos sintéticos realistas y mide latencia (p50/p95/p99) y consultas SQL de cada URL '
+            'de la API y de nutricion.utils; guarda el resultado en JSON y lo compara con una referencia')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=20)
+        parser.add_argument('--alimentos', type=int, default=5000)
+        parser.add_argument('--recetas', type=int, default=5, help='Recetas por usuario')
+        parser.add_argument('--anios', type=int, default=2, help='Años de historial por usuario')
+        parser.add_argument('--repeticiones', type=int, default=50)
+        parser.add_argument('--semilla', type=int, default=0)
+        parser.add_argument('--sin-cache', action='store_true',
+                            help='Vacía la caché antes de cada petición (mide los fallos de caché)')
+        parser.add_argument('--solo', nargs='+', help='Nombres de escenarios a medir')
+        parser.add_argument('--salida', default='benchmark_endpoints.json')
+        parser.add_argument('--referencia', help='JSON de una ejecución anterior con el que comparar')
+        parser.add_argument('--tolerancia', type=float, default=0.25,
+                            help='Aumento relativo del p50 a partir del cual hay regresión')
+        parser.add_argument('--margen-ms', type=float, default=0.5,
+                            help='Aumento absoluto mínimo del p50 para considerar regresión (ruido)')
+
+    def medir_utils(self, repeticiones):
+        perfiles = list(Perfil.objects.exclude(fecha_nacimiento=None))
+        resultados = {}
+        for nombre, argumentos in FUNCIONES_UTILS.items():
+            funcion = getattr(utils, nombre)
+            # Cada muestra son LLAMADAS_POR_MUESTRA llamadas repartidas entre los perfiles
+            llamadas = [argumentos(perfiles[i % len(perfiles)]) for i in range(LLAMADAS_POR_MUESTRA)]
+            tiempos = np.empty(repeticiones)
+            for r in range(repeticiones):
+                inicio = time.perf_counter()
+                for args in llamadas:
+                    funcion(*args)
+                tiempos[r] = (time.perf_counter() - inicio) * 1000
+            resultados[f'nutricion.utils.{nombre}'] = {
+                **percentiles(tiempos), 'peticiones': repeticiones * LLAMADAS_POR_MUESTRA, 'errores': 0,
+                'consultas': 0, 'consultas_max': 0,
+            }
+        return resultados
+
+    def handle(self, *args, **opciones):
+        escenarios = [e for e in ESCENARIOS if not opciones['solo'] or e['nombre'] in opciones['solo']]
+        sin_escenario = urls_con_nombre() - {e['url'] for e in ESCENARIOS}
+        if sin_escenario:
+            self.stderr.write(self.style.WARNING(f'URLs sin escenario: {", ".join(sorted(sin_escenario))}'))
+        referencia = None
+        if opciones['referencia']:
+            with open(opciones['referencia'], encoding='utf-8') as f:
+                referencia = json.load(f)
+
+        hoy = date.today()
+        resultados = {}
+        # Caché propia en un directorio temporal: ni se lee ni se ensucia la del proyecto
+        with tempfile.TemporaryDirectory() as directorio, override_settings(CACHES={'default': {
+            'BACKEND': 'macromate.cache.SQLiteCache', 'LOCATION': str(Path(directorio) / 'cache.sqlite3'),
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }}), base_datos_temporal():
+            registro_anterior = configurar_registro(str(Path(directorio) / 'metricas.sqlite3'))
+            try:
+                inicio = time.perf_counter()
+                usuarios = sembrar(
+                    opciones['usuarios'], opciones['alimentos'], opciones['recetas'], opciones['anios'],
+                    semilla=opciones['semilla'], hoy=hoy, salida=lambda mensaje: self.stdout.write(f'  {mensaje}'),
+                )
+                self.stdout.write(f'Datos sembrados en {time.perf_counter() - inicio:.1f} s')
+
+                contexto = Contexto(usuarios, hoy)
+                cliente = Client()
+                self.stdout.write(f'{"escenario":<36} {"p50 (ms)":>9} {"p95":>8} {"p99":>8} {"consultas":>9} {"errores":>7}')
+                for e in escenarios:
+                    repeticiones = min(opciones['repeticiones'], e['repeticiones'] or opciones['repeticiones'])
+                    resultado = medir_escenario(cliente, contexto, e, repeticiones, opciones['sin_cache'])
+                    resultados[e['nombre']] = resultado
+                    self.stdout.write(
+                        f"{e['nombre']:<36} {resultado['p50']:>9.2f} {resultado['p95']:>8.2f} {resultado['p99']:>8.2f} "
+                        f"{resultado['consultas']:>9} {resultado['errores']:>7}"
+                    )
+                if not opciones['solo']:
+                    resultados.update(self.medir_utils(opciones['repeticiones']))
+            finally:
+                configurar_registro(registro_anterior.ruta, registro_anterior.intervalo)
+
+        informe = {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'entorno': {
+                'python': platform.python_version(), 'django': django.get_version(),
+                'base_datos': connection.vendor, 'maquina': platform.machine(),
+            },
+            'parametros': {clave: opciones[clave] for clave in (
+                'usuarios', 'alimentos', 'recetas', 'anios', 'repeticiones', 'semilla', 'sin_cache',
+            )},
+            'resultados': resultados,
+        }
+        with open(opciones['salida'], 'w', encoding='utf-8') as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        self.stdout.write(f"Resultados en {opciones['salida']}")
+
+        if referencia is None:
+            return
+        regresiones = comparar(resultados, referencia['resultados'], opciones['tolerancia'], opciones['margen_ms'])
+        for nombre, motivo in regresiones:
+            self.stderr.write(self.style.ERROR(f'{nombre}: {motivo}'))
+        if regresiones:
+            raise CommandError(f"{len(regresiones)} regresiones respecto a {opciones['referencia']}")
+        self.stdout.write(self.style.SUCCESS(f"Sin regresiones respecto a {opciones['referencia']}"))
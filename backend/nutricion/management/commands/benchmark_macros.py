@@ -0,0 +1,73 @@
+import time
+from datetime import date
+from types import SimpleNamespace
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from nutricion.calculo_lote import calcular_macros_lote
+from nutricion.utils import (
+    calcular_macros_para_perfil, FACTORES_ACTIVIDAD, AJUSTES_OBJETIVO,
+)
+
+CLAVES = ('calorias_diarias', 'proteinas', 'carbohidratos', 'grasas', 'bmr', 'tdee')
+
+
+def generar_perfiles(n, semilla=0):
+    """
+    Columnas sintéticas de perfiles con la misma forma que los campos de Perfil
+    """
+    rng = np.random.default_rng(semilla)
+    inicio = np.datetime64('1950-01-01')
+    return {
+        'pesos': np.round(rng.uniform(40, 150, n), 2),
+        'alturas': np.round(rng.uniform(140, 210, n), 2),
+        'fechas_nacimiento': inicio + rng.integers(0, 365 * 55, n).astype('timedelta64[D]'),
+        'generos': rng.choice(['masculino', 'femenino', ''], n),
+        'niveles_actividad': rng.choice(list(FACTORES_ACTIVIDAD), n),
+        'objetivos': rng.choice(list(AJUSTES_OBJETIVO), n),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compara el cálculo de macros perfil a perfil con el cálculo vectorizado por lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', nargs='+', type=int, default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--semilla', type=int, default=0)
+
+    def handle(self, *args, **options):
+        hoy = date.today()
+        self.stdout.write(f"{'perfiles':>10} {'escalar (s)':>12} {'lote (s)':>10} {'aceleración':>12}")
+
+        for n in options['tamanos']:
+            columnas = generar_perfiles(n, options['semilla'])
+            perfiles = [
+                SimpleNamespace(
+                    peso_actual=float(columnas['pesos'][i]),
+                    altura=float(columnas['alturas'][i]),
+                    fecha_nacimiento=columnas['fechas_nacimiento'][i].item(),
+                    genero=str(columnas['generos'][i]),
+                    nivel_actividad=str(columnas['niveles_actividad'][i]),
+                    objetivo=str(columnas['objetivos'][i]),
+                )
+                for i in range(n)
+            ]
+
+            inicio = time.perf_counter()
+            escalar = [calcular_macros_para_perfil(p) for p in perfiles]
+            tiempo_escalar = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            lote = calcular_macros_lote(hoy=hoy, **columnas)
+            tiempo_lote = time.perf_counter() - inicio
+
+            for clave in CLAVES:
+                esperado = np.array([r[clave] for r in escalar], dtype=np.float64)
+                if not np.array_equal(esperado, lote[clave]):
+                    diferentes = int(np.sum(esperado != lote[clave]))
+                    self.stderr.write(self.style.ERROR(f'{clave}: {diferentes} perfiles no coinciden con el cálculo escalar'))
+
+            self.stdout.write(
+                f'{n:>10} {tiempo_escalar:>12.3f} {tiempo_lote:>10.3f} {tiempo_escalar / tiempo_lote:>11.1f}x'
+            )
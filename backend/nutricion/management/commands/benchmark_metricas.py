@@ -0,0 +1,103 @@
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+
+from macromate.benchmarks import base_datos_temporal
+from macromate.metricas import _medir_consulta, configurar_registro, obtener_registro
+from macromate.sembrado import sembrar
+from nutricion.management.commands.benchmark_endpoints import ESCENARIOS, Contexto, preparar_peticion
+
+MIDDLEWARE_METRICAS = 'macromate.metricas.MetricasMiddleware'
+
+
+@contextmanager
+def sin_medicion_sql():
+    # Sin el middleware el wrapper no mide nada, pero se quita para no contar ni su llamada
+    connection.execute_wrappers.remove(_medir_consulta)
+    try:
+        yield
+    finally:
+        connection.execute_wrappers.insert(0, _medir_consulta)
+
+
+class Command(BaseCommand):
+    help = ('Sobrecoste de MetricasMiddleware: misma carga de endpoints con y sin el middleware, '
+            'alternando las peticiones para que el ruido afecte igual a las dos')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=10)
+        parser.add_argument('--alimentos', type=int, default=2000)
+        parser.add_argument('--repeticiones', type=int, default=200, help='Peticiones por escenario y variante')
+        parser.add_argument('--limite', type=float, default=0.02, help='Sobrecoste máximo admitido (fracción)')
+
+    def handle(self, *args, **opciones):
+        # Los escenarios con hashing de contraseñas (cientos de ms de ruido) no aportan nada aquí
+        escenarios = [e for e in ESCENARIOS if e['repeticiones'] is None and e['url'] != 'metricas']
+        with tempfile.TemporaryDirectory() as directorio, override_settings(CACHES={'default': {
+            'BACKEND': 'macromate.cache.SQLiteCache', 'LOCATION': str(Path(directorio) / 'cache.sqlite3'),
+        }}), base_datos_temporal():
+            anterior = configurar_registro(str(Path(directorio) / 'metricas.sqlite3'))
+            try:
+                usuarios = sembrar(opciones['usuarios'], opciones['alimentos'], anios=1)
+                contexto = Contexto(usuarios, date.today())
+                self.comparar(contexto, escenarios, opciones)
+            finally:
+                configurar_registro(anterior.ruta, anterior.intervalo)
+
+    def comparar(self, contexto, escenarios, opciones):
+        con = Client()
+        sin = Client()
+        with override_settings(MIDDLEWARE=[m for m in settings.MIDDLEWARE if m != MIDDLEWARE_METRICAS]):
+            sin.handler.load_middleware()
+        con.handler.load_middleware()
+
+        def peticion(cliente, escenario, i):
+            ruta, datos, extra = preparar_peticion(contexto, escenario, i)
+            metodo = getattr(cliente, escenario['metodo'])
+            inicio = time.perf_counter()
+            if cliente is sin:
+                with sin_medicion_sql():
+                    metodo(ruta, datos, **extra)
+            else:
+                metodo(ruta, datos, **extra)
+            return (time.perf_counter() - inicio) * 1000
+
+        n = opciones['repeticiones']
+        total_diferencia = total_base = 0.0
+        self.stdout.write(f'{"escenario":<36} {"sin (ms)":>9} {"con (ms)":>9} {"sobrecoste":>10}')
+        for escenario in escenarios:
+            tiempos = {'con': np.empty(n), 'sin': np.empty(n)}
+            for i in range(len(contexto.usuarios)):  # Calentamiento
+                peticion(con, escenario, i)
+                peticion(sin, escenario, i)
+            for i in range(n):
+                # ABBA: el orden alterna para que ninguna variante vaya siempre detrás de la otra
+                orden = (('con', con), ('sin', sin)) if i % 2 == 0 else (('sin', sin), ('con', con))
+                for nombre, cliente in orden:
+                    tiempos[nombre][i] = peticion(cliente, escenario, i)
+            # Diferencia emparejada de cada par de peticiones consecutivas: robusta frente a picos y derivas
+            diferencia, base = np.median(tiempos['con'] - tiempos['sin']), np.median(tiempos['sin'])
+            total_diferencia += diferencia
+            total_base += base
+            self.stdout.write(f"{escenario['nombre']:<36} {base:>9.3f} {base + diferencia:>9.3f} {diferencia / base:>10.2%}")
+
+        # Coste aislado de anotar una petición en el registro (los volcados van en su propio hilo)
+        registro = obtener_registro()
+        inicio = time.perf_counter()
+        for i in range(100_000):
+            registro.registrar('/api/nutricion/macros-actuales/', 'GET', 200, 0.002, 3, 0.0004)
+        anotar_us = (time.perf_counter() - inicio) * 10
+
+        sobrecoste = total_diferencia / total_base
+        self.stdout.write(f'Anotar una petición: {anotar_us:.2f} µs')
+        self.stdout.write(f'Sobrecoste total: {sobrecoste:.2%} (límite {opciones["limite"]:.0%})')
+        if sobrecoste >= opciones['limite']:
+            raise CommandError(f'El middleware de métricas añade un {sobrecoste:.2%}')
@@ -0,0 +1,61 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from macromate.benchmarks import percentiles
+from nutricion.planificador import REPARTO_DEFECTO, MatrizCatalogo, generar_plan
+
+MACROS_DIA = {'calorias': 2200, 'proteinas': 140, 'carbohidratos': 250, 'grasas': 70}
+
+
+def matriz_sintetica(n, semilla=0):
+    """
+    Catálogo de n alimentos con macros por 100 g repartidos como en macromate/sembrado.py
+    """
+    rng = np.random.default_rng(semilla)
+    proteinas, carbohidratos, grasas = rng.uniform(0, 30, n), rng.uniform(0, 60, n), rng.uniform(0, 25, n)
+    calorias = 4 * proteinas + 4 * carbohidratos + 9 * grasas
+    return MatrizCatalogo(
+        np.arange(1, n + 1), [f'Alimento {i}' for i in range(n)],
+        np.column_stack([calorias, proteinas, carbohidratos, grasas]) / 100,
+    )
+
+
+class Command(BaseCommand):
+    help = ('Tiempo de generar un plan de comidas (p50/p95/p99) y su desviación de los macros '
+            'según el tamaño del catálogo, con el presupuesto de tiempo de la configuración')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', default='1000,10000,100000', help='Tamaños del catálogo separados por comas')
+        parser.add_argument('--repeticiones', type=int, default=50)
+        parser.add_argument('--limite', type=float, default=200, help='p99 máximo admitido (ms) en cualquier tamaño')
+
+    def handle(self, *args, **options):
+        comidas = list(REPARTO_DEFECTO.items())
+        self.stdout.write(
+            f"{'alimentos':>10} {'p50 (ms)':>9} {'p95':>7} {'p99':>7} "
+            f"{'desviación media':>17} {'peor':>7}"
+        )
+        peor_p99 = 0.0
+        for n in (int(t) for t in options['tamanos'].split(',')):
+            matriz = matriz_sintetica(n)
+            generar_plan(matriz, MACROS_DIA, comidas, 3, semilla=0)  # Calentamiento
+
+            tiempos, desviaciones = np.empty(options['repeticiones']), np.empty(options['repeticiones'])
+            for i in range(options['repeticiones']):
+                inicio = time.perf_counter()
+                plan = generar_plan(matriz, MACROS_DIA, comidas, 3, semilla=i)
+                tiempos[i] = (time.perf_counter() - inicio) * 1000
+                desviaciones[i] = max(abs(d) for d in plan['desviacion'].values())
+
+            p = percentiles(tiempos)
+            peor_p99 = max(peor_p99, p['p99'])
+            self.stdout.write(
+                f"{n:>10} {p['p50']:>9.1f} {p['p95']:>7.1f} {p['p99']:>7.1f} "
+                f"{desviaciones.mean():>17.2%} {desviaciones.max():>7.2%}"
+            )
+
+        self.stdout.write('Desviación: la mayor diferencia relativa entre los macros del plan y los objetivos del día')
+        if peor_p99 >= options['limite']:
+            raise CommandError(f"p99 de {peor_p99:.1f} ms, por encima del límite de {options['limite']:.0f} ms")
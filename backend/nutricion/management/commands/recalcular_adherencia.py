@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from nutricion.adherencia import TAMANO_LOTE, recalcular_resumenes
+from nutricion.models import RegistroDiario, ResumenAdherencia
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los resúmenes semanales y mensuales de adherencia desde los registros diarios'
+
+    def handle(self, *args, **options):
+        ids_perfil = list(RegistroDiario.objects.order_by('id_perfil').values_list('id_perfil', flat=True).distinct())
+        # Resúmenes de perfiles que ya no tienen registros
+        ResumenAdherencia.objects.exclude(id_perfil__in=RegistroDiario.objects.values('id_perfil')).delete()
+        for i in range(0, len(ids_perfil), TAMANO_LOTE):
+            lote = ids_perfil[i:i + TAMANO_LOTE]
+            with transaction.atomic():
+                # Desde cero: también desaparecen las cubetas que se quedaron sin registros
+                ResumenAdherencia.objects.filter(id_perfil__in=lote).delete()
+                recalcular_resumenes(RegistroDiario.objects.filter(id_perfil__in=lote).values_list('id_perfil', 'fecha'))
+        self.stdout.write(self.style.SUCCESS(f'Resúmenes de {len(ids_perfil)} perfiles recalculados'))
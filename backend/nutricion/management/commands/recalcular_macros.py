@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from nutricion.recalculo import (
+    TAMANO_LOTE_DEFECTO, drenar_perfiles_pendientes, marcar_todos_pendientes,
+)
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los macros activos de los perfiles con cambios pendientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE_DEFECTO,
+                            help='Perfiles por transacción')
+        parser.add_argument('--todos', action='store_true',
+                            help='Marca todos los perfiles antes de drenar (cambio de fórmulas)')
+
+    def handle(self, *args, **options):
+        if options['todos']:
+            marcados = marcar_todos_pendientes()
+            self.stdout.write(f'{marcados} perfiles marcados para recálculo')
+
+        inicio = time.perf_counter()
+        procesados = drenar_perfiles_pendientes(options['lote'])
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{procesados} perfiles recalculados en {duracion:.2f} s'
+        ))
@@ -0,0 +1,25 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from nutricion.models import RegistroDiario
+from nutricion.totales import reconciliar_registros
+
+TAMANO_LOTE = 500
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde cero los totales de los registros diarios recientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=7,
+                            help='Registros de los últimos N días (0 = todos)')
+
+    def handle(self, *args, **options):
+        registros = RegistroDiario.objects.order_by('pk')
+        if options['dias']:
+            registros = registros.filter(fecha__gte=date.today() - timedelta(days=options['dias']))
+        ids = list(registros.values_list('pk', flat=True))
+        for i in range(0, len(ids), TAMANO_LOTE):
+            reconciliar_registros(ids[i:i + TAMANO_LOTE])
+        self.stdout.write(self.style.SUCCESS(f'{len(ids)} registros reconciliados'))
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:17
+
+import datetime
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutricion', '0003_registrodiario_id_macro_objetivo_and_more'),
+        ('usuarios', '0003_perfil_macros_pendientes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='registrodiario',
+            name='fecha',
+            field=models.DateField(default=datetime.date.today),
+        ),
+        migrations.AlterField(
+            model_name='registrodiario',
+            name='id_macro_objetivo',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='nutricion.macronutrientes'),
+        ),
+        migrations.CreateModel(
+            name='ResumenAdherencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.CharField(choices=[('semana', 'Semana'), ('mes', 'Mes')], max_length=10)),
+                ('inicio', models.DateField()),
+                ('dias_registrados', models.IntegerField(default=0)),
+                ('dias_con_objetivo', models.IntegerField(default=0)),
+                ('calorias_consumidas', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('proteinas_consumidas', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('carbohidratos_consumidos', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('grasas_consumidas', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('calorias_consumidas_con_objetivo', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('proteinas_consumidas_con_objetivo', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('carbohidratos_consumidos_con_objetivo', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('grasas_consumidas_con_objetivo', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('calorias_objetivo', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('proteinas_objetivo', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('carbohidratos_objetivo', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('grasas_objetivo', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('dias_cumple_calorias', models.IntegerField(default=0)),
+                ('dias_cumple_proteinas', models.IntegerField(default=0)),
+                ('dias_cumple_carbohidratos', models.IntegerField(default=0)),
+                ('dias_cumple_grasas', models.IntegerField(default=0)),
+                ('id_perfil', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='usuarios.perfil')),
+            ],
+            options={
+                'db_table': 'resumenes_adherencia',
+                'unique_together': {('id_perfil', 'periodo', 'inicio')},
+            },
+        ),
+    ]
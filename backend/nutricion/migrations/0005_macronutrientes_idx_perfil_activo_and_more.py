@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:22
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def desactivar_duplicados(apps, schema_editor):
+    # Si un perfil tiene varios macros activos se conserva el más reciente
+    Macronutrientes = apps.get_model('nutricion', 'Macronutrientes')
+    ultimos = (
+        Macronutrientes.objects.filter(activo=True).values('id_perfil')
+        .annotate(ultimo=Max('id')).values_list('ultimo', flat=True)
+    )
+    Macronutrientes.objects.filter(activo=True).exclude(id__in=list(ultimos)).update(activo=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutricion', '0004_alter_registrodiario_fecha_and_more'),
+        ('usuarios', '0004_medidacorporal_idx_medida_perfil_fecha'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='macronutrientes',
+            index=models.Index(fields=['id_perfil', 'activo'], name='idx_perfil_activo'),
+        ),
+        migrations.RunPython(desactivar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='macronutrientes',
+            constraint=models.UniqueConstraint(condition=models.Q(('activo', True)), fields=('id_perfil',), name='unico_macro_activo_por_perfil'),
+        ),
+    ]
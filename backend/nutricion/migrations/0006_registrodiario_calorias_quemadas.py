@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:46
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+PESO_REFERENCIA_EJERCICIO = 70
+MAX_CALORIAS_EJERCICIO = Decimal('9999.99')
+
+
+def calcular_calorias_quemadas(calorias_por_hora, duracion_minutos, peso_kg=None):
+    # Copia de nutricion.utils.calcular_calorias_quemadas tal como era en esta migración: si cambia, esta no
+    calorias = Decimal(calorias_por_hora) * Decimal(duracion_minutos) / 60
+    if peso_kg:
+        calorias = calorias * Decimal(peso_kg) / PESO_REFERENCIA_EJERCICIO
+    return min(max(calorias, Decimal(0)), MAX_CALORIAS_EJERCICIO).quantize(Decimal('0.01'))
+
+
+def rellenar_calorias_quemadas(apps, schema_editor):
+    # Los ejercicios sin calorías las derivan como al registrarlos; después se suman por día
+    RegistroEjercicio = apps.get_model('nutricion', 'RegistroEjercicio')
+    RegistroDiario = apps.get_model('nutricion', 'RegistroDiario')
+    sin_calorias = list(RegistroEjercicio.objects.filter(calorias_quemadas__isnull=True).select_related(
+        'id_ejercicio', 'id_registro__id_perfil'
+    ))
+    for registro in sin_calorias:
+        registro.calorias_quemadas = calcular_calorias_quemadas(
+            registro.id_ejercicio.calorias_por_hora, registro.duracion_minutos, registro.id_registro.id_perfil.peso_actual
+        )
+    RegistroEjercicio.objects.bulk_update(sin_calorias, ['calorias_quemadas'], batch_size=1000)
+    suma = RegistroEjercicio.objects.filter(id_registro=OuterRef('pk')).values('id_registro').annotate(
+        total=Sum('calorias_quemadas')
+    ).values('total')
+    RegistroDiario.objects.filter(pk__in=RegistroEjercicio.objects.values('id_registro')).update(
+        calorias_quemadas=Coalesce(Subquery(suma), 0, output_field=models.DecimalField(max_digits=7, decimal_places=2))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutricion', '0005_macronutrientes_idx_perfil_activo_and_more'),
+        ('usuarios', '0004_medidacorporal_idx_medida_perfil_fecha'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='registrodiario',
+            name='calorias_quemadas',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=7),
+        ),
+        migrations.RunPython(rellenar_calorias_quemadas, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from usuarios.models import Perfil
 from datetime import date # Necesario para el default
 
@@ -18,6 +19,14 @@ class Macronutrientes(models.Model):
     
     class Meta:
         db_table = 'macronutrientes'
+        indexes = [
+            # Lectura de los macros actuales (activo llega como parámetro: el índice parcial no sirve)
+            models.Index(fields=['id_perfil', 'activo'], name='idx_perfil_activo'),
+        ]
+        constraints = [
+            # Como mucho un registro activo por perfil: obtener_macros_actuales lee ese único registro
+            models.UniqueConstraint(fields=['id_perfil'], condition=Q(activo=True), name='unico_macro_activo_por_perfil'),
+        ]
 
 class RegistroDiario(models.Model):
     id_perfil = models.ForeignKey(Perfil, on_delete=models.CASCADE)
@@ -28,6 +37,7 @@ class RegistroDiario(models.Model):
     carbohidratos_consumidos = models.DecimalField(max_digits=6, decimal_places=2, default=0)
     grasas_consumidas = models.DecimalField(max_digits=6, decimal_places=2, default=0)
     agua_litros = models.DecimalField(max_digits=4, decimal_places=2, default=0)
+    calorias_quemadas = models.DecimalField(max_digits=7, decimal_places=2, default=0)  # Suma de sus ejercicios (balance.py)
     id_macro_objetivo = models.ForeignKey('Macronutrientes', on_delete=models.SET_NULL, null=True, blank=True)
     
     class Meta:
@@ -87,4 +97,42 @@ class RegistroEjercicio(models.Model):
     calorias_quemadas = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
     
     class Meta:
-        db_table = 'registro_ejercicios'
\ No newline at end of file
+        db_table = 'registro_ejercicios'
+
+class ResumenAdherencia(models.Model):
+    """
+    Suma de los registros diarios de un perfil en una semana ISO o en un mes,
+    mantenida por nutricion/adherencia.py. Las medias y porcentajes se derivan
+    de las sumas, así que varias filas se combinan sumándolas.
+    """
+    PERIODO_CHOICES = [
+        ('semana', 'Semana'),
+        ('mes', 'Mes'),
+    ]
+
+    id_perfil = models.ForeignKey(Perfil, on_delete=models.CASCADE)
+    periodo = models.CharField(max_length=10, choices=PERIODO_CHOICES)
+    inicio = models.DateField()  # Lunes de la semana o día 1 del mes
+    dias_registrados = models.IntegerField(default=0)
+    dias_con_objetivo = models.IntegerField(default=0)
+    calorias_consumidas = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    proteinas_consumidas = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    carbohidratos_consumidos = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    grasas_consumidas = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    # Consumo y objetivo sumados solo en los días con objetivo, para el porcentaje de adherencia
+    calorias_consumidas_con_objetivo = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    proteinas_consumidas_con_objetivo = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    carbohidratos_consumidos_con_objetivo = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    grasas_consumidas_con_objetivo = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    calorias_objetivo = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    proteinas_objetivo = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    carbohidratos_objetivo = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    grasas_objetivo = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    dias_cumple_calorias = models.IntegerField(default=0)
+    dias_cumple_proteinas = models.IntegerField(default=0)
+    dias_cumple_carbohidratos = models.IntegerField(default=0)
+    dias_cumple_grasas = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'resumenes_adherencia'
+        unique_together = ['id_perfil', 'periodo', 'inicio']
@@ -0,0 +1,245 @@
+"""
+Generador de planes de comidas que se ajustan a los macros objetivo.
+
+El catálogo se guarda en memoria como una matriz densa (alimentos x 4) de
+calorías, proteínas, carbohidratos y grasas por gramo, que se reconstruye
+cuando cambia la versión del catálogo (como el índice de autocompletado).
+
+El objetivo de cada comida es su parte de los macros del día. Primero se
+preseleccionan CANDIDATOS alimentos puntuando todo el catálogo de una vez con
+numpy: los que más calorías sacan de cada macro y los de reparto más parecido
+al de la comida. Después se prueban por lotes combinaciones aleatorias de
+candidatos: para todas las del lote a la vez se resuelven los gramos por
+mínimos cuadrados (un sistema k x k por combinación con np.linalg.solve) y se
+puntúa el error relativo frente al objetivo. Se para al agotar la parte del
+presupuesto de tiempo de la comida o al bajar de ERROR_SUFICIENTE; la mejor
+combinación se afina con unos pasos de gradiente proyectado dentro de
+[GRAMOS_MIN, GRAMOS_MAX] y se redondea a 5 g.
+
+Las comidas del plan tienen el formato de registrar-dia (tipo_comida y
+alimentos con id_alimento y cantidad_gramos), así que un plan aceptado se
+registra tal cual.
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from alimentos.catalogo import version_catalogo
+from alimentos.models import Alimento
+
+MACROS = ('calorias', 'proteinas', 'carbohidratos', 'grasas')
+KCAL_POR_GRAMO = np.array([4.0, 4.0, 9.0])  # Proteínas, carbohidratos, grasas
+REPARTO_DEFECTO = {'desayuno': 0.25, 'almuerzo': 0.35, 'cena': 0.30, 'snack': 0.10}
+REDONDEO_GRAMOS = 5
+PASOS_AFINADO = 60
+
+_CONFIGURACION = settings.MACROMATE_SETTINGS['PLANIFICADOR']
+
+
+class MatrizCatalogo:
+    """
+    Catálogo en forma de matrices; inmutable, para reflejar cambios se construye otra
+    """
+
+    def __init__(self, ids, nombres, por_gramo):
+        """
+        ids: (n,) enteros; nombres: lista de n; por_gramo: (n, 4) con MACROS por gramo
+        """
+        validos = por_gramo[:, 0] > 0  # Sin calorías no aportan nada al plan
+        self.ids = np.asarray(ids, dtype=np.int64)[validos]
+        self.nombres = [nombre for nombre, valido in zip(nombres, validos) if valido]
+        self.por_gramo = np.ascontiguousarray(por_gramo[validos], dtype=np.float64)
+        # Parte de las calorías de los macros que viene de cada uno (filas que suman 1 o 0)
+        kcal = self.por_gramo[:, 1:] * KCAL_POR_GRAMO
+        total = kcal.sum(axis=1, keepdims=True)
+        self.reparto = np.divide(kcal, total, out=np.zeros_like(kcal), where=total > 0)
+        self.version = None
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def construir_matriz():
+    version = version_catalogo()
+    filas = Alimento.objects.values_list('pk', 'nombre', 'porcion_gramos', *MACROS).iterator(chunk_size=5000)
+    ids, nombres, valores = [], [], []
+    for pk, nombre, porcion, *macros in filas:
+        ids.append(pk)
+        nombres.append(nombre)
+        valores.append([float(v or 0) / float(porcion or 100) for v in macros])
+    matriz = MatrizCatalogo(ids, nombres, np.array(valores, dtype=np.float64).reshape(-1, len(MACROS)))
+    matriz.version = version
+    return matriz
+
+
+_matriz = None
+_bloqueo = threading.Lock()
+
+
+def obtener_matriz():
+    """
+    Matriz del proceso; se reconstruye si cambió la versión del catálogo.
+    Mientras un hilo reconstruye, el resto sigue usando la anterior.
+    """
+    global _matriz
+    actual = _matriz
+    if actual is not None and actual.version == version_catalogo():
+        return actual
+
+    # Solo espera al bloqueo quien todavía no tiene ninguna matriz que usar
+    if not _bloqueo.acquire(blocking=actual is None):
+        return actual
+    try:
+        if _matriz is actual:
+            _matriz = construir_matriz()
+        return _matriz
+    finally:
+        _bloqueo.release()
+
+
+def preseleccionar(matriz, objetivo, n, rng, excluidos=()):
+    """
+    Índices de hasta n candidatos para el objetivo (4,): una cuarta parte por
+    cercanía del reparto de macros y otra por cada macro más abundante. El
+    ruido aleatorio hace que planes pedidos con otra semilla cambien.
+    """
+    kcal = objetivo[1:] * KCAL_POR_GRAMO
+    reparto_objetivo = kcal / kcal.sum() if kcal.sum() > 0 else np.full(3, 1 / 3)
+    ruido = rng.gumbel(scale=_CONFIGURACION['RUIDO'], size=len(matriz))
+    puntuaciones = [-np.abs(matriz.reparto - reparto_objetivo).sum(axis=1)] + [
+        matriz.reparto[:, j] for j in range(3) if objetivo[j + 1] > 0
+    ]
+    por_criterio = max(1, n // len(puntuaciones))
+    excluidos = np.fromiter(excluidos, dtype=np.int64)
+    elegidos = []
+    for puntuacion in puntuaciones:
+        puntuacion = puntuacion + ruido
+        puntuacion[excluidos] = -np.inf
+        if por_criterio < len(matriz):
+            mejores = np.argpartition(-puntuacion, por_criterio)[:por_criterio]
+        else:
+            mejores = np.arange(len(matriz))
+        elegidos.append(mejores[np.isfinite(puntuacion[mejores])])
+    return np.unique(np.concatenate(elegidos))
+
+
+def _gramos(sistemas, limites):
+    """
+    Gramos de mínimos cuadrados de cada combinación: sistemas (B, k, 4) con los
+    aportes por gramo ya divididos por el objetivo (el objetivo es un vector de unos)
+    """
+    normal = sistemas @ sistemas.transpose(0, 2, 1)
+    # Un poco de regularización para combinaciones casi colineales
+    normal += np.eye(normal.shape[1]) * (1e-9 + 1e-6 * np.trace(normal, axis1=1, axis2=2))[:, None, None]
+    gramos = np.linalg.solve(normal, sistemas.sum(axis=2)[..., None])[..., 0]
+    return np.clip(gramos, *limites)
+
+
+def _error(sistemas, gramos):
+    # Raíz del error cuadrático medio relativo de los macros con objetivo
+    aportes = np.einsum('bk,bkj->bj', gramos, sistemas)
+    return np.sqrt(((aportes - 1) ** 2).mean(axis=1))
+
+
+def _afinar(sistema, gramos, limites):
+    # Gradiente proyectado sobre ||sistema.T g - 1||²: corrige el recorte de los gramos
+    normal = sistema @ sistema.T
+    paso = 1 / max(np.linalg.eigvalsh(normal)[-1], 1e-12)
+    b = sistema.sum(axis=1)
+    for _ in range(PASOS_AFINADO):
+        gramos = np.clip(gramos - paso * (normal @ gramos - b), *limites)
+    return gramos
+
+
+def buscar_comida(por_gramo, objetivo, k, limite_tiempo, rng):
+    """
+    Mejor combinación de k filas de por_gramo (m, 4) para el objetivo (4,)
+    antes de limite_tiempo (time.perf_counter()). Devuelve (índices, gramos, error).
+    """
+    pesos = np.divide(1, objetivo, out=np.zeros_like(objetivo), where=objetivo > 0)
+    usados = pesos > 0
+    relativo = (por_gramo * pesos)[:, usados]
+    m = len(relativo)
+    limites = (_CONFIGURACION['GRAMOS_MIN'], _CONFIGURACION['GRAMOS_MAX'])
+    if m == 0:
+        return np.array([], dtype=np.int64), np.array([]), 1.0
+
+    def probar(combinaciones):
+        sistemas = relativo[combinaciones]
+        gramos = _gramos(sistemas, limites)
+        errores = _error(sistemas, gramos)
+        i = int(errores.argmin())
+        return combinaciones[i], gramos[i], float(errores[i])
+
+    if m <= k:
+        mejor = probar(np.arange(m)[None])
+    else:
+        mejor = (None, None, np.inf)
+        # Siempre se prueba al menos un lote; los siguientes solo si queda tiempo
+        while mejor[2] >= _CONFIGURACION['ERROR_SUFICIENTE']:
+            combinaciones = np.sort(rng.integers(0, m, size=(_CONFIGURACION['COMBINACIONES_POR_LOTE'], k)), axis=1)
+            combinaciones = combinaciones[(np.diff(combinaciones, axis=1) > 0).all(axis=1)]  # Sin repetidos
+            if len(combinaciones):
+                mejor = min(mejor, probar(combinaciones), key=lambda resultado: resultado[2])
+            if time.perf_counter() >= limite_tiempo:
+                break
+
+    indices, gramos, _ = mejor
+    sistema = relativo[indices]
+    gramos = _afinar(sistema, gramos, limites)
+    gramos = np.clip(np.round(gramos / REDONDEO_GRAMOS) * REDONDEO_GRAMOS, *limites)
+    return indices, gramos, float(_error(sistema[None], gramos[None])[0])
+
+
+def generar_plan(matriz, macros, comidas, alimentos_por_comida, semilla=None, presupuesto_ms=None):
+    """
+    Plan para los macros del día (dict con MACROS; los que falten o sean None no
+    cuentan) repartidos entre comidas [(tipo_comida, proporción)]. El tiempo
+    que una comida no usa pasa a las siguientes.
+    """
+    inicio = time.perf_counter()
+    presupuesto = (presupuesto_ms or _CONFIGURACION['PRESUPUESTO_MS']) / 1000
+    rng = np.random.default_rng(semilla)
+    diario = np.array([float(macros.get(campo) or 0) for campo in MACROS])
+    total_proporciones = sum(proporcion for _, proporcion in comidas)
+
+    plan, usados, totales = [], set(), np.zeros(len(MACROS))
+    for i, (tipo, proporcion) in enumerate(comidas):
+        objetivo = diario * proporcion / total_proporciones
+        limite_tiempo = inicio + presupuesto * (i + 1) / len(comidas)
+        candidatos = preseleccionar(matriz, objetivo, _CONFIGURACION['CANDIDATOS'], rng, usados)
+        indices, gramos, error = buscar_comida(matriz.por_gramo[candidatos], objetivo, alimentos_por_comida, limite_tiempo, rng)
+        elegidos = candidatos[indices]
+        usados.update(int(j) for j in elegidos)
+        aportes = matriz.por_gramo[elegidos] * gramos[:, None]
+        totales += aportes.sum(axis=0)
+        plan.append({
+            'tipo_comida': tipo,
+            'objetivo': _redondear(objetivo),
+            'alimentos': [
+                {
+                    'id_alimento': int(matriz.ids[j]), 'nombre': matriz.nombres[j],
+                    'cantidad_gramos': int(g), **_redondear(aporte),
+                }
+                for j, g, aporte in zip(elegidos, gramos, aportes)
+            ],
+            'totales': _redondear(aportes.sum(axis=0)),
+            'error': round(error, 4),
+        })
+
+    return {
+        'objetivo': _redondear(diario),
+        'totales': _redondear(totales),
+        'desviacion': {
+            campo: round(float(total / meta - 1), 4) if meta > 0 else None
+            for campo, total, meta in zip(MACROS, totales, diario)
+        },
+        'comidas': plan,
+        'milisegundos': round((time.perf_counter() - inicio) * 1000, 1),
+    }
+
+
+def _redondear(valores):
+    return {campo: round(float(valor), 1) for campo, valor in zip(MACROS, valores)}
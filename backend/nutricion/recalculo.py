@@ -0,0 +1,89 @@
+"""
+Recalculo por lotes de los macros activos de los perfiles marcados como pendientes.
+
+Perfil.save() marca macros_pendientes cuando cambian peso, altura, fecha de
+nacimiento, género, actividad u objetivo. Este módulo drena esas marcas en
+transacciones por bloques usando el cálculo vectorizado de calculo_lote.py.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .adherencia import programar_resumenes
+from .calculo_lote import calcular_macros_queryset
+from usuarios.cache import invalidar_usuarios
+
+from .models import Macronutrientes, Perfil
+
+TAMANO_LOTE_DEFECTO = 500
+
+
+def _decimal(valor):
+    return Decimal(str(float(valor)))
+
+
+def recalcular_bloque(ids_perfil):
+    """
+    Recalcula y sustituye el registro activo de Macronutrientes de los perfiles dados.
+    Debe llamarse dentro de una transacción. Devuelve los ids con macros nuevos.
+    """
+    ids, resultado = calcular_macros_queryset(Perfil.objects.filter(pk__in=ids_perfil))
+    validos = resultado['valido']
+    ids_validos = [int(i) for i in ids[validos]]
+
+    # Desactivar macros anteriores y crear los nuevos (como en calcular_macros, pero en bloque)
+    Macronutrientes.objects.filter(id_perfil_id__in=ids_validos, activo=True).update(activo=False)
+    Macronutrientes.objects.bulk_create([
+        Macronutrientes(
+            id_perfil_id=id_perfil,
+            calorias_diarias=_decimal(calorias),
+            proteinas=_decimal(proteinas),
+            carbohidratos=_decimal(carbohidratos),
+            grasas=_decimal(grasas),
+            activo=True,
+        )
+        for id_perfil, calorias, proteinas, carbohidratos, grasas in zip(
+            ids_validos,
+            resultado['calorias_diarias'][validos],
+            resultado['proteinas'][validos],
+            resultado['carbohidratos'][validos],
+            resultado['grasas'][validos],
+        )
+    ])
+
+    # Los perfiles incompletos también se limpian: no hay macros que calcular hasta que cambien
+    Perfil.objects.filter(pk__in=ids_perfil).update(macros_pendientes=False, fecha_actualizacion=timezone.now())
+    invalidar_usuarios(Perfil.objects.filter(pk__in=ids_perfil).values_list('id_usuario', flat=True))
+    # bulk_create no emite señales: los objetivos nuevos rigen desde hoy
+    programar_resumenes((id_perfil, date.today()) for id_perfil in ids_validos)
+    return ids_validos
+
+
+def drenar_perfiles_pendientes(tamano_lote=TAMANO_LOTE_DEFECTO):
+    """
+    Procesa todos los perfiles con macros_pendientes en transacciones de tamano_lote perfiles.
+    Devuelve el número de perfiles procesados.
+    """
+    procesados = 0
+    while True:
+        with transaction.atomic():
+            # skip_locked permite varios drenadores en paralelo en bases de datos que lo soportan
+            ids = list(
+                Perfil.objects.select_for_update(skip_locked=True)
+                .filter(macros_pendientes=True)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:tamano_lote]
+            )
+            if not ids:
+                return procesados
+            recalcular_bloque(ids)
+        procesados += len(ids)
+
+
+def marcar_todos_pendientes():
+    """
+    Marca todos los perfiles para recálculo (p. ej. tras cambiar una fórmula u objetivo)
+    """
+    return Perfil.objects.filter(macros_pendientes=False).update(macros_pendientes=True, fecha_actualizacion=timezone.now())
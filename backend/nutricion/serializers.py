@@ -0,0 +1,65 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from django.conf import settings
+from rest_framework import serializers
+from .models import ComidaDiaria
+
+_CONFIGURACION = settings.MACROMATE_SETTINGS['REGISTRO_DIA']
+_MAX_DIAS_RANGO = settings.MACROMATE_SETTINGS['ADHERENCIA']['MAX_DIAS_RANGO']
+_PLANIFICADOR = settings.MACROMATE_SETTINGS['PLANIFICADOR']
+
+class AlimentoComidaSerializer(serializers.Serializer):
+    id_alimento = serializers.IntegerField(min_value=1)
+    cantidad_gramos = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=Decimal('0.01'))
+
+class ComidaRegistroSerializer(serializers.Serializer):
+    tipo_comida = serializers.ChoiceField(choices=ComidaDiaria.TIPO_COMIDA_CHOICES)
+    nombre = serializers.CharField(max_length=200, required=False, allow_blank=True, default='')
+    alimentos = AlimentoComidaSerializer(many=True, allow_empty=False)
+
+class RegistroDiaSerializer(serializers.Serializer):
+    """
+    Validación sin consultas; los ids de alimentos se comprueban después todos juntos
+    """
+    fecha = serializers.DateField(required=False)
+    comidas = ComidaRegistroSerializer(many=True, allow_empty=False, max_length=_CONFIGURACION['MAX_COMIDAS'])
+
+    def validate_comidas(self, comidas):
+        total = sum(len(comida['alimentos']) for comida in comidas)
+        if total > _CONFIGURACION['MAX_ALIMENTOS']:
+            raise serializers.ValidationError(
+                f"Como máximo {_CONFIGURACION['MAX_ALIMENTOS']} alimentos por petición"
+            )
+        return comidas
+
+class FechaSerializer(serializers.Serializer):
+    fecha = serializers.DateField(required=False)
+
+class RangoFechasSerializer(serializers.Serializer):
+    desde = serializers.DateField(required=False)
+    hasta = serializers.DateField(required=False)
+
+    def validate(self, data):
+        # Por defecto los últimos 30 días, como vista_adherencia_macros
+        data.setdefault('hasta', date.today())
+        data.setdefault('desde', data['hasta'] - timedelta(days=29))
+        if data['desde'] > data['hasta']:
+            raise serializers.ValidationError('desde no puede ser posterior a hasta')
+        if (data['hasta'] - data['desde']).days >= _MAX_DIAS_RANGO:
+            raise serializers.ValidationError(f'El rango no puede superar {_MAX_DIAS_RANGO} días')
+        return data
+
+class RangoAdherenciaSerializer(RangoFechasSerializer):
+    agrupar = serializers.ChoiceField(choices=['semana', 'mes'], required=False)
+
+class ComidaPlanSerializer(serializers.Serializer):
+    tipo_comida = serializers.ChoiceField(choices=ComidaDiaria.TIPO_COMIDA_CHOICES)
+    # Parte de los macros del día; por defecto la habitual de ese tipo de comida
+    proporcion = serializers.FloatField(min_value=0.01, max_value=1, required=False)
+
+class PlanComidasSerializer(serializers.Serializer):
+    comidas = ComidaPlanSerializer(many=True, required=False, allow_empty=False, max_length=_CONFIGURACION['MAX_COMIDAS'])
+    alimentos_por_comida = serializers.IntegerField(
+        min_value=1, max_value=_PLANIFICADOR['MAX_ALIMENTOS_POR_COMIDA'], default=_PLANIFICADOR['ALIMENTOS_POR_COMIDA']
+    )
+    semilla = serializers.IntegerField(min_value=0, required=False)  # La misma semilla repite el plan
@@ -0,0 +1,82 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .adherencia import programar_resumenes
+from .balance import aplicar_quemadas, derivar_calorias_quemadas
+from .models import AlimentoConsumido, Macronutrientes, RegistroDiario, RegistroEjercicio
+from .totales import aplicar_delta, aportes, restar
+
+
+@receiver(pre_save, sender=AlimentoConsumido)
+def guardar_aporte_previo(sender, instance, **kwargs):
+    instance._aporte_previo = None
+    if instance.pk is None:
+        return
+    previo = AlimentoConsumido.objects.select_related('id_alimento').filter(pk=instance.pk).first()
+    if previo is not None:
+        instance._aporte_previo = (previo.id_comida_id, aportes(previo.id_alimento, previo.cantidad_gramos))
+
+
+@receiver(post_save, sender=AlimentoConsumido)
+def sumar_alimento_consumido(sender, instance, **kwargs):
+    nuevo = aportes(instance.id_alimento, instance.cantidad_gramos)
+    previo = getattr(instance, '_aporte_previo', None)
+    instance._aporte_previo = None
+    if previo is None:
+        aplicar_delta(instance.id_comida_id, nuevo)
+        return
+    id_comida_previa, aporte_previo = previo
+    if id_comida_previa == instance.id_comida_id:
+        aplicar_delta(instance.id_comida_id, restar(nuevo, aporte_previo))
+    else:
+        aplicar_delta(id_comida_previa, aporte_previo, signo=-1)
+        aplicar_delta(instance.id_comida_id, nuevo)
+
+
+@receiver(post_delete, sender=AlimentoConsumido)
+def restar_alimento_consumido(sender, instance, **kwargs):
+    aplicar_delta(instance.id_comida_id, aportes(instance.id_alimento, instance.cantidad_gramos), signo=-1)
+
+
+@receiver(pre_save, sender=RegistroEjercicio)
+def preparar_registro_ejercicio(sender, instance, **kwargs):
+    if instance.calorias_quemadas is None:
+        instance.calorias_quemadas = derivar_calorias_quemadas(instance)
+    instance._quemadas_previas = None
+    if instance.pk is not None:
+        instance._quemadas_previas = RegistroEjercicio.objects.filter(pk=instance.pk).values_list(
+            'id_registro', 'calorias_quemadas'
+        ).first()
+
+
+@receiver(post_save, sender=RegistroEjercicio)
+def sumar_registro_ejercicio(sender, instance, **kwargs):
+    previo = getattr(instance, '_quemadas_previas', None)
+    instance._quemadas_previas = None
+    if previo is None:
+        aplicar_quemadas(instance.id_registro_id, instance.calorias_quemadas)
+        return
+    id_registro_previo, quemadas_previas = previo
+    if id_registro_previo == instance.id_registro_id:
+        aplicar_quemadas(instance.id_registro_id, instance.calorias_quemadas - (quemadas_previas or 0))
+    else:
+        aplicar_quemadas(id_registro_previo, -(quemadas_previas or 0))
+        aplicar_quemadas(instance.id_registro_id, instance.calorias_quemadas)
+
+
+@receiver(post_delete, sender=RegistroEjercicio)
+def restar_registro_ejercicio(sender, instance, **kwargs):
+    aplicar_quemadas(instance.id_registro_id, -(instance.calorias_quemadas or 0))
+
+
+@receiver(post_save, sender=RegistroDiario)
+@receiver(post_delete, sender=RegistroDiario)
+def actualizar_resumen_registro(sender, instance, **kwargs):
+    programar_resumenes([(instance.id_perfil_id, instance.fecha)])
+
+
+@receiver(post_save, sender=Macronutrientes)
+def actualizar_resumen_macros(sender, instance, created, **kwargs):
+    # Un objetivo nuevo rige desde su fecha de cálculo: afecta a la semana y el mes en curso
+    if created:
+        programar_resumenes([(instance.id_perfil_id, instance.fecha_calculo)])
@@ -1,7 +1,34 @@
+import os
+import tempfile
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
 from django.test import TestCase
-from datetime import date
+from unittest import skipUnless
+from django.test.utils import CaptureQueriesContext
+from datetime import date, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 from unittest.mock import MagicMock
-from .utils import calcular_bmr, calcular_tdee, distribuir_macronutrientes, calcular_edad, ajustar_calorias_objetivo
+from .utils import calcular_bmr, calcular_tdee, distribuir_macronutrientes, calcular_edad, ajustar_calorias_objetivo, calcular_macros_para_perfil, calcular_calorias_quemadas
+from .calculo_lote import calcular_macros_lote, calcular_edades
+from . import planificador
+from .adherencia import _acumulado_vacio, _dias, _formatear, _sumar_dia, resumen_rango
+from .models import AlimentoConsumido, ComidaDiaria, Ejercicio, Macronutrientes, RegistroDiario, RegistroEjercicio, ResumenAdherencia
+from .recalculo import drenar_perfiles_pendientes
+from .totales import obtener_registro_dia, reconciliar_registros
+from alimentos.models import Alimento
+from macromate import planes
+from macromate import metricas
+from macromate.benchmarks import comparar
+from macromate.sembrado import sembrar
+from nutricion.management.commands.benchmark_endpoints import ESCENARIOS, urls_con_nombre
+from nutricion.management.commands.benchmark_planificador import matriz_sintetica
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from usuarios.models import MedidaCorporal, Usuario, Perfil
 
 perfil_hombre = MagicMock(
     peso_actual=80.0,
@@ -53,4 +80,717 @@ class NutricionUtilsTestCase(TestCase):
         
         self.assertAlmostEqual(macros['proteinas'], 225.0, delta=1)
         self.assertAlmostEqual(macros['carbohidratos'], 337.5, delta=1)
-        self.assertAlmostEqual(macros['grasas'], 83.3, delta=1)
\ No newline at end of file
+        self.assertAlmostEqual(macros['grasas'], 83.3, delta=1)
+
+class CalculoLoteTestCase(TestCase):
+    def setUp(self):
+        self.perfiles = [
+            SimpleNamespace(peso_actual=80.0, altura=180.0, fecha_nacimiento=date(1995, 1, 1),
+                            genero='masculino', nivel_actividad='sedentario', objetivo='mantenimiento'),
+            SimpleNamespace(peso_actual=60.0, altura=165.0, fecha_nacimiento=date(2000, 12, 31),
+                            genero='femenino', nivel_actividad='muy_activo', objetivo='perdida_peso'),
+            SimpleNamespace(peso_actual=95.5, altura=190.0, fecha_nacimiento=date(1980, 6, 15),
+                            genero='', nivel_actividad='activo', objetivo='ganancia_muscular'),
+            SimpleNamespace(peso_actual=None, altura=170.0, fecha_nacimiento=date(1990, 1, 1),
+                            genero='masculino', nivel_actividad='ligero', objetivo='mantenimiento'),
+        ]
+
+    def calcular_lote(self):
+        return calcular_macros_lote(
+            [p.peso_actual if p.peso_actual is not None else float('nan') for p in self.perfiles],
+            [p.altura for p in self.perfiles],
+            [p.fecha_nacimiento for p in self.perfiles],
+            [p.genero for p in self.perfiles],
+            [p.nivel_actividad for p in self.perfiles],
+            [p.objetivo for p in self.perfiles],
+        )
+
+    def test_lote_coincide_con_calculo_individual(self):
+        lote = self.calcular_lote()
+        for i, perfil in enumerate(self.perfiles):
+            esperado = calcular_macros_para_perfil(perfil)
+            for clave in ('calorias_diarias', 'proteinas', 'carbohidratos', 'grasas', 'bmr', 'tdee'):
+                self.assertEqual(lote[clave][i], esperado[clave], clave)
+
+    def test_perfil_incompleto_no_es_valido(self):
+        lote = self.calcular_lote()
+        self.assertEqual(list(lote['valido']), [True, True, True, False])
+
+    def test_calcular_edades_respeta_cumpleanos(self):
+        edades = calcular_edades([date(2000, 5, 10), date(2000, 5, 11), None], hoy=date(2020, 5, 10))
+        self.assertEqual(list(edades), [20, 19, 0])
+
+
+class RecalculoPendientesTestCase(TestCase):
+    def setUp(self):
+        self.perfiles = []
+        for i in range(5):
+            usuario = Usuario.objects.create_user(f'u{i}@example.com', f'u{i}', 'clave-segura-123')
+            self.perfiles.append(Perfil.objects.create(
+                id_usuario=usuario, peso_actual=70 + i, altura=175,
+                fecha_nacimiento=date(1990, 1, 1), genero='masculino'
+            ))
+        # Perfil incompleto: se limpia sin crear macros
+        usuario = Usuario.objects.create_user('vacio@example.com', 'vacio', 'clave-segura-123')
+        Perfil.objects.create(id_usuario=usuario)
+
+    def test_drenar_crea_macros_activos_y_limpia_marcas(self):
+        Macronutrientes.objects.create(id_perfil=self.perfiles[0], calorias_diarias=1000, activo=True)
+
+        procesados = drenar_perfiles_pendientes(tamano_lote=2)
+
+        self.assertEqual(procesados, 6)
+        self.assertFalse(Perfil.objects.filter(macros_pendientes=True).exists())
+        self.assertEqual(Macronutrientes.objects.filter(activo=True).count(), 5)
+        for perfil in self.perfiles:
+            activo = Macronutrientes.objects.get(id_perfil=perfil, activo=True)
+            esperado = calcular_macros_para_perfil(perfil)
+            self.assertEqual(activo.calorias_diarias, esperado['calorias_diarias'])
+            self.assertEqual(float(activo.proteinas), esperado['proteinas'])
+
+    def test_drenar_sin_pendientes_no_hace_nada(self):
+        drenar_perfiles_pendientes()
+        with self.assertNumQueries(3):  # savepoint, selección vacía, liberación
+            self.assertEqual(drenar_perfiles_pendientes(), 0)
+
+
+class TotalesIncrementalesTestCase(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user('diario@example.com', 'diario', 'clave-segura-123')
+        self.perfil = Perfil.objects.create(id_usuario=self.usuario)
+        self.registro = obtener_registro_dia(self.perfil.pk, date.today())
+        self.desayuno = ComidaDiaria.objects.create(id_registro=self.registro, tipo_comida='desayuno')
+        self.cena = ComidaDiaria.objects.create(id_registro=self.registro, tipo_comida='cena')
+        self.avena = Alimento.objects.create(nombre='Avena', calorias=380, proteinas=13, carbohidratos=60, grasas=7)
+        self.huevo = Alimento.objects.create(nombre='Huevo', calorias=155, proteinas=13, carbohidratos=Decimal('1.1'), grasas=11, porcion_gramos=50)
+
+    def totales(self):
+        return RegistroDiario.objects.values_list('calorias_consumidas', 'proteinas_consumidas').get(pk=self.registro.pk)
+
+    def test_alta_cambio_y_baja_aplican_deltas(self):
+        avena = AlimentoConsumido.objects.create(id_comida=self.desayuno, id_alimento=self.avena, cantidad_gramos=50)
+        AlimentoConsumido.objects.create(id_comida=self.desayuno, id_alimento=self.huevo, cantidad_gramos=100)
+        self.assertEqual(self.totales(), (Decimal('500.00'), Decimal('32.50')))  # 190 + 310, 6.5 + 26
+
+        avena.cantidad_gramos = 100
+        avena.save()
+        self.assertEqual(self.totales(), (Decimal('690.00'), Decimal('39.00')))
+
+        # Cambiar de comida mueve el aporte sin alterar el total del día
+        avena.id_comida = self.cena
+        avena.save()
+        self.assertEqual(self.totales(), (Decimal('690.00'), Decimal('39.00')))
+        self.assertEqual(ComidaDiaria.objects.get(pk=self.cena.pk).calorias, Decimal('380.00'))
+        self.assertEqual(ComidaDiaria.objects.get(pk=self.desayuno.pk).calorias, Decimal('310.00'))
+
+        avena.delete()
+        self.assertEqual(self.totales(), (Decimal('310.00'), Decimal('26.00')))
+
+    def test_instancias_desactualizadas_no_pierden_sumas(self):
+        # Dos dispositivos con la misma fila del día en memoria
+        registro_a = RegistroDiario.objects.get(pk=self.registro.pk)
+        registro_b = RegistroDiario.objects.get(pk=self.registro.pk)
+        comida_a = ComidaDiaria.objects.create(id_registro=registro_a, tipo_comida='snack')
+        comida_b = ComidaDiaria.objects.create(id_registro=registro_b, tipo_comida='snack')
+        AlimentoConsumido.objects.create(id_comida=comida_a, id_alimento=self.avena, cantidad_gramos=100)
+        AlimentoConsumido.objects.create(id_comida=comida_b, id_alimento=self.avena, cantidad_gramos=100)
+        self.assertEqual(self.totales()[0], Decimal('760.00'))
+        self.assertEqual(obtener_registro_dia(self.perfil.pk, date.today()).pk, self.registro.pk)
+
+    def test_reconciliar_corrige_escrituras_sin_senales(self):
+        AlimentoConsumido.objects.create(id_comida=self.desayuno, id_alimento=self.avena, cantidad_gramos=100)
+        AlimentoConsumido.objects.bulk_create([
+            AlimentoConsumido(id_comida=self.cena, id_alimento=self.huevo, cantidad_gramos=50)
+        ])
+        self.assertEqual(self.totales()[0], Decimal('380.00'))
+
+        reconciliar_registros([self.registro.pk])
+        self.assertEqual(self.totales(), (Decimal('535.00'), Decimal('26.00')))
+        self.assertEqual(ComidaDiaria.objects.get(pk=self.cena.pk).calorias, Decimal('155.00'))
+
+    def test_totales_hoy_lee_una_fila(self):
+        AlimentoConsumido.objects.create(id_comida=self.desayuno, id_alimento=self.avena, cantidad_gramos=100)
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+        with self.assertNumQueries(1):
+            respuesta = cliente.get('/api/nutricion/totales-hoy/')
+        self.assertEqual(Decimal(respuesta.data['calorias_consumidas']), Decimal('380.00'))
+
+
+class RegistrarDiaTestCase(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user('lote@example.com', 'lote', 'clave-segura-123')
+        self.perfil = Perfil.objects.create(id_usuario=self.usuario)
+        self.alimentos = [
+            Alimento.objects.create(nombre=f'Alimento {i}', calorias=100 + i, proteinas=10, carbohidratos=20, grasas=5)
+            for i in range(10)
+        ]
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.usuario)
+
+    def dia(self, comidas, alimentos_por_comida):
+        return {
+            'fecha': '2025-03-01',
+            'comidas': [
+                {
+                    'tipo_comida': 'almuerzo',
+                    'alimentos': [
+                        {'id_alimento': self.alimentos[j % 10].pk, 'cantidad_gramos': '50'}
+                        for j in range(alimentos_por_comida)
+                    ],
+                }
+                for _ in range(comidas)
+            ],
+        }
+
+    def test_registra_comidas_y_totales(self):
+        respuesta = self.cliente.post('/api/nutricion/registrar-dia/', self.dia(2, 2), format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        # Cada comida: (100 + 101) / 2 kcal
+        self.assertEqual(respuesta.data['calorias_consumidas'], Decimal('201.00'))
+        self.assertEqual([c['calorias'] for c in respuesta.data['comidas']], [Decimal('100.50')] * 2)
+        self.assertEqual(AlimentoConsumido.objects.count(), 4)
+
+        # Un segundo envío del mismo día se suma al registro existente
+        self.cliente.post('/api/nutricion/registrar-dia/', self.dia(1, 1), format='json')
+        registro = RegistroDiario.objects.get(id_perfil=self.perfil, fecha=date(2025, 3, 1))
+        self.assertEqual(registro.calorias_consumidas, Decimal('251.00'))
+        reconciliar_registros([registro.pk])
+        registro.refresh_from_db()
+        self.assertEqual(registro.calorias_consumidas, Decimal('251.00'))
+
+    def test_consultas_constantes(self):
+        self.cliente.post('/api/nutricion/registrar-dia/', self.dia(1, 1), format='json')
+        with CaptureQueriesContext(connection) as pequeno:
+            self.cliente.post('/api/nutricion/registrar-dia/', self.dia(1, 1), format='json')
+        with CaptureQueriesContext(connection) as grande:
+            self.cliente.post('/api/nutricion/registrar-dia/', self.dia(10, 20), format='json')
+        self.assertEqual(len(grande), len(pequeno))
+        self.assertEqual(AlimentoConsumido.objects.count(), 202)
+
+    def test_alimento_inexistente_no_registra_nada(self):
+        datos = self.dia(1, 2)
+        datos['comidas'][0]['alimentos'].append({'id_alimento': 999999, 'cantidad_gramos': '10'})
+        respuesta = self.cliente.post('/api/nutricion/registrar-dia/', datos, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.data['ids'], [999999])
+        self.assertFalse(ComidaDiaria.objects.exists())
+
+    def test_limite_de_alimentos(self):
+        respuesta = self.cliente.post('/api/nutricion/registrar-dia/', self.dia(2, 101), format='json')
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class MacrosActualesCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create_user('cache@example.com', 'cache', 'clave-segura-123')
+        self.perfil = Perfil.objects.create(
+            id_usuario=self.usuario, peso_actual=80, altura=180,
+            fecha_nacimiento=date(1990, 1, 1), genero='masculino'
+        )
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.usuario)
+
+    def test_cacheado_e_invalidado_al_recalcular(self):
+        self.assertEqual(self.cliente.get('/api/nutricion/macros-actuales/').status_code, 404)
+        self.cliente.post('/api/nutricion/calcular-macros/')
+        primero = self.cliente.get('/api/nutricion/macros-actuales/').data
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cliente.get('/api/nutricion/macros-actuales/').data, primero)
+
+        self.perfil.peso_actual = 70
+        self.perfil.save()
+        drenar_perfiles_pendientes()
+        segundo = self.cliente.get('/api/nutricion/macros-actuales/').data
+        self.assertLess(segundo['calorias_diarias'], primero['calorias_diarias'])
+
+    def test_version_asincrona(self):
+        cabecera = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.usuario).access_token}'}
+        self.assertEqual(self.client.get('/api/nutricion/async/macros-actuales/', **cabecera).status_code, 404)
+        self.cliente.post('/api/nutricion/calcular-macros/')
+        asincrona = self.client.get('/api/nutricion/async/macros-actuales/', **cabecera).json()
+        cache.clear()
+        self.assertEqual(self.client.get('/api/nutricion/macros-actuales/', **cabecera).json(), asincrona)
+
+    def test_get_condicional_asincrono(self):
+        cabecera = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.usuario).access_token}'}
+        self.cliente.post('/api/nutricion/calcular-macros/')
+        cache.clear()
+        respuesta = self.client.get('/api/nutricion/async/macros-actuales/', **cabecera)
+        self.assertEqual(respuesta['ETag'], self.cliente.get('/api/nutricion/macros-actuales/')['ETag'])
+        no_modificada = self.client.get(
+            '/api/nutricion/async/macros-actuales/', HTTP_IF_NONE_MATCH=respuesta['ETag'], **cabecera)
+        self.assertEqual(no_modificada.status_code, 304)
+
+    def test_get_condicional(self):
+        self.assertNotIn('ETag', self.cliente.get('/api/nutricion/macros-actuales/'))
+        self.cliente.post('/api/nutricion/calcular-macros/')
+        cache.clear()
+        # La primera lectura llena la caché y ya sale con ETag
+        respuesta = self.cliente.get('/api/nutricion/macros-actuales/')
+        self.assertIn('ETag', respuesta)
+        with self.assertNumQueries(0):
+            no_modificada = self.cliente.get('/api/nutricion/macros-actuales/', HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(no_modificada.status_code, 304)
+
+        self.perfil.peso_actual = 70
+        self.perfil.save()
+        drenar_perfiles_pendientes()
+        cambiada = self.cliente.get('/api/nutricion/macros-actuales/', HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(cambiada.status_code, 200)
+        self.assertNotEqual(cambiada['ETag'], respuesta['ETag'])
+
+
+class AdherenciaTestCase(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user('adherencia@example.com', 'adherencia', 'clave-segura-123')
+        self.perfil = Perfil.objects.create(id_usuario=self.usuario)
+        # Objetivo de 2000 kcal desde 2024 y de 2500 desde marzo; los días de diciembre no tienen objetivo
+        for fecha, calorias in ((date(2024, 1, 1), 2000), (date(2024, 3, 1), 2500)):
+            macros = Macronutrientes.objects.create(
+                id_perfil=self.perfil, calorias_diarias=calorias, proteinas=150, carbohidratos=200, grasas=60,
+                activo=calorias == 2500,
+            )
+            Macronutrientes.objects.filter(pk=macros.pk).update(fecha_calculo=fecha)
+        with self.captureOnCommitCallbacks(execute=True):
+            RegistroDiario.objects.bulk_create([
+                RegistroDiario(
+                    id_perfil=self.perfil, fecha=date(2023, 12, 20) + timedelta(days=i),
+                    calorias_consumidas=1800 + (i * 37) % 500, proteinas_consumidas=140 + i % 20,
+                    carbohidratos_consumidos=200, grasas_consumidas=50 + i % 15,
+                )
+                for i in range(0, 140) if i % 9
+            ])
+            # bulk_create no emite señales: un día cualquiera arrastra sus semanas y meses
+            for registro in RegistroDiario.objects.all():
+                registro.save()
+
+    def calculado_desde_los_dias(self, desde, hasta):
+        acumulado = _acumulado_vacio()
+        for _, _, consumos, objetivo in _dias(
+            Q(id_perfil=self.perfil, fecha__range=(desde, hasta)), [self.perfil.pk]
+        ):
+            _sumar_dia(acumulado, consumos, objetivo)
+        return _formatear(acumulado)
+
+    def test_rango_igual_que_sumar_los_dias(self):
+        for desde, hasta in (
+            (date(2023, 12, 1), date(2024, 5, 31)),
+            (date(2024, 1, 3), date(2024, 3, 17)),
+            (date(2024, 2, 29), date(2024, 3, 1)),
+            (date(2024, 4, 10), date(2024, 4, 10)),
+        ):
+            with self.subTest(desde=desde, hasta=hasta):
+                self.assertEqual(resumen_rango(self.perfil.pk, desde, hasta)['total'], self.calculado_desde_los_dias(desde, hasta))
+
+    def test_serie_por_semanas(self):
+        resultado = resumen_rango(self.perfil.pk, date(2024, 1, 10), date(2024, 2, 20), agrupar='semana')
+        self.assertEqual(resultado['serie'][0]['desde'], date(2024, 1, 10))
+        self.assertEqual(resultado['serie'][1]['desde'], date(2024, 1, 15))
+        self.assertEqual(resultado['serie'][-1]['hasta'], date(2024, 2, 20))
+        for tramo in resultado['serie']:
+            esperado = self.calculado_desde_los_dias(tramo['desde'], tramo['hasta'])
+            self.assertEqual({k: v for k, v in tramo.items() if k not in ('desde', 'hasta')}, esperado)
+
+    def test_cambios_incrementales(self):
+        registro = RegistroDiario.objects.get(fecha=date(2024, 2, 6))
+        semana = ResumenAdherencia.objects.get(periodo='semana', inicio=date(2024, 2, 5))
+        with self.captureOnCommitCallbacks(execute=True):
+            registro.calorias_consumidas += 100
+            registro.save()
+        semana.refresh_from_db()
+        self.assertEqual(
+            semana.calorias_consumidas,
+            ResumenAdherencia.objects.get(periodo='mes', inicio=date(2024, 2, 1)).calorias_consumidas
+            - sum(r.calorias_consumidas for r in RegistroDiario.objects.filter(fecha__month=2).exclude(fecha__range=(date(2024, 2, 5), date(2024, 2, 11))))
+        )
+
+        # Un alimento consumido llega al resumen a través del total del día
+        alimento = Alimento.objects.create(nombre='Arroz', calorias=130, proteinas=3, carbohidratos=28, grasas=0)
+        antes = ResumenAdherencia.objects.get(periodo='mes', inicio=date(2024, 2, 1)).calorias_consumidas
+        with self.captureOnCommitCallbacks(execute=True):
+            comida = ComidaDiaria.objects.create(id_registro=registro, tipo_comida='cena')
+            AlimentoConsumido.objects.create(id_comida=comida, id_alimento=alimento, cantidad_gramos=200)
+        self.assertEqual(
+            ResumenAdherencia.objects.get(periodo='mes', inicio=date(2024, 2, 1)).calorias_consumidas, antes + 260
+        )
+
+        # Sin registros la cubeta desaparece
+        with self.captureOnCommitCallbacks(execute=True):
+            RegistroDiario.objects.filter(fecha__range=(date(2024, 2, 5), date(2024, 2, 11))).delete()
+        self.assertFalse(ResumenAdherencia.objects.filter(periodo='semana', inicio=date(2024, 2, 5)).exists())
+
+    def test_endpoint_un_anio_con_consultas_constantes(self):
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+        # Perfil, resúmenes, registros de los extremos y objetivos
+        with self.assertNumQueries(4):
+            respuesta = cliente.get('/api/nutricion/adherencia/', {'desde': '2023-12-22', 'hasta': '2024-12-21'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['total'], self.calculado_desde_los_dias(date(2023, 12, 22), date(2024, 12, 21)))
+        self.assertEqual(respuesta.data['total']['dias_registrados'], RegistroDiario.objects.filter(fecha__gte=date(2023, 12, 22)).count())
+
+        self.assertEqual(cliente.get('/api/nutricion/adherencia/', {'desde': '2024-02-01', 'hasta': '2024-01-01'}).status_code, 400)
+        self.assertEqual(cliente.get('/api/nutricion/adherencia/', {'agrupar': 'anio'}).status_code, 400)
+
+
+class BalanceEnergeticoTestCase(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user('balance@example.com', 'balance', 'clave-segura-123')
+        self.perfil = Perfil.objects.create(id_usuario=self.usuario, peso_actual=Decimal('84.00'))
+        self.correr = Ejercicio.objects.create(nombre='Correr', categoria='cardio', calorias_por_hora=600)
+        self.lunes = RegistroDiario.objects.create(id_perfil=self.perfil, fecha=date(2024, 5, 6), calorias_consumidas=2200)
+        self.martes = RegistroDiario.objects.create(id_perfil=self.perfil, fecha=date(2024, 5, 7), calorias_consumidas=1900)
+
+    def test_calorias_derivadas_de_duracion_ritmo_y_peso(self):
+        self.assertEqual(calcular_calorias_quemadas(600, 30), Decimal('300.00'))
+        self.assertEqual(calcular_calorias_quemadas(600, 30, 84), Decimal('360.00'))  # 84 kg frente a 70 de referencia
+        sesion = RegistroEjercicio.objects.create(id_registro=self.lunes, id_ejercicio=self.correr, duracion_minutos=30)
+        self.assertEqual(sesion.calorias_quemadas, Decimal('360.00'))
+        # Si llegan calorías (p. ej. de un pulsómetro) se respetan
+        medida = RegistroEjercicio.objects.create(
+            id_registro=self.lunes, id_ejercicio=self.correr, duracion_minutos=30, calorias_quemadas=Decimal('280')
+        )
+        self.assertEqual(medida.calorias_quemadas, Decimal('280'))
+
+    def test_total_del_dia_se_mantiene_con_cada_cambio(self):
+        sesion = RegistroEjercicio.objects.create(id_registro=self.lunes, id_ejercicio=self.correr, duracion_minutos=30)
+        RegistroEjercicio.objects.create(id_registro=self.lunes, id_ejercicio=self.correr, duracion_minutos=10, calorias_quemadas=100)
+        self.lunes.refresh_from_db()
+        self.assertEqual(self.lunes.calorias_quemadas, Decimal('460.00'))
+
+        sesion.calorias_quemadas = Decimal('400.00')
+        sesion.save()
+        self.lunes.refresh_from_db()
+        self.assertEqual(self.lunes.calorias_quemadas, Decimal('500.00'))
+
+        sesion.id_registro = self.martes
+        sesion.save()
+        self.lunes.refresh_from_db()
+        self.martes.refresh_from_db()
+        self.assertEqual((self.lunes.calorias_quemadas, self.martes.calorias_quemadas), (Decimal('100.00'), Decimal('400.00')))
+
+        sesion.delete()
+        self.martes.refresh_from_db()
+        self.assertEqual(self.martes.calorias_quemadas, Decimal('0.00'))
+
+        # Lo que no pasa por señales lo corrige la reconciliación
+        RegistroDiario.objects.filter(pk=self.lunes.pk).update(calorias_quemadas=0)
+        reconciliar_registros([self.lunes.pk, self.martes.pk])
+        self.lunes.refresh_from_db()
+        self.assertEqual(self.lunes.calorias_quemadas, Decimal('100.00'))
+
+    def test_endpoint_lee_los_totales_guardados(self):
+        RegistroEjercicio.objects.create(id_registro=self.lunes, id_ejercicio=self.correr, duracion_minutos=30)
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+        # Perfil y registros del rango: ni ejercicios ni comidas
+        with self.assertNumQueries(2):
+            respuesta = cliente.get('/api/nutricion/balance/', {'desde': '2024-05-01', 'hasta': '2024-05-31'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(
+            [(d['fecha'], d['balance_neto']) for d in respuesta.data['dias']],
+            [(date(2024, 5, 6), Decimal('1840.00')), (date(2024, 5, 7), Decimal('1900.00'))],
+        )
+        self.assertEqual(respuesta.data['total']['balance_neto'], Decimal('3740.00'))
+        self.assertEqual(respuesta.data['total']['balance_medio'], Decimal('1870.00'))
+        self.assertEqual(cliente.get('/api/nutricion/balance/', {'desde': '2024-06-01', 'hasta': '2024-05-01'}).status_code, 400)
+
+
+class PanelTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create_user('panel@example.com', 'panel', 'clave-segura-123')
+        self.perfil = Perfil.objects.create(id_usuario=self.usuario, peso_actual=70)
+        Macronutrientes.objects.create(id_perfil=self.perfil, calorias_diarias=2200, proteinas=150, carbohidratos=220, grasas=70)
+        self.arroz = Alimento.objects.create(nombre='Arroz', calorias=130, proteinas=Decimal('2.7'), carbohidratos=28, grasas=Decimal('0.3'))
+        self.correr = Ejercicio.objects.create(nombre='Correr', categoria='cardio', calorias_por_hora=600)
+        self.registro = RegistroDiario.objects.create(id_perfil=self.perfil, fecha=date.today())
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.usuario)
+
+    def registrar(self, comidas, alimentos_por_comida, ejercicios):
+        for i in range(comidas):
+            comida = ComidaDiaria.objects.create(id_registro=self.registro, tipo_comida='comida')
+            for _ in range(alimentos_por_comida):
+                AlimentoConsumido.objects.create(id_comida=comida, id_alimento=self.arroz, cantidad_gramos=200)
+        for _ in range(ejercicios):
+            RegistroEjercicio.objects.create(id_registro=self.registro, id_ejercicio=self.correr, duracion_minutos=30)
+
+    def consultas_sin_cache(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.cliente.get('/api/nutricion/panel/')
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas), respuesta.data
+
+    def test_consultas_constantes(self):
+        self.registrar(1, 1, 1)
+        pocas, _ = self.consultas_sin_cache()
+        self.registrar(4, 5, 2)
+        muchas, datos = self.consultas_sin_cache()
+        self.assertEqual(muchas, pocas)
+        # Perfil con su usuario, macros, registro, comidas, alimentos consumidos y ejercicios
+        self.assertEqual(muchas, 6)
+        with self.assertNumQueries(4):  # Perfil y macros desde la caché
+            self.cliente.get('/api/nutricion/panel/')
+
+        self.assertEqual(len(datos['comidas']), 5)
+        self.assertEqual(sum(len(c['alimentos']) for c in datos['comidas']), 21)
+        self.assertEqual(len(datos['ejercicios']), 3)
+        self.assertEqual(datos['totales']['calorias_consumidas'], Decimal('5460.00'))  # 21 × 260
+        self.assertEqual(datos['totales']['balance_neto'], Decimal('4560.00'))  # - 3 × 300
+        self.assertEqual(datos['macros']['calorias_diarias'], Decimal('2200.00'))
+        self.assertEqual(datos['perfil']['email'], 'panel@example.com')
+        self.assertEqual(datos['comidas'][0]['alimentos'][0]['calorias'], Decimal('260.00'))
+
+    def test_dia_sin_registro(self):
+        with self.assertNumQueries(3):  # Perfil con su usuario, macros y registro
+            respuesta = self.cliente.get('/api/nutricion/panel/', {'fecha': '2020-01-01'})
+        self.assertEqual((respuesta.data['comidas'], respuesta.data['ejercicios']), ([], []))
+        self.assertEqual(respuesta.data['totales']['balance_neto'], 0)
+        self.assertEqual(self.cliente.get('/api/nutricion/panel/', {'fecha': 'ayer'}).status_code, 400)
+
+
+@skipUnless(planes.soportado(), 'Los planes se leen con EXPLAIN QUERY PLAN de SQLite')
+class PlanesConsultaTestCase(TestCase):
+    def setUp(self):
+        self.perfil = Perfil.objects.create(
+            id_usuario=Usuario.objects.create_user('planes@example.com', 'planes', 'clave-segura-123')
+        )
+
+    def assertBuscaPorIndice(self, queryset, indices):
+        self.assertEqual(planes.tablas_recorridas(queryset), [])
+        self.assertTrue(set(planes.indices_usados(queryset)) & set(indices), queryset.explain())
+
+    def test_macros_actuales(self):
+        self.assertBuscaPorIndice(
+            Macronutrientes.objects.filter(id_perfil_id=self.perfil.pk, activo=True).order_by('pk')[:1],  # .first()
+            ['idx_perfil_activo', 'unico_macro_activo_por_perfil'],
+        )
+
+    def test_registro_de_un_dia_y_rango(self):
+        for queryset in (
+            RegistroDiario.objects.filter(id_perfil_id=self.perfil.pk, fecha=date(2024, 1, 1)),
+            RegistroDiario.objects.filter(id_perfil_id=self.perfil.pk, fecha__range=(date(2024, 1, 1), date(2024, 1, 31))),
+        ):
+            with self.subTest(consulta=str(queryset.query)):
+                self.assertEqual(planes.tablas_recorridas(queryset), [])
+                self.assertEqual(len(planes.indices_usados(queryset)), 1)
+
+    def test_resumenes_de_adherencia(self):
+        queryset = ResumenAdherencia.objects.filter(
+            Q(periodo='mes', inicio=date(2024, 1, 1)) | Q(periodo='semana', inicio=date(2024, 2, 5)),
+            id_perfil_id=self.perfil.pk,
+        )
+        self.assertEqual(planes.tablas_recorridas(queryset), [])
+
+    def test_como_mucho_un_macro_activo_por_perfil(self):
+        Macronutrientes.objects.create(id_perfil=self.perfil, calorias_diarias=2000, activo=True)
+        Macronutrientes.objects.create(id_perfil=self.perfil, calorias_diarias=1800, activo=False)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Macronutrientes.objects.create(id_perfil=self.perfil, calorias_diarias=2200, activo=True)
+
+
+class PlanComidasTestCase(TestCase):
+    # Nombre, calorías, proteínas, carbohidratos y grasas por 100 g
+    CATALOGO = [
+        ('Pechuga de pollo', 165, 31, 0, 3.6), ('Arroz', 130, 2.7, 28, 0.3), ('Aceite de oliva', 884, 0, 0, 100),
+        ('Avena', 389, 17, 66, 7), ('Huevo', 155, 13, 1.1, 11), ('Plátano', 89, 1.1, 23, 0.3),
+        ('Yogur griego', 97, 9, 3.6, 5), ('Salmón', 208, 20, 0, 13), ('Lentejas', 116, 9, 20, 0.4),
+        ('Pan integral', 247, 13, 41, 3.4), ('Almendras', 579, 21, 22, 50), ('Atún', 132, 28, 0, 1.3),
+        ('Patata', 77, 2, 17, 0.1), ('Queso fresco', 98, 11, 3.4, 4.3), ('Pasta', 131, 5, 25, 1.1),
+    ]
+
+    def setUp(self):
+        cache.clear()
+        # La matriz es del proceso: que no pase de un test a otro con la misma versión del catálogo
+        parche = mock.patch.object(planificador, '_matriz', None)
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.usuario = Usuario.objects.create_user('plan@example.com', 'plan', 'clave-segura-123')
+        self.perfil = Perfil.objects.create(id_usuario=self.usuario, peso_actual=70)
+        Macronutrientes.objects.create(id_perfil=self.perfil, calorias_diarias=2000, proteinas=150, carbohidratos=200, grasas=67)
+        with self.captureOnCommitCallbacks(execute=True):
+            for nombre, calorias, proteinas, carbohidratos, grasas in self.CATALOGO:
+                Alimento.objects.create(nombre=nombre, calorias=calorias, proteinas=proteinas, carbohidratos=carbohidratos, grasas=grasas)
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.usuario)
+
+    def test_plan_ajustado_a_los_macros_y_registrable(self):
+        respuesta = self.cliente.post('/api/nutricion/plan-comidas/', {'semilla': 7}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        plan = respuesta.data
+        self.assertEqual([c['tipo_comida'] for c in plan['comidas']], list(planificador.REPARTO_DEFECTO))
+        for desviacion in plan['desviacion'].values():
+            self.assertLess(abs(desviacion), 0.1)
+        ids = set(Alimento.objects.values_list('pk', flat=True))
+        elegidos = [a for comida in plan['comidas'] for a in comida['alimentos']]
+        self.assertEqual(len(elegidos), 12)
+        self.assertEqual(len({a['id_alimento'] for a in elegidos}), 12)  # Sin repetir entre comidas
+        for alimento in elegidos:
+            self.assertIn(alimento['id_alimento'], ids)
+            self.assertEqual(alimento['cantidad_gramos'] % 5, 0)
+            self.assertTrue(10 <= alimento['cantidad_gramos'] <= 400)
+
+        # Misma semilla, mismo plan
+        otra = self.cliente.post('/api/nutricion/plan-comidas/', {'semilla': 7}, format='json').data
+        self.assertEqual(otra['comidas'], plan['comidas'])
+
+        # Las comidas del plan se registran tal cual
+        registro = self.cliente.post('/api/nutricion/registrar-dia/', {'comidas': plan['comidas']}, format='json')
+        self.assertEqual(registro.status_code, 201)
+        self.assertAlmostEqual(float(registro.data['calorias_consumidas']), plan['totales']['calorias'], delta=1)
+
+    def test_reparto_de_comidas_y_validacion(self):
+        plan = self.cliente.post('/api/nutricion/plan-comidas/', {
+            'comidas': [{'tipo_comida': 'desayuno', 'proporcion': 0.3}, {'tipo_comida': 'cena', 'proporcion': 0.3}],
+            'alimentos_por_comida': 2,
+        }, format='json').data
+        self.assertEqual([c['objetivo']['calorias'] for c in plan['comidas']], [1000.0, 1000.0])
+        self.assertEqual([len(c['alimentos']) for c in plan['comidas']], [2, 2])
+
+        for datos in ({'comidas': [{'tipo_comida': 'merienda'}]}, {'alimentos_por_comida': 0}, {'comidas': []}):
+            self.assertEqual(self.cliente.post('/api/nutricion/plan-comidas/', datos, format='json').status_code, 400)
+
+        Macronutrientes.objects.update(activo=False)
+        cache.clear()
+        self.assertEqual(self.cliente.post('/api/nutricion/plan-comidas/', {}, format='json').status_code, 404)
+
+    def test_la_matriz_sigue_al_catalogo(self):
+        self.assertEqual(len(planificador.obtener_matriz()), len(self.CATALOGO))
+        with self.captureOnCommitCallbacks(execute=True):
+            Alimento.objects.create(nombre='Agua', calorias=0)  # Sin calorías no entra
+            Alimento.objects.create(nombre='Nueces', calorias=654, proteinas=15, carbohidratos=14, grasas=65, porcion_gramos=30)
+        matriz = planificador.obtener_matriz()
+        self.assertEqual(len(matriz), len(self.CATALOGO) + 1)
+        self.assertAlmostEqual(matriz.por_gramo[matriz.nombres.index('Nueces'), 0], 654 / 30)
+
+    def test_presupuesto_de_tiempo(self):
+        matriz = matriz_sintetica(20_000)
+        macros = {'calorias': 2200, 'proteinas': 140, 'carbohidratos': 250, 'grasas': 70}
+        comidas = list(planificador.REPARTO_DEFECTO.items())
+        # Con un presupuesto mínimo se prueba un solo lote por comida y aun así hay plan
+        plan = planificador.generar_plan(matriz, macros, comidas, 3, semilla=1, presupuesto_ms=1)
+        self.assertLess(plan['milisegundos'], 200)
+        self.assertEqual([len(c['alimentos']) for c in plan['comidas']], [3, 3, 3, 3])
+        self.assertLess(max(abs(d) for d in plan['desviacion'].values()), 0.1)
+
+
+class BenchmarkEndpointsTestCase(TestCase):
+    def test_todas_las_urls_tienen_escenario(self):
+        self.assertEqual(urls_con_nombre() - {e['url'] for e in ESCENARIOS}, set())
+
+    def test_sembrado_coherente(self):
+        sembrar(usuarios=2, alimentos=200, recetas_por_usuario=2, anios=1, hoy=date(2024, 6, 30))
+        self.assertEqual(Perfil.objects.count(), 2)
+        self.assertEqual(Macronutrientes.objects.filter(activo=True).count(), 2)
+        self.assertEqual(MedidaCorporal.objects.filter(fecha_registro__lt=date(2023, 7, 1)).count(), 0)
+        self.assertTrue(ResumenAdherencia.objects.exists())
+        # Los totales sembrados son los mismos que se obtienen reconciliando desde los alimentos
+        campos = ('calorias_consumidas', 'grasas_consumidas', 'calorias_quemadas')
+        sembrados = list(RegistroDiario.objects.order_by('pk').values_list(*campos))
+        self.assertTrue(RegistroEjercicio.objects.exists())
+        reconciliar_registros(RegistroDiario.objects.values_list('pk', flat=True))
+        self.assertEqual(list(RegistroDiario.objects.order_by('pk').values_list(*campos)), sembrados)
+
+    def test_comparar_con_referencia(self):
+        referencia = {
+            'lenta': {'p50': 10.0, 'consultas': 2, 'errores': 0},
+            'rapida': {'p50': 0.2, 'consultas': 1, 'errores': 0},
+        }
+        resultados = {
+            'lenta': {'p50': 13.0, 'consultas': 3, 'errores': 0},
+            'rapida': {'p50': 0.4, 'consultas': 1, 'errores': 0},  # El doble, pero por debajo del margen
+            'nueva': {'p50': 50.0, 'consultas': 9, 'errores': 0},
+        }
+        self.assertEqual(
+            [nombre for nombre, _ in comparar(resultados, referencia, tolerancia=0.25, margen_ms=0.5)],
+            ['lenta', 'lenta'],
+        )
+
+
+class MetricasTestCase(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.ruta = os.path.join(directorio.name, 'metricas.sqlite3')
+        self.registro_suite = anterior = metricas.configurar_registro(self.ruta)
+        self.addCleanup(lambda: metricas.configurar_registro(anterior.ruta, anterior.intervalo))
+
+        self.usuario = Usuario.objects.create_user('metricas@example.com', 'metricas', 'clave-segura-123')
+        perfil = Perfil.objects.create(id_usuario=self.usuario)
+        Macronutrientes.objects.create(id_perfil=perfil, calorias_diarias=2000, proteinas=150, carbohidratos=200, grasas=60)
+        self.cabecera = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.usuario).access_token}'}
+        cache.clear()
+
+    def test_la_suite_no_escribe_en_las_metricas_del_nodo(self):
+        # macromate.pruebas.EjecutorPruebas: las peticiones de todos los tests van a un fichero temporal
+        self.assertNotEqual(os.path.dirname(self.registro_suite.ruta), str(settings.BASE_DIR))
+
+    def series(self):
+        return {
+            linea.rsplit(' ', 1)[0]: float(linea.rsplit(' ', 1)[1])
+            for linea in metricas.obtener_registro().exponer().splitlines() if not linea.startswith('#')
+        }
+
+    def test_peticiones_latencia_y_consultas_por_ruta(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get('/api/nutricion/macros-actuales/', **self.cabecera).status_code, 200)
+        numero_consultas = len(consultas)  # Cada petición vacía el registro de consultas de la conexión
+        cache.clear()
+        self.assertEqual(self.client.get('/api/nutricion/async/macros-actuales/', **self.cabecera).status_code, 200)
+        self.client.get('/api/nutricion/no-existe/')
+
+        series = self.series()
+        ruta = 'ruta="/api/nutricion/macros-actuales/"'
+        self.assertEqual(series[f'macromate_peticiones_total{{{ruta},metodo="GET",estado="200"}}'], 1)
+        self.assertEqual(series[f'macromate_duracion_peticion_segundos_count{{{ruta}}}'], 1)
+        self.assertEqual(series[f'macromate_duracion_peticion_segundos_bucket{{{ruta},le="+Inf"}}'], 1)
+        self.assertEqual(series[f'macromate_consultas_sql_por_peticion_sum{{{ruta}}}'], numero_consultas)
+        self.assertGreater(series[f'macromate_tiempo_sql_segundos_total{{{ruta}}}'], 0)
+        # Las consultas de las vistas asíncronas corren en otro hilo y también se cuentan
+        self.assertGreater(
+            series['macromate_consultas_sql_por_peticion_sum{ruta="/api/nutricion/async/macros-actuales/"}'], 0
+        )
+        self.assertEqual(series['macromate_peticiones_total{ruta="sin_ruta",metodo="GET",estado="404"}'], 1)
+
+    def test_respuesta_en_streaming_se_mide_al_consumirla(self):
+        Alimento.objects.create(nombre='Avena', calorias=389)
+        with CaptureQueriesContext(connection) as en_la_vista:
+            respuesta = self.client.get('/api/alimentos/exportar/')
+        ruta = 'ruta="/api/alimentos/exportar/"'
+        # Hasta consumir el contenido no se registra la petición
+        self.assertNotIn(ruta, metricas.obtener_registro().exponer())
+
+        with CaptureQueriesContext(connection) as consultas:
+            b''.join(respuesta.streaming_content)
+        respuesta.close()
+        series = self.series()
+        self.assertEqual(series[f'macromate_peticiones_total{{{ruta},metodo="GET",estado="200"}}'], 1)
+        self.assertGreater(len(consultas), 0)
+        self.assertEqual(series[f'macromate_consultas_sql_por_peticion_sum{{{ruta}}}'], len(en_la_vista) + len(consultas))
+
+    def test_suma_de_varios_procesos(self):
+        # Cada worker tiene su registro; solo comparten el fichero
+        configuracion = metricas._CONFIGURACION
+        otro = metricas.RegistroMetricas(self.ruta, 10, configuracion['CUBETAS_SEGUNDOS'], configuracion['CUBETAS_CONSULTAS'])
+        for _ in range(3):
+            otro.registrar('/api/alimentos/lista/', 'GET', 200, 0.05, 2, 0.001)
+        otro.volcar()
+        metricas.obtener_registro().registrar('/api/alimentos/lista/', 'GET', 200, 0.002, 1, 0.001)
+
+        series = self.series()
+        self.assertEqual(series['macromate_peticiones_total{ruta="/api/alimentos/lista/",metodo="GET",estado="200"}'], 4)
+        self.assertEqual(series['macromate_consultas_sql_por_peticion_sum{ruta="/api/alimentos/lista/"}'], 7)
+        self.assertEqual(series['macromate_duracion_peticion_segundos_bucket{ruta="/api/alimentos/lista/",le="0.005"}'], 1)
+        self.assertEqual(series['macromate_duracion_peticion_segundos_bucket{ruta="/api/alimentos/lista/",le="0.05"}'], 4)
+
+    def test_endpoint_protegido_con_token(self):
+        with mock.patch.dict(metricas._CONFIGURACION, TOKEN='secreto'):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+            respuesta = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('# TYPE macromate_peticiones_total counter', respuesta.content.decode())
@@ -0,0 +1,168 @@
+"""
+Totales diarios y por comida mantenidos de forma incremental.
+
+Cada alta, cambio o baja de un AlimentoConsumido aplica su diferencia de
+calorías y macros a su ComidaDiaria y a su RegistroDiario con un UPDATE
+atómico (F + delta), de modo que varios dispositivos pueden registrar a la vez
+en el mismo día sin perder sumas y leer los totales del día es leer una fila.
+
+Las escrituras que no emiten señales (QuerySet.update, bulk_create) o los
+cambios posteriores en los valores de un alimento no se reflejan;
+reconciliar_registros() recalcula los totales desde cero, también las
+calorías quemadas en ejercicios (balance.py).
+
+Todo cambio de los totales de un día programa el recálculo de sus resúmenes
+de adherencia (nutricion/adherencia.py).
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .adherencia import programar_resumenes
+from .models import AlimentoConsumido, ComidaDiaria, RegistroDiario, RegistroEjercicio
+
+# Campo del alimento -> (campo de ComidaDiaria, campo de RegistroDiario)
+CAMPOS_TOTALES = {
+    'calorias': ('calorias', 'calorias_consumidas'),
+    'proteinas': ('proteinas', 'proteinas_consumidas'),
+    'carbohidratos': ('carbohidratos', 'carbohidratos_consumidos'),
+    'grasas': ('grasas', 'grasas_consumidas'),
+}
+_CENTESIMAS = Decimal('0.01')
+_CERO = Decimal('0.00')
+
+
+def aportes(alimento, cantidad_gramos):
+    """
+    Calorías y macros que aporta una cantidad de un alimento, redondeados a centésimas
+    """
+    factor = Decimal(cantidad_gramos) / (alimento.porcion_gramos or 100)
+    return {
+        campo: (Decimal(getattr(alimento, campo) or 0) * factor).quantize(_CENTESIMAS)
+        for campo in CAMPOS_TOTALES
+    }
+
+
+def aplicar_delta(id_comida, delta, signo=1):
+    """
+    Suma (o resta con signo=-1) los aportes a la comida y a su registro diario.
+    Los totales del registro solo cuentan alimentos consumidos.
+    """
+    if not any(delta.values()):
+        return
+    ComidaDiaria.objects.filter(pk=id_comida).update(**{
+        campo_comida: Coalesce(F(campo_comida), Value(_CERO)) + signo * delta[campo]
+        for campo, (campo_comida, _) in CAMPOS_TOTALES.items()
+    })
+    # Si la comida se está borrando en cascada ya no hay registro que actualizar
+    registro = RegistroDiario.objects.filter(comidadiaria=id_comida).values_list('pk', 'id_perfil', 'fecha').first()
+    if registro is None:
+        return
+    id_registro, id_perfil, fecha = registro
+    RegistroDiario.objects.filter(pk=id_registro).update(**{
+        campo_registro: F(campo_registro) + signo * delta[campo]
+        for campo, (_, campo_registro) in CAMPOS_TOTALES.items()
+    })
+    programar_resumenes([(id_perfil, fecha)])
+
+
+def restar(a, b):
+    return {campo: a[campo] - b[campo] for campo in CAMPOS_TOTALES}
+
+
+def obtener_registro_dia(id_perfil, fecha):
+    """
+    get_or_create del registro de un día tolerante a altas simultáneas:
+    si otro dispositivo crea la fila a la vez, unique_together hace fallar
+    el INSERT y se devuelve la fila existente.
+    """
+    try:
+        with transaction.atomic():
+            return RegistroDiario.objects.get_or_create(id_perfil_id=id_perfil, fecha=fecha)[0]
+    except IntegrityError:
+        return RegistroDiario.objects.get(id_perfil_id=id_perfil, fecha=fecha)
+
+
+def registrar_comidas(id_perfil, fecha, comidas, alimentos):
+    """
+    Registra de una vez varias comidas de un día con un número fijo de consultas:
+    upsert del registro, un bulk_create de comidas, otro de alimentos consumidos
+    y un único UPDATE con la suma del día. bulk_create no emite señales, así que
+    los totales se aplican aquí.
+
+    comidas: datos validados por RegistroDiaSerializer
+    alimentos: {id: Alimento} con todos los ids referenciados
+    """
+    with transaction.atomic():
+        registro = obtener_registro_dia(id_perfil, fecha)
+        total_dia = dict.fromkeys(CAMPOS_TOTALES, _CERO)
+        nuevas, consumidos = [], []
+        for datos in comidas:
+            comida = ComidaDiaria(id_registro=registro, tipo_comida=datos['tipo_comida'], nombre=datos['nombre'])
+            total = dict.fromkeys(CAMPOS_TOTALES, _CERO)
+            for item in datos['alimentos']:
+                for campo, valor in aportes(alimentos[item['id_alimento']], item['cantidad_gramos']).items():
+                    total[campo] += valor
+                consumidos.append((comida, item))
+            for campo, (campo_comida, _) in CAMPOS_TOTALES.items():
+                setattr(comida, campo_comida, total[campo])
+                total_dia[campo] += total[campo]
+            nuevas.append(comida)
+
+        ComidaDiaria.objects.bulk_create(nuevas)
+        AlimentoConsumido.objects.bulk_create([
+            AlimentoConsumido(id_comida=comida, id_alimento_id=item['id_alimento'], cantidad_gramos=item['cantidad_gramos'])
+            for comida, item in consumidos
+        ])
+        RegistroDiario.objects.filter(pk=registro.pk).update(**{
+            campo_registro: F(campo_registro) + total_dia[campo]
+            for campo, (_, campo_registro) in CAMPOS_TOTALES.items()
+        })
+        registro.refresh_from_db(fields=[r for _, r in CAMPOS_TOTALES.values()])
+        programar_resumenes([(id_perfil, registro.fecha)])
+    return registro, nuevas
+
+
+def reconciliar_registros(ids_registro):
+    """
+    Recalcula desde cero los totales de los registros dados y de sus comidas
+    """
+    ids_registro = list(ids_registro)
+    with transaction.atomic():
+        # Bloquear primero los registros impide que entren deltas mientras se suma
+        registros = list(RegistroDiario.objects.select_for_update().filter(pk__in=ids_registro))
+        comidas = list(ComidaDiaria.objects.select_for_update().filter(id_registro__in=ids_registro))
+        por_comida = {}
+        consumidos = AlimentoConsumido.objects.filter(
+            id_comida__id_registro__in=ids_registro
+        ).select_related('id_alimento')
+        for consumido in consumidos:
+            total = por_comida.setdefault(consumido.id_comida_id, dict.fromkeys(CAMPOS_TOTALES, _CERO))
+            for campo, valor in aportes(consumido.id_alimento, consumido.cantidad_gramos).items():
+                total[campo] += valor
+
+        por_registro = defaultdict(lambda: dict.fromkeys(CAMPOS_TOTALES, _CERO))
+        for comida in comidas:
+            total = por_comida.get(comida.pk)
+            if total is None:
+                continue  # Las comidas sin alimentos conservan los valores introducidos a mano
+            for campo, (campo_comida, _) in CAMPOS_TOTALES.items():
+                setattr(comida, campo_comida, total[campo])
+                por_registro[comida.id_registro_id][campo] += total[campo]
+        ComidaDiaria.objects.bulk_update(comidas, [c for c, _ in CAMPOS_TOTALES.values()])
+        quemadas = dict(RegistroEjercicio.objects.filter(id_registro__in=ids_registro).values(
+            'id_registro'
+        ).annotate(total=Sum('calorias_quemadas')).values_list('id_registro', 'total'))
+        for registro in registros:
+            total = por_registro[registro.pk]
+            for campo, (_, campo_registro) in CAMPOS_TOTALES.items():
+                setattr(registro, campo_registro, total[campo])
+            registro.calorias_quemadas = quemadas.get(registro.pk) or _CERO
+        RegistroDiario.objects.bulk_update(
+            registros, [r for _, r in CAMPOS_TOTALES.values()] + ['calorias_quemadas']
+        )
+        programar_resumenes((registro.id_perfil_id, registro.fecha) for registro in registros)
+    return len(registros)
@@ -4,4 +4,11 @@ from . import views
 urlpatterns = [
     path('calcular-macros/', views.calcular_macros, name='calcular_macros'),
     path('macros-actuales/', views.obtener_macros_actuales, name='macros_actuales'),
+    path('async/macros-actuales/', views.obtener_macros_actuales_async, name='macros_actuales_async'),
+    path('totales-hoy/', views.totales_hoy, name='totales_hoy'),
+    path('registrar-dia/', views.registrar_dia, name='registrar_dia'),
+    path('adherencia/', views.adherencia, name='adherencia'),
+    path('balance/', views.balance, name='balance'),
+    path('panel/', views.panel, name='panel'),
+    path('plan-comidas/', views.plan_comidas, name='plan_comidas'),
 ]
\ No newline at end of file
@@ -2,6 +2,37 @@ from decimal import Decimal
 from .models import Perfil
 from datetime import date
 
+# Tablas compartidas por el cálculo individual y el cálculo por lotes (calculo_lote.py)
+FACTORES_ACTIVIDAD = {
+    'sedentario': 1.2,      # Poco o ningún ejercicio
+    'ligero': 1.375,        # Ejercicio ligero 1-3 días/semana
+    'moderado': 1.55,       # Ejercicio moderado 3-5 días/semana  
+    'activo': 1.725,        # Ejercicio duro 6-7 días/semana
+    'muy_activo': 1.9       # Ejercicio muy duro y trabajo físico
+}
+
+AJUSTES_OBJETIVO = {
+    'perdida_peso': 0.8,        # Déficit del 20%
+    'mantenimiento': 1.0,       # Mantener peso
+    'ganancia_muscular': 1.1,   # Superávit del 10%
+}
+
+# (proteína, grasas, carbohidratos) como fracción de las calorías totales
+REPARTO_MACROS = {
+    'perdida_peso': (0.35, 0.25, 0.40),
+    'ganancia_muscular': (0.30, 0.25, 0.45),
+    'mantenimiento': (0.25, 0.25, 0.50),
+}
+
+# Constante de la ecuación de Mifflin-St Jeor según el género
+CONSTANTES_GENERO = {
+    'masculino': 5,
+    'femenino': -161,
+}
+CONSTANTE_GENERO_DEFECTO = -78  # Valor por defecto para 'otro'
+PESO_REFERENCIA_EJERCICIO = 70  # kg para los que vale Ejercicio.calorias_por_hora
+MAX_CALORIAS_EJERCICIO = Decimal('9999.99')  # Límite de RegistroEjercicio.calorias_quemadas
+
 def calcular_bmr(perfil):
     """
     Calcula la Tasa Metabólica Basal (BMR) usando la ecuación de Mifflin-St Jeor
@@ -10,13 +41,8 @@ def calcular_bmr(perfil):
     altura = float(perfil.altura) if perfil.altura else 0
     edad = calcular_edad(perfil)
     
-    if perfil.genero == 'masculino':
-        bmr = (10 * peso) + (6.25 * altura) - (5 * edad) + 5
-    elif perfil.genero == 'femenino':
-        bmr = (10 * peso) + (6.25 * altura) - (5 * edad) - 161
-    else:
-        # Valor por defecto para 'otro'
-        bmr = (10 * peso) + (6.25 * altura) - (5 * edad) - 78
+    constante = CONSTANTES_GENERO.get(perfil.genero, CONSTANTE_GENERO_DEFECTO)
+    bmr = (10 * peso) + (6.25 * altura) - (5 * edad) + constante
     
     return float(bmr)
 
@@ -33,15 +59,7 @@ def calcular_tdee(bmr, nivel_actividad):
     """
     Calcula el Gasto Energético Total Diario (TDEE) basado en el nivel de actividad
     """
-    factores_actividad = {
-        'sedentario': 1.2,      # Poco o ningún ejercicio
-        'ligero': 1.375,        # Ejercicio ligero 1-3 días/semana
-        'moderado': 1.55,       # Ejercicio moderado 3-5 días/semana  
-        'activo': 1.725,        # Ejercicio duro 6-7 días/semana
-        'muy_activo': 1.9       # Ejercicio muy duro y trabajo físico
-    }
-    
-    factor = factores_actividad.get(nivel_actividad, 1.2)
+    factor = FACTORES_ACTIVIDAD.get(nivel_actividad, 1.2)
     return float(bmr) * factor  
 
 def ajustar_calorias_objetivo(tdee, objetivo):
@@ -50,13 +68,9 @@ def ajustar_calorias_objetivo(tdee, objetivo):
     """
     tdee_float = float(tdee)  
     
-    ajustes = {
-        'perdida_peso': tdee_float * 0.8,      # Déficit del 20%
-        'mantenimiento': tdee_float,           # Mantener peso
-        'ganancia_muscular': tdee_float * 1.1,  # Superávit del 10%
-    }
-    
-    return ajustes.get(objetivo, tdee_float)
+    if objetivo not in AJUSTES_OBJETIVO:
+        return tdee_float
+    return tdee_float * AJUSTES_OBJETIVO[objetivo]
 
 def distribuir_macronutrientes(calorias_totales, objetivo):
     """
@@ -64,18 +78,9 @@ def distribuir_macronutrientes(calorias_totales, objetivo):
     """
     calorias_float = float(calorias_totales)  
     
-    if objetivo == 'perdida_peso':
-        ratio_proteina = 0.35
-        ratio_grasas = 0.25
-        ratio_carbohidratos = 0.40
-    elif objetivo == 'ganancia_muscular':
-        ratio_proteina = 0.30
-        ratio_grasas = 0.25
-        ratio_carbohidratos = 0.45
-    else:  # mantenimiento
-        ratio_proteina = 0.25
-        ratio_grasas = 0.25
-        ratio_carbohidratos = 0.50
+    ratio_proteina, ratio_grasas, ratio_carbohidratos = REPARTO_MACROS.get(
+        objetivo, REPARTO_MACROS['mantenimiento']
+    )
     
     # Calcular gramos (1g proteína = 4 cal, 1g carbohidrato = 4 cal, 1g grasa = 9 cal)
     proteinas_gramos = (calorias_float * ratio_proteina) / 4
@@ -115,4 +120,14 @@ def calcular_macros_para_perfil(perfil):
         'bmr': round(bmr),
         'tdee': round(tdee),
         'message': 'Cálculo completado exitosamente'
-    }
\ No newline at end of file
+    }
+
+def calcular_calorias_quemadas(calorias_por_hora, duracion_minutos, peso_kg=None):
+    """
+    Calorías de un ejercicio: duración × calorías por hora, escaladas por el peso
+    (el gasto es aproximadamente proporcional a la masa). Sin peso no se escala.
+    """
+    calorias = Decimal(calorias_por_hora) * Decimal(duracion_minutos) / 60
+    if peso_kg:
+        calorias = calorias * Decimal(peso_kg) / PESO_REFERENCIA_EJERCICIO
+    return min(max(calorias, Decimal(0)), MAX_CALORIAS_EJERCICIO).quantize(Decimal('0.01'))
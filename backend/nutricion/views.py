@@ -2,9 +2,26 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .models import Macronutrientes, Perfil
+from .adherencia import resumen_rango
+from .balance import balance_rango
+from .models import AlimentoConsumido, ComidaDiaria, Macronutrientes, Perfil, RegistroDiario, RegistroEjercicio
+from .planificador import REPARTO_DEFECTO, generar_plan, obtener_matriz
+from .serializers import FechaSerializer, PlanComidasSerializer, RangoAdherenciaSerializer, RangoFechasSerializer, RegistroDiaSerializer
+from .totales import CAMPOS_TOTALES, aportes, registrar_comidas
 from .utils import calcular_macros_para_perfil
+from alimentos.models import Alimento
+from django.views.decorators.http import require_GET
+from macromate.asincrono import autenticacion_requerida, respuesta_json
+from macromate.cache import aobtener_o_calcular, obtener_o_calcular
+from macromate.condicional import condicional, etag
+from usuarios.autenticacion import aid_perfil_de, id_perfil_de
+from usuarios.cache import TIMEOUT_LECTURAS, clave_macros_actuales, invalidar_usuarios
+from usuarios.views import leer_perfil
 from django.db import transaction # Importante para atomicidad
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.utils import timezone
+from datetime import date
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -31,6 +48,9 @@ def calcular_macros(request):
                     grasas=resultado['grasas'],
                     activo=True
                 )
+                # El recálculo por lotes ya no tiene nada pendiente para este perfil
+                Perfil.objects.filter(pk=perfil.pk).update(macros_pendientes=False, fecha_actualizacion=timezone.now())
+                invalidar_usuarios([request.user.pk])
         
         return Response(resultado)
         
@@ -45,22 +65,59 @@ def calcular_macros(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+def _datos_macros(macros):
+    if macros is None:
+        return None
+    return {
+        'id': macros.pk,
+        'calorias_diarias': macros.calorias_diarias,
+        'proteinas': macros.proteinas,
+        'carbohidratos': macros.carbohidratos,
+        'grasas': macros.grasas,
+        'fecha_calculo': macros.fecha_calculo
+    }
+
+def _macros_activos(id_perfil):
+    # unico_macro_activo_por_perfil garantiza como mucho un registro activo
+    return _datos_macros(Macronutrientes.objects.filter(id_perfil_id=id_perfil, activo=True).first())
+
+def _leer_macros_actuales(usuario):
+    id_perfil = id_perfil_de(usuario)
+    if id_perfil is None:
+        raise Perfil.DoesNotExist
+    return _macros_activos(id_perfil)
+
+async def _aleer_macros_actuales(usuario):
+    id_perfil = await aid_perfil_de(usuario)
+    if id_perfil is None:
+        raise Perfil.DoesNotExist
+    return _datos_macros(await Macronutrientes.objects.filter(id_perfil_id=id_perfil, activo=True).afirst())
+
+def _validadores_macros(request):
+    """
+    Los registros de Macronutrientes no se modifican (cada cálculo crea otro y
+    desactiva el anterior): el id del activo identifica la versión. Se lee de la
+    caché; sin entrada la vista lee los macros (la misma única consulta) y la
+    respuesta sale ya con su ETag. fecha_calculo es un día, demasiado grueso
+    para Last-Modified.
+    """
+    datos = cache.get(clave_macros_actuales(request.user.pk))
+    pk = datos.get('id') if datos else None
+    return (etag('macros', pk) if pk is not None else None), None
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@condicional(_validadores_macros)
 def obtener_macros_actuales(request):
     try:
-        perfil = Perfil.objects.get(id_usuario=request.user)
-        # Ahora .first() traerá el único activo garantizado
-        macros = Macronutrientes.objects.filter(id_perfil=perfil, activo=True).first()
+        # Un acierto de caché no hace ninguna consulta; calcular_macros y el recálculo por lotes invalidan
+        macros = obtener_o_calcular(
+            'macros_actuales', clave_macros_actuales(request.user.pk),
+            lambda: _leer_macros_actuales(request.user), TIMEOUT_LECTURAS
+        )
         
         if macros:
-            return Response({
-                'calorias_diarias': macros.calorias_diarias,
-                'proteinas': macros.proteinas,
-                'carbohidratos': macros.carbohidratos,
-                'grasas': macros.grasas,
-                'fecha_calculo': macros.fecha_calculo
-            })
+            return Response(macros)
         else:
             # Retornar 404 si no hay datos es mejor práctica que 200 con mensaje
             return Response(
@@ -72,4 +129,243 @@ def obtener_macros_actuales(request):
         return Response(
             {'error': 'Perfil no encontrado'},
             status=status.HTTP_404_NOT_FOUND
-        )
\ No newline at end of file
+        )
+
+@require_GET
+@autenticacion_requerida
+@condicional(_validadores_macros)
+async def obtener_macros_actuales_async(request):
+    """
+    Versión asíncrona de obtener_macros_actuales (misma caché y mismas respuestas)
+    """
+    try:
+        macros = await aobtener_o_calcular(
+            'macros_actuales', clave_macros_actuales(request.user.pk),
+            lambda: _aleer_macros_actuales(request.user), TIMEOUT_LECTURAS
+        )
+    except Perfil.DoesNotExist:
+        return respuesta_json({'error': 'Perfil no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+
+    if macros:
+        return respuesta_json(macros)
+    return respuesta_json(
+        {'error': 'No hay macros calculados. Use el endpoint de cálculo.'},
+        status=status.HTTP_404_NOT_FOUND
+    )
+
+CAMPOS_TOTALES_DIA = (
+    'fecha', 'calorias_consumidas', 'proteinas_consumidas',
+    'carbohidratos_consumidos', 'grasas_consumidas', 'agua_litros',
+)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def totales_hoy(request):
+    """
+    Totales consumidos hoy; los mantiene al día nutricion/totales.py, así que es una sola fila
+    """
+    totales = RegistroDiario.objects.filter(
+        id_perfil__id_usuario=request.user, fecha=date.today()
+    ).values(*CAMPOS_TOTALES_DIA).first()
+    if totales is None:
+        # Sin registro todavía: el día empieza a cero
+        totales = dict.fromkeys(CAMPOS_TOTALES_DIA, 0)
+        totales['fecha'] = date.today()
+    return Response(totales)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def registrar_dia(request):
+    """
+    Registra varias comidas de un día con sus alimentos en una sola petición.
+    Las consultas no dependen del número de comidas ni de alimentos.
+    """
+    serializer = RegistroDiaSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    datos = serializer.validated_data
+
+    id_perfil = id_perfil_de(request.user)
+    if id_perfil is None:
+        return Response({'error': 'Perfil no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+
+    # Todos los alimentos referenciados en una sola consulta
+    ids = {item['id_alimento'] for comida in datos['comidas'] for item in comida['alimentos']}
+    alimentos = Alimento.objects.only(
+        'porcion_gramos', *CAMPOS_TOTALES
+    ).in_bulk(ids)
+    faltan = sorted(ids - alimentos.keys())
+    if faltan:
+        return Response(
+            {'error': 'Alimentos no encontrados', 'ids': faltan},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    registro, comidas = registrar_comidas(id_perfil, datos.get('fecha', date.today()), datos['comidas'], alimentos)
+    respuesta = {campo: getattr(registro, campo) for campo in CAMPOS_TOTALES_DIA}
+    respuesta['comidas'] = [
+        {
+            'id': comida.pk,
+            'tipo_comida': comida.tipo_comida,
+            'nombre': comida.nombre,
+            **{campo: getattr(comida, campo) for campo, _ in CAMPOS_TOTALES.values()},
+        }
+        for comida in comidas
+    ]
+    return Response(respuesta, status=status.HTTP_201_CREATED)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def adherencia(request):
+    """
+    Adherencia a los objetivos en un rango: ?desde=&hasta=&agrupar=semana|mes.
+    Se sirve de los resúmenes semanales y mensuales (nutricion/adherencia.py).
+    """
+    serializer = RangoAdherenciaSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    id_perfil = id_perfil_de(request.user)
+    if id_perfil is None:
+        return Response({'error': 'Perfil no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+
+    datos = serializer.validated_data
+    return Response(resumen_rango(id_perfil, datos['desde'], datos['hasta'], datos.get('agrupar')))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def balance(request):
+    """
+    Balance energético (consumidas - quemadas) por día en un rango: ?desde=&hasta=.
+    Se sirve de los totales guardados en RegistroDiario (nutricion/balance.py).
+    """
+    serializer = RangoFechasSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    id_perfil = id_perfil_de(request.user)
+    if id_perfil is None:
+        return Response({'error': 'Perfil no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+
+    datos = serializer.validated_data
+    return Response(balance_rango(id_perfil, datos['desde'], datos['hasta']))
+
+def _datos_dia(registro, fecha):
+    """
+    Totales, comidas con sus alimentos y ejercicios de un registro ya precargado
+    """
+    if registro is None:
+        totales = dict.fromkeys(CAMPOS_TOTALES_DIA, 0)
+        totales.update(fecha=fecha, calorias_quemadas=0, balance_neto=0)
+        return totales, [], []
+
+    totales = {campo: getattr(registro, campo) for campo in CAMPOS_TOTALES_DIA}
+    totales['calorias_quemadas'] = registro.calorias_quemadas
+    totales['balance_neto'] = registro.calorias_consumidas - registro.calorias_quemadas
+    comidas = [
+        {
+            'id': comida.pk,
+            'tipo_comida': comida.tipo_comida,
+            'nombre': comida.nombre,
+            **{campo: getattr(comida, campo) for campo in CAMPOS_TOTALES},
+            'alimentos': [
+                {
+                    'id': consumido.pk,
+                    'id_alimento': consumido.id_alimento_id,
+                    'nombre': consumido.id_alimento.nombre,
+                    'cantidad_gramos': consumido.cantidad_gramos,
+                    **aportes(consumido.id_alimento, consumido.cantidad_gramos),
+                }
+                for consumido in comida.alimentoconsumido_set.all()
+            ],
+        }
+        for comida in registro.comidadiaria_set.all()
+    ]
+    ejercicios = [
+        {
+            'id': sesion.pk,
+            'id_ejercicio': sesion.id_ejercicio_id,
+            'nombre': sesion.id_ejercicio.nombre,
+            'categoria': sesion.id_ejercicio.categoria,
+            'duracion_minutos': sesion.duracion_minutos,
+            'calorias_quemadas': sesion.calorias_quemadas,
+        }
+        for sesion in registro.registroejercicio_set.all()
+    ]
+    return totales, comidas, ejercicios
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def panel(request):
+    """
+    Todo lo que necesita la página principal en una respuesta: perfil, macros actuales
+    y el día (?fecha=, por defecto hoy) con sus totales, comidas, alimentos y ejercicios.
+    Perfil y macros salen de la caché; el día son cuatro consultas como mucho,
+    registre el usuario las comidas y alimentos que registre.
+    """
+    serializer = FechaSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    fecha = serializer.validated_data.get('fecha') or date.today()
+
+    # Como GET /api/usuarios/perfil/, crea el perfil si aún no existe
+    perfil = leer_perfil(request.user)
+    id_perfil = perfil['id']
+    macros = obtener_o_calcular(
+        'macros_actuales', clave_macros_actuales(request.user.pk),
+        lambda: _macros_activos(id_perfil), TIMEOUT_LECTURAS
+    )
+    registro = RegistroDiario.objects.filter(id_perfil_id=id_perfil, fecha=fecha).prefetch_related(
+        Prefetch('comidadiaria_set', queryset=ComidaDiaria.objects.order_by('pk').prefetch_related(
+            Prefetch('alimentoconsumido_set', queryset=AlimentoConsumido.objects.select_related('id_alimento').order_by('pk'))
+        )),
+        Prefetch('registroejercicio_set', queryset=RegistroEjercicio.objects.select_related('id_ejercicio').order_by('pk')),
+    ).first()
+    totales, comidas, ejercicios = _datos_dia(registro, fecha)
+    return Response({
+        'perfil': perfil,
+        'macros': macros,
+        'totales': totales,
+        'comidas': comidas,
+        'ejercicios': ejercicios,
+    })
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def plan_comidas(request):
+    """
+    Propone las comidas de un día con alimentos del catálogo ajustadas a los
+    macros activos: comidas [{tipo_comida, proporcion}], alimentos_por_comida y
+    semilla, todos opcionales. La búsqueda tiene un presupuesto de tiempo fijo
+    (nutricion/planificador.py); las comidas se pueden enviar tal cual a registrar-dia.
+    """
+    serializer = PlanComidasSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    datos = serializer.validated_data
+
+    try:
+        macros = obtener_o_calcular(
+            'macros_actuales', clave_macros_actuales(request.user.pk),
+            lambda: _leer_macros_actuales(request.user), TIMEOUT_LECTURAS
+        )
+    except Perfil.DoesNotExist:
+        return Response({'error': 'Perfil no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+    if not macros:
+        return Response(
+            {'error': 'No hay macros calculados. Use el endpoint de cálculo.'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    matriz = obtener_matriz()
+    if not len(matriz):
+        return Response({'error': 'No hay alimentos con calorías en el catálogo'}, status=status.HTTP_404_NOT_FOUND)
+
+    comidas = [
+        (comida['tipo_comida'], comida.get('proporcion', REPARTO_DEFECTO[comida['tipo_comida']]))
+        for comida in datos.get('comidas', [])
+    ] or list(REPARTO_DEFECTO.items())
+    objetivo = {'calorias': macros['calorias_diarias'], **{campo: macros[campo] for campo in ('proteinas', 'carbohidratos', 'grasas')}}
+    plan = generar_plan(matriz, objetivo, comidas, datos['alimentos_por_comida'], datos.get('semilla'))
+    return Response({'id_macros': macros['id'], **plan})
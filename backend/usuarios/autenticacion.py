@@ -0,0 +1,168 @@
+"""
+Autenticación JWT sin consultas para los usuarios ya vistos.
+
+JWTAutenticacionCacheada resuelve el usuario del token desde una caché del
+proceso acotada (LRU con caducidad) indexada por id de usuario; opcionalmente
+guarda también el id de su Perfil, cargado en la misma consulta. Los cambios
+de contraseña, desactivaciones y cierres de sesión de cualquier worker
+invalidan la entrada a través de una generación por usuario en la caché
+compartida (usuarios/cache.py).
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import ageneracion_autenticacion, generacion_autenticacion
+from .models import Perfil
+
+_CONFIGURACION = {
+    'MAX_ENTRADAS': 10000,
+    'TTL_SEGUNDOS': 60,
+    'CACHEAR_PERFIL': True,
+    **settings.MACROMATE_SETTINGS.get('AUTH_CACHE', {}),
+}
+
+
+class CacheLRU:
+    """
+    Diccionario acotado: descarta el menos usado al llenarse y las entradas caducadas al leerlas
+    """
+
+    def __init__(self, max_entradas, ttl_segundos):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self._entradas = OrderedDict()
+        self._bloqueo = threading.Lock()
+
+    def get(self, clave):
+        with self._bloqueo:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            expira, valor = entrada
+            if expira < time.monotonic():
+                del self._entradas[clave]
+                return None
+            self._entradas.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor):
+        with self._bloqueo:
+            self._entradas[clave] = (time.monotonic() + self.ttl_segundos, valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def delete(self, clave):
+        with self._bloqueo:
+            self._entradas.pop(clave, None)
+
+    def clear(self):
+        with self._bloqueo:
+            self._entradas.clear()
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+usuarios_autenticados = CacheLRU(_CONFIGURACION['MAX_ENTRADAS'], _CONFIGURACION['TTL_SEGUNDOS'])
+
+
+class JWTAutenticacionCacheada(JWTAuthentication):
+    """
+    Igual que JWTAuthentication pero sin consultar la base de datos si el usuario está en caché
+    """
+
+    def get_user(self, validated_token):
+        id_usuario = self._id_usuario(validated_token)
+        # La generación se lee antes de cargar: una invalidación durante la carga no se pierde
+        generacion = generacion_autenticacion(id_usuario)
+        entrada = usuarios_autenticados.get(id_usuario)
+        if entrada is None or entrada[0] != generacion:
+            entrada = (generacion, self._cargar_usuario(id_usuario))
+            usuarios_autenticados.set(id_usuario, entrada)
+        return self._comprobar_usuario(entrada[1], validated_token)
+
+    async def aget_user(self, validated_token):
+        """
+        get_user() para vistas asíncronas: la carga usa el ORM asíncrono (aget)
+        """
+        id_usuario = self._id_usuario(validated_token)
+        generacion = await ageneracion_autenticacion(id_usuario)
+        entrada = usuarios_autenticados.get(id_usuario)
+        if entrada is None or entrada[0] != generacion:
+            try:
+                usuario = await self._consulta_usuarios().aget(**{api_settings.USER_ID_FIELD: id_usuario})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found') from e
+            entrada = (generacion, usuario)
+            usuarios_autenticados.set(id_usuario, entrada)
+        return self._comprobar_usuario(entrada[1], validated_token)
+
+    async def aautenticar(self, request):
+        """
+        authenticate() para vistas asíncronas de Django (sin Request de DRF)
+        """
+        cabecera = self.get_header(request)
+        if cabecera is None:
+            return None
+        token_crudo = self.get_raw_token(cabecera)
+        if token_crudo is None:
+            return None
+        token = self.get_validated_token(token_crudo)
+        return await self.aget_user(token), token
+
+    def _id_usuario(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from e
+
+    def _comprobar_usuario(self, usuario_cacheado, validated_token):
+        # Cada petición recibe su copia: las vistas pueden modificar request.user
+        usuario = copy.copy(usuario_cacheado)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not usuario.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(usuario.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return usuario
+
+    def _consulta_usuarios(self):
+        usuarios = self.user_model.objects.all()
+        if _CONFIGURACION['CACHEAR_PERFIL']:
+            # El id del perfil sale de un LEFT JOIN en la misma consulta
+            usuarios = usuarios.annotate(id_perfil_cacheado=F('perfil__id'))
+        return usuarios
+
+    def _cargar_usuario(self, id_usuario):
+        try:
+            return self._consulta_usuarios().get(**{api_settings.USER_ID_FIELD: id_usuario})
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found') from e
+
+
+def id_perfil_de(usuario):
+    """
+    Id del perfil del usuario (None si no tiene); sin consulta si lo trae la autenticación
+    """
+    if hasattr(usuario, 'id_perfil_cacheado'):
+        return usuario.id_perfil_cacheado
+    return Perfil.objects.filter(id_usuario=usuario).values_list('pk', flat=True).first()
+
+
+async def aid_perfil_de(usuario):
+    if hasattr(usuario, 'id_perfil_cacheado'):
+        return usuario.id_perfil_cacheado
+    return await Perfil.objects.filter(id_usuario=usuario).values_list('pk', flat=True).afirst()
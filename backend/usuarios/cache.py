@@ -0,0 +1,102 @@
+"""
+Claves de caché de las lecturas por usuario (perfil y macros actuales) y de
+la tendencia de peso por perfil.
+
+Se indexan por id de usuario para que un acierto no necesite ninguna consulta.
+Las escrituras invalidan al momento y otra vez al confirmar la transacción: así
+no queda en caché un valor leído por otro worker antes del commit.
+
+La autenticación cachea los usuarios en memoria de cada proceso
+(usuarios/autenticacion.py); aquí solo se guarda una generación por usuario
+que cambia al invalidar, y que cada worker compara con la de su entrada.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from macromate.cache import aleer
+
+TIMEOUT_LECTURAS = settings.MACROMATE_SETTINGS['CACHE']['TIMEOUT_LECTURAS']
+TIMEOUT_TENDENCIA = settings.MACROMATE_SETTINGS['CACHE']['TIMEOUT_TENDENCIA']
+# Pasado el TTL de la caché de autenticación ninguna entrada anterior sigue viva
+TIMEOUT_GENERACION = settings.MACROMATE_SETTINGS.get('AUTH_CACHE', {}).get('TTL_SEGUNDOS', 60)
+
+
+def clave_perfil(id_usuario):
+    return f'usuarios:perfil:{id_usuario}'
+
+
+def clave_macros_actuales(id_usuario):
+    return f'nutricion:macros_actuales:{id_usuario}'
+
+
+def invalidar_usuarios(ids_usuario):
+    claves = [clave for i in ids_usuario for clave in (clave_perfil(i), clave_macros_actuales(i))]
+    if not claves:
+        return
+    cache.delete_many(claves)
+    transaction.on_commit(lambda: cache.delete_many(claves))
+
+
+def clave_generacion_tendencia(id_perfil):
+    return f'usuarios:generacion_tendencia:{id_perfil}'
+
+
+def clave_tendencia(id_perfil):
+    """
+    Un único diccionario {puntos: tendencia} por perfil y generación. La
+    generación se lee antes de consultar las medidas: si una medida nueva se
+    confirma mientras se calcula, el resultado se guarda en la clave de la
+    generación anterior, que ya nadie lee (con TIMEOUT_TENDENCIA de un día, borrar
+    la clave dejaría la tendencia vieja hasta entonces).
+    """
+    clave_generacion = clave_generacion_tendencia(id_perfil)
+    generacion = cache.get(clave_generacion)
+    if generacion is None:
+        cache.add(clave_generacion, time.time_ns(), TIMEOUT_TENDENCIA)
+        generacion = cache.get(clave_generacion)
+    return f'usuarios:tendencia:{id_perfil}:{generacion}'
+
+
+def invalidar_tendencia(ids_perfil):
+    """
+    Medida corporal nueva, cambiada o borrada, o peso objetivo modificado
+    """
+    ids_perfil = list(ids_perfil)
+    if not ids_perfil:
+        return
+
+    def invalidar():
+        cache.set_many({clave_generacion_tendencia(i): time.time_ns() for i in ids_perfil}, TIMEOUT_TENDENCIA)
+
+    invalidar()
+    transaction.on_commit(invalidar)
+
+
+def clave_generacion_autenticacion(id_usuario):
+    return f'usuarios:generacion_auth:{id_usuario}'
+
+
+def generacion_autenticacion(id_usuario):
+    return cache.get(clave_generacion_autenticacion(id_usuario))
+
+
+async def ageneracion_autenticacion(id_usuario):
+    return await aleer(clave_generacion_autenticacion(id_usuario))
+
+
+def invalidar_autenticacion(ids_usuario):
+    """
+    Contraseña cambiada, usuario desactivado, sesión cerrada o perfil nuevo
+    """
+    ids_usuario = list(ids_usuario)
+
+    def invalidar():
+        cache.set_many(
+            {clave_generacion_autenticacion(i): time.time_ns() for i in ids_usuario}, TIMEOUT_GENERACION
+        )
+
+    invalidar()
+    transaction.on_commit(invalidar)
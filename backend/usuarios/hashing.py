@@ -0,0 +1,142 @@
+"""
+Hashing de contraseñas en un pool acotado.
+
+PBKDF2 (1M iteraciones) tarda cientos de milisegundos de CPU. Ejecutado en los
+hilos que atienden peticiones, una avalancha de logins los ocupa todos y los
+endpoints baratos esperan detrás. PBKDF2HasherAcotado calcula los hashes en un
+pool de HILOS hilos por proceso con como mucho MAX_COLA trabajos esperando; si
+está lleno falla al momento con PoolHashingSaturado (un 429 de DRF) en lugar de
+bloquear otro hilo de peticiones.
+
+Como el hasher es el de PASSWORD_HASHERS, pasan por el pool authenticate()
+(login), set_password() (registro y cambio de contraseña) y check_password().
+Los trabajos del pool solo calculan hashes: no abren conexiones a la base de
+datos que haya que cerrar.
+
+El pool acota la cola, pero no el núcleo: hashlib suelta el GIL durante
+PBKDF2, así que cada hilo del pool ocupa un núcleo entero mientras calcula. Por
+defecto HILOS es el número de núcleos disponibles menos uno, para que siempre
+quede uno para los hilos de peticiones. Con un solo núcleo no queda ninguno: el
+pool evita que los logins bloqueen los hilos, pero los endpoints baratos se
+reparten la CPU con el hash y su latencia sube durante una avalancha
+(benchmark_login lo indica).
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from rest_framework.exceptions import Throttled
+
+_CONFIGURACION = {
+    'HILOS': None,
+    'MAX_COLA': 6,
+    'SEGUNDOS_REINTENTO': 1,
+    **settings.MACROMATE_SETTINGS.get('HASHING', {}),
+}
+MUESTRAS_METRICAS = 1000
+
+
+def nucleos_disponibles():
+    # Los de la afinidad del proceso (contenedores con CPU limitada), no los de la máquina
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def hilos_por_defecto():
+    return _CONFIGURACION['HILOS'] or max(1, nucleos_disponibles() - 1)
+
+
+class PoolHashingSaturado(Throttled):
+    default_detail = 'Demasiadas operaciones de contraseña simultáneas, inténtelo de nuevo en unos segundos'
+
+
+class PoolHashing:
+    """
+    Ejecutor acotado: HILOS trabajos en curso y MAX_COLA en espera como máximo.
+    Con hilos=0 el hash se calcula en el propio hilo de la petición.
+    """
+
+    def __init__(self, hilos, max_cola):
+        self.hilos = hilos
+        self.max_cola = max_cola
+        self._ejecutor = ThreadPoolExecutor(hilos, thread_name_prefix='hashing') if hilos else None
+        self._plazas = threading.BoundedSemaphore(hilos + max_cola) if hilos else None
+        self._bloqueo = threading.Lock()
+        self._esperas = deque(maxlen=MUESTRAS_METRICAS)
+        self._duraciones = deque(maxlen=MUESTRAS_METRICAS)
+        self.completados = 0
+        self.rechazados = 0
+
+    def _medir(self, funcion, args, encolado):
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args)
+        finally:
+            fin = time.perf_counter()
+            with self._bloqueo:
+                self._esperas.append(inicio - encolado)
+                self._duraciones.append(fin - inicio)
+                self.completados += 1
+
+    def ejecutar(self, funcion, *args):
+        if self._ejecutor is None:
+            return self._medir(funcion, args, time.perf_counter())
+        if not self._plazas.acquire(blocking=False):
+            with self._bloqueo:
+                self.rechazados += 1
+            raise PoolHashingSaturado(wait=_CONFIGURACION['SEGUNDOS_REINTENTO'])
+        try:
+            futuro = self._ejecutor.submit(self._medir, funcion, args, time.perf_counter())
+        except BaseException:
+            self._plazas.release()
+            raise
+        futuro.add_done_callback(lambda _: self._plazas.release())
+        return futuro.result()
+
+    def metricas(self):
+        """
+        Contadores y percentiles (en ms) de espera en cola y de cálculo de las últimas operaciones
+        """
+        with self._bloqueo:
+            esperas, duraciones = np.array(self._esperas) * 1000, np.array(self._duraciones) * 1000
+            resultado = {'completados': self.completados, 'rechazados': self.rechazados}
+        for nombre, muestras in (('espera_ms', esperas), ('hash_ms', duraciones)):
+            if len(muestras):
+                p50, p99 = np.percentile(muestras, [50, 99])
+                resultado[nombre] = {'p50': float(p50), 'p99': float(p99), 'max': float(muestras.max())}
+        return resultado
+
+    def cerrar(self):
+        if self._ejecutor is not None:
+            self._ejecutor.shutdown(wait=True)
+
+
+_pool = PoolHashing(hilos_por_defecto(), _CONFIGURACION['MAX_COLA'])
+
+
+def obtener_pool():
+    return _pool
+
+
+def configurar_pool(hilos, max_cola):
+    """
+    Sustituye el pool del proceso (benchmarks y tests); devuelve el anterior
+    """
+    global _pool
+    anterior, _pool = _pool, PoolHashing(hilos, max_cola)
+    return anterior
+
+
+class PBKDF2HasherAcotado(PBKDF2PasswordHasher):
+    """
+    PBKDF2PasswordHasher (mismo algoritmo y formato) que calcula en el pool acotado
+    """
+
+    def encode(self, password, salt, iterations=None):
+        return obtener_pool().ejecutar(super().encode, password, salt, iterations)
@@ -0,0 +1,93 @@
+import os
+import random
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from macromate.benchmarks import base_datos_temporal, percentiles
+from macromate.cache import SQLiteCache, obtener_o_calcular
+from nutricion.models import Macronutrientes
+from nutricion.views import _leer_macros_actuales
+from usuarios.cache import clave_macros_actuales, clave_perfil
+from usuarios.models import Perfil, Usuario
+from usuarios.serializers import PerfilSerializer
+
+
+def sembrar_usuarios(n):
+    usuarios = Usuario.objects.bulk_create([
+        Usuario(email=f'bench{i}@example.com', nombre_usuario=f'bench{i}', password='!') for i in range(n)
+    ])
+    perfiles = Perfil.objects.bulk_create([
+        Perfil(id_usuario=u, peso_actual=70, altura=175, fecha_nacimiento=date(1990, 1, 1), genero='femenino')
+        for u in usuarios
+    ])
+    Macronutrientes.objects.bulk_create([
+        Macronutrientes(id_perfil=p, calorias_diarias=2000, proteinas=150, carbohidratos=200, grasas=60)
+        for p in perfiles
+    ])
+    return usuarios
+
+
+class Command(BaseCommand):
+    help = ('Compara las lecturas de perfil y macros actuales sin caché, con LocMemCache '
+            '(una por worker) y con SQLiteCache (compartida), repartiendo las peticiones entre N workers')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=500)
+        parser.add_argument('--peticiones', type=int, default=20_000)
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        with base_datos_temporal(), tempfile.TemporaryDirectory() as directorio:
+            usuarios = sembrar_usuarios(options['usuarios'])
+            aleatorio = random.Random(42)
+            secuencia = [aleatorio.choice(usuarios) for _ in range(options['peticiones'])]
+
+            # Sin purgas durante la medida: caben todas las claves
+            parametros = {'OPTIONS': {'MAX_ENTRIES': 4 * len(usuarios)}}
+            configuraciones = {
+                'sin caché': None,
+                'LocMemCache': [LocMemCache(f'bench-{w}', parametros) for w in range(workers)],
+                'SQLiteCache': [
+                    SQLiteCache(os.path.join(directorio, 'cache.sqlite3'), parametros) for _ in range(workers)
+                ],
+            }
+            self.stdout.write(f"{'backend':>12} {'p50 (ms)':>9} {'p95':>7} {'p99':>7} {'media':>7} {'aciertos':>9}")
+            for nombre, caches in configuraciones.items():
+                fallos = 0
+
+                def leer_perfil(usuario):
+                    nonlocal fallos
+                    fallos += 1
+                    return dict(PerfilSerializer(Perfil.objects.get(id_usuario=usuario)).data)
+
+                def leer_macros(usuario):
+                    nonlocal fallos
+                    fallos += 1
+                    return _leer_macros_actuales(usuario)
+
+                tiempos = np.empty(len(secuencia))
+                for i, usuario in enumerate(secuencia):
+                    inicio = time.perf_counter()
+                    if caches is None:
+                        leer_perfil(usuario)
+                        leer_macros(usuario)
+                    else:
+                        # Reparto round-robin como el de gunicorn entre procesos
+                        cache = caches[i % workers]
+                        obtener_o_calcular('perfil', clave_perfil(usuario.pk), lambda: leer_perfil(usuario), cache=cache)
+                        obtener_o_calcular('macros_actuales', clave_macros_actuales(usuario.pk),
+                                           lambda: leer_macros(usuario), cache=cache)
+                    tiempos[i] = (time.perf_counter() - inicio) * 1000
+
+                estadisticas = percentiles(tiempos)
+                ratio = 1 - fallos / (2 * len(secuencia))
+                self.stdout.write(
+                    f"{nombre:>12} {estadisticas['p50']:9.3f} {estadisticas['p95']:7.3f} "
+                    f"{estadisticas['p99']:7.3f} {estadisticas['media']:7.3f} {ratio:9.1%}"
+                )
@@ -0,0 +1,113 @@
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+
+from alimentos.management.commands.benchmark_paginacion import sembrar_alimentos
+from macromate.benchmarks import base_datos_temporal, percentiles
+from usuarios.hashing import configurar_pool, nucleos_disponibles, obtener_pool
+from usuarios.models import Usuario
+
+CREDENCIALES = {'email': 'avalancha@example.com', 'password': 'clave-segura-123'}
+
+
+def peticion(metodo, ruta, datos=None):
+    # Como un hilo de gunicorn: cada petición con su cliente y la conexión cerrada al acabar
+    try:
+        cliente = Client()
+        if metodo == 'post':
+            return cliente.post(ruta, datos, content_type='application/json').status_code
+        return cliente.get(ruta).status_code
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = ('Latencia de /api/alimentos/lista/ durante una avalancha de logins contra un servidor de N hilos '
+            '(como un worker gthread), con el hash en el hilo de la petición frente al pool acotado. '
+            'El objetivo (p99 de la lista como sin avalancha) solo se alcanza si quedan núcleos libres '
+            'además de los hilos del pool; con un núcleo no se alcanza')
+    TOLERANCIA_P99 = 2  # Con el pool acotado, p99 de la lista como mucho el doble que sin avalancha
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos-servidor', type=int, default=16)
+        parser.add_argument('--clientes-login', type=int, default=64, help='Clientes que repiten logins sin pausa')
+        parser.add_argument('--segundos', type=float, default=20)
+        parser.add_argument('--hilos-pool', type=int, default=obtener_pool().hilos)
+        parser.add_argument('--cola-pool', type=int, default=obtener_pool().max_cola)
+
+    def medir(self, servidor, clientes_login, segundos):
+        fin = time.monotonic() + segundos
+        estados = []
+
+        def cliente_login():
+            while time.monotonic() < fin:
+                estados.append(servidor.submit(peticion, 'post', '/api/usuarios/login/', CREDENCIALES).result())
+
+        clientes = ThreadPoolExecutor(max(clientes_login, 1))
+        for _ in range(clientes_login):
+            clientes.submit(cliente_login)
+        latencias = []
+        while time.monotonic() < fin:
+            # La latencia incluye la espera hasta que un hilo del servidor queda libre
+            inicio = time.perf_counter()
+            assert servidor.submit(peticion, 'get', '/api/alimentos/lista/').result() == 200
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            time.sleep(0.05)
+        clientes.shutdown()
+        return np.array(latencias), estados
+
+    def handle(self, *args, **options):
+        # Cada 429 se registraría como aviso
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        with tempfile.TemporaryDirectory() as directorio, \
+                base_datos_temporal(fichero=os.path.join(directorio, 'benchmark.sqlite3')):
+            Usuario.objects.create_user(CREDENCIALES['email'], 'avalancha', CREDENCIALES['password'])
+            sembrar_alimentos(1000)
+            connection.close()
+
+            modos = {
+                'sin avalancha': (0, (options['hilos_pool'], options['cola_pool'])),
+                'hash en el hilo de la petición': (options['clientes_login'], (0, 0)),
+                'pool acotado': (options['clientes_login'], (options['hilos_pool'], options['cola_pool'])),
+            }
+            self.stdout.write(
+                f"{'modo':>31} {'lecturas':>9} {'lista p50 (ms)':>15} {'p99':>8} {'logins ok':>10} {'429':>6} "
+                f"{'espera pool p99':>16} {'hash p50':>9}"
+            )
+            p99 = {}
+            for modo, (clientes_login, pool) in modos.items():
+                configurar_pool(*pool).cerrar()
+                servidor = ThreadPoolExecutor(options['hilos_servidor'])
+                latencias, estados = self.medir(servidor, clientes_login, options['segundos'])
+                servidor.shutdown()
+
+                estadisticas = percentiles(latencias)
+                p99[modo] = estadisticas['p99']
+                metricas = obtener_pool().metricas()
+                espera = metricas.get('espera_ms', {}).get('p99', 0)
+                hash_p50 = metricas.get('hash_ms', {}).get('p50', 0)
+                self.stdout.write(
+                    f"{modo:>31} {len(latencias):>9} {estadisticas['p50']:15.2f} {estadisticas['p99']:8.2f} "
+                    f"{estados.count(200):>10} {estados.count(429):>6} {espera:16.1f} {hash_p50:9.1f}"
+                )
+
+        nucleos = nucleos_disponibles()
+        self.stdout.write(f"{nucleos} núcleos disponibles, {options['hilos_pool']} hilos en el pool de hashing")
+        if p99['pool acotado'] <= self.TOLERANCIA_P99 * p99['sin avalancha']:
+            self.stdout.write(self.style.SUCCESS('Objetivo alcanzado: la latencia de la lista se mantiene durante la avalancha'))
+        else:
+            motivo = (
+                'no queda ningún núcleo libre para los hilos de peticiones (el hash ocupa un núcleo por hilo del pool)'
+                if nucleos <= options['hilos_pool'] else 'revisar HILOS y MAX_COLA'
+            )
+            self.stdout.write(self.style.WARNING(
+                f"Objetivo NO alcanzado: p99 de la lista {p99['pool acotado']:.1f} ms con avalancha frente a "
+                f"{p99['sin avalancha']:.1f} ms sin ella; {motivo}"
+            ))
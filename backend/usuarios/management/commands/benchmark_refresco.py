@@ -0,0 +1,71 @@
+import time
+import uuid
+from datetime import timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from macromate.benchmarks import base_datos_temporal, percentiles
+from usuarios.models import Usuario
+from usuarios.serializers import RefrescoTokenSerializer
+from usuarios.tokens import RefreshTokenFiltrado, lista_negra
+
+
+def sembrar_lista_negra(usuario, n, lote=50_000):
+    """
+    n tokens rotados (en lista negra y sin caducar), como tras n refrescos
+    """
+    expira = timezone.now() + timedelta(days=7)
+    for inicio in range(0, n, lote):
+        tokens = OutstandingToken.objects.bulk_create([
+            OutstandingToken(user=usuario, jti=uuid.uuid4().hex, token='x', expires_at=expira)
+            for _ in range(min(lote, n - inicio))
+        ])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=t) for t in tokens])
+
+
+def medir_rotaciones(serializer_class, token_class, usuario, repeticiones):
+    """
+    Cadena de refrescos: cada uno usa el refresh token devuelto por el anterior
+    """
+    refresh = str(token_class.for_user(usuario))
+    tiempos = np.empty(repeticiones)
+    for i in range(repeticiones):
+        inicio = time.perf_counter()
+        serializer = serializer_class(data={'refresh': refresh})
+        serializer.is_valid(raise_exception=True)
+        refresh = serializer.validated_data['refresh']
+        tiempos[i] = (time.perf_counter() - inicio) * 1000
+    return tiempos
+
+
+class Command(BaseCommand):
+    help = 'Latencia de refresco con rotación según el tamaño de la lista negra: RefreshToken frente a RefreshTokenFiltrado'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', type=int, nargs='+', default=[0, 100_000, 1_000_000])
+        parser.add_argument('--repeticiones', type=int, default=300)
+
+    def handle(self, *args, **options):
+        with base_datos_temporal():
+            usuario = Usuario.objects.create_user('bench@example.com', 'bench', 'clave-segura-123')
+            self.stdout.write(f"{'lista negra':>12} {'simplejwt p50 (ms)':>19} {'p99':>7} {'filtrado p50 (ms)':>18} {'p99':>7}")
+            sembrados = 0
+            for tamano in sorted(options['tamanos']):
+                sembrar_lista_negra(usuario, tamano - sembrados)
+                sembrados = tamano
+                lista_negra.reiniciar()
+                # La primera rotación construye el filtro; no entra en la medida
+                medir_rotaciones(RefrescoTokenSerializer, RefreshTokenFiltrado, usuario, 1)
+
+                base = percentiles(medir_rotaciones(TokenRefreshSerializer, RefreshToken, usuario, options['repeticiones']))
+                filtrado = percentiles(
+                    medir_rotaciones(RefrescoTokenSerializer, RefreshTokenFiltrado, usuario, options['repeticiones'])
+                )
+                self.stdout.write(
+                    f"{tamano:>12} {base['p50']:19.3f} {base['p99']:7.3f} {filtrado['p50']:18.3f} {filtrado['p99']:7.3f}"
+                )
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class Command(BaseCommand):
+    help = ('Borra por bloques los refresh tokens caducados (OutstandingToken y su BlacklistedToken); '
+            'cada bloque es una transacción corta para no bloquear los refrescos')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000, help='Tokens por transacción')
+        parser.add_argument('--pausa', type=float, default=0.0,
+                            help='Segundos de espera entre bloques para ceder la base de datos')
+
+    def handle(self, *args, **options):
+        limite = timezone.now()
+        borrados, ultimo_id = 0, 0
+        inicio = time.perf_counter()
+        while True:
+            # Recorrido por clave primaria: cada bloque empieza donde acabó el anterior
+            ids = list(
+                OutstandingToken.objects.filter(id__gt=ultimo_id, expires_at__lt=limite)
+                .order_by('id').values_list('id', flat=True)[:options['lote']]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                BlacklistedToken.objects.filter(token_id__in=ids).delete()
+                OutstandingToken.objects.filter(id__in=ids).delete()
+            borrados += len(ids)
+            ultimo_id = ids[-1]
+            if options['pausa']:
+                time.sleep(options['pausa'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{borrados} tokens caducados borrados en {time.perf_counter() - inicio:.2f} s'
+        ))
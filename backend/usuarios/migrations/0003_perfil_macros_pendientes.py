@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0002_alter_perfil_genero'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfil',
+            name='macros_pendientes',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
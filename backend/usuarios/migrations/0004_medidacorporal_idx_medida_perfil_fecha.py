@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0003_perfil_macros_pendientes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medidacorporal',
+            index=models.Index(fields=['id_perfil', 'fecha_registro'], name='idx_medida_perfil_fecha'),
+        ),
+    ]
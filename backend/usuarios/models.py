@@ -1,7 +1,9 @@
 from datetime import date
 from decimal import Decimal
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from .cache import invalidar_autenticacion, invalidar_tendencia, invalidar_usuarios
 
 # Create your models here.
 class UsuarioManager(BaseUserManager):
@@ -43,11 +45,44 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
 
     objects = UsuarioManager()
 
+    # Campos del usuario que salen en la respuesta del perfil
+    CAMPOS_PERFIL = ('email', 'nombre_usuario')
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['nombre_usuario']
 
     def __str__(self):
         return self.nombre_usuario
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._guardar_estado_perfil()
+        return instancia
+
+    def _guardar_estado_perfil(self):
+        self._estado_perfil = {campo: self.__dict__[campo] for campo in self.CAMPOS_PERFIL if campo in self.__dict__}
+
+    def save(self, *args, **kwargs):
+        # Contraseña, is_active o email pueden haber cambiado: fuera de la caché de autenticación
+        estado = getattr(self, '_estado_perfil', {})
+        modificado = not self._state.adding and any(
+            campo in self.__dict__ and estado.get(campo) != self.__dict__[campo] for campo in self.CAMPOS_PERFIL
+        )
+        super().save(*args, **kwargs)
+        self._guardar_estado_perfil()
+        invalidar_autenticacion([self.pk])
+        if modificado:
+            # La respuesta del perfil lleva email y nombre_usuario; su ETag y Last-Modified
+            # salen de fecha_actualizacion (update() no aplica auto_now)
+            Perfil.objects.filter(id_usuario=self.pk).update(fecha_actualizacion=timezone.now())
+            invalidar_usuarios([self.pk])
+
+    def delete(self, *args, **kwargs):
+        id_usuario = self.pk
+        resultado = super().delete(*args, **kwargs)
+        invalidar_autenticacion([id_usuario])
+        return resultado
     
     class Meta:
         db_table = 'usuarios'
@@ -71,6 +106,9 @@ class Perfil(models.Model):
         ('mantenimiento', 'Mantenimiento'),
         ('ganancia_muscular', 'Ganancia Muscular'),
     ]
+
+    # Campos de los que dependen BMR, TDEE y los macros objetivo
+    CAMPOS_METABOLICOS = ('peso_actual', 'altura', 'fecha_nacimiento', 'genero', 'nivel_actividad', 'objetivo')
     
     id_usuario = models.OneToOneField(Usuario, on_delete=models.CASCADE, unique=True)
     nombre = models.CharField(max_length=100, blank=True)
@@ -85,9 +123,34 @@ class Perfil(models.Model):
     bmr = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True)  # Tasa Metabólica Basal
     tdee = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True)  # Gasto Energético Total
     fecha_actualizacion = models.DateTimeField(auto_now=True)
+    macros_pendientes = models.BooleanField(default=False, db_index=True)  # Macros activos por recalcular
     
     def __str__(self):
         return f"Perfil de {self.id_usuario.nombre_usuario}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._guardar_estado_metabolico()
+        return instancia
+
+    def _guardar_estado_metabolico(self):
+        # Solo se guardan los campos cargados (los diferidos no están en __dict__)
+        self._estado_metabolico = {
+            campo: self.__dict__[campo] for campo in self.CAMPOS_METABOLICOS if campo in self.__dict__
+        }
+
+    def campos_metabolicos_modificados(self):
+        """
+        Campos metabólicos cambiados desde que se cargó o guardó el perfil
+        """
+        estado = getattr(self, '_estado_metabolico', None)
+        if self._state.adding or estado is None:
+            return set(self.CAMPOS_METABOLICOS)
+        return {
+            campo for campo in self.CAMPOS_METABOLICOS
+            if campo in self.__dict__ and (campo not in estado or estado[campo] != self.__dict__[campo])
+        }
     
     class Meta:
         db_table = 'perfiles'
@@ -122,21 +185,50 @@ class Perfil(models.Model):
 
 
     def save(self, *args, **kwargs):
-        bmr_calculado = self.calcular_bmr()
-        if bmr_calculado:
-            self.bmr = Decimal(str(round(bmr_calculado, 2)))
-            tdee_calculado = bmr_calculado * self.factor_actividad()
-            self.tdee = Decimal(str(round(tdee_calculado, 2)))
+        # Solo se recalcula (y se marcan los macros como pendientes) si cambian los datos metabólicos;
+        # editar nombre o apellidos no cuesta ningún cálculo
+        if self.campos_metabolicos_modificados():
+            bmr_calculado = self.calcular_bmr()
+            if bmr_calculado:
+                self.bmr = Decimal(str(round(bmr_calculado, 2)))
+                tdee_calculado = bmr_calculado * self.factor_actividad()
+                self.tdee = Decimal(str(round(tdee_calculado, 2)))
+            self.macros_pendientes = True
+
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'bmr', 'tdee', 'macros_pendientes'}
+        creado = self._state.adding
         super().save(*args, **kwargs)
+        self._guardar_estado_metabolico()
+        invalidar_usuarios([self.id_usuario_id])
+        invalidar_tendencia([self.pk])  # La proyección depende de peso_objetivo
+        if creado:
+            # La autenticación guarda el id del perfil (o que no tiene)
+            invalidar_autenticacion([self.id_usuario_id])
 
 class MedidaCorporal(models.Model):
     id_perfil = models.ForeignKey(Perfil, on_delete=models.CASCADE)
     fecha_registro = models.DateField(auto_now_add=True)
     peso = models.DecimalField(max_digits=5, decimal_places=2)
     porcentaje_grasa = models.DecimalField(max_digits=4, decimal_places=2, null=True, blank=True)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidar_tendencia([self.id_perfil_id])
+
+    def delete(self, *args, **kwargs):
+        id_perfil = self.id_perfil_id
+        resultado = super().delete(*args, **kwargs)
+        invalidar_tendencia([id_perfil])
+        return resultado
     
     class Meta:
         db_table = 'medidas_corporales'
+        indexes = [
+            # El mismo que idx_perfil_fecha de init.sql: la tendencia lee las medidas de un perfil por fecha
+            models.Index(fields=['id_perfil', 'fecha_registro'], name='idx_medida_perfil_fecha'),
+        ]
 
 class HistorialObjetivo(models.Model):
     OBJETIVO_CHOICES = [
@@ -1,6 +1,8 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from django.contrib.auth import authenticate
 from .models import Usuario, Perfil
+from .tokens import RefreshTokenFiltrado
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 
@@ -49,7 +51,7 @@ class PerfilSerializer(serializers.ModelSerializer):
     class Meta:
         model = Perfil
         fields = '__all__'
-        read_only_fields = ('id_usuario', 'bmr', 'tdee', 'fecha_actualizacion')
+        read_only_fields = ('id_usuario', 'bmr', 'tdee', 'fecha_actualizacion', 'macros_pendientes')
 
 class UsuarioSerializer(serializers.ModelSerializer):
     perfil = PerfilSerializer(read_only=True)
@@ -83,3 +85,7 @@ class CambiarContrasenaSerializer(serializers.Serializer):
         if not usuario.check_password(value):
             raise serializers.ValidationError("La contraseña actual es incorrecta")
         return value
+
+class RefrescoTokenSerializer(TokenRefreshSerializer):
+    # Lista negra a través del filtro de Bloom (usuarios/tokens.py)
+    token_class = RefreshTokenFiltrado
@@ -0,0 +1,159 @@
+"""
+Tendencia de peso de un perfil con NumPy a partir de sus MedidaCorporal.
+
+Todo se calcula sobre columnas en una pasada: media móvil exponencial con
+semivida en días (las medidas no tienen por qué ser diarias), ritmo semanal,
+pendiente de las últimas semanas, fecha estimada para el peso objetivo y
+reducción a un número máximo de puntos por intervalos de tiempo iguales.
+
+La media exponencial con pesos variables s_i = d_i·s_(i-1) + (1 - d_i)·x_i,
+con d_i = exp(-Δt_i/τ), se resuelve sin bucle: el producto de los d hasta i es
+exp(-(t_i - t_0)/τ), así que s_i es una suma acumulada escalada. Para que las
+exponenciales no desborden se calcula por tramos de TRAMO_TAU constantes de
+tiempo, cada uno arrancando del último valor del anterior.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+
+_CONFIGURACION = settings.MACROMATE_SETTINGS['TENDENCIA_PESO']
+TRAMO_TAU = 500  # exp(500) aún cabe de sobra en un float64
+UMBRAL_OBJETIVO_KG = 0.1
+
+
+def media_movil_exponencial(dias, valores, semivida_dias):
+    """
+    dias: días desde la primera medida (ordenados); valores: array del mismo tamaño
+    """
+    tau = semivida_dias / np.log(2)
+    resultado = np.empty(len(valores))
+    inicio, previo = 0, None
+    while inicio < len(valores):
+        if previo is not None and (dias[inicio] - dias[inicio - 1]) / tau > TRAMO_TAU:
+            previo = None  # El peso de lo anterior es despreciable: la media vuelve a empezar
+        # Tiempos relativos a la medida anterior al tramo (con su media ya calculada) o a la primera
+        referencia = dias[inicio - 1] if previo is not None else dias[inicio]
+        t = (dias[inicio:] - referencia) / tau
+        fin = inicio + max(int(np.searchsorted(t, TRAMO_TAU, side='right')), 1)
+        t, x = t[:fin - inicio], valores[inicio:fin]
+        crecimiento = np.exp(t)
+        # Peso de cada medida frente a la media anterior: 1 - exp(-Δt/τ); sin media previa, 1
+        alfa = -np.expm1(-np.diff(t, prepend=0.0 if previo is not None else -np.inf))
+        base = previo if previo is not None else 0.0
+        resultado[inicio:fin] = (base + np.cumsum(alfa * x * crecimiento)) / crecimiento
+        previo, inicio = resultado[fin - 1], fin
+    return resultado
+
+
+def ritmo_semanal(dias, serie):
+    """
+    kg por semana de cada punto respecto al punto de hace (al menos) 7 días; NaN si no lo hay
+    """
+    anteriores = np.searchsorted(dias, dias - 7, side='right') - 1
+    validos = anteriores >= 0
+    ritmo = np.full(len(serie), np.nan)
+    separacion = dias[validos] - dias[anteriores[validos]]
+    ritmo[validos] = (serie[validos] - serie[anteriores[validos]]) / separacion * 7
+    return ritmo
+
+
+def pendiente_reciente(dias, pesos, ventana_dias):
+    """
+    Pendiente por mínimos cuadrados (kg/semana) de las medidas de la última ventana
+    """
+    recientes = dias >= dias[-1] - ventana_dias
+    x, y = dias[recientes], pesos[recientes]
+    if len(x) < 2 or np.ptp(x) == 0:
+        return None
+    return float(np.polyfit(x, y, 1)[0] * 7)
+
+
+def _reducir(dias, columnas, puntos):
+    """
+    Agrupa las medidas en `puntos` intervalos de tiempo iguales. Devuelve el
+    día medio de cada intervalo no vacío y, por columna, la media (o el último
+    valor para las columnas marcadas) ignorando NaN.
+    """
+    n = len(dias)
+    if n <= puntos:
+        return dias, [valores for valores, _ in columnas]
+    extension = max(dias[-1] - dias[0], 1e-9)  # Todas el mismo día: una sola cubeta
+    cubetas = np.minimum((dias - dias[0]) / extension * puntos, puntos - 1).astype(np.intp)
+    # Las medidas están ordenadas: cada cubeta es un tramo contiguo
+    primeros = np.flatnonzero(np.r_[True, np.diff(cubetas) > 0])
+    ultimos = np.r_[primeros[1:] - 1, n - 1]
+    cantidad = ultimos - primeros + 1
+    dias_medios = np.add.reduceat(dias, primeros) / cantidad
+    reducidas = []
+    for valores, ultimo in columnas:
+        if ultimo:
+            reducidas.append(valores[ultimos])
+            continue
+        presentes = ~np.isnan(valores)
+        sumas = np.add.reduceat(np.where(presentes, valores, 0.0), primeros)
+        cuenta = np.add.reduceat(presentes.astype(np.intp), primeros)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            reducidas.append(np.where(cuenta > 0, sumas / np.maximum(cuenta, 1), np.nan))
+    return dias_medios, reducidas
+
+
+def _redondear(valor, decimales=2):
+    return None if valor is None or np.isnan(valor) else round(float(valor), decimales)
+
+
+def calcular_tendencia(medidas, peso_objetivo=None, puntos=None):
+    """
+    medidas: [(fecha, peso, porcentaje_grasa)] ordenadas por fecha
+    """
+    puntos = puntos or _CONFIGURACION['PUNTOS_DEFECTO']
+    if not medidas:
+        return {'medidas': 0, 'serie': [], 'peso_tendencia': None, 'ritmo_semanal': None,
+                'peso_objetivo': peso_objetivo, 'objetivo_alcanzado': None, 'fecha_objetivo_estimada': None}
+
+    fechas, pesos, grasas = zip(*medidas)
+    origen = fechas[0]
+    dias = np.array([(f - origen).days for f in fechas], dtype=np.float64)
+    pesos = np.array(pesos, dtype=np.float64)
+    grasas = np.array([np.nan if g is None else g for g in grasas], dtype=np.float64)
+
+    media = media_movil_exponencial(dias, pesos, _CONFIGURACION['SEMIVIDA_DIAS'])
+    ritmo = ritmo_semanal(dias, media)
+    pendiente = pendiente_reciente(dias, pesos, _CONFIGURACION['VENTANA_RITMO_DIAS'])
+
+    peso_tendencia = float(media[-1])
+    alcanzado, fecha_objetivo = None, None
+    if peso_objetivo is not None:
+        restante = float(peso_objetivo) - peso_tendencia
+        alcanzado = abs(restante) < UMBRAL_OBJETIVO_KG
+        if alcanzado:
+            fecha_objetivo = fechas[-1]
+        elif pendiente and np.sign(pendiente) == np.sign(restante):
+            dias_restantes = restante / pendiente * 7
+            if dias_restantes <= _CONFIGURACION['MAX_DIAS_PROYECCION']:
+                fecha_objetivo = fechas[-1] + timedelta(days=int(np.ceil(dias_restantes)))
+
+    dias_serie, (pesos_serie, grasas_serie, media_serie, ritmo_serie) = _reducir(
+        dias, [(pesos, False), (grasas, False), (media, True), (ritmo, True)], puntos
+    )
+    serie = [
+        {
+            'fecha': origen + timedelta(days=int(round(d))),
+            'peso': _redondear(p),
+            'porcentaje_grasa': _redondear(g),
+            'media_movil': _redondear(m),
+            'ritmo_semanal': _redondear(r, 3),
+        }
+        for d, p, g, m, r in zip(
+            dias_serie.tolist(), pesos_serie.tolist(), grasas_serie.tolist(), media_serie.tolist(), ritmo_serie.tolist()
+        )
+    ]
+    return {
+        'medidas': len(medidas),
+        'serie': serie,
+        'peso_tendencia': _redondear(peso_tendencia),
+        'ritmo_semanal': _redondear(pendiente, 3),
+        'peso_objetivo': peso_objetivo,
+        'objetivo_alcanzado': alcanzado,
+        'fecha_objetivo_estimada': fecha_objetivo,
+    }
@@ -0,0 +1,460 @@
+import asyncio
+import io
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import numpy as np
+from datetime import date, timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from unittest import mock, skipUnless
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from macromate import planes
+from macromate.cache import SQLiteCache, aleer, aobtener_o_calcular
+from .autenticacion import CacheLRU, usuarios_autenticados
+from . import hashing
+from .hashing import configurar_pool, obtener_pool
+from .models import MedidaCorporal, Usuario, Perfil
+from .tendencia import calcular_tendencia, media_movil_exponencial
+from .tokens import CLAVE_VERSION, FiltroBloom, RefreshTokenFiltrado, lista_negra
+
+
+class PerfilCamposModificadosTestCase(TestCase):
+    def setUp(self):
+        usuario = Usuario.objects.create_user('ana@example.com', 'ana', 'clave-segura-123')
+        Perfil.objects.create(
+            id_usuario=usuario, peso_actual=Decimal('60.00'), altura=Decimal('165.00'),
+            fecha_nacimiento=date(1990, 1, 1), genero='femenino'
+        )
+        Perfil.objects.update(macros_pendientes=False)
+        self.perfil = Perfil.objects.get(id_usuario=usuario)
+
+    def test_cambiar_nombre_no_marca_pendiente(self):
+        self.perfil.nombre = 'Ana'
+        self.perfil.bmr = None
+        self.perfil.save()
+
+        self.perfil.refresh_from_db()
+        self.assertFalse(self.perfil.macros_pendientes)
+        self.assertIsNone(self.perfil.bmr)  # No se ha recalculado
+
+    def test_cambiar_peso_marca_pendiente_y_recalcula(self):
+        bmr_anterior = self.perfil.bmr
+        self.perfil.peso_actual = Decimal('58.00')
+        self.perfil.save(update_fields=['peso_actual'])
+
+        self.perfil.refresh_from_db()
+        self.assertTrue(self.perfil.macros_pendientes)
+        self.assertEqual(self.perfil.bmr, bmr_anterior - 20)
+
+    def test_mismo_valor_no_marca_pendiente(self):
+        self.perfil.peso_actual = Decimal('60')
+        self.assertEqual(self.perfil.campos_metabolicos_modificados(), set())
+
+
+class SQLiteCacheTestCase(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.ruta = os.path.join(directorio.name, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.ruta, {})
+
+    def test_operaciones_basicas(self):
+        self.cache.set('a', {'x': Decimal('1.50')})
+        self.assertEqual(self.cache.get('a'), {'x': Decimal('1.50')})
+        self.assertFalse(self.cache.add('a', 2))
+        self.assertTrue(self.cache.add('b', 2))
+        self.assertEqual(self.cache.incr('b', 3), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('no-existe')
+        self.cache.delete_many(['a', 'b'])
+        self.assertIsNone(self.cache.get('a'))
+
+        self.cache.set('caduca', 1, timeout=-1)
+        self.assertIsNone(self.cache.get('caduca'))
+        self.assertTrue(self.cache.add('caduca', 2))
+
+    def test_compartida_entre_instancias(self):
+        # Cada worker tiene su propia instancia del backend sobre el mismo fichero
+        otra = SQLiteCache(self.ruta, {})
+        self.cache.set('version', 1)
+        otra.incr('version')
+        self.assertEqual(self.cache.get('version'), 2)
+
+    def test_purga_respeta_max_entries(self):
+        limitada = SQLiteCache(self.ruta, {'OPTIONS': {'MAX_ENTRIES': 50, 'CULL_FREQUENCY': 2}})
+        for i in range(300):
+            limitada.set(f'k{i}', i)
+        self.assertLessEqual(sum(limitada.has_key(f'k{i}') for i in range(300)), 150)
+
+    def test_asincrona_no_bloquea_el_bucle_de_eventos(self):
+        # Otro proceso con el bloqueo de escritura durante 0,3 s
+        otra = sqlite3.connect(self.ruta, isolation_level=None, check_same_thread=False)
+        self.cache.set('leida', 1)
+        otra.execute('BEGIN IMMEDIATE')
+        liberar = threading.Timer(0.3, lambda: otra.execute('COMMIT'))
+
+        async def calcular():
+            return {'valor': 2}
+
+        async def ejecutar():
+            # En WAL la lectura no espera al escritor: se hace en el propio bucle
+            self.assertEqual(await aleer('leida', cache=self.cache), 1)
+            vueltas = 0
+
+            async def contar():
+                nonlocal vueltas
+                while True:
+                    await asyncio.sleep(0.01)
+                    vueltas += 1
+
+            contador = asyncio.create_task(contar())
+            liberar.start()
+            valor = await aobtener_o_calcular('pruebas', 'escrita', calcular, cache=self.cache)
+            contador.cancel()
+            return valor, vueltas
+
+        valor, vueltas = asyncio.run(ejecutar())
+        self.assertEqual(valor, {'valor': 2})
+        self.assertEqual(self.cache.get('escrita'), {'valor': 2})
+        self.assertGreater(vueltas, 10)  # El bucle siguió mientras la escritura esperaba al bloqueo
+        otra.close()
+
+        # Con el fichero ocupado también para leer, la lectura pasa a otro hilo
+        with mock.patch.object(self.cache, 'get_sin_esperar', side_effect=sqlite3.OperationalError('database is locked')):
+            self.assertEqual(asyncio.run(aleer('leida', cache=self.cache)), 1)
+
+    def test_los_tests_no_usan_la_cache_del_nodo(self):
+        # macromate.pruebas.EjecutorPruebas: cache.clear() no puede vaciar la caché de un servidor en marcha
+        self.assertNotEqual(os.path.dirname(caches['default']._ruta), str(settings.BASE_DIR))
+
+
+class PerfilCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create_user('eva@example.com', 'eva', 'clave-segura-123')
+        Perfil.objects.create(id_usuario=self.usuario, peso_actual=Decimal('70.00'))
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.usuario)
+
+    def test_get_cacheado_e_invalidado_por_put(self):
+        self.cliente.get('/api/usuarios/perfil/')
+        with self.assertNumQueries(0):
+            respuesta = self.cliente.get('/api/usuarios/perfil/')
+        self.assertEqual(respuesta.data['peso_actual'], '70.00')
+
+        self.cliente.put('/api/usuarios/perfil/', {'peso_actual': '68.50'}, format='json')
+        respuesta = self.cliente.get('/api/usuarios/perfil/')
+        self.assertEqual(respuesta.data['peso_actual'], '68.50')
+        self.assertTrue(respuesta.data['macros_pendientes'])
+
+    def test_get_condicional(self):
+        respuesta = self.cliente.get('/api/usuarios/perfil/')
+        self.assertIn('no-cache', respuesta['Cache-Control'])
+        self.assertIn('private', respuesta['Cache-Control'])
+        self.assertIn('Authorization', respuesta['Vary'])
+        with self.assertNumQueries(0):
+            no_modificada = self.cliente.get('/api/usuarios/perfil/', HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(no_modificada.status_code, 304)
+        self.assertEqual(no_modificada['ETag'], respuesta['ETag'])
+        self.assertEqual(self.cliente.get(
+            '/api/usuarios/perfil/', HTTP_IF_MODIFIED_SINCE=respuesta['Last-Modified']).status_code, 304)
+
+        # Sin entrada en caché basta la consulta de id y fecha de modificación
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cliente.get(
+                '/api/usuarios/perfil/', HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+
+        self.cliente.put('/api/usuarios/perfil/', {'peso_actual': '68.50'}, format='json')
+        cambiada = self.cliente.get('/api/usuarios/perfil/', HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(cambiada.status_code, 200)
+        self.assertNotEqual(cambiada['ETag'], respuesta['ETag'])
+
+    def test_cambio_del_usuario_invalida_el_perfil(self):
+        respuesta = self.cliente.get('/api/usuarios/perfil/')
+        usuario = Usuario.objects.get(pk=self.usuario.pk)
+        usuario.email = 'eva.nueva@example.com'
+        usuario.save()
+        cambiada = self.cliente.get('/api/usuarios/perfil/', HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(cambiada.status_code, 200)
+        self.assertEqual(cambiada.data['email'], 'eva.nueva@example.com')
+
+        # Guardar sin cambiar email ni nombre (p. ej. la última sesión) no toca el perfil
+        fecha = Perfil.objects.get(id_usuario=usuario).fecha_actualizacion
+        usuario.last_login = timezone.now()
+        usuario.save(update_fields=['last_login'])
+        self.assertEqual(Perfil.objects.get(id_usuario=usuario).fecha_actualizacion, fecha)
+        self.assertEqual(self.cliente.get('/api/usuarios/perfil/', HTTP_IF_NONE_MATCH=cambiada['ETag']).status_code, 304)
+
+
+class AutenticacionCacheadaTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        usuarios_autenticados.clear()
+        self.usuario = Usuario.objects.create_user('jwt@example.com', 'jwt', 'clave-segura-123')
+        Perfil.objects.create(id_usuario=self.usuario)
+        self.refresh = RefreshToken.for_user(self.usuario)
+        self.cliente = APIClient()
+        self.cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def test_usuario_y_perfil_en_caché(self):
+        # Fallo: una sola consulta para usuario e id del perfil; la de macros no busca el perfil
+        with self.assertNumQueries(2):
+            self.assertEqual(self.cliente.get('/api/nutricion/macros-actuales/').status_code, 404)
+        self.cliente.get('/api/usuarios/perfil/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cliente.get('/api/usuarios/perfil/').status_code, 200)
+
+    def test_cambio_de_contrasena_invalida(self):
+        self.cliente.get('/api/usuarios/perfil/')
+        respuesta = self.cliente.post('/api/usuarios/cambiar_contrasena/', {
+            'contrasena_actual': 'clave-segura-123',
+            'nueva_contrasena': 'otra-clave-segura-456',
+            'confirmar_contrasena': 'otra-clave-segura-456',
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        with self.assertNumQueries(1):  # Se vuelve a cargar el usuario
+            self.cliente.get('/api/usuarios/perfil/')
+
+    def test_usuario_desactivado_y_logout(self):
+        self.cliente.get('/api/usuarios/perfil/')
+        self.cliente.post('/api/usuarios/logout/', {'refresh': str(self.refresh)}, format='json')
+        with self.assertNumQueries(1):
+            self.cliente.get('/api/usuarios/perfil/')
+
+        self.usuario.is_active = False
+        self.usuario.save()
+        self.assertEqual(self.cliente.get('/api/usuarios/perfil/').status_code, 401)
+
+    def test_cache_lru_acotada(self):
+        lru = CacheLRU(max_entradas=2, ttl_segundos=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)  # Descarta 'b', el menos usado
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+        caducada = CacheLRU(max_entradas=2, ttl_segundos=0)
+        caducada.set('a', 1)
+        self.assertIsNone(caducada.get('a'))
+
+
+class VistasAsincronasTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        usuarios_autenticados.clear()
+        self.usuario = Usuario.objects.create_user('async@example.com', 'async', 'clave-segura-123')
+        Perfil.objects.create(id_usuario=self.usuario, peso_actual=Decimal('72.50'))
+        self.cabecera = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.usuario).access_token}'}
+
+    def test_perfil_igual_que_la_version_sincrona(self):
+        asincrona = self.client.get('/api/usuarios/async/perfil/', **self.cabecera)
+        self.assertEqual(asincrona.status_code, 200)
+        # Segunda lectura: usuario y perfil salen de las cachés
+        with self.assertNumQueries(0):
+            self.client.get('/api/usuarios/async/perfil/', **self.cabecera)
+        cache.clear()
+        self.assertEqual(self.client.get('/api/usuarios/perfil/', **self.cabecera).json(), asincrona.json())
+
+    def test_get_condicional(self):
+        respuesta = self.client.get('/api/usuarios/async/perfil/', **self.cabecera)
+        # Mismos validadores que la versión síncrona
+        self.assertEqual(respuesta['ETag'], self.client.get('/api/usuarios/perfil/', **self.cabecera)['ETag'])
+        self.assertIn('Last-Modified', respuesta)
+        self.assertIn('private', respuesta['Cache-Control'])
+        with self.assertNumQueries(0):
+            no_modificada = self.client.get(
+                '/api/usuarios/async/perfil/', HTTP_IF_NONE_MATCH=respuesta['ETag'], **self.cabecera)
+        self.assertEqual(no_modificada.status_code, 304)
+        self.assertEqual(no_modificada['ETag'], respuesta['ETag'])
+
+        Perfil.objects.get(id_usuario=self.usuario).save()
+        cambiada = self.client.get('/api/usuarios/async/perfil/', HTTP_IF_NONE_MATCH=respuesta['ETag'], **self.cabecera)
+        self.assertEqual(cambiada.status_code, 200)
+        self.assertNotEqual(cambiada['ETag'], respuesta['ETag'])
+
+    def test_sin_token_o_token_invalido(self):
+        self.assertEqual(self.client.get('/api/usuarios/async/perfil/').status_code, 401)
+        respuesta = self.client.get('/api/usuarios/async/perfil/', HTTP_AUTHORIZATION='Bearer no-es-un-token')
+        self.assertEqual(respuesta.status_code, 401)
+        self.assertEqual(respuesta.json()['code'], 'token_not_valid')
+        self.assertEqual(self.client.post('/api/usuarios/async/perfil/', **self.cabecera).status_code, 405)
+
+
+class ListaNegraTokensTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        lista_negra.reiniciar()
+        self.usuario = Usuario.objects.create_user('rot@example.com', 'rot', 'clave-segura-123')
+        self.cliente = APIClient()
+
+    def refrescar(self, refresh):
+        return self.cliente.post('/api/usuarios/token/refrescar/', {'refresh': str(refresh)}, format='json')
+
+    def test_filtro_bloom_sin_falsos_negativos(self):
+        filtro = FiltroBloom(1000, 0.01)
+        filtro.agregar_varios([f'jti-{i}' for i in range(1000)])
+        filtro.agregar('otro')
+        self.assertTrue(all(f'jti-{i}' in filtro for i in range(1000)))
+        self.assertIn('otro', filtro)
+        falsos = sum(f'ausente-{i}' in filtro for i in range(10000))
+        self.assertLess(falsos, 300)
+
+    def test_rotacion_pone_en_lista_negra(self):
+        refresh = RefreshTokenFiltrado.for_user(self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.refrescar(refresh)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('refresh', respuesta.data)
+        self.assertEqual(self.refrescar(refresh).status_code, 401)
+        self.assertEqual(self.refrescar(respuesta.data['refresh']).status_code, 200)
+
+    def test_lista_negra_de_otro_worker(self):
+        refresh = RefreshTokenFiltrado.for_user(self.usuario)
+        self.assertEqual(self.refrescar(RefreshTokenFiltrado.for_user(self.usuario)).status_code, 200)
+        # Otro proceso pone el token en lista negra e incrementa la versión compartida
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=refresh['jti']))
+        cache.set(CLAVE_VERSION, 'otra')
+        self.assertEqual(self.refrescar(refresh).status_code, 401)
+
+    def test_token_no_listado_no_consulta_la_lista_negra(self):
+        self.refrescar(RefreshTokenFiltrado.for_user(self.usuario))  # Construye el filtro
+        refresh = RefreshTokenFiltrado.for_user(self.usuario)
+        evitadas = lista_negra.consultas_evitadas
+        with CaptureQueriesContext(connection) as consultas:
+            self.refrescar(refresh)
+        self.assertEqual(lista_negra.consultas_evitadas, evitadas + 1)
+        # Ninguna consulta busca el jti en la lista negra (el join con outstandingtoken)
+        self.assertFalse(any('INNER JOIN' in q['sql'] and 'blacklistedtoken' in q['sql'] for q in consultas))
+
+    def test_compactar_borra_caducados(self):
+        vigente = RefreshTokenFiltrado.for_user(self.usuario)
+        caducado = RefreshTokenFiltrado.for_user(self.usuario)
+        caducado.blacklist()
+        OutstandingToken.objects.filter(jti=caducado['jti']).update(expires_at=timezone.now() - timedelta(days=1))
+        call_command('compactar_tokens', lote=1, stdout=io.StringIO())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [vigente['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class PoolHashingTestCase(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user('hash@example.com', 'hash', 'clave-segura-123')
+        self.anterior = configurar_pool(1, 0)
+        self.addCleanup(lambda: configurar_pool(self.anterior.hilos, self.anterior.max_cola).cerrar())
+
+    def test_login_pasa_por_el_pool(self):
+        respuesta = APIClient().post('/api/usuarios/login/', {
+            'email': 'hash@example.com', 'password': 'clave-segura-123'
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        metricas = obtener_pool().metricas()
+        self.assertEqual(metricas['completados'], 1)
+        self.assertIn('hash_ms', metricas)
+
+    def test_pool_saturado_rechaza_con_429(self):
+        # Un trabajo en curso ocupa la única plaza (1 hilo, cola 0)
+        obtener_pool()._plazas.acquire()
+        self.addCleanup(obtener_pool()._plazas.release)
+
+        respuesta = APIClient().post('/api/usuarios/login/', {
+            'email': 'hash@example.com', 'password': 'clave-segura-123'
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 429)
+        self.assertEqual(respuesta['Retry-After'], '1')
+        self.assertEqual(obtener_pool().metricas()['rechazados'], 1)
+
+    def test_hilos_por_defecto_dejan_un_nucleo_libre(self):
+        for nucleos, hilos in ((8, 7), (2, 1), (1, 1)):
+            with mock.patch.object(hashing, 'nucleos_disponibles', return_value=nucleos):
+                self.assertEqual(hashing.hilos_por_defecto(), hilos)
+
+
+class TendenciaPesoTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        usuarios_autenticados.clear()
+        self.usuario = Usuario.objects.create_user('peso@example.com', 'peso', 'clave-segura-123')
+        self.perfil = Perfil.objects.create(id_usuario=self.usuario, peso_objetivo=Decimal('70.00'))
+        self.cliente = APIClient()
+        self.cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.usuario).access_token}')
+
+    def crear_medidas(self, pesos, inicio=date(2022, 1, 1)):
+        medidas = MedidaCorporal.objects.bulk_create([MedidaCorporal(id_perfil=self.perfil, peso=p) for p in pesos])
+        # fecha_registro es auto_now_add: las fechas pasadas se fijan después
+        for i, medida in enumerate(medidas):
+            medida.fecha_registro = inicio + timedelta(days=i)
+        MedidaCorporal.objects.bulk_update(medidas, ['fecha_registro'])
+
+    def test_media_exponencial_igual_que_la_recurrencia(self):
+        dias = [0.0, 1.0, 3.0, 4.0, 10.0, 30.0]
+        pesos = [80.0, 79.0, 81.0, 78.5, 79.5, 77.0]
+        esperado = [pesos[0]]
+        for i in range(1, len(pesos)):
+            decaimiento = math.exp(-(dias[i] - dias[i - 1]) * math.log(2) / 7)
+            esperado.append(decaimiento * esperado[-1] + (1 - decaimiento) * pesos[i])
+        for obtenido, valor in zip(media_movil_exponencial(np.array(dias), np.array(pesos), 7), esperado):
+            self.assertAlmostEqual(obtenido, valor, places=9)
+
+    def test_proyeccion_y_reduccion(self):
+        # Tres años bajando 0,01 kg al día: 1,1 kg de margen hasta el objetivo
+        medidas = [(date(2022, 1, 1) + timedelta(days=i), 82.0 - 0.01 * i, None) for i in range(1095)]
+        tendencia = calcular_tendencia(medidas, Decimal('70.00'), puntos=100)
+        self.assertLessEqual(len(tendencia['serie']), 100)
+        self.assertEqual(tendencia['serie'][0]['fecha'], date(2022, 1, 6))  # Media de los días 0 a 10
+        self.assertAlmostEqual(tendencia['ritmo_semanal'], -0.07, places=3)
+        self.assertFalse(tendencia['objetivo_alcanzado'])
+        # La media va ~0,1 kg por detrás del último peso (71,06): faltan ~1,16 kg a 0,01 kg/día
+        self.assertAlmostEqual((tendencia['fecha_objetivo_estimada'] - medidas[-1][0]).days, 116, delta=2)
+
+        # Sin progreso hacia el objetivo no hay fecha
+        subiendo = [(f, 100 - p, g) for f, p, g in medidas]
+        self.assertIsNone(calcular_tendencia(subiendo, Decimal('70.00'))['fecha_objetivo_estimada'])
+
+    def test_cacheada_hasta_la_siguiente_medida(self):
+        self.crear_medidas([80 - 0.02 * i for i in range(3 * 365)])
+        primera = self.cliente.get('/api/usuarios/tendencia-peso/', {'puntos': 50})
+        self.assertEqual(primera.status_code, 200)
+        self.assertEqual(primera.data['medidas'], 3 * 365)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cliente.get('/api/usuarios/tendencia-peso/', {'puntos': 50}).data, primera.data)
+
+        MedidaCorporal.objects.create(id_perfil=self.perfil, peso=Decimal('50.00'))
+        with self.assertNumQueries(2):  # Medidas y peso objetivo
+            segunda = self.cliente.get('/api/usuarios/tendencia-peso/', {'puntos': 50})
+        self.assertEqual(segunda.data['medidas'], 3 * 365 + 1)
+        self.assertEqual(self.cliente.get('/api/usuarios/tendencia-peso/', {'puntos': 1}).status_code, 400)
+
+    def test_medida_durante_el_calculo_no_queda_en_cache(self):
+        self.crear_medidas([80, 79.5, 79])
+        calcular = calcular_tendencia
+
+        def calcular_con_medida_concurrente(*args, **kwargs):
+            # Otra petición registra una medida después de leer las medidas y antes de guardar en caché
+            MedidaCorporal.objects.create(id_perfil=self.perfil, peso=Decimal('78.50'))
+            return calcular(*args, **kwargs)
+
+        with mock.patch('usuarios.views.calcular_tendencia', side_effect=calcular_con_medida_concurrente):
+            self.assertEqual(self.cliente.get('/api/usuarios/tendencia-peso/').data['medidas'], 3)
+        self.assertEqual(self.cliente.get('/api/usuarios/tendencia-peso/').data['medidas'], 4)
+
+
+@skipUnless(planes.soportado(), 'Los planes se leen con EXPLAIN QUERY PLAN de SQLite')
+class PlanesConsultaTestCase(TestCase):
+    def test_historial_de_medidas(self):
+        queryset = MedidaCorporal.objects.filter(id_perfil_id=1).order_by('fecha_registro', 'id').values_list(
+            'fecha_registro', 'peso', 'porcentaje_grasa'
+        )
+        self.assertEqual(planes.tablas_recorridas(queryset), [])
+        self.assertIn('idx_medida_perfil_fecha', planes.indices_usados(queryset))
+        self.assertFalse(planes.ordena_en_memoria(queryset))
@@ -0,0 +1,229 @@
+"""
+Comprobación de la lista negra de refresh tokens con un filtro de Bloom.
+
+Con ROTATE_REFRESH_TOKENS y BLACKLIST_AFTER_ROTATION cada refresco consulta y
+amplía token_blacklist. Cada proceso mantiene un filtro de Bloom con los jti
+en lista negra (de tokens no caducados): si el jti no está en el filtro no hay
+consulta; si está, se confirma en la base de datos (puede ser un falso
+positivo), así que el resultado es siempre exacto.
+
+El filtro se construye desde la base de datos y se pone al día con los
+BlacklistedToken nuevos (id > último visto) cuando cambia la versión de la
+lista negra en la caché compartida, que incrementa cada blacklist() de
+cualquier worker, o como mucho cada SEGUNDOS_SINCRONIZACION. Se reconstruye
+entero al llenarse o cada SEGUNDOS_RECONSTRUCCION, lo que descarta los jti
+caducados o compactados (comando compactar_tokens).
+"""
+import hashlib
+import math
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+_CONFIGURACION = {
+    'CAPACIDAD': 1_000_000,
+    'PROB_FALSOS_POSITIVOS': 0.001,
+    'SEGUNDOS_SINCRONIZACION': 5,
+    'SEGUNDOS_RECONSTRUCCION': 3600,
+    **settings.MACROMATE_SETTINGS.get('LISTA_NEGRA', {}),
+}
+CLAVE_VERSION = 'usuarios:version_lista_negra'
+TAMANO_LOTE_CARGA = 50_000
+# Los ids de varias transacciones simultáneas pueden confirmarse desordenados:
+# cada sincronización vuelve a leer este margen por debajo del último id visto
+MARGEN_IDS = 100
+
+
+def _hashes(jti):
+    digest = hashlib.blake2b(jti.encode(), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+
+class FiltroBloom:
+    """
+    Filtro de Bloom sobre un array de bits de numpy (doble hash: h1 + i·h2)
+    """
+
+    def __init__(self, capacidad, prob_falsos_positivos):
+        capacidad = max(capacidad, 1)
+        self.bits = max(64, int(-capacidad * math.log(prob_falsos_positivos) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.bits / capacidad * math.log(2)))
+        self.capacidad = capacidad
+        self.elementos = 0
+        self._array = np.zeros((self.bits + 7) // 8, dtype=np.uint8)
+        self._indices = np.arange(self.num_hashes, dtype=np.uint64)
+
+    def _posiciones(self, h1, h2):
+        # Aritmética uint64 modular, como la de los hashes
+        return (np.uint64(h1) + self._indices * np.uint64(h2)) % np.uint64(self.bits)
+
+    @staticmethod
+    def _bytes_y_mascaras(posiciones):
+        return posiciones >> np.uint64(3), np.left_shift(1, posiciones & np.uint64(7)).astype(np.uint8)
+
+    def agregar(self, jti):
+        np.bitwise_or.at(self._array, *self._bytes_y_mascaras(self._posiciones(*_hashes(jti))))
+        self.elementos += 1
+
+    def agregar_varios(self, jtis):
+        hashes = np.array([_hashes(jti) for jti in jtis], dtype=np.uint64).reshape(-1, 2)
+        if not len(hashes):
+            return
+        posiciones = ((hashes[:, :1] + self._indices * hashes[:, 1:]) % np.uint64(self.bits)).ravel()
+        np.bitwise_or.at(self._array, *self._bytes_y_mascaras(posiciones))
+        self.elementos += len(hashes)
+
+    def __contains__(self, jti):
+        indices, mascaras = self._bytes_y_mascaras(self._posiciones(*_hashes(jti)))
+        return bool(np.all(self._array[indices] & mascaras))
+
+    @property
+    def lleno(self):
+        return self.elementos >= self.capacidad
+
+
+class ListaNegraFiltrada:
+    def __init__(self):
+        self._filtro = None
+        self._ultimo_id = 0
+        self._ids_recientes = set()  # Ids ya cargados dentro del margen
+        self._version = None
+        self._sincronizado = 0.0
+        self._construido = 0.0
+        self._bloqueo = threading.Lock()
+        self.consultas_evitadas = 0
+        self.falsos_positivos = 0
+
+    def _reconstruir(self):
+        # El id máximo se fija antes de cargar: lo que entre después llega con los deltas
+        ultimo_id = BlacklistedToken.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        # Los tokens caducados no se cargan: verify() los rechaza igualmente
+        vigentes = BlacklistedToken.objects.filter(id__lte=ultimo_id, token__expires_at__gt=timezone.now())
+        filtro = FiltroBloom(
+            max(_CONFIGURACION['CAPACIDAD'], 2 * vigentes.count()), _CONFIGURACION['PROB_FALSOS_POSITIVOS']
+        )
+        lote = []
+        for jti in vigentes.order_by().values_list('token__jti', flat=True).iterator(chunk_size=TAMANO_LOTE_CARGA):
+            lote.append(jti)
+            if len(lote) == TAMANO_LOTE_CARGA:
+                filtro.agregar_varios(lote)
+                lote = []
+        filtro.agregar_varios(lote)
+        self._filtro, self._ultimo_id = filtro, ultimo_id
+        self._ids_recientes = set(
+            BlacklistedToken.objects.filter(id__gt=ultimo_id - MARGEN_IDS, id__lte=ultimo_id).values_list('id', flat=True)
+        )
+        self._construido = time.monotonic()
+
+    def _sincronizar(self):
+        nuevos = list(
+            BlacklistedToken.objects.filter(id__gt=self._ultimo_id - MARGEN_IDS)
+            .order_by('id').values_list('id', 'token__jti')
+        )
+        nuevos = [(i, jti) for i, jti in nuevos if i not in self._ids_recientes]
+        if nuevos:
+            self._filtro.agregar_varios([jti for _, jti in nuevos])
+            self._ultimo_id = max(self._ultimo_id, nuevos[-1][0])
+            self._ids_recientes.update(i for i, _ in nuevos)
+            self._ids_recientes = {i for i in self._ids_recientes if i > self._ultimo_id - MARGEN_IDS}
+
+    def _actualizar(self):
+        # La versión se lee antes de consultar: un blacklist() simultáneo no se pierde
+        version = cache.get(CLAVE_VERSION)
+        ahora = time.monotonic()
+        if (
+            self._filtro is not None and version == self._version
+            and ahora - self._sincronizado < _CONFIGURACION['SEGUNDOS_SINCRONIZACION']
+        ):
+            return
+        with self._bloqueo:
+            if (
+                self._filtro is None or self._filtro.lleno
+                or ahora - self._construido > _CONFIGURACION['SEGUNDOS_RECONSTRUCCION']
+            ):
+                self._reconstruir()
+            else:
+                self._sincronizar()
+            self._version = version
+            self._sincronizado = ahora
+
+    def contiene(self, jti):
+        self._actualizar()
+        if jti not in self._filtro:
+            self.consultas_evitadas += 1
+            return False
+        en_lista = BlacklistedToken.objects.filter(token__jti=jti).exists()
+        if not en_lista:
+            self.falsos_positivos += 1
+        return en_lista
+
+    def agregado(self, jti):
+        """
+        Anota un jti recién añadido a la lista negra en este proceso y avisa al resto
+        """
+        if self._filtro is not None:
+            self._filtro.agregar(jti)
+
+        def incrementar_version():
+            try:
+                cache.incr(CLAVE_VERSION)
+            except ValueError:
+                cache.add(CLAVE_VERSION, 1, timeout=None)
+
+        # Tras el commit: otro worker que sincronice antes no vería la fila
+        transaction.on_commit(incrementar_version)
+
+    def reiniciar(self):
+        with self._bloqueo:
+            self._filtro = None
+            self._version = None
+
+
+lista_negra = ListaNegraFiltrada()
+
+
+class RefreshTokenFiltrado(RefreshToken):
+    """
+    RefreshToken que consulta la lista negra a través del filtro de Bloom y
+    que no vuelve a cargar el usuario al anotar o poner en lista negra el token
+    """
+
+    def check_blacklist(self):
+        if lista_negra.contiene(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        token, _creado = OutstandingToken.objects.get_or_create(
+            jti=jti,
+            defaults={
+                'user_id': self.payload.get(api_settings.USER_ID_CLAIM),
+                'created_at': self.current_time,
+                'token': str(self),
+                'expires_at': datetime_from_epoch(self.payload['exp']),
+            },
+        )
+        resultado = BlacklistedToken.objects.get_or_create(token=token)
+        lista_negra.agregado(jti)
+        return resultado
+
+    def outstand(self):
+        # Solo se llama tras set_jti(): el jti es nuevo y basta un INSERT
+        return OutstandingToken.objects.create(
+            jti=self.payload[api_settings.JTI_CLAIM],
+            user_id=self.payload.get(api_settings.USER_ID_CLAIM),
+            created_at=self.current_time,
+            token=str(self),
+            expires_at=datetime_from_epoch(self.payload['exp']),
+        )
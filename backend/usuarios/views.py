@@ -2,20 +2,41 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET
 
-from .models import Usuario, Perfil
+from macromate.asincrono import autenticacion_requerida, respuesta_json
+from macromate.cache import aobtener_o_calcular, obtener_o_calcular
+from macromate.condicional import condicional, etag
+from .autenticacion import id_perfil_de
+from .cache import TIMEOUT_LECTURAS, TIMEOUT_TENDENCIA, clave_perfil, clave_tendencia, invalidar_autenticacion
+from .hashing import PoolHashingSaturado
+from .models import MedidaCorporal, Usuario, Perfil
 from .serializers import (
     UsuarioRegistroSerializer, 
     UsuarioLoginSerializer, 
     UsuarioSerializer,
     PerfilSerializer,
-    CambiarContrasenaSerializer
+    CambiarContrasenaSerializer,
+    RefrescoTokenSerializer
 )
+from .tendencia import calcular_tendencia
+from .tokens import RefreshTokenFiltrado
+
+def respuesta_pool_saturado(excepcion):
+    # Rechazo inmediato: el cliente reintenta en lugar de ocupar un hilo esperando
+    return Response(
+        {'error': str(excepcion.detail)},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={'Retry-After': str(excepcion.wait)}
+    )
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -29,7 +50,7 @@ def registro_usuario(request):
                 
                 Perfil.objects.create(id_usuario=usuario)
                 
-                refresh = RefreshToken.for_user(usuario)
+                refresh = RefreshTokenFiltrado.for_user(usuario)
                 
                 return Response({
                     'usuario': UsuarioSerializer(usuario).data,
@@ -38,6 +59,8 @@ def registro_usuario(request):
                     'message': 'Usuario registrado exitosamente'
                 }, status=status.HTTP_201_CREATED)
             
+        except PoolHashingSaturado as e:
+            return respuesta_pool_saturado(e)
         except Exception as e:
             return Response(
                 {'error': 'Error creando el perfil de usuario'}, 
@@ -50,11 +73,15 @@ def registro_usuario(request):
 def login_usuario(request):
     serializer = UsuarioLoginSerializer(data=request.data)
     
-    if serializer.is_valid():
+    try:
+        valido = serializer.is_valid()
+    except PoolHashingSaturado as e:
+        return respuesta_pool_saturado(e)
+    if valido:
         usuario = serializer.validated_data['usuario']
         
         # Generar tokens JWT
-        refresh = RefreshToken.for_user(usuario)
+        refresh = RefreshTokenFiltrado.for_user(usuario)
         
         return Response({
             'usuario': UsuarioSerializer(usuario).data,
@@ -65,15 +92,47 @@ def login_usuario(request):
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+def _perfiles_con_usuario():
+    # select_related: el serializador lee nombre_usuario y email sin otra consulta
+    return Perfil.objects.select_related('id_usuario')
+
+def _datos_perfil(perfil):
+    # Lo que se guarda en caché: igual en la vista síncrona y en la asíncrona
+    return dict(PerfilSerializer(perfil).data)
+
+def leer_perfil(usuario):
+    """
+    Datos del perfil del usuario a través de la caché (se crea vacío si no existe).
+    Perfil.save() invalida la entrada (PUT incluido).
+    """
+    def leer():
+        perfil, creado = _perfiles_con_usuario().get_or_create(id_usuario=usuario)
+        return _datos_perfil(perfil)
+
+    return obtener_o_calcular('perfil', clave_perfil(usuario.pk), leer, TIMEOUT_LECTURAS)
+
+def validadores_perfil(request):
+    """
+    ETag y Last-Modified del perfil desde la caché o, si no está, leyendo solo id y fecha_actualizacion
+    """
+    datos = cache.get(clave_perfil(request.user.pk))
+    if datos is not None:
+        pk, fecha = datos['id'], parse_datetime(datos['fecha_actualizacion'])
+    else:
+        fila = Perfil.objects.filter(id_usuario=request.user).values_list('pk', 'fecha_actualizacion').first()
+        if fila is None:
+            return None, None  # El GET lo creará
+        pk, fecha = fila
+    return etag('perfil', pk, fecha.timestamp()), fecha
+
 @api_view(['GET', 'PUT'])
 @permission_classes([IsAuthenticated])
+@condicional(validadores_perfil)
 def perfil_usuario(request):
     usuario = request.user
     
     if request.method == 'GET':
-        perfil, creado = Perfil.objects.get_or_create(id_usuario=usuario)
-        serializer = PerfilSerializer(perfil)
-        return Response(serializer.data)
+        return Response(leer_perfil(usuario))
     
     elif request.method == 'PUT':
         perfil = Perfil.objects.get(id_usuario=usuario)
@@ -85,6 +144,59 @@ def perfil_usuario(request):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@require_GET
+@autenticacion_requerida
+@condicional(validadores_perfil)
+async def perfil_usuario_async(request):
+    """
+    Versión asíncrona del GET de perfil_usuario (misma caché y misma respuesta)
+    """
+    usuario = request.user
+
+    async def aleer_perfil():
+        perfil, creado = await _perfiles_con_usuario().aget_or_create(id_usuario=usuario)
+        return _datos_perfil(perfil)
+
+    datos = await aobtener_o_calcular('perfil', clave_perfil(usuario.pk), aleer_perfil, TIMEOUT_LECTURAS)
+    return respuesta_json(datos)
+
+_TENDENCIA = settings.MACROMATE_SETTINGS['TENDENCIA_PESO']
+MAX_TENDENCIAS_CACHEADAS = 8  # Valores distintos de ?puntos= guardados por perfil
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def tendencia_peso(request):
+    """
+    Medidas de peso reducidas a ?puntos=, media móvil, ritmo semanal y fecha estimada del peso objetivo.
+    Se cachea por perfil hasta la siguiente medida (o cambio de peso objetivo).
+    """
+    try:
+        puntos = int(request.query_params.get('puntos', _TENDENCIA['PUNTOS_DEFECTO']))
+    except ValueError:
+        return Response({'error': 'puntos debe ser un número entero'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 2 <= puntos <= _TENDENCIA['MAX_PUNTOS']:
+        return Response(
+            {'error': f"puntos debe estar entre 2 y {_TENDENCIA['MAX_PUNTOS']}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    id_perfil = id_perfil_de(request.user)
+    if id_perfil is None:
+        return Response({'error': 'Perfil no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+
+    clave = clave_tendencia(id_perfil)
+    tendencias = cache.get(clave) or {}
+    if puntos not in tendencias:
+        medidas = MedidaCorporal.objects.filter(id_perfil_id=id_perfil).order_by('fecha_registro', 'id').values_list(
+            'fecha_registro', 'peso', 'porcentaje_grasa'
+        )
+        peso_objetivo = Perfil.objects.filter(pk=id_perfil).values_list('peso_objetivo', flat=True).first()
+        if len(tendencias) >= MAX_TENDENCIAS_CACHEADAS:
+            tendencias = {}
+        tendencias[puntos] = calcular_tendencia(list(medidas), peso_objetivo, puntos)
+        cache.set(clave, tendencias, TIMEOUT_TENDENCIA)
+    return Response(tendencias[puntos])
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def cambiar_contrasena(request):
@@ -93,7 +205,11 @@ def cambiar_contrasena(request):
         context={'request': request}
     )
     
-    if serializer.is_valid():
+    try:
+        valido = serializer.is_valid()
+    except PoolHashingSaturado as e:
+        return respuesta_pool_saturado(e)
+    if valido:
         usuario = request.user
         nueva_contrasena = serializer.validated_data['nueva_contrasena']
         
@@ -101,7 +217,7 @@ def cambiar_contrasena(request):
             # Validar la nueva contraseña con los validadores de Django
             validate_password(nueva_contrasena, usuario)
             
-            # Cambiar la contraseña
+            # Cambiar la contraseña (Usuario.save invalida la caché de autenticación)
             usuario.set_password(nueva_contrasena)
             usuario.save()
             
@@ -110,6 +226,8 @@ def cambiar_contrasena(request):
                 'detail': 'Tu contraseña ha sido actualizada correctamente'
             }, status=status.HTTP_200_OK)
             
+        except PoolHashingSaturado as e:
+            return respuesta_pool_saturado(e)
         except ValidationError as e:
             return Response({
                 'error': 'Error en validación de contraseña',
@@ -118,14 +236,29 @@ def cambiar_contrasena(request):
             
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def refrescar_token(request):
+    """
+    Devuelve un access token nuevo y, al rotar, un refresh token nuevo;
+    el anterior pasa a la lista negra
+    """
+    serializer = RefrescoTokenSerializer(data=request.data)
+    try:
+        serializer.is_valid(raise_exception=True)
+    except TokenError:
+        return Response({'error': 'Token inválido o expirado'}, status=status.HTTP_401_UNAUTHORIZED)
+    return Response(serializer.validated_data)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def logout_usuario(request):
     try:
         RefreshToken_token_value = request.data.get('refresh')
         if RefreshToken_token_value:
-            token = RefreshToken(RefreshToken_token_value)
+            token = RefreshTokenFiltrado(RefreshToken_token_value)
             token.blacklist()
+        invalidar_autenticacion([request.user.pk])
         return Response({'message': 'Sesión cerrada exitosamente'}, status=status.HTTP_205_RESET_CONTENT)
     except Exception as e:
         return Response({'error': 'Token inválido o expirado'}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file